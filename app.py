@@ -9,10 +9,37 @@ import streamlit as st
 import yfinance as yf
 import pandas as pd
 import numpy as np
+import pyarrow as pa
 import plotly.graph_objects as go
 from datetime import datetime, timedelta
 from groq import Groq
 import os
+import re
+import time
+import hashlib
+import bisect
+import unicodedata
+import json
+import sqlite3
+import threading
+import requests
+from types import MappingProxyType
+from functools import lru_cache
+from collections import OrderedDict, deque
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FuturesTimeoutError
+
+# Sesión HTTP con huella de navegador (dependencia de yfinance >= 0.2.54)
+try:
+    from curl_cffi import requests as curl_requests
+    from curl_cffi.curl import Curl
+except ImportError:
+    curl_requests = None
+
+# Error de símbolo inexistente (yfinance >= 0.2.38)
+try:
+    from yfinance.exceptions import YFTickerMissingError
+except ImportError:
+    YFTickerMissingError = None
 
 # =============================================================================
 # SISTEMA DE TRADUCCIONES (ESPAÑOL / INGLÉS)
@@ -43,6 +70,8 @@ TRANSLATIONS = {
         "peg_expensive": "Caro",
         "classifications": "Clasificaciones:",
         "developed_with": "Desarrollado con",
+        "http_pool_title": "🔌 Conexiones con Yahoo",
+        "http_pool_stats": "{requests} peticiones · {errors} errores · {in_flight}/{pool_size} en curso (pico {peak_in_flight}) · {rejected} sin hueco · latencia media {latency} · espera total en cola {wait:.1f} s",
         "using": "usando",
         
         # Clasificaciones Lynch
@@ -54,10 +83,15 @@ TRANSLATIONS = {
         
         # Búsqueda
         "search_stock": "🔍 Buscar Acción",
-        "ticker_placeholder": "AAPL, KO, MSFT, IBE.MC, TSLA...",
-        "ticker_help": "Introduce el símbolo de la acción. Para mercados europeos añade el sufijo (ej: IBE.MC para Iberdrola)",
+        "ticker_placeholder": "AAPL, KO, IBE.MC, Coca-Cola, Inditex...",
+        "ticker_help": "Introduce el símbolo o el nombre de la empresa. Para mercados europeos el símbolo lleva sufijo (ej: IBE.MC para Iberdrola)",
         "analyze": "ANALIZAR",
         "quick_examples": "Ejemplos rápidos:",
+        "did_you_mean": "¿Quisiste decir?",
+        "analyze_literal": "Analizar '{query}' tal cual",
+        "resolved_ticker": "'{query}' → {ticker} ({name})",
+        "choose_suggestion": "'{query}' no es un símbolo exacto: elige una de las sugerencias.",
+        "no_symbol_match": "No hay ninguna empresa que se parezca a '{query}'. Prueba con el símbolo (ej: KO, IBE.MC).",
         
         # Métricas panel
         "main_metrics": "📊 MÉTRICAS PRINCIPALES",
@@ -145,6 +179,19 @@ TRANSLATIONS = {
         "no_news": "No hay noticias recientes disponibles",
         "loading_data": "Cargando datos de",
         "error_loading": "Error al cargar datos",
+        "yahoo_unavailable": "Yahoo Finance no responde; reintentando en unos segundos",
+        "data_age": "Datos de hace {age}",
+        "data_refreshing": "actualizando en segundo plano",
+        "market_closed": "mercado cerrado",
+        "data_stale_outage": "Yahoo Finance no responde: se muestran los últimos datos válidos",
+        "analysis_loading": "⏳ {ticker} está tardando más de lo habitual: el análisis aparecerá en cuanto lleguen los datos",
+        "sections_pending": "⏳ Aún cargando: {sections}. Se completarán en cuanto lleguen",
+        "section_pending": "⏳ Cargando… esta sección se completará en cuanto lleguen los datos",
+        "section_historico": "historial de precios",
+        "section_noticias": "noticias",
+        "section_balance": "balance trimestral",
+        "section_estimaciones": "estimaciones de analistas",
+        "ai_waiting_data": "⏳ El análisis IA empezará cuando lleguen los datos pendientes",
         "invalid_ticker": "No se encontraron datos para el ticker",
         "enter_ticker": "Introduce un ticker para comenzar el análisis",
         
@@ -190,6 +237,177 @@ TRANSLATIONS = {
         "select_language": "SELECCIONAR IDIOMA",
         "language_spanish": "Español",
         "language_english": "Inglés",
+        
+        # Idioma
+        "language_name": "Español",
+        "current_language": "Idioma actual",
+        "tagline": "Compra lo que conoces",
+        
+        # Clasificaciones (nombres cortos y descripciones)
+        "class_fast_grower": "Crecimiento Rápido",
+        "class_stalwart": "Estable",
+        "class_cyclical": "Cíclica",
+        "class_turnaround": "Recuperación",
+        "class_asset_play": "Activo Oculto",
+        "tech_growth_desc": "Empresa tecnológica en fase de crecimiento",
+        "large_cap_desc": "Gran capitalización - empresa consolidada en su sector",
+        "mid_cap_desc": "Empresa de mediana capitalización consolidada",
+        "small_cap_desc": "Empresa de menor tamaño con potencial de crecimiento",
+        
+        # Descripciones de tendencia
+        "trend_desc_strong_bearish": "Caída libre: tendencia bajista fuerte bajo todas las medias",
+        "trend_desc_strong_uptrend": "Alcista fuerte: subiendo y cerca de máximos anuales",
+        "trend_desc_recovery": "Fase de recuperación: sobre SMA200 pero lejos de máximos",
+        "trend_desc_oversold_bounce": "Rebote técnico: subiendo pero aún bajo SMA200",
+        "trend_desc_downtrend": "Tendencia bajista: precio bajo medias móviles clave",
+        
+        # Períodos y gráfico de precios
+        "period_today": "hoy",
+        "refresh_price": "Actualizar precio",
+        "day_range": "Día",
+        "range_52w": "52 sem.",
+        "quote_as_of": "Cotización de las {time}",
+        "period_this_week": "esta semana",
+        "period_this_month": "este mes",
+        "period_last_3m": "últimos 3 meses",
+        "period_last_6m": "últimos 6 meses",
+        "period_last_year": "último año",
+        "period_last_5y": "últimos 5 años",
+        "period_max": "máx. histórico",
+        "period_1y": "1A",
+        "no_dividends": "Sin dividendos",
+        "not_enough_period_data": "⚠️ No hay suficientes datos para el período seleccionado",
+        "no_history_data": "⚠️ No hay datos históricos disponibles para mostrar el gráfico",
+        
+        # Búsqueda y errores de ticker
+        "verify_intro": "Por favor verifica que:",
+        "verify_spelling": "El símbolo esté escrito correctamente",
+        "verify_suffix": "Para mercados europeos, añade el sufijo correcto (ej: .MC para Madrid, .L para Londres)",
+        "verify_listed": "La acción esté listada en una bolsa soportada por Yahoo Finance",
+        "enter_ticker_warning": "⚠ Por favor, introduce un ticker para analizar",
+        "based_on": "Basado en la metodología de",
+        "methodology_suffix": "",
+        
+        # Análisis IA
+        "ai_title": "🤖 ANÁLISIS INGENIERO BROKER",
+        "ai_spinner": "🧠 El Ingeniero Broker está analizando los datos...",
+        "regenerate_analysis": "🔄 Regenerar Análisis",
+        "ai_disclaimer": "Este análisis es generado por IA con fines educativos. No constituye asesoramiento financiero. Siempre haz tu propia investigación antes de invertir.",
+        "api_key_missing_title": "⚠ API Key no configurada",
+        "api_key_missing_body": "Para obtener el análisis del Ingeniero Broker, introduce tu API Key de Groq en la barra lateral.",
+        "data_available_above": "Los datos financieros ya están disponibles arriba.",
+        "raw_data_label": "📋 Ver datos crudos para análisis manual",
+        "prompt_tokens": "≈ {prompt} tokens de prompt + {system} de instrucción de sistema",
+        "structured_verdict": "Veredicto estructurado (JSON)",
+        "structured_verdict_help": "El modelo devuelve un veredicto validado que se guarda en la caché local y se puede consultar sin volver a llamar a la IA.",
+        "verdict_label": "Veredicto",
+        "classification_label": "Clasificación",
+        "peg_label": "PEG",
+        "debt_label": "Deuda",
+        "confidence_label": "Confianza",
+        "verdict_buy": "COMPRAR",
+        "verdict_sell": "VENDER",
+        "verdict_hold": "MANTENER",
+        "verdict_invalid": "Respuesta no válida del modelo",
+        "ai_screen_title": "🤖 Veredictos por lotes (reglas + IA)",
+        "ai_screen_desc": "Puntúa una lista de tickers con las reglas de Lynch al instante y envía a la IA varias empresas por petición. Los veredictos se guardan por ticker y los ya analizados se sirven desde la caché.",
+        "ai_screen_run": "▶ Analizar lista",
+        "ai_screen_borderline": "IA solo para los casos dudosos (según las reglas)",
+        "rule_verdict_label": "⚡ Veredicto instantáneo (reglas)",
+        "rule_verdict_detail": "Puntuación {score}/100 con PEG, efectivo/deuda y posición en la banda de valor justo ({coverage:.0f}% de los datos). Provisional.",
+        "rule_score": "Puntuación",
+        "rule_verdict_short": "Reglas",
+        "verdict_ai": "Veredicto IA",
+        "local_llm_active": "🖥️ Modelo local de respaldo: {model} ({url})",
+        "ai_screen_stats": "{tickers} tickers · {requests} peticiones a la IA · {cached} desde caché",
+        
+        # Gráfico de Peter Lynch
+        "lynch_chart_title": "📊 GRÁFICO DE PETER LYNCH - Precio vs Beneficios",
+        "lynch_help_title": "¿Qué muestra este gráfico?",
+        "lynch_help_desc": "Peter Lynch recomendaba comparar el precio de la acción con su 'línea de valor justo' (EPS × P/E Justo). El <span style='color:#FFB74D;'>multiplicador P/E justo</span> se calcula como la <b>mediana histórica</b> del P/E de la acción. Cuando la <span style='color:#00FF9F;'>línea de precio</span> está POR ENCIMA de la <span style='color:#FFB74D;'>línea de valor justo</span>, la acción puede estar sobrevalorada. Cuando está POR DEBAJO, puede estar infravalorada.",
+        "lynch_growth_suffix": " ({pct:.0f}% crecim.)",
+        "lynch_conservative_legend": "Conservador PEG=1 (EPS×{multiplier}){growth}",
+        "lynch_band_legend": "Banda de Valor Justo",
+        "lynch_proj_conservative": "Proy. Conservador",
+        "lynch_projection": "Proyección",
+        "lynch_projection_annotation": "PROYECCIÓN",
+        "hover_conservative": "%{x|%Y-%m-%d}<br>Valor Conservador: $%{y:.2f}<extra></extra>",
+        "hover_fair_value": "%{x|%Y-%m-%d}<br>Valor Justo: $%{y:.2f}<extra></extra>",
+        "hover_price": "%{x|%Y-%m-%d}<br>Precio: $%{y:.2f}<extra></extra>",
+        "hover_proj_conservative": "%{x|%Y-%m-%d}<br>Conservador Proyectado: $%{y:.2f}<extra></extra>",
+        "hover_proj_fair_value": "%{x|%Y-%m-%d}<br>Valor Justo Proyectado: $%{y:.2f}<extra></extra>",
+        "status_deep_value": "OPORTUNIDAD PROFUNDA",
+        "status_deep_value_desc": "El precio está {pct:.1f}% por debajo del valor conservador. El mercado es muy pesimista.",
+        "status_overvalued": "SOBREVALORADO",
+        "status_slightly_overvalued": "LIGERAMENTE SOBREVALORADO",
+        "status_above_fair_desc": "El precio está {pct:.1f}% por encima del valor justo",
+        "status_priced_perfection": "PRECIO DE PERFECCIÓN",
+        "status_priced_perfection_desc": "PER alto ({pe:.0f}x) requiere crecimiento alto sostenido",
+        "status_fair_value": "VALOR JUSTO",
+        "status_undervalued": "INFRAVALORADO",
+        "status_below_fair_desc": "El precio está {pct:.1f}% por debajo del valor justo",
+        "lynch_method_note": "ℹ️ Valor justo = EPS × {fair} (mediana histórica del P/E). Conservador (PEG=1) = EPS × {conservative} (basado en tasa de crecimiento, mín 15, máx 25). ",
+        "lynch_method_current_eps": "Usando solo EPS actual.",
+        "lynch_method_projection": "Proyección: 1 año usando Forward EPS.",
+        "lynch_chart_error": "No se pudo generar el gráfico de Peter Lynch",
+        "lynch_no_eps_data": "No hay suficientes datos de beneficios disponibles para generar el gráfico de Peter Lynch",
+        "fair_value_label": "Valor Justo",
+        "conservative_peg1_label": "Conservador (PEG=1)",
+        "chart_error": "No se pudo generar el gráfico",
+        
+        # Insiders e institucionales
+        "insiders_title": "👔 DATOS DE INSIDERS E INSTITUCIONALES",
+        "ownership_summary": "📊 Resumen de Propiedad",
+        "institutional_ownership": "Participación Institucional",
+        "float_shares": "Acciones en Circulación (Float)",
+        "ownership_note": "ℹ️ Datos obtenidos de Yahoo Finance. Las acciones float son las disponibles para negociación pública.",
+        "insiders_ownership": "Participación de Insiders",
+        "institutions_pct_float": "% Institucional del Float",
+        "institutions_count": "Número de Instituciones",
+        "no_ownership_data": "No hay datos de propiedad disponibles",
+        "top_institutional_holders": "🏦 Principales Tenedores Institucionales",
+        "col_institution": "Institución",
+        "col_shares": "Acciones",
+        "col_date": "Fecha",
+        "col_pct_held": "% Posición",
+        "col_value": "Valor",
+        "col_position": "Cargo",
+        "col_type": "Tipo",
+        "no_institutional_data": "No hay datos de institucionales disponibles",
+        "short_interest": "📉 Interés en Corto",
+        "shares_short": "Acciones en Corto",
+        "short_ratio_days": "Ratio en Corto (Días)",
+        "float_short_pct": "% Float en Corto",
+        "change_vs_prior_month": "Cambio vs Mes Anterior:",
+        "short_interest_note": "ℹ️ El Ratio en Corto indica días para cubrir todas las posiciones cortas al volumen diario promedio. Alto % Float en Corto (>15%) puede indicar sentimiento bajista o potencial short squeeze.",
+        "no_short_data": "No hay datos de interés en corto disponibles para este ticker",
+        "insider_transactions": "📈 Transacciones Recientes de Insiders",
+        "tx_sale": "Venta",
+        "tx_buy": "Compra",
+        "tx_exercise": "Ejercicio",
+        "tx_gift": "Regalo",
+        "tx_other": "Otro",
+        "no_insider_activity": "No hay datos de actividad insider disponibles",
+        "no_insider_data": "No se pudieron obtener datos de insiders para este ticker",
+        
+        # Backtest de la banda
+        "backtest_title": "🧪 Backtest de la banda de Lynch",
+        "backtest_desc": "Compra cuando el precio cae bajo la banda de valor justo y vende cuando la supera, con datos point-in-time (EPS visible 90 días tras el cierre fiscal).",
+        "backtest_tickers": "Tickers (separados por comas)",
+        "backtest_skip_bearish": "No comprar en caída libre",
+        "backtest_run": "▶ Ejecutar backtest",
+        "backtest_spinner": "Simulando la estrategia...",
+        "backtest_error": "No se pudo ejecutar el backtest",
+        "backtest_no_data": "No hay datos suficientes para el backtest",
+        "backtest_note": "ℹ️ Cartera equiponderada entre posiciones abiertas, ejecución al cierre siguiente a la señal, sin comisiones. Rentabilidades pasadas no garantizan resultados futuros.",
+        "bt_total_return": "Rentabilidad",
+        "bt_cagr": "CAGR",
+        "bt_max_drawdown": "Máx. Drawdown",
+        "bt_hit_rate": "Acierto",
+        "bt_trades": "Operaciones",
+        "bt_buy_hold": "Comprar y Mantener",
+        "bt_exposure": "Exposición",
+        "bt_avg_trade": "Media por Operación",
     },
     "en": {
         # Main titles
@@ -216,6 +434,8 @@ TRANSLATIONS = {
         "peg_expensive": "Expensive",
         "classifications": "Classifications:",
         "developed_with": "Developed with",
+        "http_pool_title": "🔌 Yahoo connections",
+        "http_pool_stats": "{requests} requests · {errors} errors · {in_flight}/{pool_size} in flight (peak {peak_in_flight}) · {rejected} pool timeouts · average latency {latency} · total queue wait {wait:.1f} s",
         "using": "using",
         
         # Lynch classifications
@@ -227,10 +447,15 @@ TRANSLATIONS = {
         
         # Search
         "search_stock": "🔍 Search Stock",
-        "ticker_placeholder": "AAPL, KO, MSFT, IBE.MC, TSLA...",
-        "ticker_help": "Enter the stock symbol. For European markets add the suffix (e.g., IBE.MC for Iberdrola)",
+        "ticker_placeholder": "AAPL, KO, IBE.MC, Coca-Cola, Inditex...",
+        "ticker_help": "Enter the stock symbol or the company name. European symbols carry a suffix (e.g., IBE.MC for Iberdrola)",
         "analyze": "ANALYZE",
         "quick_examples": "Quick examples:",
+        "did_you_mean": "Did you mean?",
+        "analyze_literal": "Analyze '{query}' as typed",
+        "resolved_ticker": "'{query}' → {ticker} ({name})",
+        "choose_suggestion": "'{query}' is not an exact symbol: pick one of the suggestions.",
+        "no_symbol_match": "No company looks like '{query}'. Try the symbol (e.g., KO, IBE.MC).",
         
         # Metrics panel
         "main_metrics": "📊 KEY METRICS",
@@ -318,6 +543,19 @@ TRANSLATIONS = {
         "no_news": "No recent news available",
         "loading_data": "Loading data for",
         "error_loading": "Error loading data",
+        "yahoo_unavailable": "Yahoo Finance is not responding; retrying in a few seconds",
+        "data_age": "Data from {age} ago",
+        "data_refreshing": "refreshing in the background",
+        "market_closed": "market closed",
+        "data_stale_outage": "Yahoo Finance is not responding: showing the last good data",
+        "analysis_loading": "⏳ {ticker} is taking longer than usual: the analysis will appear as soon as the data arrives",
+        "sections_pending": "⏳ Still loading: {sections}. They will fill in as soon as they arrive",
+        "section_pending": "⏳ Loading… this section will fill in as soon as the data arrives",
+        "section_historico": "price history",
+        "section_noticias": "news",
+        "section_balance": "quarterly balance sheet",
+        "section_estimaciones": "analyst estimates",
+        "ai_waiting_data": "⏳ The AI analysis will start once the pending data arrives",
         "invalid_ticker": "No data found for ticker",
         "enter_ticker": "Enter a ticker to start the analysis",
         
@@ -363,17 +601,249 @@ TRANSLATIONS = {
         "select_language": "SELECT LANGUAGE",
         "language_spanish": "Spanish",
         "language_english": "English",
+        
+        # Language
+        "language_name": "English",
+        "current_language": "Current language",
+        "tagline": "Buy what you know",
+        
+        # Classifications (short names and descriptions)
+        "class_fast_grower": "Fast Grower",
+        "class_stalwart": "Stalwart",
+        "class_cyclical": "Cyclical",
+        "class_turnaround": "Turnaround",
+        "class_asset_play": "Asset Play",
+        "tech_growth_desc": "Technology company in growth phase",
+        "large_cap_desc": "Large cap - established company in its sector",
+        "mid_cap_desc": "Consolidated mid-cap company",
+        "small_cap_desc": "Smaller company with growth potential",
+        
+        # Trend descriptions
+        "trend_desc_strong_bearish": "Free fall: strong downtrend below all moving averages",
+        "trend_desc_strong_uptrend": "Strong uptrend: rising and near 52-week highs",
+        "trend_desc_recovery": "Recovery phase: above SMA200 but far from highs",
+        "trend_desc_oversold_bounce": "Technical bounce: rising but still below SMA200",
+        "trend_desc_downtrend": "Downtrend: price below key moving averages",
+        
+        # Periods and price chart
+        "period_today": "today",
+        "refresh_price": "Refresh price",
+        "day_range": "Day",
+        "range_52w": "52 wk",
+        "quote_as_of": "Quote as of {time}",
+        "period_this_week": "this week",
+        "period_this_month": "this month",
+        "period_last_3m": "last 3 months",
+        "period_last_6m": "last 6 months",
+        "period_last_year": "last year",
+        "period_last_5y": "last 5 years",
+        "period_max": "all time",
+        "period_1y": "1Y",
+        "no_dividends": "No dividends",
+        "not_enough_period_data": "⚠️ Not enough data for the selected period",
+        "no_history_data": "⚠️ No historical data available to display the chart",
+        
+        # Search and ticker errors
+        "verify_intro": "Please verify that:",
+        "verify_spelling": "The symbol is spelled correctly",
+        "verify_suffix": "For European markets, add the correct suffix (e.g., .MC for Madrid, .L for London)",
+        "verify_listed": "The stock is listed on an exchange supported by Yahoo Finance",
+        "enter_ticker_warning": "⚠ Please enter a ticker to analyze",
+        "based_on": "Based on",
+        "methodology_suffix": "methodology",
+        
+        # AI analysis
+        "ai_title": "🤖 AI ENGINEER BROKER ANALYSIS",
+        "ai_spinner": "🧠 The Engineer Broker is analyzing the data...",
+        "regenerate_analysis": "🔄 Regenerate Analysis",
+        "ai_disclaimer": "This analysis is generated by AI for educational purposes. It does not constitute financial advice. Always do your own research before investing.",
+        "api_key_missing_title": "⚠ API Key not configured",
+        "api_key_missing_body": "To get the Engineer Broker analysis, enter your Groq API Key in the sidebar.",
+        "data_available_above": "Financial data is already available above.",
+        "raw_data_label": "📋 View raw data for manual analysis",
+        "prompt_tokens": "≈ {prompt} prompt tokens + {system} system instruction tokens",
+        "structured_verdict": "Structured verdict (JSON)",
+        "structured_verdict_help": "The model returns a validated verdict that is stored in the local cache and can be queried without calling the AI again.",
+        "verdict_label": "Verdict",
+        "classification_label": "Classification",
+        "peg_label": "PEG",
+        "debt_label": "Debt",
+        "confidence_label": "Confidence",
+        "verdict_buy": "BUY",
+        "verdict_sell": "SELL",
+        "verdict_hold": "HOLD",
+        "verdict_invalid": "Invalid model response",
+        "ai_screen_title": "🤖 Batch verdicts (rules + AI)",
+        "ai_screen_desc": "Scores a list of tickers with Lynch rules instantly and sends several companies per request to the AI. Verdicts are stored per ticker and already analyzed ones are served from the cache.",
+        "ai_screen_run": "▶ Analyze list",
+        "ai_screen_borderline": "AI only for borderline cases (per the rules)",
+        "rule_verdict_label": "⚡ Instant verdict (rules)",
+        "rule_verdict_detail": "Score {score}/100 from PEG, cash/debt and position in the fair-value band ({coverage:.0f}% of the data). Provisional.",
+        "rule_score": "Score",
+        "rule_verdict_short": "Rules",
+        "verdict_ai": "AI verdict",
+        "local_llm_active": "🖥️ Local fallback model: {model} ({url})",
+        "ai_screen_stats": "{tickers} tickers · {requests} AI requests · {cached} from cache",
+        
+        # Peter Lynch chart
+        "lynch_chart_title": "📊 PETER LYNCH CHART - Price vs Earnings",
+        "lynch_help_title": "What does this chart show?",
+        "lynch_help_desc": "Peter Lynch recommended comparing the stock price with its 'fair value line' (EPS × Fair P/E). The <span style='color:#FFB74D;'>fair P/E multiplier</span> is calculated as the <b>historical median</b> of the stock's P/E ratio. When the <span style='color:#00FF9F;'>price line</span> is ABOVE the <span style='color:#FFB74D;'>fair value line</span>, the stock may be overvalued. When it's BELOW, it may be undervalued.",
+        "lynch_growth_suffix": " ({pct:.0f}% growth)",
+        "lynch_conservative_legend": "Conservative PEG=1 (EPS×{multiplier}){growth}",
+        "lynch_band_legend": "Fair Value Band",
+        "lynch_proj_conservative": "Proj. Conservative",
+        "lynch_projection": "Projection",
+        "lynch_projection_annotation": "PROJECTION",
+        "hover_conservative": "%{x|%Y-%m-%d}<br>Conservative Value: $%{y:.2f}<extra></extra>",
+        "hover_fair_value": "%{x|%Y-%m-%d}<br>Fair Value: $%{y:.2f}<extra></extra>",
+        "hover_price": "%{x|%Y-%m-%d}<br>Price: $%{y:.2f}<extra></extra>",
+        "hover_proj_conservative": "%{x|%Y-%m-%d}<br>Projected Conservative: $%{y:.2f}<extra></extra>",
+        "hover_proj_fair_value": "%{x|%Y-%m-%d}<br>Projected Fair Value: $%{y:.2f}<extra></extra>",
+        "status_deep_value": "DEEP VALUE",
+        "status_deep_value_desc": "Price is {pct:.1f}% below conservative value. Market is extremely pessimistic.",
+        "status_overvalued": "OVERVALUED",
+        "status_slightly_overvalued": "SLIGHTLY OVERVALUED",
+        "status_above_fair_desc": "Price is {pct:.1f}% above fair value",
+        "status_priced_perfection": "PRICED FOR PERFECTION",
+        "status_priced_perfection_desc": "High P/E ({pe:.0f}x) requires sustained high growth",
+        "status_fair_value": "FAIR VALUE",
+        "status_undervalued": "UNDERVALUED",
+        "status_below_fair_desc": "Price is {pct:.1f}% below fair value",
+        "lynch_method_note": "ℹ️ Fair value = EPS × {fair} (historical median P/E). Conservative (PEG=1) = EPS × {conservative} (based on growth rate, floor 15, cap 25). ",
+        "lynch_method_current_eps": "Using current EPS only.",
+        "lynch_method_projection": "Projection: 1 year using Forward EPS.",
+        "lynch_chart_error": "Could not generate Peter Lynch chart",
+        "lynch_no_eps_data": "Not enough earnings data available to generate the Peter Lynch chart",
+        "fair_value_label": "Fair Value",
+        "conservative_peg1_label": "Conservative (PEG=1)",
+        "chart_error": "Could not generate chart",
+        
+        # Insiders and institutions
+        "insiders_title": "👔 INSIDER & INSTITUTIONAL DATA",
+        "ownership_summary": "📊 Ownership Summary",
+        "institutional_ownership": "Institutional Ownership",
+        "float_shares": "Float Shares",
+        "ownership_note": "ℹ️ Data sourced from Yahoo Finance. Float shares are the shares available for public trading.",
+        "insiders_ownership": "Insiders Ownership",
+        "institutions_pct_float": "Institutions % of Float",
+        "institutions_count": "Number of Institutions",
+        "no_ownership_data": "No ownership data available",
+        "top_institutional_holders": "🏦 Top Institutional Holders",
+        "col_institution": "Institution",
+        "col_shares": "Shares",
+        "col_date": "Date",
+        "col_pct_held": "% Held",
+        "col_value": "Value",
+        "col_position": "Position",
+        "col_type": "Type",
+        "no_institutional_data": "No institutional holders data available",
+        "short_interest": "📉 Short Interest",
+        "shares_short": "Shares Short",
+        "short_ratio_days": "Short Ratio (Days)",
+        "float_short_pct": "% Float Short",
+        "change_vs_prior_month": "Change vs Prior Month:",
+        "short_interest_note": "ℹ️ Short Ratio indicates days to cover all short positions at average daily volume. High % Float Short (>15%) may indicate bearish sentiment or potential short squeeze.",
+        "no_short_data": "No short interest data available for this ticker",
+        "insider_transactions": "📈 Recent Insider Transactions",
+        "tx_sale": "Sale",
+        "tx_buy": "Buy",
+        "tx_exercise": "Exercise",
+        "tx_gift": "Gift",
+        "tx_other": "Other",
+        "no_insider_activity": "No insider activity data available",
+        "no_insider_data": "Could not retrieve insider data for this ticker",
+        
+        # Band backtest
+        "backtest_title": "🧪 Lynch band backtest",
+        "backtest_desc": "Buys when price drops below the fair-value band and sells when it rises above it, using point-in-time data (EPS visible 90 days after fiscal year end).",
+        "backtest_tickers": "Tickers (comma separated)",
+        "backtest_skip_bearish": "Don't buy in free fall",
+        "backtest_run": "▶ Run backtest",
+        "backtest_spinner": "Simulating the strategy...",
+        "backtest_error": "Could not run the backtest",
+        "backtest_no_data": "Not enough data for the backtest",
+        "backtest_note": "ℹ️ Equal-weighted across open positions, executed at the close after the signal, no commissions. Past returns do not guarantee future results.",
+        "bt_total_return": "Return",
+        "bt_cagr": "CAGR",
+        "bt_max_drawdown": "Max Drawdown",
+        "bt_hit_rate": "Hit Rate",
+        "bt_trades": "Trades",
+        "bt_buy_hold": "Buy & Hold",
+        "bt_exposure": "Exposure",
+        "bt_avg_trade": "Avg per Trade",
     }
 }
 
+DEFAULT_LANGUAGE = 'es'
+
+
+def _compile_translations(translations, fallback=DEFAULT_LANGUAGE):
+    """
+    Precompila las tablas de traducción una sola vez al cargar el módulo.
+    
+    Cada idioma se aplana sobre el idioma de respaldo (las claves que falten
+    caen al español) y se congela en un MappingProxyType de solo lectura.
+    
+    Args:
+        translations: Diccionario {idioma: {clave: texto}}
+        fallback: Idioma base para las claves ausentes
+    
+    Returns:
+        dict: {idioma: MappingProxyType} con las tablas congeladas
+    """
+    base = translations[fallback]
+    return {
+        lang: MappingProxyType({**base, **table})
+        for lang, table in translations.items()
+    }
+
+
+TEXTS = _compile_translations(TRANSLATIONS)
+
+# Idioma ligado a la ejecución actual (Streamlit ejecuta cada rerun en su hilo)
+_language_binding = threading.local()
+
+
+def bind_language(lang=None):
+    """
+    Resuelve el idioma una vez por ejecución y liga su tabla al hilo actual.
+    
+    Args:
+        lang: Código de idioma; si es None se lee de st.session_state
+    
+    Returns:
+        MappingProxyType: Tabla de traducción congelada del idioma ligado
+    """
+    if lang is None:
+        lang = st.session_state.get('language', DEFAULT_LANGUAGE)
+    if lang not in TEXTS:
+        lang = DEFAULT_LANGUAGE
+    _language_binding.lang = lang
+    _language_binding.table = TEXTS[lang]
+    return _language_binding.table
+
+
+def current_language():
+    """Devuelve el código del idioma ligado a la ejecución actual."""
+    lang = getattr(_language_binding, 'lang', None)
+    if lang is None:
+        bind_language()
+        lang = _language_binding.lang
+    return lang
+
+
 def get_text(key):
-    """Obtiene el texto traducido según el idioma seleccionado."""
-    lang = st.session_state.get('language', 'es')
-    return TRANSLATIONS.get(lang, TRANSLATIONS['es']).get(key, key)
+    """Obtiene el texto traducido según el idioma ligado a la ejecución."""
+    table = getattr(_language_binding, 'table', None)
+    if table is None:
+        table = bind_language()
+    return table.get(key, key)
 
 @st.dialog(" ")
 def language_modal():
     """Modal para selección de idioma con estilo retrofuturista."""
+    lang = current_language()
     # Título del modal con estilo
     st.markdown("""
     <div style='text-align: center; margin-bottom: 30px;'>
@@ -390,9 +860,9 @@ def language_modal():
         st.markdown("""
         <style>
         div[data-testid="column"]:first-child button {
-            background: """ + ('linear-gradient(135deg, #00FF9F 0%, #00CC7F 100%)' if st.session_state.get('language', 'es') == 'es' else 'rgba(0, 255, 159, 0.1)') + """ !important;
+            background: """ + ('linear-gradient(135deg, #00FF9F 0%, #00CC7F 100%)' if lang == 'es' else 'rgba(0, 255, 159, 0.1)') + """ !important;
             border: 2px solid #00FF9F !important;
-            color: """ + ('#0a0a0a' if st.session_state.get('language', 'es') == 'es' else '#00FF9F') + """ !important;
+            color: """ + ('#0a0a0a' if lang == 'es' else '#00FF9F') + """ !important;
             font-family: monospace !important;
             font-weight: bold !important;
             padding: 20px !important;
@@ -409,9 +879,9 @@ def language_modal():
         st.markdown("""
         <style>
         div[data-testid="column"]:last-child button {
-            background: """ + ('linear-gradient(135deg, #6464FF 0%, #4444DD 100%)' if st.session_state.get('language', 'es') == 'en' else 'rgba(100, 100, 255, 0.1)') + """ !important;
+            background: """ + ('linear-gradient(135deg, #6464FF 0%, #4444DD 100%)' if lang == 'en' else 'rgba(100, 100, 255, 0.1)') + """ !important;
             border: 2px solid #6464FF !important;
-            color: """ + ('#ffffff' if st.session_state.get('language', 'es') == 'en' else '#6464FF') + """ !important;
+            color: """ + ('#ffffff' if lang == 'en' else '#6464FF') + """ !important;
             font-family: monospace !important;
             font-weight: bold !important;
             padding: 20px !important;
@@ -425,12 +895,11 @@ def language_modal():
             st.rerun()
     
     # Indicador del idioma actual
-    current_lang_text = "Español" if st.session_state.get('language', 'es') == 'es' else "English"
-    current_flag = "🇪🇸" if st.session_state.get('language', 'es') == 'es' else "🇬🇧"
+    current_lang_text = get_text('language_name')
     st.markdown(f"""
     <div style='text-align: center; margin-top: 25px; padding-top: 20px; border-top: 1px solid rgba(255,255,255,0.1);'>
         <span style='font-family: monospace; color: rgba(255,255,255,0.5); font-size: 0.75rem;'>
-            {'Idioma actual' if st.session_state.get('language', 'es') == 'es' else 'Current language'}: 
+            {get_text('current_language')}: 
             <span style='color: #00FF9F;'>{current_lang_text}</span>
         </span>
     </div>
@@ -691,6 +1160,19 @@ st.markdown("""
         border-radius: 4px;
     }
     
+    /* ===== METRICS GRID ===== */
+    .metrics-grid {
+        display: grid;
+        grid-template-columns: repeat(4, minmax(0, 1fr));
+        gap: 24px 16px;
+    }
+    
+    @media (max-width: 640px) {
+        .metrics-grid {
+            grid-template-columns: repeat(2, minmax(0, 1fr));
+        }
+    }
+    
     /* ===== SIDEBAR ITEMS ===== */
     .sidebar-item-active {
         background: linear-gradient(135deg, rgba(0, 255, 159, 0.2) 0%, rgba(0, 255, 159, 0.05) 100%);
@@ -800,218 +1282,2477 @@ st.markdown("""
 # =============================================================================
 # SYSTEM INSTRUCTIONS PARA GROQ (PERSONALIDAD DEL INGENIERO BROKER)
 # =============================================================================
+# Instrucción compacta: se reenvía en cada llamada, así que cada token cuenta
 SYSTEM_INSTRUCTIONS = {
-    'es': """Actúa como mi Ingeniero Broker Senior (estilo Peter Lynch). Tu trabajo es analizar los datos que te paso y ejecutar 'La rutina de los dos minutos'.
-REGLAS:
+    'es': (
+        "Eres mi Ingeniero Broker Senior (estilo Peter Lynch). Recibes datos clave:valor "
+        "(importes en la divisa indicada; un campo ausente = sin dato). Ejecuta 'La rutina de "
+        "los dos minutos': 1) Clasifica la empresa (Cíclica, Recuperación, Activo Oculto, "
+        "Crecimiento Rápido, Estable). 2) Analiza el PEG (<1 barato, >2 caro) y compara el PER "
+        "con el crecimiento. 3) Evalúa la deuda (¿más deuda que efectivo?). 4) Da tu VEREDICTO "
+        "directo: COMPRAR, VENDER o MANTENER. 5) Explícalo con sentido común y analogías "
+        "sencillas. Responde SIEMPRE en español."
+    ),
+    'en': (
+        "You are my Senior Broker Engineer (Peter Lynch style). You receive key:value data "
+        "(amounts in the given currency; a missing field = no data). Run 'The Two-Minute Drill': "
+        "1) Classify the company (Cyclical, Turnaround, Asset Play, Fast Grower, Stalwart). "
+        "2) Analyze the PEG (<1 cheap, >2 expensive) and compare the P/E with growth. "
+        "3) Assess debt (more debt than cash?). 4) Give a direct VERDICT: BUY, SELL or HOLD. "
+        "5) Explain it with common sense and simple analogies. ALWAYS respond in English."
+    ),
+}
 
-1. Si el PEG ratio es < 1.0, considéralo barato. Si es > 2.0, caro.
+# Formato del veredicto estructurado (modo JSON): valores cerrados y validables
+VERDICT_SCHEMA = {
+    "classification": ("fast_grower", "stalwart", "cyclical", "turnaround", "asset_play"),
+    "peg_assessment": ("cheap", "fair", "expensive", "unknown"),
+    "debt_assessment": ("solid", "moderate", "risky", "unknown"),
+    "verdict": ("BUY", "SELL", "HOLD"),
+}
+STRUCTURED_VERDICT_FORMAT = {
+    'es': (
+        " Responde SOLO con un objeto JSON con estas claves: {fields}, "
+        "\"confidence\" (número 0-1) y \"rationale\" (máx. 3 frases en español)."
+    ),
+    'en': (
+        " Reply ONLY with a JSON object with these keys: {fields}, "
+        "\"confidence\" (number 0-1) and \"rationale\" (max 3 sentences in English)."
+    ),
+}
+# Variante por lotes: varias empresas en un mensaje, un veredicto por ticker
+STRUCTURED_BATCH_FORMAT = {
+    'es': (
+        " Recibirás varias empresas, cada una tras una línea '## TICKER'. Responde SOLO con "
+        "un objeto JSON cuyas claves son los tickers y cuyo valor es un objeto con: {fields}, "
+        "\"confidence\" (número 0-1) y \"rationale\" (máx. 2 frases en español)."
+    ),
+    'en': (
+        " You will receive several companies, each after a '## TICKER' line. Reply ONLY with "
+        "a JSON object whose keys are the tickers and whose value is an object with: {fields}, "
+        "\"confidence\" (number 0-1) and \"rationale\" (max 2 sentences in English)."
+    ),
+}
 
-2. Compara el PER con el crecimiento esperado.
 
-3. Clasifica la empresa (Cíclica, Recuperación, Activo Oculto, Crecimiento Rápido, Estable).
+def get_system_instruction(lang=None, structured=False, batch=False):
+    """
+    Obtiene la instrucción del sistema según el idioma indicado o el ligado.
+    
+    Args:
+        lang: Código de idioma (None = idioma ligado a la ejecución)
+        structured: Añadir el formato JSON del veredicto estructurado
+        batch: Formato JSON por lotes (un veredicto por ticker)
+    
+    Returns:
+        String con la instrucción del sistema
+    """
+    lang = lang if lang in SYSTEM_INSTRUCTIONS else current_language()
+    instruction = SYSTEM_INSTRUCTIONS.get(lang, SYSTEM_INSTRUCTIONS[DEFAULT_LANGUAGE])
+    if structured or batch:
+        formats = STRUCTURED_BATCH_FORMAT if batch else STRUCTURED_VERDICT_FORMAT
+        fields = ", ".join(f'"{key}" ({"|".join(values)})' for key, values in VERDICT_SCHEMA.items())
+        instruction += formats.get(lang, formats[DEFAULT_LANGUAGE]).format(fields=fields)
+    return instruction
 
-4. Busca problemas de deuda (¿Hay más deuda que efectivo?).
+# =============================================================================
+# REGISTRO TIPADO DE DATOS DE ACCIÓN (StockSnapshot)
+# =============================================================================
 
-5. Tu veredicto debe ser directo: COMPRAR, VENDER o MANTENER, explicado con sentido común y analogías sencillas.
+# Campos numéricos: atributo -> claves de ticker.info en orden de prioridad
+# (tupla vacía = campo calculado en get_stock_data)
+SNAPSHOT_NUMERIC_FIELDS = {
+    # Precios
+    "precio_actual": ("currentPrice", "regularMarketPrice"),
+    "precio_objetivo": ("targetMeanPrice",),
+    "precio_52w_high": ("fiftyTwoWeekHigh",),
+    "precio_52w_low": ("fiftyTwoWeekLow",),
+    "cierre_anterior": ("previousClose", "regularMarketPreviousClose"),
+    "maximo_dia": ("dayHigh", "regularMarketDayHigh"),
+    "minimo_dia": ("dayLow", "regularMarketDayLow"),
+    "cotizacion_at": (),  # Epoch del último refresco rápido (NaN = el de fetched_at)
 
-IMPORTANTE: Responde SIEMPRE en español.""",
+    # Ratios de valoración (CRUCIALES para Lynch)
+    "per_trailing": ("trailingPE",),
+    "per_forward": ("forwardPE",),
+    "trailing_peg_ratio": ("trailingPegRatio",),  # PEG calculado por Yahoo (más fiable)
+    "price_to_book": ("priceToBook",),
+    "price_to_sales": ("priceToSalesTrailing12Months",),
 
-    'en': """Act as my Senior Broker Engineer (Peter Lynch style). Your job is to analyze the data I provide and execute 'The Two-Minute Drill'.
-RULES:
+    # Dividendos
+    "dividend_yield": ("dividendYield",),
+    "trailing_annual_dividend_yield": ("trailingAnnualDividendYield",),
+    "dividend_rate": ("dividendRate",),
+    "last_dividend_value": ("lastDividendValue",),
+    "last_dividend_date": ("lastDividendDate",),
+    "ex_dividend_date": ("exDividendDate",),
+    "five_year_avg_dividend_yield": ("fiveYearAvgDividendYield",),
+    "payout_ratio": ("payoutRatio",),
 
-1. If the PEG ratio is < 1.0, consider it cheap. If > 2.0, expensive.
+    # Balance y deuda (datos básicos del info)
+    "deuda_total_info": ("totalDebt",),
+    "efectivo_total_info": ("totalCash",),
+    "deuda_equity": ("debtToEquity",),
 
-2. Compare the P/E with expected growth.
+    # Rentabilidad
+    "roe": ("returnOnEquity",),
+    "roa": ("returnOnAssets",),
+    "margen_beneficio": ("profitMargins",),
+    "margen_operativo": ("operatingMargins",),
 
-3. Classify the company (Cyclical, Turnaround, Asset Play, Fast Grower, Stalwart).
+    # Crecimiento
+    "crecimiento_beneficios": ("earningsGrowth",),
+    "crecimiento_ingresos": ("revenueGrowth",),
+    "crecimiento_beneficios_trimestral": ("earningsQuarterlyGrowth",),
+    "eps_actual": ("trailingEps",),
+    "eps_forward": ("forwardEps",),
+    "eps_current_year": ("epsCurrentYear",),
 
-4. Look for debt problems (Is there more debt than cash?).
+    # Tamaño y volatilidad
+    "market_cap": ("marketCap",),
+    "enterprise_value": ("enterpriseValue",),
+    "num_empleados": ("fullTimeEmployees",),
+    "beta": ("beta",),
 
-5. Your verdict must be direct: BUY, SELL or HOLD, explained with common sense and simple analogies.
+    # Calculados (PEG y balance trimestral)
+    "peg_ratio": (),
+    "growth_rate_used": (),
+    "per_used": (),
+    "deuda_total_balance": (),
+    "efectivo_inversiones_balance": (),
+    "net_debt": (),
+    "deuda_total": (),
+    "efectivo_total": (),
+}
 
-IMPORTANT: ALWAYS respond in English."""
+# Campos de texto: atributo -> claves de ticker.info en orden de prioridad
+SNAPSHOT_TEXT_FIELDS = {
+    "nombre": ("longName", "shortName"),
+    "sector": ("sector",),
+    "industria": ("industry",),
+    "pais": ("country",),
+    "moneda": ("currency",),
+    "bolsa": ("exchange",),
+    "zona_horaria": ("exchangeTimezoneName",),
+    "peg_calculation": (),
+    "balance_date": (),
+    "pendiente": (),  # Secciones que no cupieron en el plazo, separadas por comas
 }
 
-def get_system_instruction():
-    """Obtiene la instrucción del sistema según el idioma seleccionado."""
-    lang = st.session_state.get('language', 'es')
-    return SYSTEM_INSTRUCTIONS.get(lang, SYSTEM_INSTRUCTIONS['es'])
+_NUMERIC_NAMES = tuple(SNAPSHOT_NUMERIC_FIELDS)
+_TEXT_NAMES = tuple(SNAPSHOT_TEXT_FIELDS)
 
-# =============================================================================
-# CLASIFICACIÓN AUTOMÁTICA DE EMPRESAS (METODOLOGÍA PETER LYNCH)
-# =============================================================================
 
-def classify_company(data):
+def to_float(value):
     """
-    Clasifica automáticamente una empresa según la metodología de Peter Lynch.
-    
-    Categorías:
-    - 🚀 Crecimiento Rápido: Alto crecimiento de beneficios (>20%), reinvierten
-    - 🏛️ Estable: Empresas grandes, crecimiento moderado, pagan dividendos
-    - 🔄 Cíclica: Sectores que dependen del ciclo económico
-    - 📈 Recuperación: Empresas en reestructuración o recuperándose
-    - 💎 Activo Oculto: Valor oculto en balance (bajo P/B, mucho efectivo)
-    
+    Convierte un valor a float de forma segura.
+
     Args:
-        data: Diccionario con datos financieros de la empresa
-        
+        value: Valor a convertir (número, string, None...)
+
     Returns:
-        Tupla (clasificación, emoji, css_class, explicación)
+        float finito o NaN si falta o no es numérico
     """
-    # Extraer métricas relevantes
-    sector = (data.get('sector') or '').lower()
-    industria = (data.get('industria') or '').lower()
-    
-    # Función helper para convertir valores seguros a float
-    def safe_float(value, default=0):
-        if value is None or value == 'N/A' or value == '':
-            return default
+    if value is None:
+        return np.nan
+    try:
+        value = float(value)
+    except (ValueError, TypeError):
+        return np.nan
+    return value if np.isfinite(value) else np.nan
+
+
+def has_value(value):
+    """Indica si un valor numérico está disponible (no es None ni NaN)."""
+    return value is not None and value == value
+
+
+def num_or(value, default):
+    """Devuelve el valor numérico o `default` si es NaN/None."""
+    return value if has_value(value) else default
+
+
+def fmt_num(value, fmt="{:.2f}", missing="N/A"):
+    """Formatea un número con `fmt` o devuelve `missing` si no está disponible."""
+    return fmt.format(value) if has_value(value) else missing
+
+
+class StockSnapshot:
+    """
+    Registro compacto y tipado con los datos financieros de una acción.
+
+    Los campos numéricos son siempre float (NaN si faltan) y los de texto
+    siempre str, de forma que se validan una sola vez al descargar los datos
+    en lugar de en cada acceso. Al usar __slots__ no hay __dict__ por
+    instancia y se serializa como una tupla con un array float64.
+    """
+    __slots__ = ("ticker", "fetched_at", "historico", "noticias") + _NUMERIC_NAMES + _TEXT_NAMES
+
+    def __init__(self, ticker, fetched_at=None, historico=None, noticias=None, **fields):
+        self.ticker = ticker
+        self.fetched_at = time.time() if fetched_at is None else fetched_at
+        self.historico = historico if historico is not None else pd.DataFrame()
+        self.noticias = list(noticias or [])
+
+        for name in _NUMERIC_NAMES:
+            setattr(self, name, to_float(fields.pop(name, None)))
+        for name in _TEXT_NAMES:
+            value = fields.pop(name, None)
+            setattr(self, name, "" if value is None else str(value))
+
+        if fields:
+            raise TypeError(f"Campos desconocidos para StockSnapshot: {', '.join(sorted(fields))}")
+
+    @classmethod
+    def from_info(cls, ticker, info, **fields):
+        """
+        Construye el snapshot a partir del diccionario `ticker.info`.
+
+        Args:
+            ticker: Símbolo del ticker
+            info: Diccionario devuelto por yfinance
+            **fields: Campos calculados o que sobrescriben a los de info
+        """
+        values = {}
+        for name, keys in {**SNAPSHOT_NUMERIC_FIELDS, **SNAPSHOT_TEXT_FIELDS}.items():
+            for key in keys:
+                value = info.get(key)
+                if value is not None and not (isinstance(value, float) and pd.isna(value)):
+                    values[name] = value
+                    break
+        values.setdefault("nombre", ticker)
+        values.setdefault("moneda", "USD")
+        values.update(fields)
+        return cls(ticker, **values)
+
+    def cash_debt_ratio(self):
+        """
+        Ratio Efectivo/Deuda (cuántas veces puede pagar su deuda con el efectivo).
+
+        Returns:
+            float: ratio, inf si no hay deuda pero sí efectivo, NaN si no se puede determinar
+        """
+        deuda, efectivo = self.deuda_total, self.efectivo_total
+        if has_value(deuda) and deuda > 0 and has_value(efectivo) and efectivo:
+            return efectivo / deuda
+        if has_value(efectivo) and efectivo and not (has_value(deuda) and deuda):
+            return float('inf')
+        return np.nan
+
+    @property
+    def version(self):
+        """
+        Identificador corto de la versión del snapshot.
+        
+        Cambia si cambia el momento de descarga o cualquier campo numérico o de
+        texto, por lo que sirve como clave de caché para todo lo que se
+        renderiza a partir del snapshot.
+        """
+        digest = hashlib.blake2b(digest_size=8)
+        digest.update(repr((self.ticker, self.fetched_at)).encode())
+        digest.update(np.fromiter((getattr(self, name) for name in _NUMERIC_NAMES),
+                                  dtype=np.float64, count=len(_NUMERIC_NAMES)).tobytes())
+        digest.update("\x1f".join(getattr(self, name) for name in _TEXT_NAMES).encode())
+        return digest.hexdigest()
+
+    def replace(self, **changes):
+        """Devuelve una copia del snapshot con los campos indicados modificados."""
+        clone = StockSnapshot.__new__(StockSnapshot)
+        for name in self.__slots__:
+            setattr(clone, name, getattr(self, name))
+        for name, value in changes.items():
+            if name in SNAPSHOT_NUMERIC_FIELDS:
+                value = to_float(value)
+            setattr(clone, name, value)
+        return clone
+
+    def to_record(self):
+        """Serializa el snapshot a una tupla compacta (estado de pickle para cachés)."""
+        numeric = np.fromiter((getattr(self, name) for name in _NUMERIC_NAMES),
+                              dtype=np.float64, count=len(_NUMERIC_NAMES))
+        text = tuple(getattr(self, name) for name in _TEXT_NAMES)
+        return (self.ticker, self.fetched_at, numeric, text, self.historico, tuple(self.noticias))
+
+    def __getstate__(self):
+        return self.to_record()
+
+    def __setstate__(self, record):
+        ticker, fetched_at, numeric, text, historico, noticias = record
+        self.ticker = ticker
+        self.fetched_at = fetched_at
+        self.historico = historico
+        self.noticias = list(noticias)
+        for name, value in zip(_NUMERIC_NAMES, numeric.tolist()):
+            setattr(self, name, value)
+        for name, value in zip(_TEXT_NAMES, text):
+            setattr(self, name, value)
+
+    def __repr__(self):
+        return f"StockSnapshot({self.ticker!r}, precio_actual={self.precio_actual!r})"
+
+# =============================================================================
+# SESIÓN HTTP COMPARTIDA (POOL DE CONEXIONES HACIA YAHOO)
+# =============================================================================
+
+HTTP_POOL_SIZE = 8             # Conexiones simultáneas hacia Yahoo
+HTTP_IMPERSONATE = "chrome"    # Huella TLS de curl_cffi (la que usa yfinance)
+
+
+class HTTPPoolStats:
+    """Contadores de la sesión compartida: peticiones, errores, latencia y concurrencia."""
+
+    def __init__(self, pool_size):
+        self.pool_size = pool_size
+        self._lock = threading.Lock()
+        self._counts = {"requests": 0, "errors": 0, "rejected": 0, "in_flight": 0, "peak_in_flight": 0,
+                        "wait_seconds": 0.0, "busy_seconds": 0.0}
+
+    def begin(self, waited=0.0):
+        with self._lock:
+            self._counts["requests"] += 1
+            self._counts["in_flight"] += 1
+            self._counts["wait_seconds"] += waited
+            self._counts["peak_in_flight"] = max(self._counts["peak_in_flight"], self._counts["in_flight"])
+
+    def reject(self, waited):
+        """Petición que no consiguió hueco en el pool a tiempo."""
+        with self._lock:
+            self._counts["rejected"] += 1
+            self._counts["wait_seconds"] += waited
+
+    def end(self, started, ok):
+        with self._lock:
+            self._counts["in_flight"] -= 1
+            self._counts["busy_seconds"] += time.perf_counter() - started
+            if not ok:
+                self._counts["errors"] += 1
+
+    def snapshot(self, **extra):
+        with self._lock:
+            counts = dict(self._counts)
+        done = counts["requests"] - counts["in_flight"]
+        counts["avg_latency_ms"] = round(1000 * counts["busy_seconds"] / done, 1) if done else None
+        return {"pool_size": self.pool_size, **counts, **extra}
+
+
+if curl_requests is not None:
+    class PooledCurlSession(curl_requests.Session):
+        """
+        Sesión curl_cffi con un pool de handles compartido entre hilos.
+        
+        curl_cffi crea un handle por hilo y Streamlit ejecuta cada rerun en
+        un hilo nuevo, así que las conexiones keep-alive se perdían en cada
+        interacción. Aquí los handles (cada uno con su caché de conexiones
+        TLS abiertas) se prestan por petición y vuelven al pool al terminar;
+        las cookies y el crumb de Yahoo viven en la sesión y se comparten.
+        El handle prestado se expone a través de la propiedad pública `curl`.
+        
+        Esperar un hueco libre tiene el mismo límite que la propia petición
+        (request_timeout): con el pool saturado se falla con TimeoutError en
+        lugar de bloquear el hilo indefinidamente.
+        """
+
+        def __init__(self, pool_size=HTTP_POOL_SIZE, **kwargs):
+            super().__init__(impersonate=HTTP_IMPERSONATE, **kwargs)
+            self.pool_stats = HTTPPoolStats(pool_size)
+            self._slots = threading.BoundedSemaphore(pool_size)
+            self._lent = threading.local()
+            self._idle = []
+            self._idle_lock = threading.Lock()
+            self._handles = 0
+
+        @property
+        def curl(self):
+            handle = getattr(self._lent, "curl", None)
+            return handle if handle is not None else super().curl
+
+        def request(self, method, url, *args, **kwargs):
+            # El streaming duplica el handle: va por el del hilo, sin préstamo
+            if kwargs.get("stream"):
+                return self._tracked(method, url, *args, **kwargs)
+            waited = time.perf_counter()
+            if not self._slots.acquire(timeout=request_timeout()):
+                self.pool_stats.reject(time.perf_counter() - waited)
+                raise TimeoutError("HTTP pool saturated")
+            waited = time.perf_counter() - waited
+            with self._idle_lock:
+                if self._idle:
+                    handle = self._idle.pop()
+                else:
+                    handle = Curl(debug=self.debug)
+                    self._handles += 1
+            self._lent.curl = handle
+            try:
+                return self._tracked(method, url, *args, waited=waited, **kwargs)
+            finally:
+                self._lent.curl = None
+                with self._idle_lock:
+                    self._idle.append(handle)
+                self._slots.release()
+
+        def _tracked(self, method, url, *args, waited=0.0, **kwargs):
+            kwargs["timeout"] = request_timeout(kwargs.get("timeout"))
+            self.pool_stats.begin(waited)
+            started, ok = time.perf_counter(), False
+            try:
+                response = super().request(method, url, *args, **kwargs)
+                ok = True
+                return response
+            finally:
+                self.pool_stats.end(started, ok)
+
+        def stats(self):
+            with self._idle_lock:
+                return self.pool_stats.snapshot(backend="curl_cffi", handles=self._handles, idle=len(self._idle))
+
+
+class PooledRequestsSession(requests.Session):
+    """Alternativa sin curl_cffi: requests con un HTTPAdapter de pool fijo."""
+
+    def __init__(self, pool_size=HTTP_POOL_SIZE):
+        super().__init__()
+        self.pool_stats = HTTPPoolStats(pool_size)
+        adapter = requests.adapters.HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size, pool_block=True)
+        self.mount("https://", adapter)
+        self.mount("http://", adapter)
+        self._adapter = adapter
+
+    def request(self, method, url, *args, **kwargs):
+        kwargs["timeout"] = request_timeout(kwargs.get("timeout"))
+        self.pool_stats.begin()
+        started, ok = time.perf_counter(), False
         try:
-            return float(value)
-        except (ValueError, TypeError):
-            return default
-    
-    market_cap = safe_float(data.get('market_cap'), 0)
-    crecimiento = safe_float(data.get('crecimiento_beneficios'), 0)
-    crecimiento_ingresos = safe_float(data.get('crecimiento_ingresos'), 0)
-    
-    # Normalizar dividend yield (puede venir como 0.029 o 2.9)
-    dividend_yield_raw = safe_float(data.get('dividend_yield'), 0)
-    if dividend_yield_raw > 1:  # Viene como porcentaje (2.9 en lugar de 0.029)
-        dividend_yield = dividend_yield_raw / 100
-    else:
-        dividend_yield = dividend_yield_raw
-    
-    price_to_book = safe_float(data.get('price_to_book'), 999)
-    per_trailing = safe_float(data.get('per_trailing'), 0)
-    deuda = safe_float(data.get('deuda_total'), 0)
-    efectivo = safe_float(data.get('efectivo_total'), 0)
-    roe = safe_float(data.get('roe'), 0)
-    peg = safe_float(data.get('peg_ratio'), None)
-    
-    # Sectores cíclicos típicos
-    sectores_ciclicos = ['consumer cyclical', 'basic materials', 'energy', 'industrials']
-    sectores_defensivos = ['consumer defensive', 'healthcare', 'utilities', 'consumer staples']
-    
-    # 1. RECUPERACIÓN: PER negativo indica pérdidas
-    if per_trailing is not None and per_trailing < 0:
-        return (
-            "Recuperación" if st.session_state.get('language', 'es') == 'es' else "Turnaround",
-            "📈",
-            "badge-recuperacion",
-            get_text('turnaround_desc')
-        )
-    
-    # 2. ESTABLE: Empresas grandes (>50B) con dividendos en sectores defensivos
-    is_defensive = any(s in sector for s in sectores_defensivos)
-    has_good_dividend = dividend_yield > 0.015  # >1.5% dividendo
-    is_large_cap = market_cap > 50e9  # >50B
-    is_mega_cap = market_cap > 200e9  # >200B
-    
-    if is_mega_cap and has_good_dividend:
-        return (
-            "Estable" if st.session_state.get('language', 'es') == 'es' else "Stalwart",
-            "🏛️",
-            "badge-estable",
-            get_text('market_giant_dividends')
-        )
-    
-    if is_large_cap and has_good_dividend and is_defensive:
-        return (
-            "Estable" if st.session_state.get('language', 'es') == 'es' else "Stalwart",
-            "🏛️",
-            "badge-estable",
-            get_text('stalwart_desc')
-        )
-    
-    # 3. CÍCLICA: Sectores que dependen del ciclo económico
-    is_cyclical = any(s in sector for s in sectores_ciclicos)
-    is_auto = 'auto' in industria or 'vehicle' in industria
-    is_airline = 'airline' in industria
-    is_hotel = 'hotel' in industria or 'leisure' in industria
-    
-    if is_cyclical or is_auto or is_airline or is_hotel:
-        return (
-            "Cíclica" if st.session_state.get('language', 'es') == 'es' else "Cyclical",
-            "🔄",
-            "badge-ciclica",
-            get_text('cyclical_desc')
-        )
-    
-    # 4. ACTIVO OCULTO: Bajo Price/Book y buena posición de caja
-    if price_to_book < 1.2 and efectivo > deuda:
-        return (
-            "Activo Oculto" if st.session_state.get('language', 'es') == 'es' else "Asset Play",
-            "💎",
-            "badge-activo-oculto",
-            get_text('asset_play_desc')
-        )
-    
-    # 5. CRECIMIENTO RÁPIDO: Alto crecimiento de beneficios o ingresos
-    has_high_growth = crecimiento > 0.20 or crecimiento_ingresos > 0.20
-    has_good_peg = (peg is not None) and (isinstance(peg, (int, float))) and (peg < 1.5) and (peg > 0)
-    is_tech = 'technology' in sector or 'software' in industria
-    
-    if has_high_growth:
-        return (
-            "Crecimiento Rápido" if st.session_state.get('language', 'es') == 'es' else "Fast Grower",
-            "🚀",
-            "badge-crecimiento",
-            get_text('fast_grower_desc')
-        )
-    
-    if is_tech and market_cap < 100e9 and (crecimiento > 0.10 or crecimiento_ingresos > 0.15):
-        return (
-            "Crecimiento Rápido" if st.session_state.get('language', 'es') == 'es' else "Fast Grower",
-            "🚀",
-            "badge-crecimiento",
-            "Empresa tecnológica en fase de crecimiento" if st.session_state.get('language', 'es') == 'es' else "Technology company in growth phase"
-        )
-    
-    # 6. ESTABLE por defecto para empresas grandes
-    if is_large_cap:
-        return (
-            "Estable" if st.session_state.get('language', 'es') == 'es' else "Stalwart",
-            "🏛️",
-            "badge-estable",
-            "Gran capitalización - empresa consolidada en su sector" if st.session_state.get('language', 'es') == 'es' else "Large cap - established company in its sector"
-        )
-    
-    # 7. Por defecto para empresas medianas/pequeñas
-    if market_cap > 10e9:  # Mid cap
-        return (
-            "Estable" if st.session_state.get('language', 'es') == 'es' else "Stalwart",
-            "🏛️",
-            "badge-estable",
-            "Empresa de mediana capitalización consolidada" if st.session_state.get('language', 'es') == 'es' else "Consolidated mid-cap company"
-        )
-    else:
-        return (
-            "Crecimiento Rápido" if st.session_state.get('language', 'es') == 'es' else "Fast Grower",
-            "🚀",
-            "badge-crecimiento",
-            "Empresa de menor tamaño con potencial de crecimiento" if st.session_state.get('language', 'es') == 'es' else "Smaller company with growth potential"
+            response = super().request(method, url, *args, **kwargs)
+            ok = True
+            return response
+        finally:
+            self.pool_stats.end(started, ok)
+
+    def stats(self):
+        manager = self._adapter.poolmanager
+        pools = [manager.pools[key] for key in manager.pools.keys()]
+        return self.pool_stats.snapshot(
+            backend="requests",
+            hosts=len(pools),
+            connections=sum(pool.num_connections for pool in pools),
         )
 
+
+@st.cache_resource(show_spinner=False)
+def get_http_session():
+    """Sesión HTTP única del proceso, inyectada en todos los yf.Ticker."""
+    if curl_requests is not None:
+        return PooledCurlSession()
+    return PooledRequestsSession()
+
+
+def make_ticker(ticker_symbol):
+    """yf.Ticker que usa la sesión HTTP compartida (conexiones, cookies y crumb)."""
+    return yf.Ticker(ticker_symbol, session=get_http_session())
+
+
+def http_pool_stats():
+    """Estadísticas del pool HTTP compartido (para diagnóstico)."""
+    return get_http_session().stats()
+
+
+def render_http_pool_stats():
+    """Resumen del pool HTTP compartido en la barra lateral."""
+    stats = http_pool_stats()
+    latency = stats["avg_latency_ms"]
+    with st.expander(get_text('http_pool_title')):
+        st.caption(get_text('http_pool_stats').format(
+            latency=f"{latency:.0f} ms" if latency is not None else "—",
+            wait=stats["wait_seconds"], **stats))
+
 # =============================================================================
-# FUNCIONES AUXILIARES
+# HORARIO DE MERCADO POR BOLSA (CADUCIDAD DE LAS COTIZACIONES)
 # =============================================================================
+# Una cotización solo envejece con la bolsa abierta: descargada con el
+# mercado cerrado sigue valiendo hasta la siguiente apertura.
 
-def format_large_number(num):
+# Sufijo del ticker -> (timezone, apertura, cierre) en minutos desde medianoche
+MARKET_HOURS = {
+    "": ("America/New_York", 570, 960),
+    "TO": ("America/Toronto", 570, 960),
+    "MC": ("Europe/Madrid", 540, 1050),
+    "DE": ("Europe/Berlin", 540, 1050),
+    "F": ("Europe/Berlin", 480, 1320),
+    "PA": ("Europe/Paris", 540, 1050),
+    "AS": ("Europe/Amsterdam", 540, 1050),
+    "BR": ("Europe/Brussels", 540, 1050),
+    "MI": ("Europe/Rome", 540, 1050),
+    "LS": ("Europe/Lisbon", 480, 990),
+    "SW": ("Europe/Zurich", 540, 1050),
+    "L": ("Europe/London", 480, 990),
+    "T": ("Asia/Tokyo", 540, 930),
+    "HK": ("Asia/Hong_Kong", 570, 960),
+    "AX": ("Australia/Sydney", 600, 960),
+}
+
+# Código `info['exchange']` de Yahoo -> sufijo de MARKET_HOURS
+EXCHANGE_SUFFIXES = {
+    "NMS": "", "NYQ": "", "NGM": "", "NCM": "", "ASE": "", "PCX": "", "BTS": "",
+    "TOR": "TO", "MCE": "MC", "GER": "DE", "FRA": "F", "PAR": "PA", "AMS": "AS",
+    "BRU": "BR", "MIL": "MI", "LIS": "LS", "EBS": "SW", "LSE": "L", "JPX": "T",
+    "HKG": "HK", "ASX": "AX",
+}
+
+# Mercados que no cierran (criptomonedas): caducidad por TTL simple
+ALWAYS_OPEN_EXCHANGES = ("CCC",)
+
+# Horario supuesto para bolsas desconocidas de las que solo sabemos la timezone
+DEFAULT_SESSION_MINUTES = (540, 1050)
+
+
+def market_hours(ticker_symbol, exchange=None, timezone=None):
     """
-    Formatea números grandes a formato legible (B para billones, M para millones).
+    Horario de la bolsa de un ticker.
+    
+    Se usa el sufijo del ticker (IBE.MC, SAP.DE) y, si no es conocido,
+    el código `exchange` o la timezone que devuelve Yahoo.
     
     Args:
-        num: Número a formatear
-        
+        ticker_symbol: Símbolo del ticker
+        exchange: Código de bolsa de Yahoo (opcional)
+        timezone: Timezone de la bolsa (opcional)
+    
     Returns:
-        String formateado o 'N/A' si no es válido
+        Tupla (timezone, apertura, cierre) o None si el mercado no cierra
     """
-    if num is None or pd.isna(num):
-        return "N/A"
+    if exchange in ALWAYS_OPEN_EXCHANGES:
+        return None
+    symbol = str(ticker_symbol).upper()
+    suffix = symbol.rsplit(".", 1)[1] if "." in symbol else ""
+    if suffix and suffix in MARKET_HOURS:
+        return MARKET_HOURS[suffix]
+    if exchange in EXCHANGE_SUFFIXES:
+        return MARKET_HOURS[EXCHANGE_SUFFIXES[exchange]]
+    if timezone:
+        return (timezone,) + DEFAULT_SESSION_MINUTES
+    return MARKET_HOURS[""]
+
+
+def quote_expiry(ticker_symbol, fetched_at, ttl, exchange=None, timezone=None):
+    """
+    Momento en que caduca una cotización descargada en `fetched_at`.
+    
+    Con la bolsa abierta caduca a los `ttl` segundos; con la bolsa cerrada
+    (noche o fin de semana) sigue valiendo hasta la siguiente apertura. Los
+    festivos no se modelan: cuentan como días hábiles normales.
+    
+    Args:
+        ticker_symbol: Símbolo del ticker
+        fetched_at: Epoch de la descarga
+        ttl: Segundos de validez con el mercado abierto
+        exchange: Código de bolsa de Yahoo (opcional)
+        timezone: Timezone de la bolsa (opcional)
     
+    Returns:
+        Epoch de caducidad
+    """
+    hours = market_hours(ticker_symbol, exchange, timezone)
+    if hours is None:
+        return fetched_at + ttl
+    tz, open_minutes, close_minutes = hours
     try:
-        num = float(num)
+        local = pd.Timestamp(fetched_at, unit="s", tz="UTC").tz_convert(tz)
+    except Exception:
+        return fetched_at + ttl
+    
+    # Los días se cuentan en la fecha local sin zona y las horas se sitúan
+    # después en la zona: sumar 24 h a una medianoche con zona descuadra la
+    # apertura una hora los fines de semana de cambio de horario
+    day = local.tz_localize(None).normalize()
+    
+    def at(minutes):
+        return (day + pd.Timedelta(minutes=minutes)).tz_localize(
+            tz, ambiguous=False, nonexistent="shift_forward")
+    
+    if local.weekday() < 5 and at(open_minutes) <= local < at(close_minutes):
+        return fetched_at + ttl
+    
+    # Cerrado: siguiente apertura en día laborable
+    if local >= at(open_minutes) or local.weekday() >= 5:
+        day += pd.Timedelta(days=1)
+    while day.weekday() >= 5:
+        day += pd.Timedelta(days=1)
+    return at(open_minutes).timestamp()
+
+
+def quote_is_fresh(ticker_symbol, fetched_at, ttl, exchange=None, timezone=None, now=None):
+    """True si una cotización descargada en `fetched_at` sigue vigente."""
+    now = time.time() if now is None else now
+    return now < quote_expiry(ticker_symbol, fetched_at, ttl, exchange, timezone)
+
+
+def market_is_open(ticker_symbol, exchange=None, timezone=None, now=None):
+    """True si la bolsa del ticker está en sesión ahora mismo."""
+    now = time.time() if now is None else now
+    hours = market_hours(ticker_symbol, exchange, timezone)
+    return hours is None or quote_expiry(ticker_symbol, now, 0, exchange, timezone) == now
+
+# =============================================================================
+# DIRECTORIO LOCAL DE SÍMBOLOS (BÚSQUEDA DIFUSA Y AUTOCOMPLETADO)
+# =============================================================================
+# Resuelve nombres de empresa y erratas sin preguntar a Yahoo: "coca cola" ->
+# KO, "iberdrola" -> IBE.MC. El directorio base va aquí; los tickers que se
+# analizan con éxito y no estaban se añaden a DATA_DIR/symbols.tsv.
+
+SYMBOL_SUGGESTIONS = 5             # Sugerencias que se muestran bajo el buscador
+SYMBOL_MIN_SIMILARITY = 0.3        # Similitud de trigramas mínima para sugerir
+SYMBOL_RESOLVE_SCORE = 0.75        # Puntuación mínima para resolver sin preguntar
+SYMBOL_RESOLVE_MARGIN = 0.1        # Ventaja mínima sobre la segunda sugerencia
+REJECTED_SYMBOL_TTL = 6 * 3600     # Un símbolo rechazado por Yahoo no se reintenta
+SYMBOL_PATTERN = re.compile(r"^[A-Za-z0-9^=.\-]{1,15}$")
+SYMBOL_MAX_LETTERS = 5             # Una palabra suelta así de corta puede ser un ticker
+# Formas societarias que no distinguen a una empresa de otra en la similitud
+SYMBOL_STOPWORDS = frozenset((
+    "a", "ag", "and", "co", "company", "corp", "corporation", "de", "group", "holding",
+    "holdings", "inc", "incorporated", "limited", "ltd", "n", "nv", "plc", "s", "sa",
+    "se", "spa", "the", "v",
+))
+
+# SÍMBOLO|Nombre (alias entre paréntesis)|Bolsa
+SYMBOL_DIRECTORY_DATA = """
+# Estados Unidos
+AAPL|Apple Inc.|NASDAQ
+MSFT|Microsoft Corporation|NASDAQ
+GOOGL|Alphabet Inc. Class A (Google)|NASDAQ
+GOOG|Alphabet Inc. Class C (Google)|NASDAQ
+AMZN|Amazon.com, Inc.|NASDAQ
+META|Meta Platforms, Inc. (Facebook)|NASDAQ
+NVDA|NVIDIA Corporation|NASDAQ
+TSLA|Tesla, Inc.|NASDAQ
+BRK-B|Berkshire Hathaway Inc. Class B|NYSE
+JPM|JPMorgan Chase & Co.|NYSE
+V|Visa Inc.|NYSE
+MA|Mastercard Incorporated|NYSE
+JNJ|Johnson & Johnson|NYSE
+PG|Procter & Gamble Company|NYSE
+KO|Coca-Cola Company|NYSE
+PEP|PepsiCo, Inc.|NASDAQ
+WMT|Walmart Inc.|NASDAQ
+COST|Costco Wholesale Corporation|NASDAQ
+HD|Home Depot, Inc.|NYSE
+LOW|Lowe's Companies, Inc.|NYSE
+TGT|Target Corporation|NYSE
+MCD|McDonald's Corporation|NYSE
+SBUX|Starbucks Corporation|NASDAQ
+CMG|Chipotle Mexican Grill, Inc.|NYSE
+YUM|Yum! Brands, Inc.|NYSE
+DPZ|Domino's Pizza, Inc.|NASDAQ
+NKE|NIKE, Inc.|NYSE
+LULU|Lululemon Athletica Inc.|NASDAQ
+CROX|Crocs, Inc.|NASDAQ
+DIS|Walt Disney Company|NYSE
+NFLX|Netflix, Inc.|NASDAQ
+SPOT|Spotify Technology S.A.|NYSE
+CMCSA|Comcast Corporation|NASDAQ
+T|AT&T Inc.|NYSE
+VZ|Verizon Communications Inc.|NYSE
+ADBE|Adobe Inc.|NASDAQ
+CRM|Salesforce, Inc.|NYSE
+ORCL|Oracle Corporation|NYSE
+NOW|ServiceNow, Inc.|NYSE
+INTU|Intuit Inc.|NASDAQ
+IBM|International Business Machines Corporation (IBM)|NYSE
+CSCO|Cisco Systems, Inc.|NASDAQ
+INTC|Intel Corporation|NASDAQ
+AMD|Advanced Micro Devices, Inc. (AMD)|NASDAQ
+QCOM|QUALCOMM Incorporated|NASDAQ
+AVGO|Broadcom Inc.|NASDAQ
+TXN|Texas Instruments Incorporated|NASDAQ
+AMAT|Applied Materials, Inc.|NASDAQ
+MU|Micron Technology, Inc.|NASDAQ
+DELL|Dell Technologies Inc.|NYSE
+HPQ|HP Inc.|NYSE
+PLTR|Palantir Technologies Inc.|NASDAQ
+SNOW|Snowflake Inc.|NYSE
+SHOP|Shopify Inc.|NASDAQ
+UBER|Uber Technologies, Inc.|NYSE
+ABNB|Airbnb, Inc.|NASDAQ
+BKNG|Booking Holdings Inc.|NASDAQ
+MAR|Marriott International, Inc.|NASDAQ
+PYPL|PayPal Holdings, Inc.|NASDAQ
+XYZ|Block, Inc. (Square)|NYSE
+COIN|Coinbase Global, Inc.|NASDAQ
+ETSY|Etsy, Inc.|NASDAQ
+ZM|Zoom Communications, Inc.|NASDAQ
+UNH|UnitedHealth Group Incorporated|NYSE
+CVS|CVS Health Corporation|NYSE
+PFE|Pfizer Inc.|NYSE
+MRK|Merck & Co., Inc.|NYSE
+ABBV|AbbVie Inc.|NYSE
+LLY|Eli Lilly and Company|NYSE
+BMY|Bristol-Myers Squibb Company|NYSE
+AMGN|Amgen Inc.|NASDAQ
+GILD|Gilead Sciences, Inc.|NASDAQ
+ABT|Abbott Laboratories|NYSE
+TMO|Thermo Fisher Scientific Inc.|NYSE
+DHR|Danaher Corporation|NYSE
+MDT|Medtronic plc|NYSE
+ISRG|Intuitive Surgical, Inc.|NASDAQ
+BAC|Bank of America Corporation|NYSE
+WFC|Wells Fargo & Company|NYSE
+C|Citigroup Inc.|NYSE
+GS|Goldman Sachs Group, Inc.|NYSE
+MS|Morgan Stanley|NYSE
+AXP|American Express Company|NYSE
+BLK|BlackRock, Inc.|NYSE
+XOM|Exxon Mobil Corporation|NYSE
+CVX|Chevron Corporation|NYSE
+COP|ConocoPhillips|NYSE
+NEE|NextEra Energy, Inc.|NYSE
+DUK|Duke Energy Corporation|NYSE
+SO|Southern Company|NYSE
+O|Realty Income Corporation|NYSE
+AMT|American Tower Corporation|NYSE
+BA|Boeing Company|NYSE
+CAT|Caterpillar Inc.|NYSE
+DE|Deere & Company (John Deere)|NYSE
+GE|GE Aerospace (General Electric)|NYSE
+MMM|3M Company|NYSE
+HON|Honeywell International Inc.|NASDAQ
+UPS|United Parcel Service, Inc. (UPS)|NYSE
+LMT|Lockheed Martin Corporation|NYSE
+RTX|RTX Corporation (Raytheon)|NYSE
+F|Ford Motor Company|NYSE
+GM|General Motors Company|NYSE
+MO|Altria Group, Inc.|NYSE
+PM|Philip Morris International Inc.|NYSE
+CL|Colgate-Palmolive Company|NYSE
+KHC|Kraft Heinz Company|NASDAQ
+MDLZ|Mondelez International, Inc.|NASDAQ
+HSY|Hershey Company|NYSE
+GIS|General Mills, Inc.|NYSE
+SPY|SPDR S&P 500 ETF Trust|NYSE Arca
+QQQ|Invesco QQQ Trust (Nasdaq 100)|NASDAQ
+# ADR de empresas extranjeras en EE. UU.
+ASML|ASML Holding N.V. (ADR)|NASDAQ
+TSM|Taiwan Semiconductor Manufacturing Company (TSMC, ADR)|NYSE
+BABA|Alibaba Group Holding Limited (ADR)|NYSE
+NVO|Novo Nordisk A/S (ADR)|NYSE
+SAP|SAP SE (ADR)|NYSE
+TM|Toyota Motor Corporation (ADR)|NYSE
+SONY|Sony Group Corporation (ADR)|NYSE
+UL|Unilever PLC (ADR)|NYSE
+BTI|British American Tobacco p.l.c. (ADR)|NYSE
+BUD|Anheuser-Busch InBev SA/NV (ADR)|NYSE
+SAN|Banco Santander, S.A. (ADR)|NYSE
+BBVA|Banco Bilbao Vizcaya Argentaria, S.A. (BBVA, ADR)|NYSE
+TEF|Telefónica, S.A. (ADR)|NYSE
+BP|BP p.l.c. (ADR)|NYSE
+SHEL|Shell plc (ADR)|NYSE
+# España
+SAN.MC|Banco Santander, S.A.|BME
+BBVA.MC|Banco Bilbao Vizcaya Argentaria, S.A. (BBVA)|BME
+ITX.MC|Industria de Diseño Textil, S.A. (Inditex, Zara)|BME
+IBE.MC|Iberdrola, S.A.|BME
+TEF.MC|Telefónica, S.A.|BME
+REP.MC|Repsol, S.A.|BME
+CABK.MC|CaixaBank, S.A.|BME
+SAB.MC|Banco de Sabadell, S.A.|BME
+BKT.MC|Bankinter, S.A.|BME
+UNI.MC|Unicaja Banco, S.A.|BME
+MAP.MC|Mapfre, S.A.|BME
+AMS.MC|Amadeus IT Group, S.A.|BME
+FER.MC|Ferrovial SE|BME
+ACS.MC|ACS, Actividades de Construcción y Servicios, S.A.|BME
+ANA.MC|Acciona, S.A.|BME
+ANE.MC|Corporación Acciona Energías Renovables, S.A. (Acciona Energía)|BME
+AENA.MC|Aena S.M.E., S.A.|BME
+IAG.MC|International Consolidated Airlines Group (IAG, Iberia, British Airways)|BME
+ELE.MC|Endesa, S.A.|BME
+NTGY.MC|Naturgy Energy Group, S.A.|BME
+ENG.MC|Enagás, S.A.|BME
+RED.MC|Redeia Corporación, S.A. (Red Eléctrica)|BME
+SLR.MC|Solaria Energía y Medio Ambiente, S.A.|BME
+GRF.MC|Grifols, S.A.|BME
+ROVI.MC|Laboratorios Farmacéuticos Rovi, S.A.|BME
+CLNX.MC|Cellnex Telecom, S.A.|BME
+IDR.MC|Indra Sistemas, S.A.|BME
+MEL.MC|Meliá Hotels International, S.A.|BME
+ACX.MC|Acerinox, S.A.|BME
+MTS.MC|ArcelorMittal, S.A.|BME
+COL.MC|Inmobiliaria Colonial, SOCIMI, S.A.|BME
+MRL.MC|Merlin Properties SOCIMI, S.A.|BME
+LOG.MC|Logista Integral, S.A.|BME
+FDR.MC|Fluidra, S.A.|BME
+PUIG.MC|Puig Brands, S.A.|BME
+VIS.MC|Viscofan, S.A.|BME
+EBRO.MC|Ebro Foods, S.A.|BME
+CIE.MC|CIE Automotive, S.A.|BME
+ENC.MC|ENCE Energía y Celulosa, S.A.|BME
+TRE.MC|Técnicas Reunidas, S.A.|BME
+# Reino Unido
+HSBA.L|HSBC Holdings plc|LSE
+SHEL.L|Shell plc|LSE
+AZN.L|AstraZeneca PLC|LSE
+ULVR.L|Unilever PLC|LSE
+BP.L|BP p.l.c.|LSE
+GSK.L|GSK plc|LSE
+RIO.L|Rio Tinto Group|LSE
+AAL.L|Anglo American plc|LSE
+GLEN.L|Glencore plc|LSE
+DGE.L|Diageo plc|LSE
+BATS.L|British American Tobacco p.l.c.|LSE
+IMB.L|Imperial Brands PLC|LSE
+LLOY.L|Lloyds Banking Group plc|LSE
+BARC.L|Barclays PLC|LSE
+NWG.L|NatWest Group plc|LSE
+PRU.L|Prudential plc|LSE
+AV.L|Aviva plc|LSE
+LGEN.L|Legal & General Group Plc|LSE
+LSEG.L|London Stock Exchange Group plc|LSE
+VOD.L|Vodafone Group Plc|LSE
+BT-A.L|BT Group plc|LSE
+TSCO.L|Tesco PLC|LSE
+REL.L|RELX PLC|LSE
+NG.L|National Grid plc|LSE
+SSE.L|SSE plc|LSE
+RR.L|Rolls-Royce Holdings plc|LSE
+BA.L|BAE Systems plc|LSE
+CPG.L|Compass Group PLC|LSE
+RKT.L|Reckitt Benckiser Group plc|LSE
+HLN.L|Haleon plc|LSE
+# Alemania
+SAP.DE|SAP SE|XETRA
+SIE.DE|Siemens AG|XETRA
+SHL.DE|Siemens Healthineers AG|XETRA
+ENR.DE|Siemens Energy AG|XETRA
+ALV.DE|Allianz SE|XETRA
+MUV2.DE|Münchener Rückversicherungs-Gesellschaft AG (Munich Re)|XETRA
+HNR1.DE|Hannover Rück SE|XETRA
+DTE.DE|Deutsche Telekom AG|XETRA
+DBK.DE|Deutsche Bank AG|XETRA
+CBK.DE|Commerzbank AG|XETRA
+DB1.DE|Deutsche Börse AG|XETRA
+DHL.DE|Deutsche Post AG (DHL Group)|XETRA
+MBG.DE|Mercedes-Benz Group AG|XETRA
+BMW.DE|Bayerische Motoren Werke AG (BMW)|XETRA
+VOW3.DE|Volkswagen AG|XETRA
+PAH3.DE|Porsche Automobil Holding SE|XETRA
+P911.DE|Dr. Ing. h.c. F. Porsche AG|XETRA
+CON.DE|Continental AG|XETRA
+BAS.DE|BASF SE|XETRA
+BAYN.DE|Bayer AG|XETRA
+MRK.DE|Merck KGaA|XETRA
+FRE.DE|Fresenius SE & Co. KGaA|XETRA
+ADS.DE|adidas AG|XETRA
+PUM.DE|PUMA SE|XETRA
+BEI.DE|Beiersdorf AG (Nivea)|XETRA
+HEN3.DE|Henkel AG & Co. KGaA|XETRA
+IFX.DE|Infineon Technologies AG|XETRA
+EOAN.DE|E.ON SE|XETRA
+RWE.DE|RWE AG|XETRA
+RHM.DE|Rheinmetall AG|XETRA
+MTX.DE|MTU Aero Engines AG|XETRA
+VNA.DE|Vonovia SE|XETRA
+ZAL.DE|Zalando SE|XETRA
+# Francia
+MC.PA|LVMH Moët Hennessy Louis Vuitton SE|Euronext Paris
+OR.PA|L'Oréal S.A.|Euronext Paris
+RMS.PA|Hermès International|Euronext Paris
+KER.PA|Kering SA (Gucci)|Euronext Paris
+EL.PA|EssilorLuxottica|Euronext Paris
+TTE.PA|TotalEnergies SE|Euronext Paris
+SAN.PA|Sanofi|Euronext Paris
+AIR.PA|Airbus SE|Euronext Paris
+SAF.PA|Safran SA|Euronext Paris
+HO.PA|Thales S.A.|Euronext Paris
+SU.PA|Schneider Electric SE|Euronext Paris
+LR.PA|Legrand SA|Euronext Paris
+AI.PA|Air Liquide S.A.|Euronext Paris
+BNP.PA|BNP Paribas SA|Euronext Paris
+GLE.PA|Société Générale SA|Euronext Paris
+ACA.PA|Crédit Agricole S.A.|Euronext Paris
+CS.PA|AXA SA|Euronext Paris
+BN.PA|Danone S.A.|Euronext Paris
+RI.PA|Pernod Ricard SA|Euronext Paris
+CA.PA|Carrefour SA|Euronext Paris
+ORA.PA|Orange S.A.|Euronext Paris
+ENGI.PA|Engie SA|Euronext Paris
+VIE.PA|Veolia Environnement SA|Euronext Paris
+DG.PA|Vinci SA|Euronext Paris
+EN.PA|Bouygues SA|Euronext Paris
+SGO.PA|Compagnie de Saint-Gobain S.A.|Euronext Paris
+CAP.PA|Capgemini SE|Euronext Paris
+DSY.PA|Dassault Systèmes SE|Euronext Paris
+PUB.PA|Publicis Groupe S.A.|Euronext Paris
+RNO.PA|Renault SA|Euronext Paris
+ML.PA|Compagnie Générale des Établissements Michelin (Michelin)|Euronext Paris
+AC.PA|Accor SA|Euronext Paris
+UBI.PA|Ubisoft Entertainment SA|Euronext Paris
+STLAP.PA|Stellantis N.V.|Euronext Paris
+# Países Bajos, Bélgica, Italia y Portugal
+ASML.AS|ASML Holding N.V.|Euronext Amsterdam
+ASM.AS|ASM International N.V.|Euronext Amsterdam
+ADYEN.AS|Adyen N.V.|Euronext Amsterdam
+INGA.AS|ING Groep N.V.|Euronext Amsterdam
+HEIA.AS|Heineken N.V.|Euronext Amsterdam
+PHIA.AS|Koninklijke Philips N.V. (Philips)|Euronext Amsterdam
+AD.AS|Koninklijke Ahold Delhaize N.V.|Euronext Amsterdam
+PRX.AS|Prosus N.V.|Euronext Amsterdam
+WKL.AS|Wolters Kluwer N.V.|Euronext Amsterdam
+UMG.AS|Universal Music Group N.V.|Euronext Amsterdam
+ABI.BR|Anheuser-Busch InBev SA/NV|Euronext Brussels
+KBC.BR|KBC Group NV|Euronext Brussels
+UCB.BR|UCB SA|Euronext Brussels
+ENEL.MI|Enel SpA|Borsa Italiana
+ENI.MI|Eni S.p.A.|Borsa Italiana
+ISP.MI|Intesa Sanpaolo S.p.A.|Borsa Italiana
+UCG.MI|UniCredit S.p.A.|Borsa Italiana
+G.MI|Assicurazioni Generali S.p.A.|Borsa Italiana
+RACE.MI|Ferrari N.V.|Borsa Italiana
+STLAM.MI|Stellantis N.V.|Borsa Italiana
+MONC.MI|Moncler S.p.A.|Borsa Italiana
+EDP.LS|EDP - Energias de Portugal, S.A.|Euronext Lisbon
+GALP.LS|Galp Energia, SGPS, S.A.|Euronext Lisbon
+JMT.LS|Jerónimo Martins, SGPS, S.A.|Euronext Lisbon
+# Suiza
+NESN.SW|Nestlé S.A.|SIX
+NOVN.SW|Novartis AG|SIX
+ROG.SW|Roche Holding AG|SIX
+UBSG.SW|UBS Group AG|SIX
+ZURN.SW|Zurich Insurance Group AG|SIX
+SREN.SW|Swiss Re AG|SIX
+ABBN.SW|ABB Ltd|SIX
+CFR.SW|Compagnie Financière Richemont SA (Cartier)|SIX
+LONN.SW|Lonza Group AG|SIX
+LOGN.SW|Logitech International S.A.|SIX
+# Canadá
+RY.TO|Royal Bank of Canada|TSX
+TD.TO|Toronto-Dominion Bank|TSX
+BNS.TO|Bank of Nova Scotia (Scotiabank)|TSX
+BMO.TO|Bank of Montreal|TSX
+SHOP.TO|Shopify Inc.|TSX
+ENB.TO|Enbridge Inc.|TSX
+SU.TO|Suncor Energy Inc.|TSX
+CNR.TO|Canadian National Railway Company|TSX
+CP.TO|Canadian Pacific Kansas City Limited|TSX
+ATD.TO|Alimentation Couche-Tard Inc.|TSX
+BN.TO|Brookfield Corporation|TSX
+# Japón, Hong Kong y Australia
+7203.T|Toyota Motor Corporation|TSE
+6758.T|Sony Group Corporation|TSE
+7267.T|Honda Motor Co., Ltd.|TSE
+7974.T|Nintendo Co., Ltd.|TSE
+9984.T|SoftBank Group Corp.|TSE
+6861.T|Keyence Corporation|TSE
+6501.T|Hitachi, Ltd.|TSE
+8035.T|Tokyo Electron Limited|TSE
+8306.T|Mitsubishi UFJ Financial Group, Inc.|TSE
+9432.T|Nippon Telegraph and Telephone Corporation (NTT)|TSE
+9983.T|Fast Retailing Co., Ltd. (Uniqlo)|TSE
+0700.HK|Tencent Holdings Limited|HKEX
+9988.HK|Alibaba Group Holding Limited|HKEX
+0005.HK|HSBC Holdings plc|HKEX
+1299.HK|AIA Group Limited|HKEX
+0941.HK|China Mobile Limited|HKEX
+3690.HK|Meituan|HKEX
+1810.HK|Xiaomi Corporation|HKEX
+0388.HK|Hong Kong Exchanges and Clearing Limited|HKEX
+BHP.AX|BHP Group Limited|ASX
+RIO.AX|Rio Tinto Limited|ASX
+FMG.AX|Fortescue Ltd|ASX
+CBA.AX|Commonwealth Bank of Australia|ASX
+NAB.AX|National Australia Bank Limited|ASX
+WBC.AX|Westpac Banking Corporation|ASX
+ANZ.AX|ANZ Group Holdings Limited|ASX
+MQG.AX|Macquarie Group Limited|ASX
+CSL.AX|CSL Limited|ASX
+WES.AX|Wesfarmers Limited|ASX
+WOW.AX|Woolworths Group Limited|ASX
+# Criptomonedas
+BTC-USD|Bitcoin USD|CCC
+ETH-USD|Ethereum USD|CCC
+"""
+
+
+def normalize_search_text(text):
+    """Minúsculas sin acentos ni signos: 'Nestlé S.A.' -> 'nestle s a'."""
+    text = unicodedata.normalize("NFKD", str(text))
+    text = "".join(ch for ch in text if not unicodedata.combining(ch)).lower()
+    return " ".join(re.sub(r"[^a-z0-9]+", " ", text).split())
+
+
+def _trigrams(text):
+    """Trigramas de un texto normalizado sin formas societarias ('limited', 'inc'...)."""
+    words = [word for word in text.split() if word not in SYMBOL_STOPWORDS]
+    if not words:
+        return set()
+    padded = f" {' '.join(words)} "
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+
+def looks_like_symbol(query):
+    """
+    True si el texto se escribió como un símbolo y no como un nombre.
+    
+    Un símbolo va en mayúsculas o lleva cifras o signos de Yahoo ('NET',
+    '7203.T', 'brk-b'); 'iberdrola' o 'coca cola' son nombres. Un símbolo que
+    no está en el directorio se pide a Yahoo tal cual: resolverlo por
+    parecido cambiaría un ticker válido por otro (NET -> NFLX).
+    """
+    query = str(query).strip()
+    if not SYMBOL_PATTERN.match(query):
+        return False
+    return not any(ch.islower() for ch in query) or bool(re.search(r"[0-9^=.\-]", query))
+
+
+def looks_like_name(query):
+    """
+    True si el texto es claramente un nombre de empresa y se puede resolver.
+    
+    Solo varias palabras o una palabra más larga que SYMBOL_MAX_LETTERS: una
+    palabra corta en minúsculas ('net', 'on') puede ser un ticker y se deja
+    elegir entre las sugerencias o pedirla tal cual.
+    """
+    query = str(query).strip()
+    if looks_like_symbol(query):
+        return False
+    return not SYMBOL_PATTERN.match(query) or len(query) > SYMBOL_MAX_LETTERS
+
+
+class SymbolEntry:
+    """Fila del directorio: símbolo de Yahoo, nombre, bolsa y sufijo."""
+
+    __slots__ = ("symbol", "name", "exchange", "suffix", "key")
+
+    def __init__(self, symbol, name, exchange=""):
+        self.symbol = symbol.upper()
+        self.name = name
+        self.exchange = exchange
+        self.suffix = self.symbol.rpartition(".")[2] if "." in self.symbol else ""
+        self.key = normalize_search_text(name)
+
+    @property
+    def base(self):
+        """Símbolo sin el sufijo de bolsa ('IBE' para 'IBE.MC')."""
+        return self.symbol[:-len(self.suffix) - 1] if self.suffix else self.symbol
+
+    def __repr__(self):
+        return f"SymbolEntry({self.symbol!r}, {self.name!r})"
+
+
+class SymbolDirectory:
+    """
+    Directorio de símbolos con índice de prefijos y de trigramas.
+    
+    El índice de prefijos es una lista ordenada de (palabra, fila) en la que
+    se busca con bisect; el de trigramas asocia cada trigrama a las filas que
+    lo contienen y sirve para las erratas ('iberdola', 'APPL'). Con unos
+    cientos de filas una búsqueda tarda decenas de microsegundos.
+    Los símbolos que Yahoo rechaza se recuerdan REJECTED_SYMBOL_TTL segundos.
+    """
+
+    def __init__(self, path=None):
+        self.path = path
+        self._entries = []
+        self._by_symbol = {}
+        self._words = []
+        self._grams = {}
+        self._gram_counts = []
+        self._rejected = {}
+        self._lock = threading.Lock()
+        self._load(SYMBOL_DIRECTORY_DATA.splitlines())
+        if path and os.path.exists(path):
+            try:
+                with open(path, encoding="utf-8") as f:
+                    self._load(line.replace("\t", "|") for line in f)
+            except OSError:
+                pass
+
+    def _load(self, lines):
+        for line in lines:
+            line = line.strip()
+            if line and not line.startswith("#"):
+                symbol, _, rest = line.partition("|")
+                name, _, exchange = rest.partition("|")
+                self._add(SymbolEntry(symbol, name or symbol, exchange))
+
+    def _add(self, entry):
+        if entry.symbol in self._by_symbol:
+            return
+        row = len(self._entries)
+        self._entries.append(entry)
+        self._by_symbol[entry.symbol] = row
+        for word in set(entry.key.split()) | {entry.symbol.lower(), entry.base.lower()}:
+            bisect.insort(self._words, (word, row))
+        grams = _trigrams(f"{entry.base.lower()} {entry.key}")
+        self._gram_counts.append(len(grams))
+        for gram in grams:
+            self._grams.setdefault(gram, []).append(row)
+
+    def __len__(self):
+        return len(self._entries)
+
+    def get(self, symbol):
+        """Fila del símbolo exacto o None."""
+        row = self._by_symbol.get(str(symbol).strip().upper())
+        return self._entries[row] if row is not None else None
+
+    def _prefix_rows(self, word):
+        # Filas con alguna palabra que empieza por `word`
+        rows = set()
+        start = bisect.bisect_left(self._words, (word, -1))
+        for candidate, row in self._words[start:]:
+            if not candidate.startswith(word):
+                break
+            rows.add(row)
+        return rows
+
+    def search(self, query, limit=SYMBOL_SUGGESTIONS):
+        """
+        Busca por símbolo, nombre o parecido del nombre.
+        
+        Args:
+            query: Texto del usuario ('coca cola', 'IBE', 'iberdola'...)
+            limit: Número máximo de resultados
+        
+        Returns:
+            Lista de (SymbolEntry, puntuación 0-1) de mejor a peor
+        """
+        text = normalize_search_text(query)
+        if not text:
+            return []
+        symbol = str(query).strip().upper()
+        words = text.split()
+        scores = {}
+        
+        def score(row, value):
+            if value > scores.get(row, 0.0):
+                scores[row] = value
+        
+        with self._lock:
+            if symbol in self._by_symbol:
+                score(self._by_symbol[symbol], 1.0)
+            # Todas las palabras de la consulta son prefijos de palabras de la fila
+            rows = self._prefix_rows(words[0])
+            for word in words[1:]:
+                rows &= self._prefix_rows(word)
+            for row in rows:
+                entry = self._entries[row]
+                if entry.base == symbol:
+                    score(row, 0.9)
+                elif entry.key.startswith(text):
+                    score(row, 0.85)
+                elif entry.symbol.startswith(symbol):
+                    score(row, 0.7)
+                else:
+                    score(row, 0.75)
+            # Erratas: coeficiente de Dice sobre trigramas
+            grams = _trigrams(text)
+            shared = {}  # fila -> trigramas en común
+            for gram in grams:
+                for row in self._grams.get(gram, ()):
+                    shared[row] = shared.get(row, 0) + 1
+            for row, count in shared.items():
+                similarity = 2 * count / (len(grams) + self._gram_counts[row])
+                if similarity >= SYMBOL_MIN_SIMILARITY:
+                    score(row, 0.65 * similarity)
+            ranked = sorted(scores.items(), key=lambda item: (-item[1], item[0]))[:limit]
+            return [(self._entries[row], value) for row, value in ranked]
+
+    def resolve(self, query):
+        """
+        Símbolo inequívoco para la consulta o None si hay que preguntar.
+        
+        Se resuelve si la mejor coincidencia supera SYMBOL_RESOLVE_SCORE con
+        una ventaja de SYMBOL_RESOLVE_MARGIN sobre la segunda.
+        """
+        results = self.search(query, limit=2)
+        if not results or results[0][1] < SYMBOL_RESOLVE_SCORE:
+            return None
+        if len(results) > 1 and results[0][1] - results[1][1] < SYMBOL_RESOLVE_MARGIN:
+            return None
+        return results[0][0]
+
+    def learn(self, symbol, name, exchange=""):
+        """Añade un ticker analizado con éxito (y lo guarda en disco si se puede)."""
+        entry = SymbolEntry(symbol, name or symbol, exchange)
+        with self._lock:
+            self._rejected.pop(entry.symbol, None)
+            if entry.symbol in self._by_symbol:
+                return
+            self._add(entry)
+        if self.path:
+            try:
+                with open(self.path, "a", encoding="utf-8") as f:
+                    f.write(f"{entry.symbol}\t{entry.name}\t{entry.exchange}\n")
+            except OSError:
+                pass
+
+    def reject(self, symbol):
+        """Recuerda que Yahoo no conoce el símbolo."""
+        with self._lock:
+            self._rejected[str(symbol).strip().upper()] = time.time()
+
+    def is_rejected(self, symbol):
+        """True si Yahoo rechazó el símbolo hace menos de REJECTED_SYMBOL_TTL."""
+        with self._lock:
+            rejected_at = self._rejected.get(str(symbol).strip().upper())
+        return rejected_at is not None and time.time() - rejected_at < REJECTED_SYMBOL_TTL
+
+
+@st.cache_resource(show_spinner=False)
+def get_symbol_directory():
+    """Directorio de símbolos compartido por todas las sesiones."""
+    try:
+        os.makedirs(DATA_DIR, exist_ok=True)
+        return SymbolDirectory(os.path.join(DATA_DIR, "symbols.tsv"))
+    except OSError:
+        return SymbolDirectory()
+
+# =============================================================================
+# CANCELACIÓN DE TRABAJO SUPERADO (TOKENS POR SESIÓN)
+# =============================================================================
+# Cada sesión analiza un solo ticker a la vez. Cuando cambia, el token del
+# anterior se cancela y sus descargas y llamadas a la IA se abandonan en la
+# siguiente frontera (antes de cada llamada a Yahoo o al modelo): una petición
+# HTTP ya en vuelo no se puede interrumpir, pero no se lanza ninguna más.
+
+FETCH_WORKERS = 8              # Hilos para las descargas de las sesiones
+FETCH_HEARTBEAT_SECONDS = 0.2  # Cada cuánto el script cede el control mientras espera
+
+
+class OperationCancelled(BaseException):
+    """
+    El trabajo pertenece a un análisis que ya no mira nadie.
+    
+    Hereda de BaseException (como asyncio.CancelledError) para que los
+    `except Exception` de los extractores no la traten como un fallo de datos.
+    """
+
+
+class CancelToken:
+    """Marca de cancelación compartida por todo el trabajo de un análisis."""
+
+    def __init__(self, label=""):
+        self.label = label
+        self._event = threading.Event()
+
+    def cancel(self):
+        """Cancela el trabajo asociado (idempotente)."""
+        self._event.set()
+
+    @property
+    def cancelled(self):
+        return self._event.is_set()
+
+    def check(self):
+        """
+        Raises:
+            OperationCancelled: si el token está cancelado
+        """
+        if self._event.is_set():
+            raise OperationCancelled(self.label)
+
+
+# Token ligado al hilo que ejecuta el trabajo (None = trabajo sin dueño)
+_cancel_binding = threading.local()
+
+
+def bind_cancel_token(token):
+    """Liga un token de cancelación al hilo actual (None lo desliga)."""
+    _cancel_binding.token = token
+
+
+def current_cancel_token():
+    """Devuelve el token ligado al hilo actual o None."""
+    return getattr(_cancel_binding, 'token', None)
+
+
+def check_cancelled():
+    """
+    Frontera de cancelación: se llama antes de cada llamada costosa.
+    
+    Raises:
+        OperationCancelled: si el trabajo del hilo actual fue superado
+    """
+    token = current_cancel_token()
+    if token is not None:
+        token.check()
+
+
+def run_with_token(token, fn, *args, lang=None, **kwargs):
+    """
+    Ejecuta fn con el token (y opcionalmente el idioma) ligados al hilo.
+    
+    Pensada para los hilos de los pools, que se reutilizan entre trabajos.
+    """
+    bind_cancel_token(token)
+    if lang is not None:
+        bind_language(lang)
+    try:
+        token.check()
+        return fn(*args, **kwargs)
+    finally:
+        bind_cancel_token(None)
+
+
+@st.cache_resource(show_spinner=False)
+def get_fetch_pool():
+    """Pool de descargas compartido por todas las sesiones del proceso."""
+    return ThreadPoolExecutor(max_workers=FETCH_WORKERS, thread_name_prefix="fetch")
+
+
+def session_owner_id():
+    """Identificador estable de la sesión para la cola de la IA."""
+    if 'session_owner' not in st.session_state:
+        st.session_state['session_owner'] = os.urandom(8).hex()
+    return st.session_state['session_owner']
+
+
+def session_cancel_token(ticker_symbol):
+    """
+    Token del análisis en curso de la sesión.
+    
+    Si el ticker cambia, cancela el token anterior y suelta los trabajos de
+    la IA de la sesión (los que no comparta con otra se cancelan).
+    
+    Args:
+        ticker_symbol: Ticker que la sesión está analizando ahora
+    
+    Returns:
+        CancelToken del ticker actual
+    """
+    ticker_symbol = str(ticker_symbol).upper()
+    current = st.session_state.get('analysis_token')
+    if current is not None and current.label == ticker_symbol and not current.cancelled:
+        return current
+    if current is not None:
+        current.cancel()
+        get_ai_job_queue().release(session_owner_id())
+    token = st.session_state['analysis_token'] = CancelToken(ticker_symbol)
+    return token
+
+
+def run_for_session(token, fn, *args, deadline=None, **kwargs):
+    """
+    Ejecuta una descarga en el pool mientras el script sigue interrumpible.
+    
+    El script de Streamlit solo atiende un rerun cuando emite un elemento, así
+    que mientras espera toca un marcador vacío cada FETCH_HEARTBEAT_SECONDS:
+    si el usuario ya pidió otro ticker, la ejecución se detiene ahí y la nueva
+    cancela el token. fn no debe llamar a st.* (corre fuera del script).
+    
+    Args:
+        token: CancelToken de session_cancel_token
+        fn: Función de descarga
+        deadline: Epoch a partir del cual se deja de esperar (None = sin límite)
+    
+    Returns:
+        El resultado de fn
+    
+    Raises:
+        DeadlineExceeded: si no terminó a tiempo; la descarga sigue en el pool
+        y la sección queda pendiente hasta que acabe
+    """
+    future = get_fetch_pool().submit(run_with_token, token, fn, *args,
+                                     lang=current_language(), **kwargs)
+    heartbeat = st.empty()
+    try:
+        while True:
+            try:
+                return future.result(timeout=FETCH_HEARTBEAT_SECONDS)
+            except FuturesTimeoutError:
+                # En Python >= 3.11 es el TimeoutError nativo: si la tarea ya
+                # terminó, el error es de fn (p. ej. DeadlineExceeded) y se
+                # propaga; solo es fin de espera mientras sigue en marcha
+                if future.done():
+                    return future.result()
+                if deadline is not None and time.time() >= deadline:
+                    mark_pending(future.done)
+                    raise DeadlineExceeded(getattr(fn, "__name__", "fetch"))
+                heartbeat.empty()
+    except OperationCancelled:
+        # Esta ejecución ya fue superada por otra de la misma sesión
+        st.stop()
+    finally:
+        heartbeat.empty()
+
+# =============================================================================
+# PRESUPUESTO DE LATENCIA POR ANÁLISIS (DEADLINES)
+# =============================================================================
+# La página tiene ANALYSIS_BUDGET_SECONDS para el primer pintado. Lo que llegue
+# a tiempo se pinta; lo demás se marca como pendiente y un sondeo relanza la
+# página cuando termina. Dentro del snapshot el plazo llega a cada petición a
+# Yahoo: las secundarias (noticias, historial, balance...) se cortan al
+# agotarse y se completan después en segundo plano.
+
+ANALYSIS_BUDGET_SECONDS = 2.5    # Hasta el primer pintado de un análisis
+YAHOO_REQUEST_TIMEOUT = 10       # Techo de cualquier petición HTTP a Yahoo
+MIN_REQUEST_TIMEOUT = 0.25       # Timeout mínimo de una petición con presupuesto
+DEADLINE_HEADROOM_SECONDS = 0.5  # Margen para montar y pintar lo que llegó a tiempo
+PENDING_POLL_SECONDS = 1.0       # Sondeo de las secciones pendientes
+ESSENTIAL_ENDPOINTS = ("info", "quote")  # Sin ellos no hay página: nunca se cortan
+
+
+class DeadlineExceeded(TimeoutError):
+    """Una sección o una llamada secundaria no cupo en el presupuesto."""
+
+
+# Plazo del análisis y, durante una llamada con presupuesto, el de sus peticiones
+_deadline_binding = threading.local()
+
+
+def bind_deadline(deadline):
+    """Liga el plazo (epoch) del análisis al hilo actual (None lo desliga)."""
+    _deadline_binding.deadline = deadline
+
+
+def current_deadline():
+    """Devuelve el plazo ligado al hilo actual o None."""
+    return getattr(_deadline_binding, 'deadline', None)
+
+
+def request_timeout(timeout=None):
+    """
+    Timeout de una petición HTTP hacia Yahoo.
+    
+    Args:
+        timeout: El que pide yfinance (30 s por defecto)
+    
+    Returns:
+        El menor entre el pedido, YAHOO_REQUEST_TIMEOUT y, si la petición
+        pertenece a una llamada con presupuesto, lo que quede del plazo
+    """
+    if timeout is not None and not isinstance(timeout, (int, float)):
+        return timeout
+    limit = YAHOO_REQUEST_TIMEOUT if timeout is None else min(timeout, YAHOO_REQUEST_TIMEOUT)
+    deadline = getattr(_deadline_binding, 'request_deadline', None)
+    if deadline is not None:
+        limit = min(limit, max(deadline - time.time(), MIN_REQUEST_TIMEOUT))
+    return limit
+
+
+def mark_pending(ready):
+    """
+    Registra una sección que se rellenará más tarde.
+    
+    Args:
+        ready: Función sin argumentos que devuelve True cuando ya llegó
+    """
+    st.session_state.setdefault('pending_sections', []).append(ready)
+
+
+@st.fragment(run_every=PENDING_POLL_SECONDS)
+def poll_pending_sections():
+    """Relanza la página en cuanto llega alguna sección pendiente."""
+    if any(ready() for ready in st.session_state.get('pending_sections', [])):
+        st.rerun()
+
+# =============================================================================
+# SINGLE-FLIGHT: UNA SOLA DESCARGA EN CURSO POR (TICKER, RECURSO)
+# =============================================================================
+
+class _FlightCall:
+    """Descarga en curso: los seguidores esperan a `done` y leen su resultado."""
+
+    __slots__ = ("done", "result", "error")
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+
+
+class SingleFlight:
+    """
+    Agrupa llamadas concurrentes idénticas en una sola ejecución.
+    
+    La primera sesión que pide una clave ejecuta la función; las que llegan
+    mientras sigue en curso esperan y reciben el mismo resultado (o la misma
+    excepción). Al terminar la clave se libera, así que no es una caché:
+    las llamadas posteriores vuelven a ejecutar la función. Si lo que se
+    cancela (o agota su plazo) es el análisis del líder, un seguidor vigente
+    toma el relevo.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._calls = {}
+        self._stats = {"executed": 0, "shared": 0}
+
+    def do(self, key, fn, *args, **kwargs):
+        """
+        Ejecuta fn(*args, **kwargs) o espera a la ejecución en curso de `key`.
+        
+        Args:
+            key: Clave hashable, normalmente (ticker, recurso)
+            fn: Función a ejecutar
+        
+        Returns:
+            El resultado de fn, compartido entre las llamadas concurrentes
+        """
+        while True:
+            with self._lock:
+                call = self._calls.get(key)
+                leader = call is None
+                if leader:
+                    call = self._calls[key] = _FlightCall()
+                    self._stats["executed"] += 1
+                else:
+                    self._stats["shared"] += 1
+            if leader:
+                break
+            call.done.wait()
+            if isinstance(call.error, (OperationCancelled, DeadlineExceeded)):
+                # El plazo o la cancelación eran del líder, no nuestros: tomar el relevo
+                check_cancelled()
+                continue
+            if call.error is not None:
+                raise call.error
+            return call.result
+        
+        try:
+            call.result = fn(*args, **kwargs)
+            return call.result
+        except BaseException as e:
+            call.error = e
+            raise
+        finally:
+            with self._lock:
+                del self._calls[key]
+            call.done.set()
+
+    def stats(self):
+        """Ejecuciones reales, llamadas servidas por otra y claves en curso."""
+        with self._lock:
+            return {**self._stats, "in_flight": len(self._calls)}
+
+
+@st.cache_resource(show_spinner=False)
+def get_single_flight():
+    """Registro de descargas en curso compartido por todas las sesiones."""
+    return SingleFlight()
+
+
+def coalesce(ticker_symbol, resource, fn, *args, **kwargs):
+    """
+    Atajo de SingleFlight.do con la clave (TICKER, recurso).
+    
+    Args:
+        ticker_symbol: Símbolo del ticker
+        resource: Nombre del recurso ("snapshot", "insiders", "history:5y"...)
+        fn: Función que descarga el recurso
+    
+    Returns:
+        El resultado de fn
+    """
+    key = (str(ticker_symbol).upper(), resource)
+    return get_single_flight().do(key, fn, *args, **kwargs)
+
+# =============================================================================
+# DISPONIBILIDAD DE YAHOO: CIRCUIT BREAKER Y STALE-WHILE-REVALIDATE
+# =============================================================================
+
+BREAKER_WINDOW = 20            # Últimas llamadas consideradas por endpoint
+BREAKER_MIN_CALLS = 5          # Llamadas mínimas antes de poder abrir
+BREAKER_FAILURE_RATE = 0.5     # Tasa de fallos que abre el circuito
+BREAKER_OPEN_SECONDS = 60      # Tiempo sin llamar a Yahoo tras abrirse
+REVALIDATE_WORKERS = 2         # Hilos para refrescos en segundo plano
+LAST_GOOD_MAX_ENTRIES = 512    # Últimos valores buenos guardados
+INSIDERS_FRESH_SECONDS = 3600  # Holders e insiders cambian poco
+
+
+class CircuitOpenError(RuntimeError):
+    """El endpoint de Yahoo está en reposo tras demasiados fallos."""
+
+
+class CircuitBreaker:
+    """
+    Circuit breaker de un endpoint de Yahoo con ventana de llamadas.
+    
+    Cerrado: deja pasar todo y anota el resultado. Si en las últimas
+    BREAKER_WINDOW llamadas falla al menos BREAKER_FAILURE_RATE, se abre y
+    rechaza llamadas durante BREAKER_OPEN_SECONDS. Pasado ese tiempo deja
+    pasar una sola sonda: si va bien se cierra y si falla vuelve a abrirse.
+    """
+
+    def __init__(self, name):
+        self.name = name
+        self._results = deque(maxlen=BREAKER_WINDOW)
+        self._opened_at = None
+        self._probing = False
+        self._lock = threading.Lock()
+
+    @property
+    def state(self):
+        """'closed', 'open' o 'half_open'."""
+        if self._opened_at is None:
+            return "closed"
+        if time.time() - self._opened_at < BREAKER_OPEN_SECONDS:
+            return "open"
+        return "half_open"
+
+    def allow(self):
+        """True si la llamada puede salir hacia Yahoo."""
+        with self._lock:
+            state = self.state
+            if state == "closed":
+                return True
+            if state == "half_open" and not self._probing:
+                self._probing = True
+                return True
+            return False
+
+    def abandon(self):
+        """Libera la sonda sin anotar resultado (llamada cortada por nuestro plazo)."""
+        with self._lock:
+            self._probing = False
+
+    def record(self, ok):
+        """Anota el resultado de una llamada y abre/cierra el circuito."""
+        with self._lock:
+            if self._opened_at is not None:
+                # Resultado de la sonda
+                self._probing = False
+                if ok:
+                    self._opened_at = None
+                    self._results.clear()
+                else:
+                    self._opened_at = time.time()
+                return
+            self._results.append(bool(ok))
+            failures = self._results.count(False)
+            if len(self._results) >= BREAKER_MIN_CALLS and failures / len(self._results) >= BREAKER_FAILURE_RATE:
+                self._opened_at = time.time()
+
+    def stats(self):
+        """Estado, llamadas en la ventana y tasa de fallos."""
+        with self._lock:
+            calls = len(self._results)
+            return {
+                "state": self.state,
+                "calls": calls,
+                "failure_rate": self._results.count(False) / calls if calls else 0.0,
+            }
+
+
+class YahooBreakers:
+    """Circuit breakers de Yahoo por endpoint ("info", "history", "news"...)."""
+
+    def __init__(self):
+        self._breakers = {}
+        self._lock = threading.Lock()
+
+    def get(self, endpoint):
+        with self._lock:
+            if endpoint not in self._breakers:
+                self._breakers[endpoint] = CircuitBreaker(endpoint)
+            return self._breakers[endpoint]
+
+    def degraded(self):
+        """Endpoints con el circuito abierto o en prueba."""
+        with self._lock:
+            breakers = list(self._breakers.values())
+        return [b.name for b in breakers if b.state != "closed"]
+
+    def stats(self):
+        with self._lock:
+            breakers = list(self._breakers.values())
+        return {b.name: b.stats() for b in breakers}
+
+
+@st.cache_resource(show_spinner=False)
+def get_yahoo_breakers():
+    """Circuit breakers compartidos por todas las sesiones del proceso."""
+    return YahooBreakers()
+
+
+def is_missing_symbol_error(error):
+    """
+    Indica si un error de Yahoo significa "el símbolo no existe".
+    
+    Es una respuesta correcta de Yahoo (típicamente una errata del usuario),
+    no un fallo del servicio: no debe abrir el circuito para todos.
+    """
+    if YFTickerMissingError is not None and isinstance(error, YFTickerMissingError):
+        return True
+    response = getattr(error, "response", None)
+    return getattr(response, "status_code", None) == 404
+
+
+def yahoo_call(endpoint, fn, *args, **kwargs):
+    """
+    Llama a Yahoo a través del circuit breaker del endpoint.
+    
+    Args:
+        endpoint: Nombre del endpoint ("info", "history", "news"...)
+        fn: Función que hace la llamada (p. ej. getattr, ticker, "info")
+    
+    Returns:
+        El resultado de fn
+    
+    Raises:
+        CircuitOpenError: si el circuito está abierto
+        OperationCancelled: si el análisis del hilo fue superado
+        DeadlineExceeded: si es secundaria y se agotó el plazo del análisis
+    """
+    check_cancelled()
+    deadline = current_deadline() if endpoint not in ESSENTIAL_ENDPOINTS else None
+    if deadline is not None and time.time() >= deadline:
+        raise DeadlineExceeded(endpoint)
+    breaker = get_yahoo_breakers().get(endpoint)
+    if not breaker.allow():
+        raise CircuitOpenError(endpoint)
+    _deadline_binding.request_deadline = deadline
+    try:
+        result = fn(*args, **kwargs)
+    except Exception as e:
+        if deadline is not None and time.time() >= deadline:
+            # Cortada por nuestro plazo, no por Yahoo: no cuenta como fallo
+            breaker.abandon()
+            raise DeadlineExceeded(endpoint) from e
+        # Un símbolo inexistente es una respuesta válida: Yahoo funciona
+        breaker.record(is_missing_symbol_error(e))
+        raise
+    finally:
+        _deadline_binding.request_deadline = None
+    breaker.record(True)
+    return result
+
+
+class Revalidator:
+    """
+    Refrescos en segundo plano, como mucho uno pendiente por (ticker, recurso).
+    
+    Los errores se descartan: ya cuentan en el circuit breaker y la sesión
+    sigue mostrando el último valor bueno.
+    """
+
+    def __init__(self, workers=REVALIDATE_WORKERS):
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="revalidate")
+        self._pending = set()
+        self._lock = threading.Lock()
+
+    def submit(self, ticker_symbol, resource, fn, *args, on_success=None):
+        """
+        Programa coalesce(ticker, resource, fn, *args) si no estaba ya pendiente.
+        
+        Args:
+            on_success: Callback con el resultado (si no es None)
+        
+        Returns:
+            True si se programó un refresco nuevo
+        """
+        key = (str(ticker_symbol).upper(), resource)
+        with self._lock:
+            if key in self._pending:
+                return False
+            self._pending.add(key)
+        
+        def run():
+            try:
+                result = coalesce(ticker_symbol, resource, fn, *args)
+                if result is not None and on_success is not None:
+                    on_success(result)
+            except Exception:
+                pass
+            finally:
+                with self._lock:
+                    self._pending.discard(key)
+        
+        self._executor.submit(run)
+        return True
+
+    def is_pending(self, ticker_symbol, resource):
+        with self._lock:
+            return (str(ticker_symbol).upper(), resource) in self._pending
+
+
+@st.cache_resource(show_spinner=False)
+def get_revalidator():
+    """Pool de refrescos en segundo plano compartido por el proceso."""
+    return Revalidator()
+
+
+class LastGoodCache:
+    """Último valor bueno de cada (ticker, recurso) con su hora de descarga."""
+
+    def __init__(self, max_entries=LAST_GOOD_MAX_ENTRIES):
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        """Tupla (valor, fetched_at) o None."""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                self._entries.move_to_end(key)
+            return entry
+
+    def put(self, key, value, fetched_at=None):
+        with self._lock:
+            self._entries[key] = (value, time.time() if fetched_at is None else fetched_at)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+
+@st.cache_resource(show_spinner=False)
+def get_last_good_cache():
+    """Últimos valores buenos compartidos por todas las sesiones."""
+    return LastGoodCache()
+
+
+def fetch_swr(ticker_symbol, resource, fn, *args, fresh_for=INSIDERS_FRESH_SECONDS):
+    """
+    Stale-while-revalidate: devuelve el último valor bueno al instante.
+    
+    Si el valor guardado ha caducado se refresca en segundo plano; solo la
+    primera petición de un recurso (sin valor guardado) espera a Yahoo.
+    
+    Args:
+        ticker_symbol: Símbolo del ticker
+        resource: Nombre del recurso
+        fn: Función que descarga el recurso
+        fresh_for: Segundos durante los que el valor no se refresca
+    
+    Returns:
+        Tupla (valor, fetched_at); valor None si nunca se pudo descargar
+    """
+    cache = get_last_good_cache()
+    key = (str(ticker_symbol).upper(), resource)
+    entry = cache.get(key)
+    if entry is not None:
+        if time.time() - entry[1] >= fresh_for:
+            get_revalidator().submit(ticker_symbol, resource, fn, *args,
+                                     on_success=lambda value: cache.put(key, value))
+        return entry
+    
+    try:
+        value = coalesce(ticker_symbol, resource, fn, *args)
+    except Exception:
+        return None, None
+    if value is None:
+        return None, None
+    cache.put(key, value)
+    return cache.get(key)
+
+
+def format_age(seconds):
+    """Antigüedad compacta: '45 s', '12 min', '3 h', '2 d'."""
+    seconds = max(0, int(seconds))
+    if seconds < 60:
+        return f"{seconds} s"
+    if seconds < 3600:
+        return f"{seconds // 60} min"
+    if seconds < 86400:
+        return f"{seconds // 3600} h"
+    return f"{seconds // 86400} d"
+
+
+def freshness_caption(fetched_at, ticker_symbol, resource, exchange=None, timezone=None):
+    """
+    Texto de frescura de unos datos para mostrar bajo su sección.
+    
+    Args:
+        fetched_at: Epoch de la descarga
+        ticker_symbol: Símbolo del ticker
+        resource: Recurso ("snapshot", "insiders"...)
+        exchange: Código de bolsa de Yahoo (opcional)
+        timezone: Timezone de la bolsa (opcional)
+    
+    Returns:
+        str localizado con la antigüedad y, si aplica, el estado del refresco
+    """
+    text = "🕒 " + get_text('data_age').format(age=format_age(time.time() - fetched_at))
+    if not market_is_open(ticker_symbol, exchange, timezone):
+        text += f" · {get_text('market_closed')}"
+    if get_revalidator().is_pending(ticker_symbol, resource):
+        text += f" · 🔄 {get_text('data_refreshing')}"
+    elif get_yahoo_breakers().degraded():
+        text += f" · ⚠️ {get_text('data_stale_outage')}"
+    return text
+
+# =============================================================================
+# CACHÉ COMPARTIDA DE SNAPSHOTS (LA SESIÓN SOLO GUARDA REFERENCIAS)
+# =============================================================================
+
+PRICE_COLUMNS = ("Open", "High", "Low", "Close", "Volume")
+SNAPSHOT_CACHE_MAX_BYTES = 256 * 1024 ** 2   # Memoria máxima de la caché
+SNAPSHOT_REUSE_SECONDS = 300                 # Reutilizar descargas recientes
+SNAPSHOT_STALE_SECONDS = 86400               # Servir y refrescar en segundo plano
+
+
+def slim_price_history(hist):
+    """
+    Reduce el historial a lo que usa la app: OHLCV en float32.
+    
+    Las columnas de dividendos y splits no se usan en ningún gráfico ni
+    cálculo; float32 mantiene 7 cifras significativas, de sobra para
+    precios y volúmenes que solo se dibujan o se promedian.
+    
+    Args:
+        hist: DataFrame devuelto por ticker.history()
+    
+    Returns:
+        DataFrame con las columnas de PRICE_COLUMNS disponibles
+    """
+    if hist is None or hist.empty:
+        return pd.DataFrame()
+    columns = [c for c in PRICE_COLUMNS if c in hist.columns]
+    return hist[columns].astype(np.float32)
+
+
+def slim_news(news):
+    """Conserva solo el título de cada noticia (lo único que se usa)."""
+    slim = []
+    for item in news or []:
+        content = item.get('content') if isinstance(item.get('content'), dict) else {}
+        title = item.get('title') or content.get('title')
+        if title:
+            slim.append({'title': str(title)})
+    return slim
+
+
+class SnapshotCache:
+    """
+    Caché LRU de snapshots compartida por todas las sesiones del proceso.
+    
+    Cada sesión guarda solo la referencia (ticker, versión); el snapshot
+    vive una única vez aquí aunque lo consulten muchos usuarios, y los
+    menos usados se descartan al superar `max_bytes`. Una referencia
+    descartada se resuelve volviendo a descargar los datos.
+    
+    Las versiones creadas al refrescar la cotización comparten el mismo
+    historial: su tamaño se cuenta una sola vez, mientras alguna versión
+    que lo use siga en la caché.
+    """
+
+    def __init__(self, max_bytes=SNAPSHOT_CACHE_MAX_BYTES):
+        self.max_bytes = max_bytes
+        self.bytes = 0
+        self._entries = OrderedDict()
+        self._frames = {}  # id(historico) -> [bytes, versiones que lo usan]
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def snapshot_nbytes(snapshot):
+        """Tamaño aproximado en memoria de un snapshot, sin su historial."""
+        return 64 * len(_NUMERIC_NAMES) + sum(len(n.get('title', '')) for n in snapshot.noticias) + 1024
+
+    @staticmethod
+    def frame_nbytes(frame):
+        """Tamaño aproximado en memoria de un historial."""
+        return int(frame.memory_usage(index=True, deep=True).sum()) if not frame.empty else 0
+
+    def put(self, snapshot):
+        """
+        Guarda un snapshot y devuelve su referencia.
+        
+        Returns:
+            Tupla (ticker, versión)
+        """
+        ref = (snapshot.ticker, snapshot.version)
+        with self._lock:
+            if ref in self._entries:
+                self._entries.move_to_end(ref)
+                return ref
+            size = self.snapshot_nbytes(snapshot)
+            shared = self._frames.get(id(snapshot.historico))
+            if shared is None:
+                shared = self._frames[id(snapshot.historico)] = [self.frame_nbytes(snapshot.historico), 0]
+                size += shared[0]
+            shared[1] += 1
+            self._entries[ref] = (snapshot, size)
+            self.bytes += size
+            while self.bytes > self.max_bytes and len(self._entries) > 1:
+                self._evict_oldest()
+        return ref
+
+    def _evict_oldest(self):
+        _, (snapshot, size) = self._entries.popitem(last=False)
+        self.bytes -= size
+        key = id(snapshot.historico)
+        shared = self._frames[key]
+        shared[1] -= 1
+        if shared[1] == 0:
+            del self._frames[key]
+        elif size > self.snapshot_nbytes(snapshot):
+            # El historial lo siguen usando otras versiones: pasa a cargo de una de ellas
+            for other_ref, (other, other_size) in self._entries.items():
+                if other.historico is snapshot.historico:
+                    self._entries[other_ref] = (other, other_size + shared[0])
+                    self.bytes += shared[0]
+                    break
+
+    def get(self, ref):
+        """Snapshot de una referencia, o None si ya se descartó."""
+        with self._lock:
+            entry = self._entries.get(tuple(ref)) if ref else None
+            if entry is None:
+                return None
+            self._entries.move_to_end(tuple(ref))
+            return entry[0]
+
+    def latest(self, ticker, max_age=SNAPSHOT_REUSE_SECONDS):
+        """Snapshot más reciente de un ticker si tiene menos de `max_age` segundos."""
+        now = time.time()
+        with self._lock:
+            candidates = [s for (t, _), (s, _) in self._entries.items() if t == ticker]
+        fresh = [s for s in candidates if now - s.fetched_at < max_age]
+        # A igual descarga completa, gana la cotización refrescada más reciente
+        return max(fresh, key=lambda s: (s.fetched_at, num_or(s.cotizacion_at, 0.0))) if fresh else None
+
+    def stats(self):
+        """Entradas y bytes ocupados (para diagnóstico)."""
+        with self._lock:
+            return {"entries": len(self._entries), "bytes": self.bytes, "max_bytes": self.max_bytes}
+
+
+@st.cache_resource(show_spinner=False)
+def get_snapshot_cache():
+    """Caché de snapshots compartida por todas las sesiones del proceso."""
+    return SnapshotCache()
+
+
+def snapshot_is_fresh(snapshot, max_age=SNAPSHOT_REUSE_SECONDS):
+    """Vigencia de un snapshot según el horario de su bolsa."""
+    return quote_is_fresh(snapshot.ticker, snapshot.fetched_at, max_age,
+                          snapshot.bolsa or None, snapshot.zona_horaria or None)
+
+
+# Cotización rápida (fast_info): atributo del snapshot -> clave de fast_info
+QUOTE_FIELDS = {
+    "precio_actual": "last_price",
+    "cierre_anterior": "previous_close",
+    "maximo_dia": "day_high",
+    "minimo_dia": "day_low",
+    "precio_52w_high": "year_high",
+    "precio_52w_low": "year_low",
+}
+QUOTE_TTL = 60              # Segundos de validez de la cotización con la bolsa abierta
+QUOTE_POLL_SECONDS = 30     # Intervalo de refresco del header
+
+
+def get_fast_quote(ticker_symbol):
+    """
+    Cotización ligera desde `fast_info`, sin tocar el pesado `ticker.info`.
+    
+    Args:
+        ticker_symbol: Símbolo del ticker
+    
+    Returns:
+        dict con los campos de QUOTE_FIELDS y `cotizacion_at`
+    
+    Raises:
+        Exception: si no se obtiene al menos el último precio
+    """
+    fast = make_ticker(ticker_symbol).fast_info
+    quote = {"precio_actual": yahoo_call("quote", getattr, fast, QUOTE_FIELDS["precio_actual"])}
+    for name, key in QUOTE_FIELDS.items():
+        if name in quote:
+            continue
+        try:
+            quote[name] = getattr(fast, key)
+        except Exception:
+            pass
+    if not has_value(to_float(quote["precio_actual"])):
+        raise ValueError(f"No quote for {ticker_symbol}")
+    quote["cotizacion_at"] = time.time()
+    return quote
+
+
+def refresh_quote(snapshot):
+    """
+    Actualiza solo los campos de precio de un snapshot (sin fundamentales,
+    historial ni noticias) y lo publica en la caché compartida.
+    
+    Args:
+        snapshot: StockSnapshot de partida
+    
+    Returns:
+        Tupla (snapshot actualizado, referencia)
+    """
+    quote = coalesce(snapshot.ticker, "quote", get_fast_quote, snapshot.ticker)
+    updated = snapshot.replace(**quote)
+    return updated, get_snapshot_cache().put(updated)
+
+
+def quote_is_stale(snapshot):
+    """True si la cotización del snapshot caducó según el horario de su bolsa."""
+    quote_at = num_or(snapshot.cotizacion_at, snapshot.fetched_at)
+    return not quote_is_fresh(snapshot.ticker, quote_at, QUOTE_TTL,
+                              snapshot.bolsa or None, snapshot.zona_horaria or None)
+
+
+def fetch_snapshot(ticker_symbol, max_age=SNAPSHOT_REUSE_SECONDS, deadline=None):
+    """
+    Snapshot de un ticker desde la caché compartida o descargándolo.
+    
+    No llama a st.*, así que puede correr en el pool de descargas. Un snapshot
+    con secciones pendientes se sirve tal cual y se completa en segundo plano.
+    
+    Args:
+        ticker_symbol: Símbolo del ticker
+        max_age: Segundos de validez de un snapshot con la bolsa abierta (0 = descargar)
+        deadline: Plazo (epoch) para las llamadas secundarias a Yahoo
+    
+    Returns:
+        Tupla (snapshot, referencia, mensaje de error); snapshot y referencia
+        son None si el ticker no es válido o Yahoo no responde
+    """
+    cache = get_snapshot_cache()
+    snapshot = cache.latest(ticker_symbol, float("inf")) if max_age else None
+    if snapshot is not None and not snapshot_is_fresh(snapshot, max_age):
+        # Stale-while-revalidate: el último snapshot sirve mientras se refresca
+        expired_at = quote_expiry(snapshot.ticker, snapshot.fetched_at, max_age,
+                                  snapshot.bolsa or None, snapshot.zona_horaria or None)
+        if time.time() - expired_at < SNAPSHOT_STALE_SECONDS:
+            get_revalidator().submit(ticker_symbol, "snapshot", get_stock_data, ticker_symbol,
+                                     on_success=cache.put)
+        else:
+            snapshot = None
+    if snapshot is None:
+        bind_deadline(deadline)
+        try:
+            snapshot = coalesce(ticker_symbol, "snapshot", get_stock_data, ticker_symbol)
+        except Exception as e:
+            # Yahoo falla: mejor el último snapshot bueno, tenga la edad que tenga
+            snapshot = cache.latest(ticker_symbol, float("inf"))
+            if snapshot is None:
+                message = get_text('yahoo_unavailable') if isinstance(e, CircuitOpenError) else str(e)
+                return None, None, message
+        finally:
+            bind_deadline(None)
+        if snapshot is None:
+            return None, None, None
+    if snapshot.pendiente:
+        get_revalidator().submit(ticker_symbol, "snapshot", get_stock_data, ticker_symbol,
+                                 on_success=cache.put)
+    return snapshot, cache.put(snapshot), None
+
+
+def load_snapshot(ticker_symbol, max_age=SNAPSHOT_REUSE_SECONDS, token=None, deadline=None):
+    """
+    Como fetch_snapshot, mostrando el error de descarga en la página.
+    
+    Args:
+        ticker_symbol: Símbolo del ticker
+        max_age: Segundos de validez de un snapshot con la bolsa abierta (0 = descargar)
+        token: CancelToken de la sesión; si se indica, la descarga corre en el
+               pool y se abandona si la sesión pasa a otro ticker
+        deadline: Plazo (epoch) del análisis; solo con token
+    
+    Returns:
+        Tupla (snapshot, referencia, mensaje de error); snapshot y referencia
+        son None si el ticker no es válido (sin mensaje) o Yahoo falló
+    
+    Raises:
+        DeadlineExceeded: si ni siquiera lo esencial llegó a tiempo
+    """
+    if token is None:
+        snapshot, ref, error = fetch_snapshot(ticker_symbol, max_age)
+    else:
+        # Las peticiones secundarias se cortan antes para que el snapshot parcial llegue a tiempo
+        fetch_deadline = deadline - DEADLINE_HEADROOM_SECONDS if deadline is not None else None
+        snapshot, ref, error = run_for_session(token, fetch_snapshot, ticker_symbol, max_age, fetch_deadline,
+                                               deadline=deadline)
+    if error:
+        st.error(f"{get_text('error_loading')}: {error}")
+    return snapshot, ref, error
+
+# =============================================================================
+# CLASIFICACIÓN AUTOMÁTICA DE EMPRESAS (METODOLOGÍA PETER LYNCH)
+# =============================================================================
+
+def classify_company(data):
+    """
+    Clasifica automáticamente una empresa según la metodología de Peter Lynch.
+    
+    Categorías:
+    - 🚀 Crecimiento Rápido: Alto crecimiento de beneficios (>20%), reinvierten
+    - 🏛️ Estable: Empresas grandes, crecimiento moderado, pagan dividendos
+    - 🔄 Cíclica: Sectores que dependen del ciclo económico
+    - 📈 Recuperación: Empresas en reestructuración o recuperándose
+    - 💎 Activo Oculto: Valor oculto en balance (bajo P/B, mucho efectivo)
+    
+    Args:
+        data: StockSnapshot con los datos financieros de la empresa
+        
+    Returns:
+        Tupla (clasificación, emoji, css_class, explicación)
+    """
+    # Extraer métricas relevantes (los campos ya vienen tipados, NaN si faltan)
+    sector = data.sector.lower()
+    industria = data.industria.lower()
+    
+    market_cap = num_or(data.market_cap, 0)
+    crecimiento = num_or(data.crecimiento_beneficios, 0)
+    crecimiento_ingresos = num_or(data.crecimiento_ingresos, 0)
+    
+    # Normalizar dividend yield (puede venir como 0.029 o 2.9)
+    dividend_yield_raw = num_or(data.dividend_yield, 0)
+    if dividend_yield_raw > 1:  # Viene como porcentaje (2.9 en lugar de 0.029)
+        dividend_yield = dividend_yield_raw / 100
+    else:
+        dividend_yield = dividend_yield_raw
+    
+    price_to_book = num_or(data.price_to_book, 999)
+    per_trailing = num_or(data.per_trailing, 0)
+    deuda = num_or(data.deuda_total, 0)
+    efectivo = num_or(data.efectivo_total, 0)
+    roe = num_or(data.roe, 0)
+    peg = data.peg_ratio
+    
+    # Sectores cíclicos típicos
+    sectores_ciclicos = ['consumer cyclical', 'basic materials', 'energy', 'industrials']
+    sectores_defensivos = ['consumer defensive', 'healthcare', 'utilities', 'consumer staples']
+    
+    # 1. RECUPERACIÓN: PER negativo indica pérdidas
+    if per_trailing < 0:
+        return (
+            get_text('class_turnaround'),
+            "📈",
+            "badge-recuperacion",
+            get_text('turnaround_desc')
+        )
+    
+    # 2. ESTABLE: Empresas grandes (>50B) con dividendos en sectores defensivos
+    is_defensive = any(s in sector for s in sectores_defensivos)
+    has_good_dividend = dividend_yield > 0.015  # >1.5% dividendo
+    is_large_cap = market_cap > 50e9  # >50B
+    is_mega_cap = market_cap > 200e9  # >200B
+    
+    if is_mega_cap and has_good_dividend:
+        return (
+            get_text('class_stalwart'),
+            "🏛️",
+            "badge-estable",
+            get_text('market_giant_dividends')
+        )
+    
+    if is_large_cap and has_good_dividend and is_defensive:
+        return (
+            get_text('class_stalwart'),
+            "🏛️",
+            "badge-estable",
+            get_text('stalwart_desc')
+        )
+    
+    # 3. CÍCLICA: Sectores que dependen del ciclo económico
+    is_cyclical = any(s in sector for s in sectores_ciclicos)
+    is_auto = 'auto' in industria or 'vehicle' in industria
+    is_airline = 'airline' in industria
+    is_hotel = 'hotel' in industria or 'leisure' in industria
+    
+    if is_cyclical or is_auto or is_airline or is_hotel:
+        return (
+            get_text('class_cyclical'),
+            "🔄",
+            "badge-ciclica",
+            get_text('cyclical_desc')
+        )
+    
+    # 4. ACTIVO OCULTO: Bajo Price/Book y buena posición de caja
+    if price_to_book < 1.2 and efectivo > deuda:
+        return (
+            get_text('class_asset_play'),
+            "💎",
+            "badge-activo-oculto",
+            get_text('asset_play_desc')
+        )
+    
+    # 5. CRECIMIENTO RÁPIDO: Alto crecimiento de beneficios o ingresos
+    has_high_growth = crecimiento > 0.20 or crecimiento_ingresos > 0.20
+    has_good_peg = has_value(peg) and 0 < peg < 1.5
+    is_tech = 'technology' in sector or 'software' in industria
+    
+    if has_high_growth:
+        return (
+            get_text('class_fast_grower'),
+            "🚀",
+            "badge-crecimiento",
+            get_text('fast_grower_desc')
+        )
+    
+    if is_tech and market_cap < 100e9 and (crecimiento > 0.10 or crecimiento_ingresos > 0.15):
+        return (
+            get_text('class_fast_grower'),
+            "🚀",
+            "badge-crecimiento",
+            get_text('tech_growth_desc')
+        )
+    
+    # 6. ESTABLE por defecto para empresas grandes
+    if is_large_cap:
+        return (
+            get_text('class_stalwart'),
+            "🏛️",
+            "badge-estable",
+            get_text('large_cap_desc')
+        )
+    
+    # 7. Por defecto para empresas medianas/pequeñas
+    if market_cap > 10e9:  # Mid cap
+        return (
+            get_text('class_stalwart'),
+            "🏛️",
+            "badge-estable",
+            get_text('mid_cap_desc')
+        )
+    else:
+        return (
+            get_text('class_fast_grower'),
+            "🚀",
+            "badge-crecimiento",
+            get_text('small_cap_desc')
+        )
+
+# =============================================================================
+# VEREDICTO INSTANTÁNEO POR REGLAS (SIN LLM)
+# =============================================================================
+
+# Código neutro de cada clasificación (a partir de su clase CSS)
+CLASSIFICATION_CODES = {
+    "badge-crecimiento": "fast_grower",
+    "badge-estable": "stalwart",
+    "badge-ciclica": "cyclical",
+    "badge-recuperacion": "turnaround",
+    "badge-activo-oculto": "asset_play",
+}
+
+# Peso de cada factor en la puntuación (se reparte si falta alguno)
+RULE_WEIGHTS = {"peg": 0.40, "debt": 0.25, "band": 0.35}
+# En cíclicas y activos ocultos el PEG engaña (beneficios de pico, valor en balance)
+RULE_PEG_WEIGHT_BY_CLASS = {"cyclical": 0.5, "asset_play": 0.5, "turnaround": 0.0}
+# Tramos lineales (x, puntuación 0-1) de cada factor
+RULE_PEG_CURVE = ((0.5, 1.0), (1.0, 0.75), (2.0, 0.25), (3.0, 0.0))
+RULE_CASH_DEBT_CURVE = ((0.2, 0.0), (0.5, 0.35), (1.0, 0.75), (2.0, 1.0))
+RULE_BAND_CURVE = ((-0.5, 1.0), (0.0, 0.8), (1.0, 0.3), (1.5, 0.0))
+RULE_BUY_SCORE = 65     # Puntuación mínima para COMPRAR
+RULE_SELL_SCORE = 35    # Puntuación máxima para VENDER
+RULE_REVIEW_MARGIN = 8  # Cerca de un umbral = merece la opinión de la IA
+RULE_MIN_COVERAGE = 0.5  # Menos peso con dato = merece la opinión de la IA
+
+
+def _piecewise(x, curve):
+    """Interpolación lineal en tramos, constante fuera de los extremos."""
+    if x <= curve[0][0]:
+        return curve[0][1]
+    for (x0, y0), (x1, y1) in zip(curve, curve[1:]):
+        if x <= x1:
+            return y0 + (y1 - y0) * (x - x0) / (x1 - x0)
+    return curve[-1][1]
+
+
+def assess_peg(peg):
+    """Valoración del PEG: cheap (<1), fair (1-2), expensive (>2) o unknown."""
+    if not has_value(peg) or peg <= 0:
+        return "unknown"
+    return "cheap" if peg < 1 else "expensive" if peg > 2 else "fair"
+
+
+def assess_debt(cash_debt):
+    """Valoración del ratio efectivo/deuda: solid (≥1), moderate (≥0.5), risky o unknown."""
+    if not has_value(cash_debt):
+        return "unknown"
+    return "solid" if cash_debt >= 1 else "moderate" if cash_debt >= 0.5 else "risky"
+
+
+def rule_based_verdict(data, classification=None, band_position=None):
+    """
+    Veredicto de Lynch determinista a partir de las métricas ya calculadas.
+    
+    Puntúa de 0 a 100 el PEG, el ratio efectivo/deuda y la posición del
+    precio en la banda de valor justo, con pesos que dependen de la
+    clasificación. No hace E/S: sirve para mostrar un veredicto provisional
+    al instante y para filtrar pantallas de muchos tickers sin coste de IA.
+    
+    Args:
+        data: StockSnapshot con los datos financieros
+        classification: Código de clasificación (None = classify_company)
+        band_position: Posición en la banda de LynchBandDataset (None = sin banda)
+    
+    Returns:
+        dict con los campos de VERDICT_SCHEMA, confidence (0-1), score
+        (0-100 o NaN sin datos) y coverage (fracción del peso con dato)
+    """
+    if classification is None:
+        classification = CLASSIFICATION_CODES.get(classify_company(data)[2], "stalwart")
+    peg = data.peg_ratio
+    cash_debt = data.cash_debt_ratio()
+    
+    factors = {}
+    if has_value(peg) and peg > 0:
+        factors["peg"] = _piecewise(peg, RULE_PEG_CURVE)
+    if cash_debt == float('inf'):
+        factors["debt"] = 1.0
+    elif has_value(cash_debt):
+        factors["debt"] = _piecewise(cash_debt, RULE_CASH_DEBT_CURVE)
+    if band_position is not None and has_value(band_position):
+        factors["band"] = _piecewise(band_position, RULE_BAND_CURVE)
+    
+    weights = dict(RULE_WEIGHTS, peg=RULE_WEIGHTS["peg"] * RULE_PEG_WEIGHT_BY_CLASS.get(classification, 1.0))
+    available = sum(weights[name] for name in factors)
+    coverage = available / sum(weights.values())
+    if available:
+        score = 100 * sum(weights[name] * value for name, value in factors.items()) / available
+    else:
+        score = np.nan
+    
+    if not has_value(score):
+        verdict = "HOLD"
+    elif score >= RULE_BUY_SCORE:
+        verdict = "BUY"
+    elif score <= RULE_SELL_SCORE:
+        verdict = "SELL"
+    else:
+        verdict = "HOLD"
+    # Confianza: cobertura de datos por distancia al centro (0.5 en la zona neutra)
+    confidence = coverage * min(1.0, 0.5 + abs(score - 50) / 50) if has_value(score) else 0.0
+    
+    return {
+        "classification": classification,
+        "peg_assessment": assess_peg(peg),
+        "debt_assessment": assess_debt(cash_debt),
+        "verdict": verdict,
+        "confidence": confidence,
+        "score": score,
+        "coverage": coverage,
+    }
+
+
+def needs_ai_review(rule_verdict):
+    """
+    Indica si un ticker merece el análisis (caro) del modelo.
+    
+    Se reserva para veredictos dudosos: puntuación cerca de un umbral,
+    menos de la mitad de los datos o una recuperación, donde las cifras
+    dicen poco sin contexto.
+    """
+    score = rule_verdict["score"]
+    return (not has_value(score)
+            or rule_verdict["coverage"] < RULE_MIN_COVERAGE
+            or rule_verdict["classification"] == "turnaround"
+            or abs(score - RULE_BUY_SCORE) <= RULE_REVIEW_MARGIN
+            or abs(score - RULE_SELL_SCORE) <= RULE_REVIEW_MARGIN)
+
+# =============================================================================
+# FUNCIONES AUXILIARES
+# =============================================================================
+
+def format_large_number(num):
+    """
+    Formatea números grandes a formato legible (B para billones, M para millones).
+    
+    Args:
+        num: Número a formatear
+        
+    Returns:
+        String formateado o 'N/A' si no es válido
+    """
+    if num is None or pd.isna(num):
+        return "N/A"
+    
+    try:
+        num = float(num)
         if abs(num) >= 1e12:
             return f"${num/1e12:.2f}T"
         elif abs(num) >= 1e9:
@@ -1019,1077 +3760,2686 @@ def format_large_number(num):
         elif abs(num) >= 1e6:
             return f"${num/1e6:.2f}M"
         else:
-            return f"${num:,.2f}"
-    except (ValueError, TypeError):
-        return "N/A"
+            return f"${num:,.2f}"
+    except (ValueError, TypeError):
+        return "N/A"
+
+
+# Umbrales del árbol de decisión de tendencia (compartidos con el backtest)
+TREND_STRONG_BEAR_THRESHOLD = -0.10  # -0.10% diario = caída fuerte
+TREND_NEAR_HIGH_THRESHOLD = -20      # -20% = cerca de máximos
+
+
+def analyze_trend_robust(price_data, period_days=90):
+    """
+    Analiza la tendencia de precios usando Regresión Lineal, SMA_50 y SMA_200.
+    
+    Incorpora SMA_200 como filtro de tendencia de largo plazo para evitar falsos positivos.
+    
+    Clasifica en 5 estados (jerarquía):
+    - 🚀 STRONG_BULLISH: Slope > 0, Price > SMA50, Price > SMA200 (tendencia sana)
+    - 🔄 POTENTIAL_REVERSAL: Slope > 0, Price > SMA50, Price < SMA200 (rebote en bajista)
+    - ⚠️ BULL_TRAP: Slope > 0, Price < SMA50 (subida débil, sin fuerza)
+    - 🐻 BEARISH: Price < SMA50 (bajista)
+    - 💀 STRONG_BEARISH: Slope < -0.1, Price < SMA50, Price < SMA200 (caída libre)
+    
+    Args:
+        price_data: DataFrame con columna 'Close' e índice de fechas
+        period_days: Días naturales para calcular pendiente (default 90)
+        
+    Returns:
+        dict con: trend_state, icon, color, slope_pct, sma_50, sma_200, 
+                  is_above_sma50, is_above_sma200, dist_to_high_pct, description
+    """
+    result = {
+        'trend_state': 'bearish',
+        'trend_text': 'BEARISH',
+        'icon': '🐻',
+        'color': '#FF6B6B',
+        'slope_pct': 0.0,
+        'slope_daily': 0.0,
+        'sma_50': None,
+        'sma_200': None,
+        'price_vs_sma': 'N/A',
+        'is_above_sma': None,
+        'is_above_sma50': None,
+        'is_above_sma200': None,
+        'dist_to_high_pct': None,
+        'high_52w': None,
+        'description': ''
+    }
+    
+    try:
+        if price_data is None or price_data.empty or len(price_data) < 20:
+            return result
+        
+        if 'Close' not in price_data.columns:
+            return result
+        
+        current_price = price_data['Close'].iloc[-1]
+        
+        # =====================================================================
+        # CÁLCULO DE MEDIAS MÓVILES
+        # =====================================================================
+        # SMA_50
+        # Solo se usa el último valor: basta con la media de la última ventana
+        if len(price_data) >= 50:
+            sma_50 = price_data['Close'].iloc[-50:].mean()
+        else:
+            sma_50 = price_data['Close'].mean()
+        
+        # SMA_200 (usar SMA_50 como fallback si no hay suficientes datos)
+        if len(price_data) >= 200:
+            sma_200 = price_data['Close'].iloc[-200:].mean()
+        else:
+            # Fallback: usar todos los datos disponibles o SMA_50
+            sma_200 = price_data['Close'].mean() if len(price_data) >= 50 else sma_50
+        
+        result['sma_50'] = sma_50
+        result['sma_200'] = sma_200
+        
+        # Posición respecto a SMAs
+        is_above_sma50 = current_price > sma_50
+        is_above_sma200 = current_price > sma_200
+        
+        result['is_above_sma50'] = is_above_sma50
+        result['is_above_sma200'] = is_above_sma200
+        result['is_above_sma'] = is_above_sma50  # Compatibilidad
+        result['price_vs_sma'] = 'above_sma' if is_above_sma50 else 'below_sma'
+        
+        # =====================================================================
+        # MÁXIMO DE 52 SEMANAS Y DISTANCIA
+        # =====================================================================
+        # Calcular máximo de últimas 52 semanas (252 días de trading aprox)
+        days_52w = min(252, len(price_data))
+        high_52w = price_data['Close'].tail(days_52w).max()
+        result['high_52w'] = high_52w
+        
+        # Distancia al máximo como porcentaje (negativo = por debajo)
+        dist_to_high_pct = ((current_price - high_52w) / high_52w) * 100 if high_52w > 0 else 0
+        result['dist_to_high_pct'] = dist_to_high_pct
+        
+        # =====================================================================
+        # REGRESIÓN LINEAL (Pendiente de 3 meses)
+        # =====================================================================
+        end_date = price_data.index.max()
+        start_date = end_date - pd.Timedelta(days=period_days)
+        recent_data = price_data[price_data.index >= start_date].copy()
+        
+        if len(recent_data) < 20:
+            recent_data = price_data.tail(50).copy()
+        
+        closes = recent_data['Close'].dropna().values
+        if len(closes) < 10:
+            return result
+        
+        x = np.arange(len(closes))
+        coefficients = np.polyfit(x, closes, 1)
+        slope = coefficients[0]
+        
+        avg_price = np.mean(closes)
+        slope_pct = (slope / avg_price) * 100 if avg_price > 0 else 0
+        
+        result['slope_daily'] = slope
+        result['slope_pct'] = slope_pct
+        
+        # =====================================================================
+        # ÁRBOL DE DECISIÓN - Con dist_to_high como filtro clave
+        # =====================================================================
+        # Convertir dist_to_high a ratio para comparación
+        dist_ratio = dist_to_high_pct  # Ya está en porcentaje (-68 significa -68%)
+        
+        # 💀 STRONG BEARISH (Caída Libre):
+        # Pendiente muy negativa + bajo ambas SMAs
+        if slope_pct < TREND_STRONG_BEAR_THRESHOLD and not is_above_sma50 and not is_above_sma200:
+            result['trend_state'] = 'strong_bearish'
+            result['trend_text'] = get_text('strong_bearish')
+            result['icon'] = '💀'
+            result['color'] = '#FF006E'
+            result['description'] = get_text('trend_desc_strong_bearish')
+        
+        # 🚀 STRONG UPTREND (Alcista Fuerte):
+        # Slope > 0 + sobre SMA200 + CERCA DE MÁXIMOS (< -20%)
+        elif slope_pct > 0 and is_above_sma200 and dist_ratio > TREND_NEAR_HIGH_THRESHOLD:
+            result['trend_state'] = 'strong_uptrend'
+            result['trend_text'] = get_text('strong_uptrend')
+            result['icon'] = '🚀'
+            result['color'] = '#00FF9F'
+            result['description'] = get_text('trend_desc_strong_uptrend')
+        
+        # 🏗️ RECOVERY (Recuperación / Formando Suelo):
+        # Slope > 0 + sobre SMA200 + LEJOS DE MÁXIMOS (> -20%)
+        # Esto captura casos como IOVA: cruzó SMA200 pero viene de -68%
+        elif slope_pct > 0 and is_above_sma200 and dist_ratio <= TREND_NEAR_HIGH_THRESHOLD:
+            result['trend_state'] = 'recovery'
+            result['trend_text'] = get_text('recovery')
+            result['icon'] = '🏗️'
+            result['color'] = '#4FC3F7'  # Azul claro (esperanza, no euforia)
+            result['description'] = get_text('trend_desc_recovery')
+        
+        # ⚡ OVERSOLD BOUNCE (Rebote Técnico):
+        # Slope positivo PERO aún bajo SMA200 (rebote en tendencia bajista)
+        elif slope_pct > 0 and not is_above_sma200:
+            result['trend_state'] = 'oversold_bounce'
+            result['trend_text'] = get_text('oversold_bounce')
+            result['icon'] = '⚡'
+            result['color'] = '#FFB74D'  # Naranja (precaución)
+            result['description'] = get_text('trend_desc_oversold_bounce')
+        
+        # 📉 DOWNTREND (Bajista): Default cuando precio < SMA50
+        else:
+            result['trend_state'] = 'downtrend'
+            result['trend_text'] = get_text('downtrend')
+            result['icon'] = '📉'
+            result['color'] = '#FF6B6B'
+            result['description'] = get_text('trend_desc_downtrend')
+        
+        return result
+        
+    except Exception as e:
+        result['description'] = f"Error: {str(e)}"
+        return result
+
+
+# =============================================================================
+# ALMACÉN LOCAL DE FUNDAMENTALES (EPS Y BALANCE CON FECHA DE INFORME)
+# =============================================================================
+
+# Directorio de datos locales (cachés persistentes entre ejecuciones)
+DATA_DIR = os.environ.get(
+    "LYNCHPANEL_DATA_DIR",
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), ".cache"),
+)
+
+# Métricas guardadas: nombre -> etiquetas de yfinance en orden de prioridad
+EPS_FIELDS = ('Basic EPS', 'Diluted EPS', 'BasicEPS', 'DilutedEPS')
+BALANCE_FIELDS = {
+    "total_debt": ('Total Debt', 'TotalDebt'),
+    "cash_st_investments": ('Cash Cash Equivalents And Short Term Investments',
+                            'CashCashEquivalentsAndShortTermInvestments',
+                            'Cash And Cash Equivalents',
+                            'CashAndCashEquivalents'),
+    "net_debt": ('Net Debt', 'NetDebt'),
+}
+
+# Calendario de presentación: (meses entre periodos, días hasta publicar)
+FILING_SCHEDULE = {
+    "annual": (12, 90),
+    "quarterly": (3, 45),
+}
+FUNDAMENTALS_RECHECK_SECONDS = 24 * 3600     # Reintento tras la fecha esperada
+FUNDAMENTALS_EMPTY_RECHECK_SECONDS = 7 * 24 * 3600  # Tickers sin fundamentales
+
+
+def _clean_period(date):
+    """Normaliza una fecha de periodo fiscal a Timestamp sin timezone."""
+    clean_date = pd.to_datetime(date)
+    if getattr(clean_date, 'tz', None) is not None:
+        clean_date = clean_date.tz_localize(None)
+    return clean_date.normalize()
+
+
+def extract_eps_points(ticker):
+    """
+    Extrae los EPS anuales positivos de los estados financieros de un ticker.
+    
+    Args:
+        ticker: Objeto yf.Ticker
+    
+    Returns:
+        Tupla ({fecha de cierre fiscal: eps}, nombre de la fuente o None)
+    
+    Raises:
+        Exception: el error de descarga si ninguna fuente dio EPS y alguna
+            falló (un resultado vacío sin errores devuelve ({}, None))
+    """
+    error = None
+    for source_name, source_func in [
+        ("financials", lambda: yahoo_call("fundamentals", getattr, ticker, "financials")),
+        ("income_stmt", lambda: yahoo_call("fundamentals", getattr, ticker, "income_stmt")),
+    ]:
+        try:
+            data_source = source_func()
+        except Exception as e:
+            error = e
+            continue
+        if data_source is not None and not data_source.empty:
+            for field in EPS_FIELDS:
+                if field in data_source.index:
+                    eps_points = {}
+                    eps_row = data_source.loc[field].dropna()
+                    for date, value in eps_row.items():
+                        if pd.notna(value) and value > 0:
+                            eps_points[_clean_period(date)] = float(value)
+                    if eps_points:
+                        return eps_points, source_name
+    if error is not None:
+        raise error
+    return {}, None
+
+
+def extract_balance_observations(balance_sheet):
+    """
+    Extrae deuda, efectivo y deuda neta de cada columna del balance trimestral.
+    
+    Args:
+        balance_sheet: DataFrame `quarterly_balance_sheet` de yfinance
+    
+    Returns:
+        Diccionario {métrica: {fecha de periodo: valor}}
+    """
+    observations = {metric: {} for metric in BALANCE_FIELDS}
+    if balance_sheet is None or balance_sheet.empty:
+        return observations
+    for column in balance_sheet.columns:
+        period = _clean_period(column)
+        values = balance_sheet[column]
+        for metric, labels in BALANCE_FIELDS.items():
+            for label in labels:
+                if label in values.index and pd.notna(values.get(label)):
+                    observations[metric][period] = float(values[label])
+                    break
+    return observations
+
+
+class FundamentalsStore:
+    """
+    Almacén SQLite de observaciones fundamentales por ticker.
+    
+    Cada observación (ticker, métrica, fin de periodo) guarda su valor, la
+    fuente y cuándo se vio por primera vez, de modo que se conserva el
+    histórico aunque Yahoo deje de devolver periodos antiguos. Un registro
+    de comprobaciones decide cuándo merece la pena volver a descargar: solo
+    cuando ya debería haberse publicado el siguiente informe.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False, timeout=30)
+        with self._lock, self._conn:
+            if path != ":memory:":
+                self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute("""
+                CREATE TABLE IF NOT EXISTS observations (
+                    ticker TEXT NOT NULL,
+                    metric TEXT NOT NULL,
+                    period_end TEXT NOT NULL,
+                    value REAL NOT NULL,
+                    source TEXT,
+                    first_seen REAL NOT NULL,
+                    fetched_at REAL NOT NULL,
+                    PRIMARY KEY (ticker, metric, period_end)
+                )""")
+            self._conn.execute("""
+                CREATE TABLE IF NOT EXISTS refresh_log (
+                    ticker TEXT NOT NULL,
+                    dataset TEXT NOT NULL,
+                    last_checked REAL NOT NULL,
+                    latest_period TEXT,
+                    PRIMARY KEY (ticker, dataset)
+                )""")
+
+    def upsert(self, ticker, metric, points, source=None, now=None):
+        """
+        Inserta o actualiza observaciones conservando su primera fecha de visión.
+        
+        Args:
+            ticker: Símbolo del ticker
+            metric: Nombre de la métrica (ej: 'eps_annual', 'total_debt')
+            points: Diccionario {fecha de periodo: valor}
+            source: Endpoint de origen
+            now: Marca de tiempo (por defecto time.time())
+        """
+        now = time.time() if now is None else now
+        rows = [(ticker, metric, _clean_period(date).date().isoformat(), float(value), source, now, now)
+                for date, value in points.items()]
+        if not rows:
+            return
+        with self._lock, self._conn:
+            self._conn.executemany("""
+                INSERT INTO observations (ticker, metric, period_end, value, source, first_seen, fetched_at)
+                VALUES (?, ?, ?, ?, ?, ?, ?)
+                ON CONFLICT (ticker, metric, period_end)
+                DO UPDATE SET value = excluded.value, source = excluded.source, fetched_at = excluded.fetched_at
+                """, rows)
+
+    def series(self, ticker, metric):
+        """
+        Todas las observaciones de una métrica ordenadas por fecha.
+        
+        Returns:
+            Tupla ({Timestamp de periodo: valor}, fuente más reciente o None)
+        """
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT period_end, value, source FROM observations "
+                "WHERE ticker = ? AND metric = ? ORDER BY period_end", (ticker, metric)
+            ).fetchall()
+        points = {pd.Timestamp(period): value for period, value, _ in rows}
+        return points, (rows[-1][2] if rows else None)
+
+    def latest_period(self, ticker, metrics):
+        """Fecha del periodo más reciente con alguna de las métricas indicadas."""
+        placeholders = ", ".join("?" for _ in metrics)
+        with self._lock:
+            row = self._conn.execute(
+                f"SELECT MAX(period_end) FROM observations WHERE ticker = ? AND metric IN ({placeholders})",
+                (ticker, *metrics)
+            ).fetchone()
+        return pd.Timestamp(row[0]) if row and row[0] else None
+
+    def values_at(self, ticker, period, metrics):
+        """Valores de varias métricas en un periodo concreto (None si faltan)."""
+        placeholders = ", ".join("?" for _ in metrics)
+        with self._lock:
+            rows = self._conn.execute(
+                f"SELECT metric, value FROM observations WHERE ticker = ? AND period_end = ? "
+                f"AND metric IN ({placeholders})",
+                (ticker, period.date().isoformat(), *metrics)
+            ).fetchall()
+        found = dict(rows)
+        return {metric: found.get(metric) for metric in metrics}
+
+    def needs_refresh(self, ticker, dataset, now=None):
+        """
+        Indica si toca volver a descargar un conjunto de fundamentales.
+        
+        Se descarga si nunca se comprobó, si el siguiente informe ya debería
+        estar publicado (y no se ha comprobado en el último día), o cada
+        semana si el ticker nunca devolvió datos.
+        
+        Args:
+            ticker: Símbolo del ticker
+            dataset: 'annual' o 'quarterly' (ver FILING_SCHEDULE)
+            now: Marca de tiempo (por defecto time.time())
+        """
+        now = time.time() if now is None else now
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT last_checked, latest_period FROM refresh_log WHERE ticker = ? AND dataset = ?",
+                (ticker, dataset)
+            ).fetchone()
+        if row is None:
+            return True
+        last_checked, latest_period = row
+        if latest_period is None:
+            return now - last_checked >= FUNDAMENTALS_EMPTY_RECHECK_SECONDS
+        months, lag_days = FILING_SCHEDULE[dataset]
+        expected = pd.Timestamp(latest_period) + pd.DateOffset(months=months) + pd.Timedelta(days=lag_days)
+        return (pd.Timestamp(now, unit='s') >= expected
+                and now - last_checked >= FUNDAMENTALS_RECHECK_SECONDS)
+
+    def mark_checked(self, ticker, dataset, latest_period, now=None):
+        """Registra una comprobación y el periodo más reciente conocido."""
+        now = time.time() if now is None else now
+        period = latest_period.date().isoformat() if latest_period is not None else None
+        with self._lock, self._conn:
+            self._conn.execute("""
+                INSERT INTO refresh_log (ticker, dataset, last_checked, latest_period) VALUES (?, ?, ?, ?)
+                ON CONFLICT (ticker, dataset)
+                DO UPDATE SET last_checked = excluded.last_checked, latest_period = excluded.latest_period
+                """, (ticker, dataset, now, period))
+
+
+@st.cache_resource(show_spinner=False)
+def get_fundamentals_store():
+    """
+    Almacén de fundamentales compartido por todas las sesiones del proceso.
+    
+    Returns:
+        FundamentalsStore en DATA_DIR (o en memoria si no se puede escribir)
+    """
+    try:
+        os.makedirs(DATA_DIR, exist_ok=True)
+        return FundamentalsStore(os.path.join(DATA_DIR, "fundamentals.sqlite3"))
+    except (OSError, sqlite3.Error):
+        return FundamentalsStore(":memory:")
+
+
+def refresh_fundamentals(ticker_symbol, dataset, ticker=None, store=None):
+    """
+    Descarga un conjunto de fundamentales solo si toca según el calendario.
+    
+    Args:
+        ticker_symbol: Símbolo del ticker
+        dataset: 'annual' (EPS de financials) o 'quarterly' (balance)
+        ticker: yf.Ticker ya creado (opcional)
+        store: FundamentalsStore (por defecto el compartido)
+    
+    Raises:
+        Exception: cualquier fallo de la descarga (incluido DeadlineExceeded);
+            el conjunto no se marca como revisado y se reintenta en la
+            siguiente consulta
+    """
+    store = store or get_fundamentals_store()
+    if not store.needs_refresh(ticker_symbol, dataset):
+        return
+    # Con Yahoo caído no se marca como revisado: se reintenta al reabrir
+    if get_yahoo_breakers().get("fundamentals").state == "open":
+        raise CircuitOpenError("fundamentals")
+    ticker = ticker or make_ticker(ticker_symbol)
+    
+    if dataset == "annual":
+        eps_points, source = extract_eps_points(ticker)
+        store.upsert(ticker_symbol, "eps_annual", eps_points, source)
+        latest = store.latest_period(ticker_symbol, ("eps_annual",))
+    else:
+        balance_sheet = yahoo_call("fundamentals", getattr, ticker, "quarterly_balance_sheet")
+        for metric, points in extract_balance_observations(balance_sheet).items():
+            store.upsert(ticker_symbol, metric, points, "quarterly_balance_sheet")
+        latest = store.latest_period(ticker_symbol, tuple(BALANCE_FIELDS))
+    # Solo tras una descarga correcta (aunque viniera vacía)
+    store.mark_checked(ticker_symbol, dataset, latest)
+
+
+def _refresh_or_stored(ticker_symbol, dataset, metrics, ticker, store):
+    # Un fallo transitorio sirve lo ya almacenado; sin nada guardado, el error sube
+    try:
+        refresh_fundamentals(ticker_symbol, dataset, ticker, store)
+    except DeadlineExceeded:
+        raise
+    except Exception:
+        if store.latest_period(ticker_symbol, metrics) is None:
+            raise
+
+
+def get_eps_points(ticker_symbol, ticker=None):
+    """
+    EPS anuales del almacén local (refrescados solo cuando toca).
+    
+    Args:
+        ticker_symbol: Símbolo del ticker
+        ticker: yf.Ticker ya creado (opcional)
+    
+    Returns:
+        Tupla ({fecha de cierre fiscal: eps}, fuente o None)
+    
+    Raises:
+        Exception: si la descarga falla y no hay EPS almacenados
+    """
+    store = get_fundamentals_store()
+    _refresh_or_stored(ticker_symbol, "annual", ("eps_annual",), ticker, store)
+    return store.series(ticker_symbol, "eps_annual")
+
+
+def get_balance_fields(ticker_symbol, ticker=None):
+    """
+    Deuda, efectivo y deuda neta del último balance trimestral almacenado.
+    
+    Args:
+        ticker_symbol: Símbolo del ticker
+        ticker: yf.Ticker ya creado (opcional)
+    
+    Returns:
+        Diccionario con los campos *_balance, net_debt y balance_date del
+        StockSnapshot (vacío si no hay balance)
+    
+    Raises:
+        Exception: si la descarga falla y no hay balance almacenado
+    """
+    store = get_fundamentals_store()
+    _refresh_or_stored(ticker_symbol, "quarterly", tuple(BALANCE_FIELDS), ticker, store)
+    period = store.latest_period(ticker_symbol, tuple(BALANCE_FIELDS))
+    if period is None:
+        return {}
+    values = store.values_at(ticker_symbol, period, tuple(BALANCE_FIELDS))
+    return {
+        "deuda_total_balance": values["total_debt"],
+        "efectivo_inversiones_balance": values["cash_st_investments"],
+        "net_debt": values["net_debt"],
+        "balance_date": period.date().isoformat(),
+    }
+
+
+# =============================================================================
+# CACHÉ DE PRECIOS EN ARROW IPC (MAPEADA EN MEMORIA Y COMPARTIDA ENTRE PROCESOS)
+# =============================================================================
+
+PRICE_CACHE_SCHEMA = "1"
+PRICE_CACHE_TTL = 15 * 60   # Segundos antes de volver a descargar el historial
+PRICE_MAPS_MAX = 96         # Ficheros mapeados que se mantienen abiertos por proceso
+
+# Barras agregadas que se mantienen junto al diario: resolución -> días de bolsa por barra
+BAR_RESOLUTIONS = {"1wk": 5, "1mo": 21}
+BAR_AGGREGATION = {"Open": "first", "High": "max", "Low": "min", "Close": "last", "Volume": "sum"}
+CHART_MAX_POINTS = 300      # Puntos por serie a partir de los que se agrega
+
+
+def _bucket_starts(index, resolution):
+    """Inicio (hora local, sin timezone) de la semana o el mes de cada fecha."""
+    local = pd.DatetimeIndex(index)
+    if local.tz is not None:
+        local = local.tz_localize(None)
+    days = local.normalize()
+    if resolution == "1wk":
+        return days - pd.to_timedelta(days.dayofweek, unit="D")
+    return days - pd.to_timedelta(days.day - 1, unit="D")
+
+
+def aggregate_ohlcv(daily, resolution):
+    """
+    Agrega barras diarias a semanales o mensuales.
+    
+    Cada barra se fecha con su último día de bolsa, así que su cierre
+    coincide con un cierre diario real.
+    
+    Args:
+        daily: DataFrame OHLCV diario
+        resolution: '1wk' o '1mo'
+    
+    Returns:
+        DataFrame OHLCV float32 con una fila por semana o mes
+    """
+    if daily is None or daily.empty:
+        return pd.DataFrame()
+    keys = _bucket_starts(daily.index, resolution)
+    columns = {c: BAR_AGGREGATION[c] for c in daily.columns if c in BAR_AGGREGATION}
+    bars = daily.groupby(keys, sort=True).agg(columns).astype(np.float32)
+    bars.index = pd.DatetimeIndex(pd.Series(daily.index, index=daily.index).groupby(keys, sort=True).last())
+    return bars
+
+
+def merge_bars(existing, daily, resolution):
+    """
+    Actualiza barras agregadas con un historial diario nuevo.
+    
+    Solo se recalcula desde el inicio de la última barra guardada (que
+    puede estar incompleta); las anteriores se conservan tal cual, incluso
+    si ya han salido de la ventana diaria descargada.
+    
+    Args:
+        existing: Barras guardadas (None = ninguna)
+        daily: Historial diario recién descargado
+        resolution: '1wk' o '1mo'
+    
+    Returns:
+        DataFrame con las barras actualizadas
+    """
+    if existing is None or existing.empty:
+        return aggregate_ohlcv(daily, resolution)
+    cutoff = _bucket_starts(existing.index[-1:], resolution)[0]
+    fresh = daily[_bucket_starts(daily.index, resolution) >= cutoff]
+    kept = existing[_bucket_starts(existing.index, resolution) < cutoff]
+    if fresh.empty:
+        return existing
+    if kept.index.tz is not None and fresh.index.tz is not None:
+        kept = kept.tz_convert(fresh.index.tz)
+    return pd.concat([kept, aggregate_ohlcv(fresh, resolution)])
+
+
+def choose_resolution(trading_days, max_points=CHART_MAX_POINTS):
+    """Resolución más fina ('1d', '1wk' o '1mo') que no supera `max_points`."""
+    for resolution, days_per_bar in (("1d", 1), *BAR_RESOLUTIONS.items()):
+        if trading_days / days_per_bar <= max_points:
+            return resolution
+    return "1mo"
+
+
+def thin_price_series(daily, bars):
+    """
+    Serie para dibujar: barras agregadas con el primer y el último día exactos.
+    
+    Args:
+        daily: Tramo diario que se quiere representar
+        bars: Barras agregadas del mismo ticker
+    
+    Returns:
+        DataFrame con el primer día, las barras intermedias y el último día
+    """
+    if daily.empty or bars is None or bars.empty:
+        return daily
+    # Alinear la timezone de las barras con la del tramo diario
+    if daily.index.tz is None and bars.index.tz is not None:
+        bars = bars.tz_localize(None)
+    elif daily.index.tz is not None and bars.index.tz is None:
+        bars = bars.tz_localize(daily.index.tz)
+    start, end = daily.index[0], daily.index[-1]
+    inner = bars[(bars.index > start) & (bars.index < end)]
+    return pd.concat([daily.iloc[:1], inner[daily.columns.intersection(inner.columns)], daily.iloc[-1:]])
+
+
+class PriceStore:
+    """
+    Historiales OHLCV en ficheros Arrow IPC (Feather v2) sin comprimir.
+    
+    Cada proceso mapea los ficheros en solo lectura, así que varios workers
+    de Streamlit comparten una única copia física (la caché de páginas del
+    sistema) y un proceso recién arrancado lee el historial sin descargar.
+    Las columnas se exponen como vistas NumPy sobre el mapeo, sin copias;
+    las escrituras van a un fichero temporal y se publican con os.replace.
+    
+    El descriptor de cada fichero se cierra nada más leerlo (el mapeo sigue
+    vivo mientras haya vistas sobre él) y solo se recuerdan los
+    PRICE_MAPS_MAX mapeos usados más recientemente.
+    """
+
+    def __init__(self, directory, max_maps=PRICE_MAPS_MAX):
+        self.directory = directory
+        os.makedirs(directory, exist_ok=True)
+        self.max_maps = max_maps
+        self._mapped = OrderedDict()
+        self._lock = threading.Lock()
+
+    def path(self, ticker, period, resolution="1d"):
+        """Ruta del fichero de un ticker, periodo y resolución."""
+        safe = re.sub(r"[^A-Za-z0-9._-]", "_", ticker.upper())
+        suffix = "" if resolution == "1d" else f".{resolution}"
+        return os.path.join(self.directory, f"{safe}.{period}{suffix}.arrow")
+
+    def write(self, ticker, period, hist, now=None, resolution="1d", exchange=""):
+        """
+        Guarda un historial (ya reducido a OHLCV float32) de forma atómica.
+        
+        Args:
+            ticker: Símbolo del ticker
+            period: Periodo de yfinance (ej: '5y')
+            hist: DataFrame con índice de fechas
+            now: Marca de tiempo de la descarga (por defecto time.time())
+            resolution: '1d' o una de BAR_RESOLUTIONS
+            exchange: Código de bolsa de Yahoo, para saber su horario al leer
+        """
+        frame = slim_price_history(hist)
+        index = pd.DatetimeIndex(frame.index).as_unit("ns")
+        metadata = {
+            "schema": PRICE_CACHE_SCHEMA,
+            "fetched_at": repr(time.time() if now is None else now),
+            "tz": str(index.tz) if index.tz is not None else "",
+            "exchange": exchange or "",
+        }
+        table = pa.Table.from_arrays(
+            [pa.array(index.asi8)] + [pa.array(frame[c].to_numpy(np.float32)) for c in frame.columns],
+            names=["ts", *frame.columns],
+        ).replace_schema_metadata(metadata)
+        
+        path = self.path(ticker, period, resolution)
+        temp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with pa.OSFile(temp_path, "wb") as sink, pa.ipc.new_file(sink, table.schema) as writer:
+            writer.write_table(table)
+        os.replace(temp_path, path)
+
+    def read(self, ticker, period, resolution="1d"):
+        """
+        Historial mapeado en memoria.
+        
+        Returns:
+            Tupla (DataFrame OHLCV float32 de solo lectura, marca de descarga)
+            o (None, None) si no existe o es de otro esquema. El código de
+            bolsa guardado va en `frame.attrs["exchange"]` ('' si no se sabe)
+        """
+        path = self.path(ticker, period, resolution)
+        try:
+            mtime = os.stat(path).st_mtime_ns
+        except OSError:
+            return None, None
+        with self._lock:
+            cached = self._mapped.get(path)
+            if cached is not None:
+                self._mapped.move_to_end(path)
+        if cached is None or cached[0] != mtime:
+            try:
+                # Al cerrar el fichero el mapeo se libera cuando dejan de usarse sus vistas
+                with pa.memory_map(path, "r") as source:
+                    table = pa.ipc.open_file(source).read_all()
+            except (OSError, pa.ArrowInvalid):
+                return None, None
+            cached = (mtime, table)
+            with self._lock:
+                self._mapped[path] = cached
+                self._mapped.move_to_end(path)
+                while len(self._mapped) > self.max_maps:
+                    self._mapped.popitem(last=False)
+        table = cached[1]
+        metadata = {k.decode(): v.decode() for k, v in (table.schema.metadata or {}).items()}
+        if metadata.get("schema") != PRICE_CACHE_SCHEMA:
+            return None, None
+        frame = self._frame(table, metadata.get("tz"))
+        frame.attrs["exchange"] = metadata.get("exchange", "")
+        return frame, float(metadata["fetched_at"])
+
+    def update_bars(self, ticker, period, daily, now=None):
+        """
+        Actualiza de forma incremental las barras de BAR_RESOLUTIONS.
+        
+        Returns:
+            Diccionario {resolución: DataFrame de barras}
+        """
+        updated = {}
+        for resolution in BAR_RESOLUTIONS:
+            existing, _ = self.read(ticker, period, resolution)
+            bars = merge_bars(existing, daily, resolution)
+            self.write(ticker, period, bars, now=now, resolution=resolution)
+            updated[resolution] = bars
+        return updated
+
+    @staticmethod
+    def _frame(table, tz):
+        # Vistas sin copia sobre los buffers mapeados (un único bloque por columna)
+        def view(name):
+            column = table.column(name)
+            return column.chunk(0).to_numpy(zero_copy_only=True) if column.num_chunks == 1 else column.to_numpy()
+        
+        index = pd.DatetimeIndex(view("ts").view("datetime64[ns]"))
+        if tz:
+            index = index.tz_localize("UTC").tz_convert(tz)
+        columns = {name: view(name) for name in table.column_names if name != "ts"}
+        return pd.DataFrame(columns, index=index, copy=False)
+
+
+@st.cache_resource(show_spinner=False)
+def get_price_store():
+    """
+    Caché de precios compartida por las sesiones (y, vía disco, por los procesos).
+    
+    Returns:
+        PriceStore en DATA_DIR/prices (o en un directorio temporal)
+    """
+    try:
+        return PriceStore(os.path.join(DATA_DIR, "prices"))
+    except OSError:
+        import tempfile
+        return PriceStore(tempfile.mkdtemp(prefix="lynchpanel-prices-"))
+
+
+def get_price_history(ticker_symbol, period="5y", ticker=None, max_age=PRICE_CACHE_TTL):
+    """
+    Historial OHLCV desde la caché mapeada, descargándolo solo si caducó.
+    
+    Args:
+        ticker_symbol: Símbolo del ticker
+        period: Periodo de yfinance
+        ticker: yf.Ticker ya creado (opcional)
+        max_age: Segundos de validez con la bolsa abierta
+    
+    Returns:
+        DataFrame OHLCV float32 (vacío si no hay datos)
+    """
+    store = get_price_store()
+    frame, fetched_at = store.read(ticker_symbol, period)
+    if frame is not None:
+        # Con la bolsa de la descarga: las criptomonedas (CCC) no cierran
+        tz = str(frame.index.tz) if frame.index.tz is not None else None
+        exchange = frame.attrs.get("exchange") or None
+        if not quote_is_fresh(ticker_symbol, fetched_at, max_age, exchange, tz):
+            # Stale-while-revalidate: se sirve el mapeado y se refresca aparte
+            get_revalidator().submit(ticker_symbol, f"history:{period}",
+                                     _download_price_history, ticker_symbol, period)
+        return frame
+    
+    # Sin historial guardado: snapshot y banda de Lynch piden el mismo, una sola
+    # descarga (el caducado ya se sirvió arriba mientras se revalida)
+    fresh = coalesce(ticker_symbol, f"history:{period}", _download_price_history,
+                     ticker_symbol, period, ticker)
+    return fresh if fresh is not None else pd.DataFrame()
+
+
+def _download_price_history(ticker_symbol, period, ticker=None):
+    """
+    Descarga el historial y lo publica en la caché mapeada.
+    
+    Returns:
+        DataFrame OHLCV float32 o None si Yahoo no devolvió datos
+    """
+    store = get_price_store()
+    ticker = ticker or make_ticker(ticker_symbol)
+    hist = yahoo_call("history", ticker.history, period=period)
+    if hist.empty:
+        return None
+    hist.index = pd.to_datetime(hist.index)
+    # Yahoo devuelve la bolsa en los metadatos de la misma respuesta
+    try:
+        exchange = (ticker.history_metadata or {}).get("exchangeName", "")
+    except Exception:
+        exchange = ""
+    try:
+        store.write(ticker_symbol, period, hist, exchange=exchange)
+        store.update_bars(ticker_symbol, period, slim_price_history(hist))
+    except OSError:
+        return slim_price_history(hist)
+    frame, _ = store.read(ticker_symbol, period)
+    return frame if frame is not None else slim_price_history(hist)
+
+
+def get_price_bars(ticker_symbol, resolution="1wk", period="5y"):
+    """
+    Barras OHLCV a la resolución pedida desde la caché de precios.
+    
+    Args:
+        ticker_symbol: Símbolo del ticker
+        resolution: '1d' o una de BAR_RESOLUTIONS
+        period: Periodo de yfinance del historial diario de origen
+    
+    Returns:
+        DataFrame OHLCV float32 (vacío si no hay datos)
+    """
+    daily = get_price_history(ticker_symbol, period)
+    if resolution == "1d" or daily.empty:
+        return daily
+    store = get_price_store()
+    bars, _ = store.read(ticker_symbol, period, resolution)
+    if bars is None:
+        # Caché anterior a las barras o sin permisos de escritura
+        try:
+            bars = store.update_bars(ticker_symbol, period, daily)[resolution]
+        except OSError:
+            bars = aggregate_ohlcv(daily, resolution)
+    return bars
+
+
+def get_stock_data(ticker_symbol):
+    """
+    Obtiene todos los datos financieros de una acción usando yfinance.
+    
+    Args:
+        ticker_symbol: Símbolo del ticker (ej: AAPL, KO, IBE.MC)
+        
+    Returns:
+        StockSnapshot con todos los datos financieros o None si el ticker no es válido.
+        Con un plazo ligado al hilo, las secciones secundarias que no llegan
+        a tiempo quedan vacías y anotadas en `pendiente`
+    
+    Raises:
+        Exception: si Yahoo falla (incluido CircuitOpenError); quien llama
+        decide si sirve el último snapshot bueno
+    """
+    # Crear objeto ticker
+    ticker = make_ticker(ticker_symbol)
+    pending = []
+    
+    # Obtener información general
+    info = yahoo_call("info", getattr, ticker, "info")
+    
+    # Verificar que el ticker es válido
+    if not info or 'regularMarketPrice' not in info and 'currentPrice' not in info:
+        return None
+    
+    # =====================================================================
+    # CALCULAR PEG RATIO - MÉTODO MEJORADO
+    # =====================================================================
+    # Prioridad:
+    # 1. trailingPegRatio de Yahoo Finance (ya calculado con 5Y growth)
+    # 2. Calcular manualmente con EPS forward growth anualizado a 5 años
+    
+    peg_final = None
+    peg_calculation = ""
+    growth_rate_used = None
+    per_used = None
+    
+    # Función helper para validar números (ya convertidos a float)
+    def is_valid_number(val):
+        return has_value(val) and val != 0
+    
+    # Obtener valores
+    per_trailing = to_float(info.get("trailingPE"))
+    trailing_peg = to_float(info.get("trailingPegRatio"))
+    eps_trailing = to_float(info.get("trailingEps"))
+    eps_forward = to_float(info.get("forwardEps"))
+    
+    # MÉTODO 1: Usar trailingPegRatio de Yahoo (el más fiable)
+    if is_valid_number(trailing_peg):
+        peg_val = float(trailing_peg)
+        if 0.1 <= peg_val <= 10:  # Validar rango razonable
+            peg_final = peg_val
+            # Calcular el growth implícito: Growth = PE / PEG
+            if is_valid_number(per_trailing):
+                implied_growth = float(per_trailing) / peg_val
+                peg_calculation = f"P/E: {float(per_trailing):.2f} ÷ Growth (5Y Est.): {implied_growth:.1f}% = PEG: {peg_val:.2f} (Yahoo Finance)"
+                growth_rate_used = implied_growth
+                per_used = float(per_trailing)
+            else:
+                peg_calculation = f"PEG: {peg_val:.2f} (Yahoo Finance - trailingPegRatio)"
+    
+    # MÉTODO 2: Calcular con Forward EPS Growth si no hay trailingPegRatio
+    if peg_final is None and is_valid_number(per_trailing) and is_valid_number(eps_trailing) and is_valid_number(eps_forward):
+        pe = float(per_trailing)
+        eps_t = float(eps_trailing)
+        eps_f = float(eps_forward)
+        
+        if eps_t > 0 and eps_f > eps_t:
+            # Growth de 1 año
+            growth_1y = ((eps_f - eps_t) / eps_t) * 100
+            # Estimar growth anualizado a 5 años (más conservador)
+            # Asumimos que el growth disminuye gradualmente
+            growth_5y_est = growth_1y * 0.6  # Factor de ajuste conservador
+            
+            if growth_5y_est > 0:
+                peg_final = pe / growth_5y_est
+                peg_calculation = f"P/E: {pe:.2f} ÷ Growth Est. (5Y): {growth_5y_est:.1f}% = PEG: {peg_final:.2f} (Calculado)"
+                growth_rate_used = growth_5y_est
+                per_used = pe
+    
+    # MÉTODO 3: Intentar obtener growth de analyst estimates
+    if peg_final is None:
+        try:
+            growth_estimates = yahoo_call("estimates", getattr, ticker, "growth_estimates")
+            if growth_estimates is not None and not growth_estimates.empty:
+                # Buscar el crecimiento del próximo año (+1y) en stockTrend
+                if '+1y' in growth_estimates.index and 'stockTrend' in growth_estimates.columns:
+                    growth_1y = growth_estimates.loc['+1y', 'stockTrend']
+                    if pd.notna(growth_1y) and is_valid_number(per_trailing):
+                        growth_pct = float(growth_1y) * 100
+                        if growth_pct > 0:
+                            pe = float(per_trailing)
+                            peg_final = pe / growth_pct
+                            peg_calculation = f"P/E: {pe:.2f} ÷ Growth Analyst (+1Y): {growth_pct:.1f}% = PEG: {peg_final:.2f}"
+                            growth_rate_used = growth_pct
+                            per_used = pe
+        except DeadlineExceeded:
+            pending.append("estimaciones")
+        except Exception:
+            pass
+    
+    # Si aún no tenemos PEG, indicar por qué
+    if peg_final is None:
+        if is_valid_number(per_trailing):
+            peg_calculation = f"P/E: {float(per_trailing):.2f} ÷ Growth Rate: N/A = No calculable"
+            per_used = float(per_trailing)
+        else:
+            peg_calculation = "P/E y/o Growth Rate no disponibles"
+    
+    # Guardar resultados
+    fields = {
+        "peg_ratio": peg_final,
+        "peg_calculation": peg_calculation,
+        "growth_rate_used": growth_rate_used,
+        "per_used": per_used,
+    }
+    
+    # Obtener historial de precios (5 años para tener datos completos)
+    try:
+        # Desde la caché mapeada (índice datetime sin nombre, OHLCV float32)
+        fields["historico"] = get_price_history(ticker_symbol, "5y", ticker)
+    except DeadlineExceeded:
+        pending.append("historico")
+        fields["historico"] = pd.DataFrame()
+    except Exception:
+        fields["historico"] = pd.DataFrame()
+    
+    # Obtener noticias recientes (Scuttlebutt de Lynch)
+    try:
+        news = yahoo_call("news", getattr, ticker, "news")
+        if news and len(news) > 0:
+            fields["noticias"] = slim_news(news[:5])  # Últimas 5 noticias
+        else:
+            fields["noticias"] = []
+    except DeadlineExceeded:
+        pending.append("noticias")
+        fields["noticias"] = []
+    except Exception:
+        fields["noticias"] = []
+    
+    # =====================================================================
+    # CALCULAR RATIO EFECTIVO/DEUDA - MÉTODO MEJORADO
+    # =====================================================================
+    # Usamos datos del balance sheet trimestral para mayor precisión
+    # El ratio Efectivo/Deuda indica cuántas veces puede pagar su deuda
+    # con el efectivo disponible. Un ratio > 1 significa posición neta positiva.
+    
+    # Balance del almacén local (solo se descarga cuando hay un trimestre nuevo)
+    try:
+        fields.update(get_balance_fields(ticker_symbol, ticker))
+    except DeadlineExceeded:
+        pending.append("balance")
+    except Exception:
+        pass
+    
+    # Determinar mejores valores para deuda y efectivo
+    # Prioridad: Balance Sheet > Info
+    fields["deuda_total"] = fields.get("deuda_total_balance") or to_float(info.get("totalDebt"))
+    fields["efectivo_total"] = fields.get("efectivo_inversiones_balance") or to_float(info.get("totalCash"))
+    
+    # Parsear una sola vez a un registro tipado
+    fields["pendiente"] = ",".join(pending)
+    return StockSnapshot.from_info(ticker_symbol, info, **fields)
+
+
+def get_insider_data(ticker_symbol):
+    """
+    Obtiene datos de insiders e institucionales de una acción.
+    
+    Args:
+        ticker_symbol: Símbolo del ticker (ej: AAPL, KO)
+        
+    Returns:
+        Diccionario con datos de insiders, institucionales y transacciones
+    
+    Raises:
+        Exception: si fallan todas las llamadas a Yahoo, para que se siga
+        sirviendo el último valor bueno
+    """
+    errors = []
+    try:
+        ticker = make_ticker(ticker_symbol)
+        
+        insider_data = {
+            "major_holders": None,
+            "institutional_holders": None,
+            "insider_transactions": None,
+            "ownership_info": None,  # Datos precisos del ticker.info
+        }
+        
+        # Obtener datos precisos de propiedad desde ticker.info
+        try:
+            info = yahoo_call("info", getattr, ticker, "info")
+            ownership_info = {}
+            
+            # Shares Outstanding (total de acciones) - Dato base fiable
+            shares_outstanding = None
+            if 'sharesOutstanding' in info and info['sharesOutstanding'] is not None:
+                shares_outstanding = info['sharesOutstanding']
+                ownership_info['shares_outstanding'] = shares_outstanding
+            
+            # Float Shares (acciones disponibles para negociar)
+            float_shares = None
+            if 'floatShares' in info and info['floatShares'] is not None:
+                float_shares = info['floatShares']
+                ownership_info['float_shares'] = float_shares
+            
+            # MÉTODO MEJORADO: Calcular participación de insiders
+            # Fórmula: (Shares Outstanding - Float Shares) / Shares Outstanding
+            # Esto da las acciones NO disponibles para el público (restricted/insider shares)
+            insiders_pct_calculated = None
+            if shares_outstanding and float_shares and shares_outstanding > 0:
+                restricted_shares = shares_outstanding - float_shares
+                if restricted_shares >= 0:
+                    insiders_pct_calculated = restricted_shares / shares_outstanding
+                    ownership_info['insiders_percent_calculated'] = insiders_pct_calculated
+            
+            # Obtener también el valor de Yahoo para comparar
+            if 'heldPercentInsiders' in info and info['heldPercentInsiders'] is not None:
+                ownership_info['insiders_percent_yahoo'] = info['heldPercentInsiders']
+            
+            # Usar el valor calculado como principal (más fiable), con fallback a Yahoo
+            if insiders_pct_calculated is not None:
+                ownership_info['insiders_percent'] = insiders_pct_calculated
+                ownership_info['insiders_method'] = 'calculated'
+            elif 'insiders_percent_yahoo' in ownership_info:
+                ownership_info['insiders_percent'] = ownership_info['insiders_percent_yahoo']
+                ownership_info['insiders_method'] = 'yahoo'
+            
+            # Participación Institucional (%) - este dato suele ser más fiable
+            if 'heldPercentInstitutions' in info and info['heldPercentInstitutions'] is not None:
+                ownership_info['institutions_percent'] = info['heldPercentInstitutions']
+            
+            # Implied Shares Outstanding (puede ser diferente por dilución)
+            if 'impliedSharesOutstanding' in info and info['impliedSharesOutstanding'] is not None:
+                ownership_info['implied_shares'] = info['impliedSharesOutstanding']
+            
+            # Short Interest
+            if 'sharesShort' in info and info['sharesShort'] is not None:
+                ownership_info['shares_short'] = info['sharesShort']
+            
+            if 'shortRatio' in info and info['shortRatio'] is not None:
+                ownership_info['short_ratio'] = info['shortRatio']
+            
+            if 'shortPercentOfFloat' in info and info['shortPercentOfFloat'] is not None:
+                ownership_info['short_percent_float'] = info['shortPercentOfFloat']
+            
+            if 'sharesShortPriorMonth' in info and info['sharesShortPriorMonth'] is not None:
+                ownership_info['shares_short_prior'] = info['sharesShortPriorMonth']
+            
+            if 'dateShortInterest' in info and info['dateShortInterest'] is not None:
+                ownership_info['short_interest_date'] = info['dateShortInterest']
+            
+            if ownership_info:
+                insider_data["ownership_info"] = ownership_info
+                
+        except Exception as e:
+            errors.append(e)
+        
+        # Obtener Major Holders como respaldo
+        try:
+            major = yahoo_call("holders", getattr, ticker, "major_holders")
+            if major is not None and not major.empty:
+                insider_data["major_holders"] = major
+        except Exception as e:
+            errors.append(e)
+        
+        # Obtener Institutional Holders (fondos, ETFs, etc.)
+        try:
+            institutional = yahoo_call("holders", getattr, ticker, "institutional_holders")
+            if institutional is not None and not institutional.empty:
+                insider_data["institutional_holders"] = institutional
+        except Exception as e:
+            errors.append(e)
+        
+        # Obtener transacciones de insiders
+        try:
+            insider_trans = yahoo_call("insiders", getattr, ticker, "insider_transactions")
+            if insider_trans is not None and not insider_trans.empty:
+                insider_data["insider_transactions"] = insider_trans
+        except Exception as e:
+            errors.append(e)
+        
+    except Exception as e:
+        errors.append(e)
+        insider_data = {}
+    
+    # Todo falló: no es "sin datos" sino Yahoo caído
+    if len(errors) == 4 or not insider_data:
+        raise errors[-1] if errors else RuntimeError("insider data unavailable")
+    return insider_data
+
+
+# =============================================================================
+# BANDA DE VALOR JUSTO DE PETER LYNCH (DATASET REUTILIZABLE)
+# =============================================================================
+
+# Versión del esquema del dataset; cambiarla invalida los datasets cacheados
+LYNCH_BAND_SCHEMA = 1
+LYNCH_BAND_COLUMNS = ("EPS", "Fair_Value", "Conservative_Value", "Close", "Band_Position")
+
+
+class LynchBandDataset:
+    """
+    Serie temporal de la banda de valor justo de Peter Lynch para un ticker.
+    
+    Columnas float32 indexadas por fecha (diaria, histórico + 1 año de
+    proyección): EPS interpolado, valor justo, valor conservador (PEG=1),
+    cierre y posición del precio dentro de la banda (0 = borde inferior,
+    1 = borde superior, <0 por debajo, >1 por encima; NaN sin precio).
+    """
+    __slots__ = ("ticker", "frame", "fair_multiplier", "conservative_multiplier", "growth_rate",
+                 "method", "projection_start", "forward_eps", "trailing_eps", "version")
+
+    def __init__(self, ticker, frame, fair_multiplier, conservative_multiplier, growth_rate=None,
+                 method=None, projection_start=None, forward_eps=None, trailing_eps=None):
+        self.ticker = ticker
+        self.frame = frame
+        self.fair_multiplier = fair_multiplier
+        self.conservative_multiplier = conservative_multiplier
+        self.growth_rate = growth_rate
+        self.method = method
+        self.projection_start = projection_start
+        self.forward_eps = forward_eps
+        self.trailing_eps = trailing_eps
+
+        digest = hashlib.blake2b(digest_size=8)
+        digest.update(repr((LYNCH_BAND_SCHEMA, ticker, fair_multiplier, conservative_multiplier,
+                            projection_start)).encode())
+        digest.update(frame.index.asi8.tobytes())
+        digest.update(frame.to_numpy().tobytes())
+        self.version = f"{LYNCH_BAND_SCHEMA}-{digest.hexdigest()}"
+
+    @property
+    def has_projection(self):
+        """True si la banda se extiende más allá del último precio."""
+        return self.projection_start is not None and self.frame.index[-1] > self.projection_start
+
+    def between(self, start=None, end=None, columns=None):
+        """
+        Devuelve el tramo de la banda entre dos fechas (ambas inclusive).
+        
+        Args:
+            start: Fecha inicial (None = desde el principio)
+            end: Fecha final (None = hasta el final, incluida la proyección)
+            columns: Columnas a devolver (None = todas)
+        
+        Returns:
+            DataFrame float32 con el tramo solicitado
+        """
+        start = pd.Timestamp(start) if start is not None else None
+        end = pd.Timestamp(end) if end is not None else None
+        frame = self.frame.loc[start:end]
+        return frame if columns is None else frame[list(columns)]
+
+    def historical(self, columns=None):
+        """Tramo con precio real (hasta `projection_start`)."""
+        return self.between(end=self.projection_start, columns=columns)
+
+    def projection(self, columns=None):
+        """Tramo proyectado con Forward EPS (desde `projection_start`)."""
+        return self.between(start=self.projection_start, columns=columns)
+
+    def latest(self):
+        """Última fila con precio (valores actuales de la banda)."""
+        return self.historical().iloc[-1]
+
+    def __repr__(self):
+        return f"LynchBandDataset({self.ticker!r}, rows={len(self.frame)}, version={self.version!r})"
+
+
+def compute_lynch_band(prices_df, eps_points, forward_eps=None, growth_rate=None):
+    """
+    Calcula la banda de valor justo a partir de precios y puntos de EPS.
+    
+    Características:
+    - Interpolación lineal suave (sin efecto escalera)
+    - Proyección a 1 año usando Forward EPS
+    - Línea de Valor Conservador (PEG=1) como referencia de suelo
+    - Técnicas vectorizadas (sin bucles for, sin sumar enteros a fechas)
+    
+    Args:
+        prices_df: DataFrame con columna 'Close' e índice de fechas sin timezone
+        eps_points: Diccionario {fecha: eps} con al menos dos puntos
+        forward_eps: EPS estimado a 1 año (opcional, activa la proyección)
+        growth_rate: Tasa de crecimiento esperada (opcional)
+    
+    Returns:
+        Tupla (frame, fair_multiplier, conservative_multiplier); frame es
+        None si no queda EPS válido tras interpolar
+    """
+    last_price_date = prices_df.index.max()
+    first_price_date = prices_df.index.min()
+    
+    # IMPORTANTE: Usar pd.date_range para fechas futuras (NUNCA sumar enteros)
+    future_dates = pd.date_range(start=last_price_date, periods=365, freq='D')
+    full_date_range = pd.date_range(start=first_price_date, end=future_dates[-1], freq='D')
+    
+    # Colocar los EPS conocidos en su fecha (o la más cercana del índice)
+    eps = pd.Series(np.nan, index=full_date_range, dtype=np.float64)
+    for date, eps_value in eps_points.items():
+        if date in eps.index:
+            eps.loc[date] = eps_value
+        else:
+            nearest_idx = eps.index.get_indexer([date], method='nearest')[0]
+            eps.iloc[nearest_idx] = eps_value
+    
+    # Forward EPS al final del período de proyección
+    if forward_eps and forward_eps > 0:
+        eps.loc[future_dates[-1]] = forward_eps
+    
+    # Interpolación suave (método 'time') y relleno de extremos
+    eps = eps.interpolate(method='time').ffill().bfill()
+    eps = eps[eps > 0]
+    if eps.empty:
+        return None, 15, 15
+    
+    # Fair PE Multiplier: mediana histórica del P/E (solo período con precio)
+    fair_multiplier = 15  # Default
+    historical = pd.concat([eps[eps.index <= last_price_date].rename('EPS'), prices_df['Close']],
+                           axis=1, join='inner')
+    if len(historical) > 20:
+        pe = (historical['Close'] / historical['EPS']).replace([np.inf, -np.inf], np.nan).dropna()
+        pe = pe[(pe > 0) & (pe < 200)]
+        if len(pe) > 20:
+            fair_multiplier = max(5, min(60, pe.median()))
+    fair_multiplier = round(fair_multiplier, 1)
+    
+    # Conservative Multiplier (PEG=1): si crece al 15% anual, PER justo sería 15
+    conservative_multiplier = 15  # Default para empresas estables
+    if growth_rate is not None and growth_rate > 0:
+        conservative_multiplier = growth_rate * 100
+    conservative_multiplier = max(15, min(25, conservative_multiplier))
+    
+    # Construir la banda y la posición del precio dentro de ella
+    fair_value = eps * fair_multiplier
+    conservative_value = eps * conservative_multiplier
+    close = prices_df['Close'].reindex(eps.index)
+    lower = np.minimum(fair_value, conservative_value)
+    width = (np.maximum(fair_value, conservative_value) - lower).replace(0, np.nan)
+    
+    frame = pd.DataFrame({
+        "EPS": eps,
+        "Fair_Value": fair_value,
+        "Conservative_Value": conservative_value,
+        "Close": close,
+        "Band_Position": (close - lower) / width,
+    }, columns=list(LYNCH_BAND_COLUMNS)).astype(np.float32)
+    frame.index.name = "Date"
+    
+    return frame, fair_multiplier, round(conservative_multiplier, 1)
+
+
+class LynchBandUnavailable(RuntimeError):
+    """Fallo transitorio al descargar la banda (no se guarda en caché)."""
+
+
+def fetch_lynch_inputs(ticker_symbol):
+    """
+    Descarga los datos de entrada de la banda de Lynch.
+    
+    Args:
+        ticker_symbol: Símbolo del ticker (ej: AAPL, MSFT)
+    
+    Returns:
+        Diccionario con prices_df, eps_points, method, forward_eps, trailing_eps,
+        growth_rate y error (None si todo fue bien)
+    
+    Raises:
+        LynchBandUnavailable: si la descarga de precios falla (Yahoo caído,
+            circuito abierto...); reintentarlo más tarde puede funcionar
+    """
+    ticker = make_ticker(ticker_symbol)
+    inputs = {"prices_df": None, "eps_points": {}, "method": None, "forward_eps": None,
+              "trailing_eps": None, "growth_rate": None, "error": None}
+    
+    # Historial de precios (5 años) sin timezone, compartido con get_stock_data
+    try:
+        price_hist = get_price_history(ticker_symbol, "5y", ticker)
+        if price_hist.empty:
+            inputs["error"] = "No price history available"
+            return inputs
+        if price_hist.index.tz is not None:
+            price_hist = price_hist.set_axis(price_hist.index.tz_localize(None))
+        prices_df = price_hist[['Close']].dropna()
+        if len(prices_df) < 50:
+            inputs["error"] = "Insufficient price data"
+            return inputs
+    except DeadlineExceeded:
+        raise
+    except Exception as e:
+        raise LynchBandUnavailable(f"Error fetching prices: {str(e)}") from e
+    inputs["prices_df"] = prices_df
+    
+    # EPS históricos de múltiples fuentes
+    try:
+        eps_points, inputs["method"] = get_eps_points(ticker_symbol, ticker)
+    except DeadlineExceeded:
+        raise
+    except Exception as e:
+        raise LynchBandUnavailable(f"Error fetching EPS: {str(e)}") from e
+    
+    # Forward/Trailing EPS para proyección, growth y fallback
+    try:
+        info = yahoo_call("info", getattr, ticker, "info")
+        forward_eps = info.get('forwardEps')
+        trailing_eps = info.get('trailingEps')
+        if forward_eps and forward_eps > 0:
+            inputs["forward_eps"] = forward_eps
+        if trailing_eps and trailing_eps > 0:
+            inputs["trailing_eps"] = trailing_eps
+        if forward_eps and trailing_eps and trailing_eps > 0:
+            inputs["growth_rate"] = (forward_eps - trailing_eps) / trailing_eps
+    except Exception:
+        pass
+    
+    # Fallback: usar EPS actual en ambos extremos del historial
+    if len(eps_points) < 2 and inputs["trailing_eps"]:
+        eps_points[prices_df.index[-1]] = float(inputs["trailing_eps"])
+        eps_points[prices_df.index[0]] = float(inputs["trailing_eps"])
+        inputs["method"] = "current_eps_only"
+    
+    if len(eps_points) < 2:
+        inputs["error"] = "No EPS data available"
+    inputs["eps_points"] = eps_points
+    return inputs
+
+
+def get_lynch_band_dataset(ticker_symbol):
+    """
+    Dataset de la banda de valor justo para un ticker.
+    
+    Los resultados definitivos (incluido "sin EPS") se cachean una hora;
+    los fallos transitorios se devuelven sin cachear para que el gráfico
+    vuelva en cuanto Yahoo se recupere.
+    
+    Args:
+        ticker_symbol: Símbolo del ticker (ej: AAPL, MSFT)
+    
+    Returns:
+        Tupla (LynchBandDataset o None, mensaje de error o None)
+    """
+    try:
+        return _cached_lynch_band_dataset(ticker_symbol)
+    except LynchBandUnavailable as e:
+        return None, str(e)
+
+
+@st.cache_data(ttl=3600, show_spinner=False)
+def _cached_lynch_band_dataset(ticker_symbol):
+    """Parte cacheada de get_lynch_band_dataset; los fallos transitorios se lanzan."""
+    inputs = fetch_lynch_inputs(ticker_symbol)
+    if inputs["error"]:
+        return None, inputs["error"]
+    
+    prices_df = inputs["prices_df"]
+    frame, fair_multiplier, conservative_multiplier = compute_lynch_band(
+        prices_df, inputs["eps_points"], inputs["forward_eps"], inputs["growth_rate"]
+    )
+    if frame is None:
+        return None, "No valid EPS after interpolation"
+    
+    dataset = LynchBandDataset(
+        ticker_symbol, frame, fair_multiplier, conservative_multiplier,
+        growth_rate=inputs["growth_rate"], method=inputs["method"],
+        projection_start=prices_df.index.max(),
+        forward_eps=inputs["forward_eps"], trailing_eps=inputs["trailing_eps"],
+    )
+    return dataset, None
+
+
+def thin_band_frame(frame, projection_start=None, step=7):
+    """
+    Muestrea la banda diaria cada `step` filas para dibujarla.
+    
+    Las líneas de la banda son interpolaciones lineales del EPS, así que
+    entre muestras no se pierde forma; se conservan además los extremos y
+    los días alrededor del inicio de la proyección.
+    """
+    positions = set(range(0, len(frame), step)) | {len(frame) - 1}
+    if projection_start is not None:
+        start = frame.index.searchsorted(projection_start)
+        positions |= {p for p in (start - 1, start) if 0 <= p < len(frame)}
+    return frame.iloc[sorted(positions)]
+
+
+def get_peter_lynch_chart_data(ticker_symbol, dataset, error=None):
+    """
+    Genera los datos para el Gráfico de Valoración Dinámica de Peter Lynch.
+    
+    Parte del dataset que ya descargó el análisis (con su plazo y su token):
+    aquí no se vuelve a pedir a Yahoo.
+    
+    Args:
+        ticker_symbol: Símbolo del ticker (ej: AAPL, MSFT)
+        dataset: LynchBandDataset de get_lynch_band_dataset o None
+        error: Mensaje de error de get_lynch_band_dataset
+        
+    Returns:
+        Diccionario con datos para el gráfico
+    """
+    try:
+        if dataset is None:
+            return {"has_data": False, "error": error}
+        
+        # Las líneas del gráfico se leen del dataset (float32 -> float64 para Plotly),
+        # con barras semanales y la banda muestreada cada semana si hay muchos puntos
+        prices = dataset.historical(["Close"]).dropna()
+        frame = dataset.frame
+        if choose_resolution(len(prices)) != "1d":
+            prices = thin_price_series(prices, get_price_bars(ticker_symbol, "1wk"))
+            frame = thin_band_frame(frame, dataset.projection_start)
+        return {
+            "price_history": prices.astype(np.float64),
+            "fair_value_line": frame[["Fair_Value"]].astype(np.float64),
+            "conservative_value_line": frame[["Conservative_Value"]].astype(np.float64),
+            "fair_multiplier": dataset.fair_multiplier,
+            "conservative_multiplier": dataset.conservative_multiplier,
+            "growth_rate": dataset.growth_rate,
+            "has_data": True,
+            "method": dataset.method,
+            "error": None,
+            "has_projection": bool(dataset.forward_eps) and dataset.has_projection,
+            "forward_eps": dataset.forward_eps,
+            "trailing_eps": dataset.trailing_eps,
+            "projection_start": dataset.projection_start,
+            "dataset": dataset,
+        }
+        
+    except Exception as e:
+        return {
+            "has_data": False,
+            "error": f"Unexpected error: {str(e)}"
+        }
+
+
+# =============================================================================
+# BACKTEST DE LA BANDA DE VALOR JUSTO (VECTORIZADO, POINT-IN-TIME)
+# =============================================================================
+
+# Estados de tendencia en el orden de su código numérico (-1 = sin datos)
+TREND_STATES = ("strong_bearish", "strong_uptrend", "recovery", "oversold_bounce", "downtrend")
+
+# Días naturales entre el cierre fiscal y la publicación del EPS anual
+EPS_REPORT_LAG_DAYS = 90
+
+
+def _rolling_trend_states(closes, slope_window=63):
+    """
+    Estado de tendencia de `analyze_trend_robust` para cada fecha y ticker.
+    
+    Replica el árbol de decisión con ventanas móviles sobre la matriz
+    completa (fechas x tickers): SMA50/SMA200 con el mismo fallback a la
+    media expandida, máximo de 52 semanas y pendiente de regresión lineal
+    sobre las últimas `slope_window` sesiones (~90 días naturales)
+    calculada con sumas móviles en lugar de un polyfit por fecha.
+    
+    Args:
+        closes: DataFrame de cierres (índice fechas, columnas tickers)
+        slope_window: Sesiones de la regresión lineal
+    
+    Returns:
+        DataFrame int8 con el índice de TREND_STATES (-1 sin datos suficientes)
+    """
+    sma_50 = closes.rolling(50, min_periods=1).mean()
+    sma_200 = closes.rolling(200, min_periods=1).mean()
+    high_52w = closes.rolling(252, min_periods=1).max()
+    dist_to_high_pct = (closes - high_52w) / high_52w * 100
+    
+    # Pendiente OLS con x = 0..W-1: (W·Σxy − Σx·Σy) / (W·Σx² − (Σx)²)
+    w = slope_window
+    position = pd.Series(np.arange(len(closes), dtype=np.float64), index=closes.index)
+    sum_y = closes.rolling(w).sum()
+    sum_iy = closes.mul(position, axis=0).rolling(w).sum()
+    start = (position - (w - 1)).to_numpy()[:, None]
+    sum_xy = sum_iy - sum_y * start
+    sum_x = w * (w - 1) / 2
+    slope = (w * sum_xy - sum_x * sum_y) / (w * w * (w * w - 1) / 12)
+    avg_price = sum_y / w
+    slope_pct = (slope / avg_price * 100).where(avg_price > 0, 0.0)
+    
+    above_50 = closes > sma_50
+    above_200 = closes > sma_200
+    rising = slope_pct > 0
+    conditions = [
+        (slope_pct < TREND_STRONG_BEAR_THRESHOLD) & ~above_50 & ~above_200,
+        rising & above_200 & (dist_to_high_pct > TREND_NEAR_HIGH_THRESHOLD),
+        rising & above_200 & (dist_to_high_pct <= TREND_NEAR_HIGH_THRESHOLD),
+        rising & ~above_200,
+    ]
+    codes = np.select([c.to_numpy() for c in conditions], [0, 1, 2, 3], default=4).astype(np.int8)
+    codes[slope_pct.isna().to_numpy()] = -1
+    return pd.DataFrame(codes, index=closes.index, columns=closes.columns)
+
+
+def _point_in_time_eps(eps_reports, index, report_lag_days=EPS_REPORT_LAG_DAYS):
+    """
+    EPS y crecimiento conocidos en cada fecha (sin mirar al futuro).
+    
+    Cada EPS anual se hace visible `report_lag_days` después del cierre
+    fiscal y se mantiene hasta el siguiente informe. A diferencia de la
+    banda del gráfico, no se interpola entre informes ni se usa el Forward
+    EPS, porque ambos dependen de datos futuros.
+    
+    Args:
+        eps_reports: Diccionario {ticker: {fecha cierre fiscal: eps}}
+        index: Índice de fechas de negociación
+        report_lag_days: Retraso de publicación en días naturales
+    
+    Returns:
+        Tupla (eps, growth) de DataFrames alineados con `index`
+    """
+    lag = pd.Timedelta(days=report_lag_days)
+    eps_cols, growth_cols = {}, {}
+    for ticker, points in eps_reports.items():
+        reports = pd.Series(points, dtype=np.float64).sort_index()
+        reports.index = pd.DatetimeIndex(reports.index) + lag
+        reports = reports[~reports.index.duplicated(keep='last')]
+        eps_cols[ticker] = reports
+        growth_cols[ticker] = reports.pct_change(fill_method=None)
+    
+    def align(columns):
+        frame = pd.DataFrame(columns, columns=list(eps_reports))
+        full_index = frame.index.union(index)
+        return frame.reindex(full_index).ffill().reindex(index)
+    
+    return align(eps_cols), align(growth_cols)
+
+
+def run_lynch_band_backtest(closes, eps_reports, entry_trends=None, slope_window=63,
+                            report_lag_days=EPS_REPORT_LAG_DAYS, adjusted_closes=None):
+    """
+    Simula comprar bajo la banda de Lynch y vender sobre ella, point-in-time.
+    
+    Reglas por ticker: se entra cuando el cierre queda por debajo del borde
+    inferior de la banda (y la tendencia está en `entry_trends`) y se sale
+    cuando supera el borde superior. La señal de un cierre se ejecuta al
+    cierre siguiente. El P/E justo es la mediana expandida del P/E
+    observado hasta cada fecha y el conservador se deriva del crecimiento
+    del último EPS publicado, con los mismos límites que compute_lynch_band.
+    Todo se calcula sobre matrices fechas x tickers, sin bucles por fecha.
+    
+    El P/E y las señales usan los cierres ajustados por splits pero no por
+    dividendos (el Close de Yahoo con auto_adjust=False), en la misma base
+    que el EPS publicado; los ajustados también por dividendos solo se usan
+    para la tendencia y los rendimientos.
+    
+    Args:
+        closes: DataFrame de cierres ajustados por splits, no por dividendos
+                (índice fechas, columnas tickers)
+        eps_reports: Diccionario {ticker: {fecha cierre fiscal: eps}}
+        entry_trends: Estados de TREND_STATES que permiten entrar (None = todos)
+        slope_window: Sesiones de la regresión de tendencia
+        report_lag_days: Retraso de publicación del EPS en días naturales
+        adjusted_closes: Cierres ajustados por splits y dividendos con las
+                         mismas columnas (None = closes)
+    
+    Returns:
+        Diccionario con summary (métricas por ticker), portfolio (métricas de
+        la cartera equiponderada), equity, positions, trend_states y trades
+    """
+    def prepare(frame):
+        frame = frame.sort_index().astype(np.float64)
+        index = pd.DatetimeIndex(frame.index)
+        frame.index = index.tz_localize(None) if index.tz is not None else index
+        return frame
+    
+    closes = prepare(closes)
+    adjusted = closes if adjusted_closes is None else prepare(adjusted_closes).reindex_like(closes)
+    eps, growth = _point_in_time_eps(
+        {t: eps_reports.get(t, {}) for t in closes.columns}, closes.index, report_lag_days
+    )
+    eps = eps.where(eps > 0)
+    
+    # Multiplicadores point-in-time
+    pe = (closes / eps).where(lambda x: (x > 0) & (x < 200))
+    fair_multiplier = pe.expanding(min_periods=21).median().clip(5, 60).fillna(15).round(1)
+    conservative_multiplier = (growth * 100).where(growth > 0, 15).clip(15, 25).fillna(15)
+    fair_value = eps * fair_multiplier
+    conservative_value = eps * conservative_multiplier
+    lower = np.fmin(fair_value, conservative_value)
+    upper = np.fmax(fair_value, conservative_value)
+    
+    # Tendencia y señales
+    trend_states = _rolling_trend_states(adjusted, slope_window)
+    entry = closes < lower
+    if entry_trends is not None:
+        allowed = [TREND_STATES.index(state) for state in entry_trends]
+        entry &= trend_states.isin(allowed)
+    exit_ = closes > upper
+    signal = pd.DataFrame(np.where(entry, 1.0, np.where(exit_, 0.0, np.nan)),
+                          index=closes.index, columns=closes.columns)
+    positions = signal.ffill().fillna(0.0)
+    held = positions.shift(1).fillna(0.0)
+    
+    # Rendimientos diarios
+    returns = adjusted.pct_change(fill_method=None).fillna(0.0)
+    strategy = held * returns
+    equity = (1 + strategy).cumprod()
+    drawdown = equity / equity.cummax() - 1
+    
+    # Operaciones: cada entrada abre un identificador nuevo por ticker
+    opened = (held.diff().fillna(held) > 0).astype(np.int32)
+    trade_id = opened.cumsum().where(held > 0)
+    log_returns = np.log1p(strategy)
+    stacked = pd.DataFrame({
+        "trade": trade_id.stack(),
+        "log_return": log_returns.where(held > 0).stack(),
+    }).dropna()
+    stacked.index.names = ["Date", "Ticker"]
+    grouped = stacked.reset_index().groupby(["Ticker", "trade"])
+    trades = grouped.agg(entry=("Date", "min"), exit=("Date", "max"), log_return=("log_return", "sum"))
+    trades["return"] = np.expm1(trades.pop("log_return"))
+    trades["days"] = grouped.size()
+    trades = trades.reset_index().drop(columns="trade")
+    
+    # Métricas por ticker
+    first_valid = adjusted.apply(lambda col: col.loc[col.first_valid_index()] if col.notna().any() else np.nan)
+    last_valid = adjusted.ffill().iloc[-1]
+    trade_stats = trades.groupby("Ticker")["return"].agg(["count", lambda r: (r > 0).mean(), "mean"])
+    trade_stats.columns = ["trades", "hit_rate", "avg_trade_return"]
+    summary = pd.DataFrame({
+        "total_return": equity.iloc[-1] - 1,
+        "buy_hold_return": last_valid / first_valid - 1,
+        "max_drawdown": drawdown.min(),
+        "exposure": held.mean(),
+    }).join(trade_stats)
+    summary["trades"] = summary["trades"].fillna(0).astype(int)
+    
+    # Cartera equiponderada entre las posiciones abiertas (efectivo si no hay)
+    n_held = held.sum(axis=1)
+    portfolio_returns = (strategy.sum(axis=1) / n_held.replace(0, np.nan)).fillna(0.0)
+    portfolio_equity = (1 + portfolio_returns).cumprod()
+    years = max((closes.index[-1] - closes.index[0]).days / 365.25, 1e-9)
+    portfolio = {
+        "total_return": portfolio_equity.iloc[-1] - 1,
+        "cagr": portfolio_equity.iloc[-1] ** (1 / years) - 1,
+        "max_drawdown": (portfolio_equity / portfolio_equity.cummax() - 1).min(),
+        "hit_rate": (trades["return"] > 0).mean() if len(trades) else np.nan,
+        "trades": len(trades),
+        "exposure": (n_held > 0).mean(),
+    }
+    
+    return {
+        "summary": summary,
+        "portfolio": portfolio,
+        "equity": portfolio_equity,
+        "positions": positions,
+        "trend_states": trend_states,
+        "trades": trades,
+    }
+
+
+def load_backtest_data(tickers, period="10y"):
+    """
+    Descarga cierres en bloque y EPS anuales de cada ticker.
+    
+    Args:
+        tickers: Lista de símbolos
+        period: Período de historial de yfinance
+    
+    Returns:
+        Tupla (cierres ajustados por splits pero no por dividendos fechas x
+        tickers, cierres ajustados también por dividendos, {ticker: {fecha: eps}})
+    """
+    prices = yf.download(list(tickers), period=period, auto_adjust=False, progress=False,
+                         session=get_http_session())
+    
+    def column(name):
+        frame = prices[name] if isinstance(prices.columns, pd.MultiIndex) else prices[[name]]
+        if not isinstance(prices.columns, pd.MultiIndex):
+            frame.columns = list(tickers)[:1]
+        return frame
+    
+    closes = column("Close").dropna(axis=1, how="all")
+    adjusted = column("Adj Close").reindex(columns=closes.columns)
+    
+    eps_reports = {}
+    for symbol in closes.columns:
+        try:
+            eps_reports[symbol], _ = get_eps_points(symbol)
+        except Exception:
+            eps_reports[symbol] = {}
+    return closes, adjusted, eps_reports
+
+
+@st.cache_data(ttl=3600, show_spinner=False)
+def get_lynch_backtest(tickers, period="10y", entry_trends=None):
+    """
+    Backtest cacheado de la banda de Lynch para una lista de tickers.
+    
+    Args:
+        tickers: Tupla de símbolos
+        period: Período de historial de yfinance
+        entry_trends: Tupla de estados que permiten entrar (None = todos)
+    
+    Returns:
+        Diccionario devuelto por run_lynch_band_backtest, o None sin datos
+    """
+    closes, adjusted, eps_reports = load_backtest_data(tickers, period)
+    if closes.empty:
+        return None
+    return run_lynch_band_backtest(closes, eps_reports, entry_trends=entry_trends,
+                                   adjusted_closes=adjusted)
+
+
+def build_analysis_prompt(data, ticker):
+    """
+    Construye un prompt compacto clave:valor con los datos financieros.
+    
+    Sin decoración (emojis, reglas, viñetas) y sin los campos que faltan:
+    el modelo recibe solo datos y las instrucciones viven en la instrucción
+    de sistema. Las claves son neutras al idioma.
+    
+    Args:
+        data: StockSnapshot con los datos financieros
+        ticker: Símbolo del ticker
+        
+    Returns:
+        String con una línea `clave:valor` por dato disponible
+    """
+    def num(value, fmt="{:.2f}"):
+        return fmt_num(value, fmt, missing=None)
+    
+    def pct(value):
+        return fmt_num(value * 100, "{:.1f}%", missing=None)
+    
+    def large(value):
+        return format_large_number(value).lstrip("$") if has_value(value) else None
+    
+    # Ratio efectivo/deuda (inf = sin deuda)
+    cash_debt = data.cash_debt_ratio()
+    cash_debt = "no_debt" if cash_debt == float('inf') else num(cash_debt)
+    
+    yield_pct = get_dividend_info(data)['yield_pct']
+    news = " | ".join(n.get('title', '').strip() for n in data.noticias[:3] if n.get('title'))
+    
+    fields = (
+        ("ticker", ticker),
+        ("name", data.nombre),
+        ("sector", data.sector),
+        ("industry", data.industria),
+        ("country", data.pais),
+        ("currency", data.moneda),
+        ("mcap", large(data.market_cap)),
+        ("employees", num(data.num_empleados, "{:.0f}")),
+        ("price", num(data.precio_actual)),
+        ("target", num(data.precio_objetivo)),
+        ("high_52w", num(data.precio_52w_high)),
+        ("low_52w", num(data.precio_52w_low)),
+        ("pe_ttm", num(data.per_trailing)),
+        ("pe_fwd", num(data.per_forward)),
+        ("peg", num(data.peg_ratio)),
+        ("pb", num(data.price_to_book)),
+        ("ps", num(data.price_to_sales)),
+        ("div_yield", fmt_num(yield_pct, "{:.2f}%", missing=None) if yield_pct is not None else None),
+        ("div_rate", num(data.dividend_rate)),
+        ("payout", pct(data.payout_ratio)),
+        ("debt", large(data.deuda_total)),
+        ("cash", large(data.efectivo_total)),
+        ("cash_debt", cash_debt),
+        ("debt_equity", num(data.deuda_equity)),
+        ("roe", pct(data.roe)),
+        ("margin", pct(data.margen_beneficio)),
+        ("eps_growth", pct(data.crecimiento_beneficios)),
+        ("rev_growth", pct(data.crecimiento_ingresos)),
+        ("beta", num(data.beta)),
+        ("news", news),
+    )
+    return "\n".join(f"{key}:{value}" for key, value in fields if value)
+
+
+# Líneas del prompt que cambian con cada refresco de la cotización
+PROMPT_QUOTE_KEYS = frozenset(("price", "high_52w", "low_52w", "div_yield"))
+
+
+def prompt_fingerprint(prompt):
+    """
+    Hash corto de un prompt sin sus líneas de cotización.
+    
+    Identifica el análisis de IA (trabajo en cola y veredicto guardado): un
+    refresco del precio no debe pagar otra llamada al modelo mientras los
+    fundamentales sigan siendo los mismos.
+    """
+    stable = "\n".join(line for line in prompt.splitlines()
+                       if line.partition(":")[0] not in PROMPT_QUOTE_KEYS)
+    return hashlib.sha256(stable.encode("utf-8")).hexdigest()[:16]
+
+
+# Fragmentos para estimar tokens: palabras y rachas de signos
+_TOKEN_PIECES = re.compile(r"\w+|[^\w\s]+")
+
+
+def estimate_tokens(text):
+    """
+    Estimación rápida de tokens BPE (≈4 bytes UTF-8 por token y fragmento).
+    
+    No sustituye al tokenizador del modelo, pero sirve para comparar
+    prompts entre sí y vigilar el consumo de cuota.
+    
+    Args:
+        text: Texto a medir
+    
+    Returns:
+        int: número aproximado de tokens
+    """
+    return sum(-(-len(piece.encode("utf-8")) // 4) for piece in _TOKEN_PIECES.findall(text))
+
+
+# =============================================================================
+# BACKENDS DE LLM (GROQ + SERVIDOR LOCAL COMPATIBLE CON OPENAI)
+# =============================================================================
+
+AI_MODEL = "llama-3.3-70b-versatile"
+# Servidor local opcional (llama.cpp, Ollama, vLLM...): URL base de la API /v1
+LOCAL_LLM_URL = os.environ.get("LYNCHPANEL_LOCAL_LLM_URL", "").rstrip("/")
+LOCAL_LLM_MODEL = os.environ.get("LYNCHPANEL_LOCAL_LLM_MODEL", "llama3.1")
+LOCAL_LLM_TIMEOUT = 120         # Segundos (los modelos locales son lentos)
+LLM_LATENCY_SMOOTHING = 0.3     # Peso de la última medida en la media móvil
+LLM_ERROR_COOLDOWN = 15         # Segundos sin usar un backend tras un fallo
+LLM_RATE_LIMIT_COOLDOWN = 60    # ... o tras agotar la cuota (HTTP 429)
+
+
+class LLMBackend:
+    """
+    Interfaz común de los proveedores de chat.
+    
+    Cada backend lleva su propia salud: latencia media (EWMA), número de
+    fallos seguidos y hasta cuándo queda en reposo tras un error.
+    """
+
+    name = "llm"
+
+    def __init__(self, model):
+        self.model = model
+        self.latency = None
+        self.failures = 0
+        self.cooldown_until = 0.0
+
+    @property
+    def label(self):
+        """Identificador 'backend:modelo' que se guarda con cada veredicto."""
+        return f"{self.name}:{self.model}"
+
+    def available(self, now=None):
+        """Indica si el backend no está en reposo por un fallo reciente."""
+        return (time.time() if now is None else now) >= self.cooldown_until
+
+    def record_success(self, seconds):
+        self.failures = 0
+        self.cooldown_until = 0.0
+        self.latency = seconds if self.latency is None else (
+            LLM_LATENCY_SMOOTHING * seconds + (1 - LLM_LATENCY_SMOOTHING) * self.latency)
+
+    def record_failure(self, error):
+        self.failures += 1
+        status = getattr(error, "status_code", None) or getattr(getattr(error, "response", None), "status_code", None)
+        base = LLM_RATE_LIMIT_COOLDOWN if status == 429 else LLM_ERROR_COOLDOWN
+        self.cooldown_until = time.time() + base * min(self.failures, 4)
+
+    def complete(self, system, prompt, **options):
+        """Devuelve el contenido de la respuesta (a implementar por cada backend)."""
+        raise NotImplementedError
+
+
+class GroqBackend(LLMBackend):
+    """API de Groq (Llama 3.3 70B, gratuito y muy potente)."""
+
+    name = "groq"
+
+    def __init__(self, api_key, model=AI_MODEL):
+        super().__init__(model)
+        self.client = Groq(api_key=api_key)
+
+    def complete(self, system, prompt, **options):
+        chat_completion = self.client.chat.completions.create(
+            messages=[
+                {"role": "system", "content": system},
+                {"role": "user", "content": prompt},
+            ],
+            model=self.model,
+            **options,
+        )
+        return chat_completion.choices[0].message.content
+
+
+class OpenAICompatibleBackend(LLMBackend):
+    """Servidor con la API /v1/chat/completions de OpenAI (llama.cpp, Ollama...)."""
+
+    name = "local"
+
+    def __init__(self, base_url, model=LOCAL_LLM_MODEL, api_key=None, timeout=LOCAL_LLM_TIMEOUT):
+        super().__init__(model)
+        self.base_url = base_url.rstrip("/")
+        self.api_key = api_key
+        self.timeout = timeout
+
+    def complete(self, system, prompt, **options):
+        headers = {"Authorization": f"Bearer {self.api_key}"} if self.api_key else {}
+        response = requests.post(
+            f"{self.base_url}/chat/completions",
+            json={
+                "model": self.model,
+                "messages": [
+                    {"role": "system", "content": system},
+                    {"role": "user", "content": prompt},
+                ],
+                **options,
+            },
+            headers=headers,
+            timeout=self.timeout,
+        )
+        response.raise_for_status()
+        return response.json()["choices"][0]["message"]["content"]
+
+
+class LLMRouter:
+    """
+    Reparte las llamadas entre backends con conmutación automática.
+    
+    Se prueba primero el backend disponible más rápido (los aún no medidos
+    van delante, en el orden configurado, para obtener su latencia); si
+    falla o está sin cuota pasa a reposo y se intenta el siguiente
+    disponible. Los que están en reposo no se llaman mientras haya alguno
+    disponible, aunque fallen todos los disponibles: la llamada falla y se
+    respeta el reposo. Solo cuando al empezar la llamada están todos en
+    reposo se prueban igualmente, por orden de fin del reposo.
+    """
+
+    def __init__(self, backends):
+        self.backends = list(backends)
+        self._lock = threading.Lock()
+
+    def ranked(self):
+        """Backends a probar en la próxima llamada (en reposo solo si no hay otros)."""
+        with self._lock:
+            now = time.time()
+            order = {id(backend): i for i, backend in enumerate(self.backends)}
+            ready = [b for b in self.backends if b.available(now)]
+            if not ready:
+                return sorted(self.backends, key=lambda b: b.cooldown_until)
+            return sorted(ready, key=lambda b: (b.latency is not None, b.latency or 0.0, order[id(b)]))
+
+    def complete(self, system, prompt, **options):
+        """
+        Completa el chat con el primer backend que responda.
+        
+        Returns:
+            Tupla (contenido, etiqueta 'backend:modelo')
+        
+        Raises:
+            RuntimeError: si no hay backends configurados
+            OperationCancelled: si el trabajo fue superado antes de llamar
+            Exception: el error del último backend si fallan todos
+        """
+        if not self.backends:
+            raise RuntimeError("no LLM backend configured")
+        error = None
+        for backend in self.ranked():
+            check_cancelled()
+            start = time.perf_counter()
+            try:
+                content = backend.complete(system, prompt, **options)
+            except Exception as e:
+                with self._lock:
+                    backend.record_failure(e)
+                error = e
+                continue
+            with self._lock:
+                backend.record_success(time.perf_counter() - start)
+            return content, backend.label
+        raise error
+
+    def stats(self):
+        """Estado de cada backend (para diagnóstico)."""
+        with self._lock:
+            return [{"backend": b.label, "latency": b.latency, "failures": b.failures,
+                     "available": b.available()} for b in self.backends]
+
+
+def ai_configured(api_key):
+    """Indica si hay algún backend de IA (Groq con clave o servidor local)."""
+    return bool(api_key) or bool(LOCAL_LLM_URL)
+
+
+@st.cache_resource(show_spinner=False)
+def get_llm_router(api_key):
+    """
+    Router de LLM compartido (uno por API Key), con su estado de salud.
+    
+    Args:
+        api_key: API Key de Groq (vacía = solo servidor local)
+    
+    Returns:
+        LLMRouter con Groq y, si está configurado, el servidor local
+    """
+    backends = []
+    if api_key:
+        backends.append(GroqBackend(api_key))
+    if LOCAL_LLM_URL:
+        backends.append(OpenAICompatibleBackend(LOCAL_LLM_URL))
+    return LLMRouter(backends)
+
+
+def _chat_completion(prompt, api_key, system, **options):
+    """
+    Llamada de chat a través del router de backends.
+    
+    Args:
+        prompt: Mensaje de usuario
+        api_key: API Key de Groq
+        system: Instrucción del sistema
+        **options: Parámetros extra de la API (temperature, max_tokens...)
+    
+    Returns:
+        Tupla (contenido de la respuesta, etiqueta 'backend:modelo')
+    """
+    return get_llm_router(api_key or "").complete(system, prompt, **options)
+
+
+def get_ai_analysis(prompt, api_key, lang=None):
+    """
+    Envía el prompt a la API de Groq y obtiene el análisis.
+    
+    Puede ejecutarse fuera del hilo del script (cola de análisis), por eso
+    el idioma se pasa explícitamente en lugar de leerse de la sesión.
+    
+    Args:
+        prompt: Prompt con los datos financieros
+        api_key: API Key de Groq
+        lang: Código de idioma (None = idioma ligado a la ejecución)
+        
+    Returns:
+        String con el análisis generado
+    
+    Raises:
+        Exception: el error de la API se propaga para que la cola no lo guarde
+        como resultado y el siguiente rerun lo reintente
+    """
+    content, _ = _chat_completion(prompt, api_key, get_system_instruction(lang),
+                                  temperature=0.7, max_tokens=2048)
+    return content
+
+
+def _load_json_object(text):
+    """Decodifica un objeto JSON devuelto por el modelo (ValueError si no lo es)."""
+    try:
+        payload = json.loads(text)
+    except (TypeError, json.JSONDecodeError) as e:
+        raise ValueError(f"invalid JSON: {e}") from None
+    if not isinstance(payload, dict):
+        raise ValueError("expected a JSON object")
+    return payload
 
 
-def safe_get(data_dict, key, default="N/A"):
+def parse_structured_verdict(text):
     """
-    Obtiene un valor de un diccionario de forma segura.
+    Valida la respuesta JSON del modo estructurado.
     
     Args:
-        data_dict: Diccionario de datos
-        key: Clave a buscar
-        default: Valor por defecto si no existe
-        
+        text: Contenido devuelto por el modelo
+    
     Returns:
-        Valor encontrado o default
+        dict validado por validate_verdict
+    
+    Raises:
+        ValueError: si el JSON no es válido o no cumple el esquema
     """
-    try:
-        value = data_dict.get(key)
-        if value is None or (isinstance(value, float) and pd.isna(value)):
-            return default
-        return value
-    except (KeyError, TypeError, AttributeError):
-        return default
+    return validate_verdict(_load_json_object(text))
 
 
-def analyze_trend_robust(price_data, period_days=90):
+def validate_verdict(payload):
     """
-    Analiza la tendencia de precios usando Regresión Lineal, SMA_50 y SMA_200.
+    Valida un veredicto ya decodificado.
     
-    Incorpora SMA_200 como filtro de tendencia de largo plazo para evitar falsos positivos.
+    Se aceptan variaciones menores (mayúsculas, guiones, confianza en 0-100)
+    pero cualquier valor fuera de VERDICT_SCHEMA se rechaza: un veredicto
+    guardado siempre es consultable sin volver a interpretarlo.
     
-    Clasifica en 5 estados (jerarquía):
-    - 🚀 STRONG_BULLISH: Slope > 0, Price > SMA50, Price > SMA200 (tendencia sana)
-    - 🔄 POTENTIAL_REVERSAL: Slope > 0, Price > SMA50, Price < SMA200 (rebote en bajista)
-    - ⚠️ BULL_TRAP: Slope > 0, Price < SMA50 (subida débil, sin fuerza)
-    - 🐻 BEARISH: Price < SMA50 (bajista)
-    - 💀 STRONG_BEARISH: Slope < -0.1, Price < SMA50, Price < SMA200 (caída libre)
+    Args:
+        payload: Diccionario con los campos del veredicto
+    
+    Returns:
+        dict con classification, peg_assessment, debt_assessment, verdict,
+        confidence (0-1) y rationale
+    
+    Raises:
+        ValueError: si falta algún campo o tiene un valor no permitido
+    """
+    if not isinstance(payload, dict):
+        raise ValueError("expected a JSON object")
+    verdict = {}
+    for field, allowed in VERDICT_SCHEMA.items():
+        value = str(payload.get(field, "")).strip().replace("-", "_").replace(" ", "_")
+        value = value.upper() if field == "verdict" else value.lower()
+        if value not in allowed:
+            raise ValueError(f"{field}={payload.get(field)!r} not in {allowed}")
+        verdict[field] = value
+    
+    confidence = to_float(payload.get("confidence"))
+    if has_value(confidence) and 1 < confidence <= 100:
+        confidence /= 100
+    if not has_value(confidence) or not 0 <= confidence <= 1:
+        raise ValueError(f"confidence={payload.get('confidence')!r} out of range")
+    verdict["confidence"] = confidence
+    verdict["rationale"] = str(payload.get("rationale") or "").strip()
+    return verdict
+
+
+def get_ai_verdict(prompt, api_key, lang=None):
+    """
+    Pide al modelo el veredicto estructurado en modo JSON.
     
     Args:
-        price_data: DataFrame con columna 'Close' e índice de fechas
-        period_days: Días naturales para calcular pendiente (default 90)
-        
+        prompt: Prompt con los datos financieros
+        api_key: API Key de Groq
+        lang: Código de idioma (None = idioma ligado a la ejecución)
+    
     Returns:
-        dict con: trend_state, icon, color, slope_pct, sma_50, sma_200, 
-                  is_above_sma50, is_above_sma200, dist_to_high_pct, description
+        dict validado por parse_structured_verdict
+    
+    Raises:
+        ValueError: si la respuesta no cumple el esquema
     """
-    result = {
-        'trend_state': 'bearish',
-        'trend_text': 'BEARISH',
-        'icon': '🐻',
-        'color': '#FF6B6B',
-        'slope_pct': 0.0,
-        'slope_daily': 0.0,
-        'sma_50': None,
-        'sma_200': None,
-        'price_vs_sma': 'N/A',
-        'is_above_sma': None,
-        'is_above_sma50': None,
-        'is_above_sma200': None,
-        'dist_to_high_pct': None,
-        'high_52w': None,
-        'description': ''
-    }
+    content, model = _chat_completion(
+        prompt, api_key, get_system_instruction(lang, structured=True),
+        temperature=0.2, max_tokens=400, response_format={"type": "json_object"},
+    )
+    return {**parse_structured_verdict(content), "model": model}
+
+
+AI_BATCH_SIZE = 8                 # Empresas por petición en los lotes
+AI_BATCH_TOKENS_PER_TICKER = 200  # Presupuesto de respuesta por empresa
+
+
+def build_batch_prompt(prompts):
+    """
+    Une varios prompts compactos en un único mensaje.
     
-    try:
-        if price_data is None or price_data.empty or len(price_data) < 20:
-            return result
-        
-        if 'Close' not in price_data.columns:
-            return result
-        
-        is_en = st.session_state.get('language', 'es') == 'en'
-        current_price = price_data['Close'].iloc[-1]
-        
-        # =====================================================================
-        # CÁLCULO DE MEDIAS MÓVILES
-        # =====================================================================
-        # SMA_50
-        if len(price_data) >= 50:
-            sma_50 = price_data['Close'].rolling(window=50).mean().iloc[-1]
-        else:
-            sma_50 = price_data['Close'].mean()
-        
-        # SMA_200 (usar SMA_50 como fallback si no hay suficientes datos)
-        if len(price_data) >= 200:
-            sma_200 = price_data['Close'].rolling(window=200).mean().iloc[-1]
-        else:
-            # Fallback: usar todos los datos disponibles o SMA_50
-            sma_200 = price_data['Close'].mean() if len(price_data) >= 50 else sma_50
-        
-        result['sma_50'] = sma_50
-        result['sma_200'] = sma_200
-        
-        # Posición respecto a SMAs
-        is_above_sma50 = current_price > sma_50
-        is_above_sma200 = current_price > sma_200
-        
-        result['is_above_sma50'] = is_above_sma50
-        result['is_above_sma200'] = is_above_sma200
-        result['is_above_sma'] = is_above_sma50  # Compatibilidad
-        result['price_vs_sma'] = 'above_sma' if is_above_sma50 else 'below_sma'
-        
-        # =====================================================================
-        # MÁXIMO DE 52 SEMANAS Y DISTANCIA
-        # =====================================================================
-        # Calcular máximo de últimas 52 semanas (252 días de trading aprox)
-        days_52w = min(252, len(price_data))
-        high_52w = price_data['Close'].tail(days_52w).max()
-        result['high_52w'] = high_52w
-        
-        # Distancia al máximo como porcentaje (negativo = por debajo)
-        dist_to_high_pct = ((current_price - high_52w) / high_52w) * 100 if high_52w > 0 else 0
-        result['dist_to_high_pct'] = dist_to_high_pct
-        
-        # =====================================================================
-        # REGRESIÓN LINEAL (Pendiente de 3 meses)
-        # =====================================================================
-        end_date = price_data.index.max()
-        start_date = end_date - pd.Timedelta(days=period_days)
-        recent_data = price_data[price_data.index >= start_date].copy()
-        
-        if len(recent_data) < 20:
-            recent_data = price_data.tail(50).copy()
-        
-        closes = recent_data['Close'].dropna().values
-        if len(closes) < 10:
-            return result
-        
-        x = np.arange(len(closes))
-        coefficients = np.polyfit(x, closes, 1)
-        slope = coefficients[0]
-        
-        avg_price = np.mean(closes)
-        slope_pct = (slope / avg_price) * 100 if avg_price > 0 else 0
-        
-        result['slope_daily'] = slope
-        result['slope_pct'] = slope_pct
-        
-        # =====================================================================
-        # ÁRBOL DE DECISIÓN - Con dist_to_high como filtro clave
-        # =====================================================================
-        # Umbrales
-        STRONG_BEAR_THRESHOLD = -0.10  # -0.10% diario = caída fuerte
-        NEAR_HIGH_THRESHOLD = -20      # -20% = cerca de máximos
-        
-        # Convertir dist_to_high a ratio para comparación
-        dist_ratio = dist_to_high_pct  # Ya está en porcentaje (-68 significa -68%)
-        
-        # 💀 STRONG BEARISH (Caída Libre):
-        # Pendiente muy negativa + bajo ambas SMAs
-        if slope_pct < STRONG_BEAR_THRESHOLD and not is_above_sma50 and not is_above_sma200:
-            result['trend_state'] = 'strong_bearish'
-            result['trend_text'] = get_text('strong_bearish')
-            result['icon'] = '💀'
-            result['color'] = '#FF006E'
-            result['description'] = 'Free fall: strong downtrend below all moving averages' if is_en else 'Caída libre: tendencia bajista fuerte bajo todas las medias'
-        
-        # 🚀 STRONG UPTREND (Alcista Fuerte):
-        # Slope > 0 + sobre SMA200 + CERCA DE MÁXIMOS (< -20%)
-        elif slope_pct > 0 and is_above_sma200 and dist_ratio > NEAR_HIGH_THRESHOLD:
-            result['trend_state'] = 'strong_uptrend'
-            result['trend_text'] = get_text('strong_uptrend')
-            result['icon'] = '🚀'
-            result['color'] = '#00FF9F'
-            result['description'] = 'Strong uptrend: rising and near 52-week highs' if is_en else 'Alcista fuerte: subiendo y cerca de máximos anuales'
-        
-        # 🏗️ RECOVERY (Recuperación / Formando Suelo):
-        # Slope > 0 + sobre SMA200 + LEJOS DE MÁXIMOS (> -20%)
-        # Esto captura casos como IOVA: cruzó SMA200 pero viene de -68%
-        elif slope_pct > 0 and is_above_sma200 and dist_ratio <= NEAR_HIGH_THRESHOLD:
-            result['trend_state'] = 'recovery'
-            result['trend_text'] = get_text('recovery')
-            result['icon'] = '🏗️'
-            result['color'] = '#4FC3F7'  # Azul claro (esperanza, no euforia)
-            result['description'] = 'Recovery phase: above SMA200 but far from highs' if is_en else 'Fase de recuperación: sobre SMA200 pero lejos de máximos'
-        
-        # ⚡ OVERSOLD BOUNCE (Rebote Técnico):
-        # Slope positivo PERO aún bajo SMA200 (rebote en tendencia bajista)
-        elif slope_pct > 0 and not is_above_sma200:
-            result['trend_state'] = 'oversold_bounce'
-            result['trend_text'] = get_text('oversold_bounce')
-            result['icon'] = '⚡'
-            result['color'] = '#FFB74D'  # Naranja (precaución)
-            result['description'] = 'Technical bounce: rising but still below SMA200' if is_en else 'Rebote técnico: subiendo pero aún bajo SMA200'
-        
-        # 📉 DOWNTREND (Bajista): Default cuando precio < SMA50
-        else:
-            result['trend_state'] = 'downtrend'
-            result['trend_text'] = get_text('downtrend')
-            result['icon'] = '📉'
-            result['color'] = '#FF6B6B'
-            result['description'] = 'Downtrend: price below key moving averages' if is_en else 'Tendencia bajista: precio bajo medias móviles clave'
-        
-        return result
-        
-    except Exception as e:
-        result['description'] = f"Error: {str(e)}"
-        return result
+    Args:
+        prompts: Diccionario {ticker: prompt de build_analysis_prompt}
+    
+    Returns:
+        String con una sección '## TICKER' por empresa
+    """
+    return "\n\n".join(f"## {ticker}\n{prompt}" for ticker, prompt in prompts.items())
 
 
-def get_stock_data(ticker_symbol):
+def get_ai_verdicts_batch(prompts, api_key, lang=None):
     """
-    Obtiene todos los datos financieros de una acción usando yfinance.
+    Pide en una sola llamada el veredicto estructurado de varias empresas.
+    
+    La instrucción del sistema se envía una vez por lote en lugar de una
+    vez por ticker, y la respuesta se reparte validando cada entrada por
+    separado: un ticker mal respondido no invalida al resto.
     
     Args:
-        ticker_symbol: Símbolo del ticker (ej: AAPL, KO, IBE.MC)
-        
+        prompts: Diccionario {ticker: prompt}
+        api_key: API Key de Groq
+        lang: Código de idioma (None = idioma ligado a la ejecución)
+    
     Returns:
-        Diccionario con todos los datos financieros o None si hay error
+        Diccionario {ticker: dict validado o ValueError}
+    
+    Raises:
+        ValueError: si la respuesta completa no es un objeto JSON
     """
-    try:
-        # Crear objeto ticker
-        ticker = yf.Ticker(ticker_symbol)
-        
-        # Obtener información general
-        info = ticker.info
-        
-        # Verificar que el ticker es válido
-        if not info or 'regularMarketPrice' not in info and 'currentPrice' not in info:
-            return None
-        
-        # Extraer métricas clave
-        data = {
-            # Información básica
-            "nombre": safe_get(info, "longName", safe_get(info, "shortName", ticker_symbol)),
-            "sector": safe_get(info, "sector"),
-            "industria": safe_get(info, "industry"),
-            "pais": safe_get(info, "country"),
-            "moneda": safe_get(info, "currency", "USD"),
-            
-            # Precios
-            "precio_actual": safe_get(info, "currentPrice", safe_get(info, "regularMarketPrice")),
-            "precio_objetivo": safe_get(info, "targetMeanPrice"),
-            "precio_52w_high": safe_get(info, "fiftyTwoWeekHigh"),
-            "precio_52w_low": safe_get(info, "fiftyTwoWeekLow"),
-            
-            # Ratios de valoración (CRUCIALES para Lynch)
-            "per_trailing": safe_get(info, "trailingPE"),
-            "per_forward": safe_get(info, "forwardPE"),
-            "trailing_peg_ratio": safe_get(info, "trailingPegRatio"),  # PEG calculado por Yahoo (más fiable)
-            "price_to_book": safe_get(info, "priceToBook"),
-            "price_to_sales": safe_get(info, "priceToSalesTrailing12Months"),
-            
-            # Dividendos - múltiples fuentes para mejor precisión
-            "dividend_yield": safe_get(info, "dividendYield"),  # Yield actual (decimal)
-            "trailing_annual_dividend_yield": safe_get(info, "trailingAnnualDividendYield"),  # Yield anual trailing
-            "dividend_rate": safe_get(info, "dividendRate"),  # Dividendo anual por acción
-            "last_dividend_value": safe_get(info, "lastDividendValue"),  # Último dividendo pagado
-            "last_dividend_date": safe_get(info, "lastDividendDate"),  # Fecha del último dividendo
-            "ex_dividend_date": safe_get(info, "exDividendDate"),  # Fecha ex-dividendo
-            "five_year_avg_dividend_yield": safe_get(info, "fiveYearAvgDividendYield"),
-            "payout_ratio": safe_get(info, "payoutRatio"),
-            
-            # Balance y deuda (datos básicos del info)
-            "deuda_total_info": safe_get(info, "totalDebt"),
-            "efectivo_total_info": safe_get(info, "totalCash"),
-            "deuda_equity": safe_get(info, "debtToEquity"),
-            
-            # Rentabilidad
-            "roe": safe_get(info, "returnOnEquity"),
-            "roa": safe_get(info, "returnOnAssets"),
-            "margen_beneficio": safe_get(info, "profitMargins"),
-            "margen_operativo": safe_get(info, "operatingMargins"),
-            
-            # Crecimiento - múltiples fuentes para mejor precisión
-            "crecimiento_beneficios": safe_get(info, "earningsGrowth"),
-            "crecimiento_ingresos": safe_get(info, "revenueGrowth"),
-            "crecimiento_beneficios_trimestral": safe_get(info, "earningsQuarterlyGrowth"),
-            "eps_actual": safe_get(info, "trailingEps"),
-            "eps_forward": safe_get(info, "forwardEps"),
-            "eps_current_year": safe_get(info, "epsCurrentYear"),
-            
-            # Tamaño
-            "market_cap": safe_get(info, "marketCap"),
-            "enterprise_value": safe_get(info, "enterpriseValue"),
-            "num_empleados": safe_get(info, "fullTimeEmployees"),
-            
-            # Beta (volatilidad)
-            "beta": safe_get(info, "beta"),
-        }
-        
-        # =====================================================================
-        # CALCULAR PEG RATIO - MÉTODO MEJORADO
-        # =====================================================================
-        # Prioridad:
-        # 1. trailingPegRatio de Yahoo Finance (ya calculado con 5Y growth)
-        # 2. Calcular manualmente con EPS forward growth anualizado a 5 años
-        
-        peg_final = None
-        peg_calculation = ""
-        growth_rate_used = None
-        per_used = None
-        
-        # Función helper para validar números
-        def is_valid_number(val):
-            if val is None or val == 'N/A':
-                return False
-            try:
-                v = float(val)
-                return not (pd.isna(v)) and v != 0
-            except:
-                return False
-        
-        # Obtener valores
-        per_trailing = data.get("per_trailing")
-        trailing_peg = data.get("trailing_peg_ratio")
-        eps_trailing = data.get("eps_actual")
-        eps_forward = data.get("eps_forward")
-        
-        # MÉTODO 1: Usar trailingPegRatio de Yahoo (el más fiable)
-        if is_valid_number(trailing_peg):
-            peg_val = float(trailing_peg)
-            if 0.1 <= peg_val <= 10:  # Validar rango razonable
-                peg_final = peg_val
-                # Calcular el growth implícito: Growth = PE / PEG
-                if is_valid_number(per_trailing):
-                    implied_growth = float(per_trailing) / peg_val
-                    peg_calculation = f"P/E: {float(per_trailing):.2f} ÷ Growth (5Y Est.): {implied_growth:.1f}% = PEG: {peg_val:.2f} (Yahoo Finance)"
-                    growth_rate_used = implied_growth
-                    per_used = float(per_trailing)
-                else:
-                    peg_calculation = f"PEG: {peg_val:.2f} (Yahoo Finance - trailingPegRatio)"
-        
-        # MÉTODO 2: Calcular con Forward EPS Growth si no hay trailingPegRatio
-        if peg_final is None and is_valid_number(per_trailing) and is_valid_number(eps_trailing) and is_valid_number(eps_forward):
-            pe = float(per_trailing)
-            eps_t = float(eps_trailing)
-            eps_f = float(eps_forward)
-            
-            if eps_t > 0 and eps_f > eps_t:
-                # Growth de 1 año
-                growth_1y = ((eps_f - eps_t) / eps_t) * 100
-                # Estimar growth anualizado a 5 años (más conservador)
-                # Asumimos que el growth disminuye gradualmente
-                growth_5y_est = growth_1y * 0.6  # Factor de ajuste conservador
-                
-                if growth_5y_est > 0:
-                    peg_final = pe / growth_5y_est
-                    peg_calculation = f"P/E: {pe:.2f} ÷ Growth Est. (5Y): {growth_5y_est:.1f}% = PEG: {peg_final:.2f} (Calculado)"
-                    growth_rate_used = growth_5y_est
-                    per_used = pe
-        
-        # MÉTODO 3: Intentar obtener growth de analyst estimates
-        if peg_final is None:
-            try:
-                growth_estimates = ticker.growth_estimates
-                if growth_estimates is not None and not growth_estimates.empty:
-                    # Buscar el crecimiento del próximo año (+1y) en stockTrend
-                    if '+1y' in growth_estimates.index and 'stockTrend' in growth_estimates.columns:
-                        growth_1y = growth_estimates.loc['+1y', 'stockTrend']
-                        if pd.notna(growth_1y) and is_valid_number(per_trailing):
-                            growth_pct = float(growth_1y) * 100
-                            if growth_pct > 0:
-                                pe = float(per_trailing)
-                                peg_final = pe / growth_pct
-                                peg_calculation = f"P/E: {pe:.2f} ÷ Growth Analyst (+1Y): {growth_pct:.1f}% = PEG: {peg_final:.2f}"
-                                growth_rate_used = growth_pct
-                                per_used = pe
-            except:
-                pass
-        
-        # Si aún no tenemos PEG, indicar por qué
-        if peg_final is None:
-            if is_valid_number(per_trailing):
-                peg_calculation = f"P/E: {float(per_trailing):.2f} ÷ Growth Rate: N/A = No calculable"
-                per_used = float(per_trailing)
-            else:
-                peg_calculation = "P/E y/o Growth Rate no disponibles"
-        
-        # Guardar resultados
-        data["peg_ratio"] = peg_final
-        data["peg_calculation"] = peg_calculation
-        data["growth_rate_used"] = growth_rate_used
-        data["per_used"] = per_used
-        
-        # Obtener historial de precios (5 años para tener datos completos)
-        try:
-            hist = ticker.history(period="5y")
-            # Limpiar el índice para evitar "Unnamed" en el gráfico
-            if not hist.empty:
-                hist.index.name = None
-                # Asegurar que el índice sea datetime
-                hist.index = pd.to_datetime(hist.index)
-            data["historico"] = hist
-        except Exception:
-            data["historico"] = pd.DataFrame()
-        
-        # Obtener noticias recientes (Scuttlebutt de Lynch)
-        try:
-            news = ticker.news
-            if news and len(news) > 0:
-                data["noticias"] = news[:5]  # Últimas 5 noticias
-            else:
-                data["noticias"] = []
-        except Exception:
-            data["noticias"] = []
-        
-        # =====================================================================
-        # CALCULAR RATIO EFECTIVO/DEUDA - MÉTODO MEJORADO
-        # =====================================================================
-        # Usamos datos del balance sheet trimestral para mayor precisión
-        # El ratio Efectivo/Deuda indica cuántas veces puede pagar su deuda
-        # con el efectivo disponible. Un ratio > 1 significa posición neta positiva.
-        
+    content, model = _chat_completion(
+        build_batch_prompt(prompts), api_key, get_system_instruction(lang, batch=True),
+        temperature=0.2, max_tokens=AI_BATCH_TOKENS_PER_TICKER * len(prompts),
+        response_format={"type": "json_object"},
+    )
+    payload = _load_json_object(content)
+    # El modelo puede cambiar mayúsculas o envolver todo en una clave extra
+    tickers = {ticker.upper() for ticker in prompts}
+    if len(payload) == 1 and str(next(iter(payload))).strip().upper() not in tickers:
+        inner = next(iter(payload.values()))
+        payload = inner if isinstance(inner, dict) else payload
+    entries = {str(key).strip().upper(): value for key, value in payload.items()}
+    
+    results = {}
+    for ticker in prompts:
         try:
-            balance_sheet = ticker.quarterly_balance_sheet
-            if not balance_sheet.empty:
-                latest_bs = balance_sheet.iloc[:, 0]  # Columna más reciente
-                
-                # Obtener deuda total del balance (más preciso)
-                deuda_total_bs = None
-                for field in ['Total Debt', 'TotalDebt']:
-                    if field in latest_bs.index and pd.notna(latest_bs.get(field)):
-                        deuda_total_bs = float(latest_bs[field])
-                        break
-                
-                # Obtener efectivo + inversiones a corto plazo (liquidez total)
-                efectivo_inversiones = None
-                for field in ['Cash Cash Equivalents And Short Term Investments', 
-                              'CashCashEquivalentsAndShortTermInvestments',
-                              'Cash And Cash Equivalents',
-                              'CashAndCashEquivalents']:
-                    if field in latest_bs.index and pd.notna(latest_bs.get(field)):
-                        efectivo_inversiones = float(latest_bs[field])
-                        break
-                
-                # Obtener Net Debt (ya calculado por yfinance si está disponible)
-                net_debt = None
-                for field in ['Net Debt', 'NetDebt']:
-                    if field in latest_bs.index and pd.notna(latest_bs.get(field)):
-                        net_debt = float(latest_bs[field])
-                        break
-                
-                # Guardar datos del balance
-                data["deuda_total_balance"] = deuda_total_bs
-                data["efectivo_inversiones_balance"] = efectivo_inversiones
-                data["net_debt"] = net_debt
-                data["balance_date"] = str(balance_sheet.columns[0].date()) if hasattr(balance_sheet.columns[0], 'date') else str(balance_sheet.columns[0])
-            else:
-                data["deuda_total_balance"] = None
-                data["efectivo_inversiones_balance"] = None
-                data["net_debt"] = None
-                data["balance_date"] = None
-        except Exception:
-            data["deuda_total_balance"] = None
-            data["efectivo_inversiones_balance"] = None
-            data["net_debt"] = None
-            data["balance_date"] = None
-        
-        # Determinar mejores valores para deuda y efectivo
-        # Prioridad: Balance Sheet > Info
-        data["deuda_total"] = data.get("deuda_total_balance") or data.get("deuda_total_info") or None
-        data["efectivo_total"] = data.get("efectivo_inversiones_balance") or data.get("efectivo_total_info") or None
-        
-        return data
-        
-    except Exception as e:
-        st.error(f"Error al obtener datos: {str(e)}")
-        return None
+            if ticker.upper() not in entries:
+                raise ValueError("missing from response")
+            results[ticker] = {**validate_verdict(entries[ticker.upper()]), "model": model}
+        except ValueError as e:
+            results[ticker] = e
+    return results
+
+
+class VerdictStore:
+    """
+    Caché SQLite de veredictos estructurados.
+    
+    Cada veredicto se guarda ya validado y en columnas, indexado por ticker,
+    idioma y hash del prompt: un prompt repetido no vuelve a llamar al
+    modelo, y pantallas o cuadros de mando pueden filtrar miles de
+    veredictos con una consulta SQL en lugar de reinterpretar texto.
+    """
+
+    COLUMNS = ("ticker", "lang", "prompt_hash", "created_at", *VERDICT_SCHEMA,
+               "confidence", "rationale", "model")
+
+    def __init__(self, path):
+        self.path = path
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False, timeout=30)
+        with self._lock, self._conn:
+            if path != ":memory:":
+                self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute("""
+                CREATE TABLE IF NOT EXISTS verdicts (
+                    ticker TEXT NOT NULL,
+                    lang TEXT NOT NULL,
+                    prompt_hash TEXT NOT NULL,
+                    created_at REAL NOT NULL,
+                    classification TEXT NOT NULL,
+                    peg_assessment TEXT NOT NULL,
+                    debt_assessment TEXT NOT NULL,
+                    verdict TEXT NOT NULL,
+                    confidence REAL NOT NULL,
+                    rationale TEXT,
+                    model TEXT,
+                    PRIMARY KEY (ticker, lang, prompt_hash)
+                )""")
+            self._conn.execute(
+                "CREATE INDEX IF NOT EXISTS verdicts_by_ticker ON verdicts (ticker, created_at)")
+            self._conn.execute(
+                "CREATE INDEX IF NOT EXISTS verdicts_by_verdict ON verdicts (verdict, confidence)")
+
+    def save(self, ticker, lang, prompt_hash, verdict, now=None):
+        """Guarda (o reemplaza) un veredicto validado."""
+        now = time.time() if now is None else now
+        row = (ticker, lang, prompt_hash, now, *(verdict[field] for field in VERDICT_SCHEMA),
+               verdict["confidence"], verdict.get("rationale", ""), verdict.get("model"))
+        with self._lock, self._conn:
+            self._conn.execute(
+                f"INSERT OR REPLACE INTO verdicts ({', '.join(self.COLUMNS)}) "
+                f"VALUES ({', '.join('?' for _ in self.COLUMNS)})", row)
+
+    def get(self, ticker, lang, prompt_hash):
+        """Veredicto guardado para un prompt concreto, o None."""
+        with self._lock:
+            row = self._conn.execute(
+                f"SELECT {', '.join(self.COLUMNS)} FROM verdicts "
+                "WHERE ticker = ? AND lang = ? AND prompt_hash = ?", (ticker, lang, prompt_hash)
+            ).fetchone()
+        return dict(zip(self.COLUMNS, row)) if row else None
+
+    def delete(self, ticker, lang, prompt_hash):
+        """Borra un veredicto guardado (para forzar su regeneración)."""
+        with self._lock, self._conn:
+            self._conn.execute(
+                "DELETE FROM verdicts WHERE ticker = ? AND lang = ? AND prompt_hash = ?",
+                (ticker, lang, prompt_hash))
+
+    def query(self, tickers=None, verdict=None, classification=None, min_confidence=None,
+              lang=None, latest_only=True):
+        """
+        Consulta veredictos guardados.
+        
+        Args:
+            tickers: Lista de tickers (None = todos)
+            verdict: 'BUY', 'SELL' o 'HOLD'
+            classification: Código de clasificación (ver VERDICT_SCHEMA)
+            min_confidence: Confianza mínima (0-1)
+            lang: Código de idioma
+            latest_only: Solo el veredicto más reciente por ticker e idioma
+        
+        Returns:
+            DataFrame con una fila por veredicto, del más reciente al más antiguo
+        """
+        conditions, params = [], []
+        if tickers:
+            conditions.append(f"ticker IN ({', '.join('?' for _ in tickers)})")
+            params.extend(tickers)
+        for column, value in (("verdict", verdict), ("classification", classification), ("lang", lang)):
+            if value is not None:
+                conditions.append(f"{column} = ?")
+                params.append(value)
+        if min_confidence is not None:
+            conditions.append("confidence >= ?")
+            params.append(float(min_confidence))
+        if latest_only:
+            conditions.append(
+                "created_at = (SELECT MAX(created_at) FROM verdicts AS newer "
+                "WHERE newer.ticker = verdicts.ticker AND newer.lang = verdicts.lang)")
+        where = f"WHERE {' AND '.join(conditions)}" if conditions else ""
+        with self._lock:
+            rows = self._conn.execute(
+                f"SELECT {', '.join(self.COLUMNS)} FROM verdicts {where} ORDER BY created_at DESC",
+                params
+            ).fetchall()
+        return pd.DataFrame(rows, columns=list(self.COLUMNS))
+
+
+@st.cache_resource(show_spinner=False)
+def get_verdict_store():
+    """
+    Caché de veredictos compartida por todas las sesiones del proceso.
+    
+    Returns:
+        VerdictStore en DATA_DIR (o en memoria si no se puede escribir)
+    """
+    try:
+        os.makedirs(DATA_DIR, exist_ok=True)
+        return VerdictStore(os.path.join(DATA_DIR, "verdicts.sqlite3"))
+    except (OSError, sqlite3.Error):
+        return VerdictStore(":memory:")
 
 
-def get_insider_data(ticker_symbol):
+def run_structured_verdict(ticker, lang, prompt_hash, prompt, api_key):
     """
-    Obtiene datos de insiders e institucionales de una acción.
+    Veredicto estructurado con caché: solo llama al modelo si no está guardado.
     
     Args:
-        ticker_symbol: Símbolo del ticker (ej: AAPL, KO)
-        
+        ticker: Símbolo del ticker
+        lang: Código de idioma
+        prompt_hash: Hash del prompt (último elemento de AIJobQueue.job_key)
+        prompt: Prompt con los datos financieros
+        api_key: API Key de Groq
+    
     Returns:
-        Diccionario con datos de insiders, institucionales y transacciones
+        dict con el veredicto guardado
     """
-    try:
-        ticker = yf.Ticker(ticker_symbol)
-        
-        insider_data = {
-            "major_holders": None,
-            "institutional_holders": None,
-            "insider_transactions": None,
-            "ownership_info": None,  # Datos precisos del ticker.info
-        }
-        
-        # Obtener datos precisos de propiedad desde ticker.info
-        try:
-            info = ticker.info
-            ownership_info = {}
-            
-            # Shares Outstanding (total de acciones) - Dato base fiable
-            shares_outstanding = None
-            if 'sharesOutstanding' in info and info['sharesOutstanding'] is not None:
-                shares_outstanding = info['sharesOutstanding']
-                ownership_info['shares_outstanding'] = shares_outstanding
-            
-            # Float Shares (acciones disponibles para negociar)
-            float_shares = None
-            if 'floatShares' in info and info['floatShares'] is not None:
-                float_shares = info['floatShares']
-                ownership_info['float_shares'] = float_shares
-            
-            # MÉTODO MEJORADO: Calcular participación de insiders
-            # Fórmula: (Shares Outstanding - Float Shares) / Shares Outstanding
-            # Esto da las acciones NO disponibles para el público (restricted/insider shares)
-            insiders_pct_calculated = None
-            if shares_outstanding and float_shares and shares_outstanding > 0:
-                restricted_shares = shares_outstanding - float_shares
-                if restricted_shares >= 0:
-                    insiders_pct_calculated = restricted_shares / shares_outstanding
-                    ownership_info['insiders_percent_calculated'] = insiders_pct_calculated
-            
-            # Obtener también el valor de Yahoo para comparar
-            if 'heldPercentInsiders' in info and info['heldPercentInsiders'] is not None:
-                ownership_info['insiders_percent_yahoo'] = info['heldPercentInsiders']
-            
-            # Usar el valor calculado como principal (más fiable), con fallback a Yahoo
-            if insiders_pct_calculated is not None:
-                ownership_info['insiders_percent'] = insiders_pct_calculated
-                ownership_info['insiders_method'] = 'calculated'
-            elif 'insiders_percent_yahoo' in ownership_info:
-                ownership_info['insiders_percent'] = ownership_info['insiders_percent_yahoo']
-                ownership_info['insiders_method'] = 'yahoo'
-            
-            # Participación Institucional (%) - este dato suele ser más fiable
-            if 'heldPercentInstitutions' in info and info['heldPercentInstitutions'] is not None:
-                ownership_info['institutions_percent'] = info['heldPercentInstitutions']
-            
-            # Implied Shares Outstanding (puede ser diferente por dilución)
-            if 'impliedSharesOutstanding' in info and info['impliedSharesOutstanding'] is not None:
-                ownership_info['implied_shares'] = info['impliedSharesOutstanding']
-            
-            # Short Interest
-            if 'sharesShort' in info and info['sharesShort'] is not None:
-                ownership_info['shares_short'] = info['sharesShort']
-            
-            if 'shortRatio' in info and info['shortRatio'] is not None:
-                ownership_info['short_ratio'] = info['shortRatio']
-            
-            if 'shortPercentOfFloat' in info and info['shortPercentOfFloat'] is not None:
-                ownership_info['short_percent_float'] = info['shortPercentOfFloat']
-            
-            if 'sharesShortPriorMonth' in info and info['sharesShortPriorMonth'] is not None:
-                ownership_info['shares_short_prior'] = info['sharesShortPriorMonth']
-            
-            if 'dateShortInterest' in info and info['dateShortInterest'] is not None:
-                ownership_info['short_interest_date'] = info['dateShortInterest']
-            
-            if ownership_info:
-                insider_data["ownership_info"] = ownership_info
-                
-        except:
-            pass
-        
-        # Obtener Major Holders como respaldo
-        try:
-            major = ticker.major_holders
-            if major is not None and not major.empty:
-                insider_data["major_holders"] = major
-        except:
-            pass
-        
-        # Obtener Institutional Holders (fondos, ETFs, etc.)
-        try:
-            institutional = ticker.institutional_holders
-            if institutional is not None and not institutional.empty:
-                insider_data["institutional_holders"] = institutional
-        except:
-            pass
-        
-        # Obtener transacciones de insiders
-        try:
-            insider_trans = ticker.insider_transactions
-            if insider_trans is not None and not insider_trans.empty:
-                insider_data["insider_transactions"] = insider_trans
-        except:
-            pass
-        
-        return insider_data
-        
-    except Exception as e:
-        return None
+    store = get_verdict_store()
+    cached = store.get(ticker, lang, prompt_hash)
+    if cached is not None:
+        return cached
+    store.save(ticker, lang, prompt_hash, get_ai_verdict(prompt, api_key, lang))
+    return store.get(ticker, lang, prompt_hash)
 
 
-def get_peter_lynch_chart_data(ticker_symbol):
+def run_batch_verdicts(items, lang, api_key, batch_size=AI_BATCH_SIZE):
     """
-    Genera los datos para el Gráfico de Valoración Dinámica de Peter Lynch.
+    Veredictos estructurados de una lista de tickers, agrupados en lotes.
     
-    Características:
-    - Interpolación lineal suave (sin efecto escalera)
-    - Proyección a 1 año usando Forward EPS
-    - Línea de Valor Conservador (PEG=1) como referencia de suelo
-    - Técnicas vectorizadas (sin bucles for, sin sumar enteros a fechas)
+    Los tickers ya guardados (mismo prompt) no se vuelven a pedir; el resto
+    se envía en grupos de `batch_size` y cada veredicto válido se guarda
+    por separado, con el mismo hash que usa el análisis individual.
     
     Args:
-        ticker_symbol: Símbolo del ticker (ej: AAPL, MSFT)
-        
+        items: Lista de (ticker, hash del prompt, prompt)
+        lang: Código de idioma
+        api_key: API Key de Groq
+        batch_size: Empresas por petición
+    
     Returns:
-        Diccionario con datos para el gráfico
+        dict con 'verdicts' {ticker: veredicto}, 'errors' {ticker: mensaje},
+        'requests' (llamadas hechas) y 'cached' (tickers servidos de caché)
     """
-    try:
-        ticker = yf.Ticker(ticker_symbol)
-        
-        result = {
-            "price_history": None,
-            "fair_value_line": None,
-            "conservative_value_line": None,  # Nueva línea PEG=1
-            "fair_multiplier": 15,
-            "conservative_multiplier": 15,  # Basado en growth rate
-            "growth_rate": None,
-            "has_data": False,
-            "method": None,
-            "error": None,
-            "has_projection": False,
-            "forward_eps": None,
-            "trailing_eps": None
-        }
-        
-        # =====================================================================
-        # PASO 1: Extraer historial de precios (5 años)
-        # =====================================================================
+    store = get_verdict_store()
+    result = {"verdicts": {}, "errors": {}, "requests": 0, "cached": 0}
+    pending = []
+    for ticker, prompt_hash, prompt in items:
+        cached = store.get(ticker, lang, prompt_hash)
+        if cached is not None:
+            result["verdicts"][ticker] = cached
+            result["cached"] += 1
+        else:
+            pending.append((ticker, prompt_hash, prompt))
+    
+    for start in range(0, len(pending), batch_size):
+        chunk = pending[start:start + batch_size]
+        hashes = {ticker: prompt_hash for ticker, prompt_hash, _ in chunk}
+        result["requests"] += 1
         try:
-            price_hist = ticker.history(period="5y")
-            if price_hist.empty:
-                result["error"] = "No price history available"
-                return result
-            
-            # Limpiar índice de timezone
-            price_hist.index = pd.to_datetime(price_hist.index)
-            if price_hist.index.tz is not None:
-                price_hist.index = price_hist.index.tz_localize(None)
-            
-            prices_df = price_hist[['Close']].copy().dropna()
-            
-            if len(prices_df) < 50:
-                result["error"] = "Insufficient price data"
-                return result
-                
+            answers = get_ai_verdicts_batch({ticker: prompt for ticker, _, prompt in chunk}, api_key, lang)
         except Exception as e:
-            result["error"] = f"Error fetching prices: {str(e)}"
-            return result
-        
-        # =====================================================================
-        # PASO 2: Extraer datos de EPS históricos
-        # =====================================================================
-        eps_points = {}  # {fecha: eps_value}
-        method_used = None
-        
-        # Intentar obtener EPS de múltiples fuentes
-        for source_name, source_func in [
-            ("financials", lambda: ticker.financials),
-            ("income_stmt", lambda: ticker.income_stmt),
-        ]:
-            if eps_points:
-                break
-            try:
-                data_source = source_func()
-                if data_source is not None and not data_source.empty:
-                    for field in ['Basic EPS', 'Diluted EPS', 'BasicEPS', 'DilutedEPS']:
-                        if field in data_source.index:
-                            eps_row = data_source.loc[field].dropna()
-                            for date, value in eps_row.items():
-                                if pd.notna(value) and value > 0:
-                                    clean_date = pd.to_datetime(date)
-                                    if hasattr(clean_date, 'tz') and clean_date.tz is not None:
-                                        clean_date = clean_date.tz_localize(None)
-                                    eps_points[clean_date] = float(value)
-                            if eps_points:
-                                method_used = source_name
-                                break
-            except:
-                pass
-        
-        # Fallback: usar EPS actual
-        if len(eps_points) < 2:
-            try:
-                info = ticker.info
-                trailing_eps = info.get('trailingEps')
-                if trailing_eps and trailing_eps > 0:
-                    # Asignar a la fecha más reciente del historial
-                    eps_points[prices_df.index[-1]] = float(trailing_eps)
-                    # Y a una fecha anterior para tener al menos 2 puntos
-                    eps_points[prices_df.index[0]] = float(trailing_eps)
-                    method_used = "current_eps_only"
-            except:
-                pass
-        
-        if len(eps_points) < 2:
-            result["error"] = "No EPS data available"
-            return result
-        
-        # =====================================================================
-        # PASO 3: Obtener Forward EPS y Trailing EPS para proyección y growth
-        # =====================================================================
-        forward_eps = None
-        trailing_eps = None
-        growth_rate = None
-        
-        try:
-            info = ticker.info
-            forward_eps = info.get('forwardEps')
-            trailing_eps = info.get('trailingEps')
-            
-            if forward_eps and forward_eps > 0:
-                result["forward_eps"] = forward_eps
-            if trailing_eps and trailing_eps > 0:
-                result["trailing_eps"] = trailing_eps
-            
-            # Calcular tasa de crecimiento esperada
-            if forward_eps and trailing_eps and trailing_eps > 0:
-                growth_rate = (forward_eps - trailing_eps) / trailing_eps
-                result["growth_rate"] = growth_rate
-        except:
-            pass
-        
-        # =====================================================================
-        # PASO 4: Crear rango de fechas extendido (histórico + 1 año futuro)
-        # =====================================================================
-        last_price_date = prices_df.index.max()
-        first_price_date = prices_df.index.min()
-        
-        # IMPORTANTE: Usar pd.date_range para fechas futuras (NUNCA sumar enteros)
-        future_dates = pd.date_range(
-            start=last_price_date,
-            periods=365,  # ~1 año (más realista)
-            freq='D'
-        )
+            result["errors"].update({ticker: str(e) for ticker in hashes})
+            continue
+        for ticker, answer in answers.items():
+            if isinstance(answer, Exception):
+                result["errors"][ticker] = str(answer)
+                continue
+            store.save(ticker, lang, hashes[ticker], answer)
+            result["verdicts"][ticker] = store.get(ticker, lang, hashes[ticker])
+    return result
+
+
+# =============================================================================
+# COLA DE ANÁLISIS IA EN SEGUNDO PLANO
+# =============================================================================
+
+AI_WORKERS = 4            # Llamadas simultáneas al modelo
+AI_JOB_HISTORY = 256      # Resultados terminados que se conservan
+AI_POLL_SECONDS = 1.5     # Intervalo de sondeo de la interfaz
+
+
+class AIJobQueue:
+    """
+    Pool de hilos para los análisis IA, independiente del hilo del script.
+    
+    Cada trabajo se identifica por (ticker, idioma, modo, hash del prompt sin
+    la cotización): enviar dos veces el mismo prompt, aunque el precio se haya
+    refrescado entre medias, reutiliza el trabajo en curso o su resultado,
+    y un rerun de Streamlit no cancela ni descarta una respuesta ya pagada.
+    Los trabajos enviados con `owner` se cancelan cuando todas las sesiones
+    que los pidieron pasan a otro ticker (ver release).
+    Se conservan los últimos AI_JOB_HISTORY resultados terminados.
+    """
+
+    def __init__(self, max_workers=AI_WORKERS, history=AI_JOB_HISTORY):
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="ai-verdict")
+        self._jobs = OrderedDict()
+        self._owners = {}
+        self._tokens = {}
+        self._lock = threading.Lock()
+        self._history = history
+
+    @staticmethod
+    def job_key(ticker, lang, prompt, mode="text"):
+        """Clave del trabajo: (ticker, idioma, modo, prompt_fingerprint del prompt)."""
+        return (ticker, lang, mode, prompt_fingerprint(prompt))
+
+    def submit(self, key, fn, *args, owner=None, **kwargs):
+        """
+        Encola `fn(*args, **kwargs)` salvo que ya exista un trabajo válido.
         
-        # Crear índice completo: histórico + futuro
-        full_date_range = pd.date_range(
-            start=first_price_date,
-            end=future_dates[-1],
-            freq='D'
-        )
+        Args:
+            owner: Sesión que espera el resultado (None = nunca se cancela)
         
-        # =====================================================================
-        # PASO 5: Construir Serie de EPS con puntos conocidos + proyección
-        # =====================================================================
-        # Crear DataFrame vacío con todas las fechas
-        eps_df = pd.DataFrame(index=full_date_range, columns=['EPS'])
-        eps_df['EPS'] = np.nan
-        
-        # Asignar valores de EPS históricos a sus fechas
-        for date, eps_value in eps_points.items():
-            # Encontrar la fecha más cercana en el índice
-            if date in eps_df.index:
-                eps_df.loc[date, 'EPS'] = eps_value
+        Returns:
+            concurrent.futures.Future del trabajo (nuevo o existente)
+        """
+        with self._lock:
+            future = self._jobs.get(key)
+            if future is None or future.cancelled() or (future.done() and future.exception() is not None):
+                token = self._tokens[key] = CancelToken(key[0])
+                future = self._jobs[key] = self._executor.submit(run_with_token, token, fn, *args, **kwargs)
+                self._owners.pop(key, None)
+                self._evict()
             else:
-                # Buscar fecha más cercana
-                nearest_idx = eps_df.index.get_indexer([date], method='nearest')[0]
-                eps_df.iloc[nearest_idx, 0] = eps_value
-        
-        # Añadir Forward EPS al final del período futuro (1 año)
-        if forward_eps and forward_eps > 0:
-            # Asignar forward EPS al final del período de proyección
-            future_eps_date = future_dates[-1]  # Final del año de proyección
-            eps_df.loc[future_eps_date, 'EPS'] = forward_eps
-            result["has_projection"] = True
-        
-        # =====================================================================
-        # PASO 6: INTERPOLACIÓN SUAVE (método 'time' para series temporales)
-        # =====================================================================
-        # Primero, interpolar linealmente entre puntos conocidos
-        eps_df['EPS'] = eps_df['EPS'].interpolate(method='time')
-        
-        # Rellenar extremos si quedan NaN
-        eps_df['EPS'] = eps_df['EPS'].ffill().bfill()
-        
-        # Filtrar solo valores positivos
-        eps_df = eps_df[eps_df['EPS'] > 0]
-        
-        if eps_df.empty:
-            result["error"] = "No valid EPS after interpolation"
-            return result
-        
-        # =====================================================================
-        # PASO 7: Calcular Fair PE Multiplier (mediana histórica)
-        # =====================================================================
-        # Solo usar el período histórico para calcular el multiplicador
-        historical_mask = eps_df.index <= last_price_date
-        
-        # Combinar precios con EPS interpolado (solo histórico)
-        historical_df = eps_df[historical_mask].copy()
-        historical_df = historical_df.join(prices_df, how='inner')
-        
-        fair_multiplier = 15  # Default
-        
-        if len(historical_df) > 20:
-            try:
-                historical_df['PE'] = historical_df['Close'] / historical_df['EPS']
-                valid_pe = historical_df['PE'].replace([np.inf, -np.inf], np.nan).dropna()
-                valid_pe = valid_pe[(valid_pe > 0) & (valid_pe < 200)]
-                
-                if len(valid_pe) > 20:
-                    fair_multiplier = valid_pe.median()
-                    # Límites de seguridad
-                    fair_multiplier = max(5, min(60, fair_multiplier))
-            except:
-                pass
-        
-        result["fair_multiplier"] = round(fair_multiplier, 1)
-        
-        # =====================================================================
-        # PASO 8: Calcular Fair Value Line (suavizada)
-        # =====================================================================
-        eps_df['Fair_Value'] = eps_df['EPS'] * result["fair_multiplier"]
-        
-        # =====================================================================
-        # PASO 9: Calcular Conservative Value Line (PEG=1)
-        # =====================================================================
-        # El multiplicador conservador se basa en la tasa de crecimiento
-        # Si crece al 15% anual, PER justo sería 15 (PEG=1)
-        conservative_multiplier = 15  # Default para empresas estables
-        
-        if growth_rate is not None and growth_rate > 0:
-            # Convertir tasa de crecimiento a multiplicador (ej: 0.15 -> 15)
-            conservative_multiplier = growth_rate * 100
-        
-        # Aplicar suelo y techo para evitar extremos
-        conservative_multiplier = max(15, min(25, conservative_multiplier))
-        result["conservative_multiplier"] = round(conservative_multiplier, 1)
-        
-        # Calcular línea de valor conservador
-        eps_df['Conservative_Value'] = eps_df['EPS'] * conservative_multiplier
-        
-        # Separar histórico y proyección
-        result["fair_value_line"] = eps_df[['Fair_Value']].copy()
-        result["conservative_value_line"] = eps_df[['Conservative_Value']].copy()
-        result["price_history"] = prices_df.copy()
-        result["projection_start"] = last_price_date
-        result["has_data"] = True
-        result["method"] = method_used
-        
-        return result
+                self._jobs.move_to_end(key)
+            if owner is not None:
+                self._owners.setdefault(key, set()).add(owner)
+            return future
+
+    def release(self, owner):
+        """
+        Suelta los trabajos de una sesión que ha pasado a otro ticker.
         
-    except Exception as e:
-        return {
-            "has_data": False,
-            "error": f"Unexpected error: {str(e)}"
-        }
+        Los que ya no espera ninguna sesión se cancelan: si siguen en la cola
+        no llegan a ejecutarse y, si están en curso, se abandonan antes de la
+        siguiente llamada al modelo.
+        """
+        with self._lock:
+            for key, owners in list(self._owners.items()):
+                owners.discard(owner)
+                if owners:
+                    continue
+                del self._owners[key]
+                future = self._jobs.get(key)
+                if future is not None and not future.done() and not future.cancel():
+                    self._tokens[key].cancel()
 
+    def get(self, key):
+        """Devuelve el Future de un trabajo o None si no existe."""
+        with self._lock:
+            return self._jobs.get(key)
 
-def build_analysis_prompt(data, ticker):
+    def discard(self, key):
+        """Olvida un trabajo (para forzar su regeneración)."""
+        with self._lock:
+            self._jobs.pop(key, None)
+            self._owners.pop(key, None)
+            self._tokens.pop(key, None)
+
+    def _evict(self):
+        # Descartar los resultados terminados más antiguos (nunca los pendientes)
+        excess = len(self._jobs) - self._history
+        for key in [k for k, f in self._jobs.items() if f.done()][:max(excess, 0)]:
+            del self._jobs[key]
+            self._owners.pop(key, None)
+            self._tokens.pop(key, None)
+
+
+@st.cache_resource(show_spinner=False)
+def get_ai_job_queue():
+    """Cola de análisis IA compartida por todas las sesiones del proceso."""
+    return AIJobQueue()
+
+
+def render_ai_analysis(analysis):
     """
-    Construye el prompt dinámico para enviar a Gemini con todos los datos financieros.
+    Muestra el análisis con estilo retrofuturista.
     
     Args:
-        data: Diccionario con datos financieros
-        ticker: Símbolo del ticker
-        
-    Returns:
-        String con el prompt completo
+        analysis: Texto del análisis generado
+    """
+    st.markdown(f"""
+    <div style='background: linear-gradient(135deg, rgba(15, 15, 25, 0.95) 0%, rgba(20, 20, 35, 0.95) 100%); 
+                border: 1px solid rgba(255, 0, 110, 0.3); border-radius: 12px; padding: 25px; margin: 15px 0;
+                box-shadow: 0 0 30px rgba(255, 0, 110, 0.1);'>
+        <div style='font-family: monospace; color: rgba(255,255,255,0.85); line-height: 1.8; font-size: 0.9rem;'>
+            {analysis}
+        </div>
+    </div>
+    """, unsafe_allow_html=True)
+
+
+# Colores y textos de cada valor del veredicto estructurado
+VERDICT_COLORS = {"BUY": "#00FF9F", "HOLD": "#FFB74D", "SELL": "#FF006E"}
+PEG_ASSESSMENT_KEYS = {"cheap": "peg_cheap", "fair": "peg_fair", "expensive": "peg_expensive"}
+DEBT_ASSESSMENT_KEYS = {"solid": "solid", "moderate": "moderate", "risky": "risk"}
+
+
+def render_structured_verdict(verdict, title=None):
+    """
+    Muestra un veredicto estructurado con sus campos traducidos.
+    
+    Args:
+        verdict: dict guardado en VerdictStore (o de rule_based_verdict)
+        title: Encabezado (None = 'Veredicto')
+    """
+    color = VERDICT_COLORS.get(verdict["verdict"], "#00D4FF")
+    fields = (
+        (get_text('classification_label'), get_text(f"class_{verdict['classification']}")),
+        (get_text('peg_label'), get_text(PEG_ASSESSMENT_KEYS[verdict['peg_assessment']])
+            if verdict['peg_assessment'] in PEG_ASSESSMENT_KEYS else "N/A"),
+        (get_text('debt_label'), get_text(DEBT_ASSESSMENT_KEYS[verdict['debt_assessment']]).lstrip("● ")
+            if verdict['debt_assessment'] in DEBT_ASSESSMENT_KEYS else "N/A"),
+        (get_text('confidence_label'), f"{verdict['confidence'] * 100:.0f}%"),
+    )
+    cells = "".join(
+        f"<div><div style='color: #555; font-size: 0.65rem; text-transform: uppercase; letter-spacing: 1px;'>{label}</div>"
+        f"<div style='color: rgba(255,255,255,0.9); font-size: 0.95rem;'>{value}</div></div>"
+        for label, value in fields
+    )
+    st.markdown(f"""
+    <div style='background: linear-gradient(135deg, rgba(15, 15, 25, 0.95) 0%, rgba(20, 20, 35, 0.95) 100%); 
+                border: 1px solid {color}55; border-radius: 12px; padding: 25px; margin: 15px 0;
+                box-shadow: 0 0 30px {color}1A; font-family: monospace;'>
+        <div style='color: #555; font-size: 0.7rem; text-transform: uppercase; letter-spacing: 2px;'>{title or get_text('verdict_label')}</div>
+        <div style='color: {color}; font-size: 1.6rem; letter-spacing: 3px; margin-bottom: 15px;'>{get_text(f"verdict_{verdict['verdict'].lower()}")}</div>
+        <div style='display: grid; grid-template-columns: repeat(4, 1fr); gap: 10px; margin-bottom: 15px;'>{cells}</div>
+        <div style='color: rgba(255,255,255,0.75); line-height: 1.7; font-size: 0.85rem;'>{verdict.get('rationale') or ''}</div>
+    </div>
+    """, unsafe_allow_html=True)
+
+
+@st.fragment(run_every=AI_POLL_SECONDS)
+def poll_ai_job(job_key):
+    """
+    Sondea un análisis pendiente sin bloquear el resto de la página.
+    
+    Cuando el trabajo termina lanza un rerun completo para que el análisis
+    se dibuje en su sitio y el sondeo se detenga.
+    
+    Args:
+        job_key: Clave devuelta por AIJobQueue.job_key
+    """
+    future = get_ai_job_queue().get(job_key)
+    if future is None or future.done():
+        st.rerun()
+    st.markdown(f"""
+    <div style='background: rgba(255, 0, 110, 0.05); border: 1px dashed rgba(255, 0, 110, 0.3);
+                border-radius: 12px; padding: 25px; margin: 15px 0; font-family: monospace;
+                color: rgba(255,255,255,0.6); font-size: 0.85rem;'>
+        {get_text('ai_spinner')}
+    </div>
+    """, unsafe_allow_html=True)
+
+
+# =============================================================================
+# SERIALIZACIÓN DE TRAZAS (ARRAYS TIPADOS EN BASE64)
+# =============================================================================
+# Plotly >= 6 serializa los arrays NumPy como {dtype, bdata} en lugar de
+# listas JSON, así que las trazas reciben arrays y no listas de Python.
+
+# Por debajo de este valor absoluto float32 conserva los céntimos
+CHART_FLOAT32_LIMIT = 1e5
+
+
+def chart_dates(index):
     """
+    Fechas de una traza como milisegundos epoch (float64).
     
-    lang = st.session_state.get('language', 'es')
-    is_en = lang == 'en'
-    
-    # Formatear dividend yield
-    div_yield = data.get('dividend_yield')
-    if div_yield and div_yield != "N/A":
-        div_yield_str = f"{float(div_yield) * 100:.2f}%"
-    else:
-        div_yield_str = "N/A"
-    
-    # Formatear márgenes y ROE
-    roe = data.get('roe')
-    if roe and roe != "N/A":
-        roe_str = f"{float(roe) * 100:.2f}%"
-    else:
-        roe_str = "N/A"
+    Se usa la hora de pared del mercado, igual que Plotly interpreta las
+    fechas en texto, para que los ejes de tipo fecha muestren el mismo día.
     
-    margen = data.get('margen_beneficio')
-    if margen and margen != "N/A":
-        margen_str = f"{float(margen) * 100:.2f}%"
-    else:
-        margen_str = "N/A"
-    
-    # Calcular ratio efectivo/deuda (capacidad de pago)
-    deuda = data.get('deuda_total')
-    efectivo = data.get('efectivo_total')
-    net_debt = data.get('net_debt')
-    
-    if deuda and efectivo and float(deuda) > 0:
-        ratio_efectivo_deuda = float(efectivo) / float(deuda)
-        if ratio_efectivo_deuda >= 1:
-            if is_en:
-                situacion_deuda = f"More cash than debt ✅ (can pay {ratio_efectivo_deuda:.1f}x its debt)"
-            else:
-                situacion_deuda = f"Más efectivo que deuda ✅ (puede pagar {ratio_efectivo_deuda:.1f}x su deuda)"
-        else:
-            if is_en:
-                situacion_deuda = f"More debt than cash ⚠️ (covers {ratio_efectivo_deuda*100:.0f}% of debt)"
-            else:
-                situacion_deuda = f"Más deuda que efectivo ⚠️ (cubre {ratio_efectivo_deuda*100:.0f}% de la deuda)"
-        ratio_str = f"{ratio_efectivo_deuda:.2f}x"
-    elif efectivo and (not deuda or float(deuda) == 0):
-        ratio_str = "No debt" if is_en else "Sin deuda"
-        situacion_deuda = "No debt - Excellent position ✅" if is_en else "Sin deuda - Excelente posición ✅"
-        ratio_efectivo_deuda = float('inf')
-    else:
-        ratio_str = "N/A"
-        ratio_efectivo_deuda = None
-        situacion_deuda = "Cannot be determined" if is_en else "No se puede determinar"
-    
-    # Construir sección de noticias
-    noticias_text = ""
-    if data.get('noticias'):
-        noticias_text = "\n📰 " + ("LATEST NEWS (Scuttlebutt):" if is_en else "ÚLTIMAS NOTICIAS (Scuttlebutt):") + "\n"
-        for i, noticia in enumerate(data['noticias'][:3], 1):
-            titulo = noticia.get('title', 'No title' if is_en else 'Sin título')
-            noticias_text += f"   {i}. {titulo}\n"
-    else:
-        noticias_text = "\n📰 " + ("NEWS: No recent news available." if is_en else "NOTICIAS: No hay noticias recientes disponibles.") + "\n"
-    
-    # Textos según idioma
-    if is_en:
-        prompt = f"""
-================================================================================
-🎯 INVESTMENT ANALYSIS: {ticker} - {data.get('nombre', 'N/A')}
-================================================================================
-
-📊 GENERAL INFORMATION:
-   • Sector: {data.get('sector', 'N/A')}
-   • Industry: {data.get('industria', 'N/A')}
-   • Country: {data.get('pais', 'N/A')}
-   • Market Cap: {format_large_number(data.get('market_cap'))}
-   • Number of Employees: {data.get('num_empleados', 'N/A')}
-
-💰 PRICES:
-   • Current Price: {data.get('moneda', '$')}{data.get('precio_actual', 'N/A')}
-   • Analyst Target Price: {data.get('moneda', '$')}{data.get('precio_objetivo', 'N/A')}
-   • 52-Week High: {data.get('moneda', '$')}{data.get('precio_52w_high', 'N/A')}
-   • 52-Week Low: {data.get('moneda', '$')}{data.get('precio_52w_low', 'N/A')}
-
-📈 VALUATION RATIOS (KEY FOR LYNCH):
-   • Trailing P/E (last 12 months): {data.get('per_trailing', 'N/A')}
-   • Forward P/E (estimated): {data.get('per_forward', 'N/A')}
-   • ⭐ PEG Ratio (MOST IMPORTANT): {data.get('peg_ratio', 'N/A')}
-   • Price/Book: {data.get('price_to_book', 'N/A')}
-   • Price/Sales: {data.get('price_to_sales', 'N/A')}
-
-💵 DIVIDENDS:
-   • Dividend Yield: {div_yield_str}
-   • Dividend per Share: {data.get('moneda', '$')}{data.get('dividend_rate', 'N/A')}
-   • Payout Ratio: {data.get('payout_ratio', 'N/A')}
-
-🏦 BALANCE SHEET & DEBT (Most recent Balance Sheet data):
-   • Total Debt: {format_large_number(data.get('deuda_total'))}
-   • Cash + Short-term Investments: {format_large_number(data.get('efectivo_total'))}
-   • Cash/Debt Ratio: {ratio_str}
-   • Debt/Equity Ratio: {data.get('deuda_equity', 'N/A')}
-   • ⚡ Financial Position: {situacion_deuda}
-
-📊 PROFITABILITY:
-   • ROE (Return on Equity): {roe_str}
-   • Profit Margin: {margen_str}
-   • Earnings Growth: {data.get('crecimiento_beneficios', 'N/A')}
-   • Revenue Growth: {data.get('crecimiento_ingresos', 'N/A')}
-
-📉 VOLATILITY:
-   • Beta: {data.get('beta', 'N/A')}
-
-{noticias_text}
-
-================================================================================
-Please execute Peter Lynch's "Two-Minute Drill":
-1. Classify this company (Cyclical, Turnaround, Asset Play, Fast Grower, Stalwart)
-2. Analyze the PEG ratio and determine if it's cheap or expensive
-3. Evaluate the debt situation
-4. Give your VERDICT: BUY, SELL or HOLD
-5. Explain with simple analogies that anyone can understand
-================================================================================
-"""
-    else:
-        prompt = f"""
-================================================================================
-🎯 ANÁLISIS DE INVERSIÓN: {ticker} - {data.get('nombre', 'N/A')}
-================================================================================
-
-📊 INFORMACIÓN GENERAL:
-   • Sector: {data.get('sector', 'N/A')}
-   • Industria: {data.get('industria', 'N/A')}
-   • País: {data.get('pais', 'N/A')}
-   • Capitalización de Mercado: {format_large_number(data.get('market_cap'))}
-   • Número de Empleados: {data.get('num_empleados', 'N/A')}
-
-💰 PRECIOS:
-   • Precio Actual: {data.get('moneda', '$')}{data.get('precio_actual', 'N/A')}
-   • Precio Objetivo Analistas: {data.get('moneda', '$')}{data.get('precio_objetivo', 'N/A')}
-   • Máximo 52 semanas: {data.get('moneda', '$')}{data.get('precio_52w_high', 'N/A')}
-   • Mínimo 52 semanas: {data.get('moneda', '$')}{data.get('precio_52w_low', 'N/A')}
-
-📈 RATIOS DE VALORACIÓN (CLAVE PARA LYNCH):
-   • PER Trailing (últimos 12 meses): {data.get('per_trailing', 'N/A')}
-   • PER Forward (estimado): {data.get('per_forward', 'N/A')}
-   • ⭐ PEG Ratio (EL MÁS IMPORTANTE): {data.get('peg_ratio', 'N/A')}
-   • Price/Book: {data.get('price_to_book', 'N/A')}
-   • Price/Sales: {data.get('price_to_sales', 'N/A')}
-
-💵 DIVIDENDOS:
-   • Dividend Yield: {div_yield_str}
-   • Dividendo por acción: {data.get('moneda', '$')}{data.get('dividend_rate', 'N/A')}
-   • Payout Ratio: {data.get('payout_ratio', 'N/A')}
-
-🏦 BALANCE Y DEUDA (Datos del Balance Sheet más reciente):
-   • Deuda Total: {format_large_number(data.get('deuda_total'))}
-   • Efectivo + Inversiones C/P: {format_large_number(data.get('efectivo_total'))}
-   • Ratio Efectivo/Deuda: {ratio_str}
-   • Ratio Deuda/Equity: {data.get('deuda_equity', 'N/A')}
-   • ⚡ Situación Financiera: {situacion_deuda}
-
-📊 RENTABILIDAD:
-   • ROE (Return on Equity): {roe_str}
-   • Margen de Beneficio: {margen_str}
-   • Crecimiento Beneficios: {data.get('crecimiento_beneficios', 'N/A')}
-   • Crecimiento Ingresos: {data.get('crecimiento_ingresos', 'N/A')}
-
-📉 VOLATILIDAD:
-   • Beta: {data.get('beta', 'N/A')}
-
-{noticias_text}
-
-================================================================================
-Por favor, ejecuta "La rutina de los dos minutos" de Peter Lynch:
-1. Clasifica esta empresa (Cíclica, Recuperación, Activo Oculto, Crecimiento Rápido, Estable)
-2. Analiza el PEG ratio y determina si está barata o cara
-3. Evalúa la situación de deuda
-4. Da tu VEREDICTO: COMPRAR, VENDER o MANTENER
-5. Explica con analogías sencillas que cualquiera pueda entender
-================================================================================
-"""
+    Args:
+        index: Índice de fechas (con o sin timezone)
     
-    return prompt
+    Returns:
+        np.ndarray float64
+    """
+    index = pd.DatetimeIndex(index)
+    if index.tz is not None:
+        index = index.tz_localize(None)
+    return index.as_unit("ms").asi8.astype(np.float64)
 
 
-def get_ai_analysis(prompt, api_key):
+def chart_values(values):
     """
-    Envía el prompt a la API de Groq y obtiene el análisis.
+    Valores de una traza en float32 si la precisión lo permite.
     
     Args:
-        prompt: Prompt con los datos financieros
-        api_key: API Key de Groq
-        
+        values: Serie o array numérico
+    
     Returns:
-        String con el análisis generado o mensaje de error
+        np.ndarray float32 (o float64 para magnitudes grandes)
     """
-    try:
-        # Crear cliente de Groq
-        client = Groq(api_key=api_key)
-        
-        # Generar respuesta usando Llama 3.3 70B (gratuito y muy potente)
-        chat_completion = client.chat.completions.create(
-            messages=[
-                {
-                    "role": "system",
-                    "content": get_system_instruction()
-                },
-                {
-                    "role": "user",
-                    "content": prompt
-                }
-            ],
-            model="llama-3.3-70b-versatile",
-            temperature=0.7,
-            max_tokens=2048,
-        )
-        
-        return chat_completion.choices[0].message.content
-        
-    except Exception as e:
-        return f"❌ Error al conectar con Groq: {str(e)}"
+    values = np.asarray(values, dtype=np.float64)
+    finite = values[np.isfinite(values)]
+    if finite.size == 0 or np.abs(finite).max() < CHART_FLOAT32_LIMIT:
+        return values.astype(np.float32)
+    return values
 
 
-def create_google_finance_chart(historico, ticker, nombre, periodo_label="1A"):
+def create_google_finance_chart(historico, ticker, nombre):
     """
     Crea un gráfico estilo retrofuturista con hover de línea vertical.
     """
@@ -2132,9 +6482,11 @@ def create_google_finance_chart(historico, ticker, nombre, periodo_label="1A"):
     fig = go.Figure()
     
     # Efecto glow detrás de la línea principal
+    x_values = chart_dates(df['Fecha'])
+    y_values = chart_values(df['Close'])
     fig.add_trace(go.Scatter(
-        x=df['Fecha'].tolist(),
-        y=df['Close'].tolist(),
+        x=x_values,
+        y=y_values,
         mode='lines',
         line=dict(color=glow_color, width=8),
         hoverinfo='skip',
@@ -2143,8 +6495,8 @@ def create_google_finance_chart(historico, ticker, nombre, periodo_label="1A"):
     
     # Línea principal
     fig.add_trace(go.Scatter(
-        x=df['Fecha'].tolist(),
-        y=df['Close'].tolist(),
+        x=x_values,
+        y=y_values,
         mode='lines',
         name=ticker,
         line=dict(color=line_color, width=2),
@@ -2164,6 +6516,7 @@ def create_google_finance_chart(historico, ticker, nombre, periodo_label="1A"):
         hovermode='x',
         
         xaxis=dict(
+            type='date',
             showgrid=True,
             gridcolor='rgba(255, 255, 255, 0.03)',
             showline=False,
@@ -2208,40 +6561,218 @@ def create_google_finance_chart(historico, ticker, nombre, periodo_label="1A"):
     return fig
 
 
-def display_google_finance_header(data, historico, periodo_dias):
+def period_label_text(periodo_dias):
     """
-    Muestra el header estilo Google Finance con precio y cambio destacado.
+    Texto del período ("este mes", "último año"...) según su número de sesiones.
     
     Args:
-        data: Datos de la empresa
-        historico: DataFrame con el historial filtrado
         periodo_dias: Número de días del período
-    """
-    if historico.empty:
-        return
-    
-    precio_actual = historico['Close'].iloc[-1]
-    precio_inicial = historico['Close'].iloc[0]
-    cambio = precio_actual - precio_inicial
-    cambio_pct = (cambio / precio_inicial) * 100
     
-    # Determinar período para el texto
+    Returns:
+        str localizado
+    """
     if periodo_dias == 1:
-        periodo_text = "hoy"
+        return get_text('period_today')
     elif periodo_dias <= 5:
-        periodo_text = "esta semana"
+        return get_text('period_this_week')
     elif periodo_dias <= 30:
-        periodo_text = "este mes"
+        return get_text('period_this_month')
     elif periodo_dias <= 90:
-        periodo_text = "últimos 3 meses"
+        return get_text('period_last_3m')
     elif periodo_dias <= 180:
-        periodo_text = "últimos 6 meses"
+        return get_text('period_last_6m')
     elif periodo_dias <= 365:
-        periodo_text = "último año"
+        return get_text('period_last_year')
     elif periodo_dias <= 1300:
-        periodo_text = "últimos 5 años"
+        return get_text('period_last_5y')
+    return get_text('period_max')
+
+
+def _period_chart_state(historico, dias):
+    """
+    Estado del gráfico para un período: rango, colores y cambio.
+    
+    Args:
+        historico: Historial diario completo
+        dias: Sesiones del período
+    
+    Returns:
+        tuple (restyle, relayout) listo para un botón "update" de Plotly
+    """
+    tramo = historico.tail(dias)
+    close = tramo['Close']
+    precio_inicial = float(close.iloc[0])
+    cambio = float(close.iloc[-1]) - precio_inicial
+    cambio_pct = cambio / precio_inicial * 100 if precio_inicial else 0.0
+    
+    precio_min, precio_max = float(close.min()), float(close.max())
+    rango = precio_max - precio_min
+    margen = rango * 0.15 if rango > 0 else precio_min * 0.05
+    
+    if cambio >= 0:
+        line_color, arrow, signo = '#00FF9F', "▲", "+"
+        fill_color, glow_color = 'rgba(0, 255, 159, 0.08)', 'rgba(0, 255, 159, 0.4)'
     else:
-        periodo_text = "máx. histórico"
+        line_color, arrow, signo = '#FF006E', "▼", ""
+        fill_color, glow_color = 'rgba(255, 0, 110, 0.08)', 'rgba(255, 0, 110, 0.4)'
+    
+    texto = (f"{arrow} {signo}${abs(cambio):,.2f} ({signo}{cambio_pct:.2f}%) "
+             f"<span style='color:#444'>⏤ {period_label_text(len(tramo))}</span>")
+    restyle = {'line.color': [glow_color, line_color], 'fillcolor': [fill_color, fill_color]}
+    relayout = {
+        'xaxis.range': chart_dates(tramo.index[[0, -1]]).tolist(),
+        'xaxis.tickformat': '%b %Y' if len(tramo) > 60 else '%d %b',
+        'xaxis.spikecolor': line_color,
+        'yaxis.range': [precio_min - margen, precio_max + margen],
+        'hoverlabel.bordercolor': line_color,
+        'annotations': [dict(
+            text=texto, xref='paper', yref='paper', x=1, y=1.02,
+            xanchor='right', yanchor='bottom', showarrow=False,
+            font=dict(color=line_color, family='monospace', size=13),
+        )],
+        'shapes': [dict(
+            type='line', xref='paper', yref='y', x0=0, x1=1, y0=precio_inicial, y1=precio_inicial,
+            line=dict(color='rgba(255, 255, 255, 0.15)', width=1, dash='dot'),
+        )],
+    }
+    return restyle, relayout
+
+
+def create_period_switch_chart(historico, ticker, nombre, periodos, periodo_inicial="1A"):
+    """
+    Gráfico con el selector de período resuelto en el navegador.
+    
+    La serie completa se envía una sola vez (diaria en el último año y en
+    barras semanales antes) y cada botón es un "update" de Plotly con el
+    rango X/Y, los colores y el cambio del período precalculados, así que
+    cambiar de período no provoca un rerun ni reenvía la figura.
+    
+    Args:
+        historico: Historial diario completo
+        ticker: Símbolo del ticker
+        nombre: Nombre de la empresa
+        periodos: dict etiqueta -> sesiones
+        periodo_inicial: Etiqueta activa al cargar
+    
+    Returns:
+        go.Figure o None si no hay datos
+    """
+    if historico.empty or len(historico) < 2:
+        return None
+    
+    # Tramo diario que cubren los periodos cortos; lo anterior, en barras
+    diario = max([d for d in periodos.values() if d <= CHART_MAX_POINTS] or [CHART_MAX_POINTS])
+    serie = historico
+    if len(historico) > diario + 1:
+        antiguo = thin_price_series(historico.iloc[:-diario], get_price_bars(ticker, "1wk"))
+        serie = pd.concat([antiguo, historico.iloc[-diario:]])
+    
+    fig = create_google_finance_chart(serie, ticker, nombre)
+    if fig is None:
+        return None
+    
+    etiquetas = list(periodos.keys())
+    botones = []
+    for etiqueta in etiquetas:
+        restyle, relayout = _period_chart_state(historico, periodos[etiqueta])
+        botones.append(dict(label=etiqueta, method='update', args=[restyle, relayout]))
+    
+    # Estado inicial = el del botón activo
+    activo = etiquetas.index(periodo_inicial) if periodo_inicial in etiquetas else len(etiquetas) - 1
+    restyle, relayout = botones[activo]['args']
+    for i, trace in enumerate(fig.data):
+        trace.line.color = restyle['line.color'][i]
+        trace.fillcolor = restyle['fillcolor'][i]
+    fig.layout.shapes = ()
+    fig.plotly_relayout(relayout)
+    
+    fig.update_layout(
+        margin=dict(l=10, r=60, t=45, b=40),
+        updatemenus=[dict(
+            type='buttons', direction='right', active=activo, buttons=botones,
+            x=0, y=1.02, xanchor='left', yanchor='bottom', showactive=True,
+            pad=dict(r=4, t=0), bgcolor='rgba(15, 15, 25, 0.9)',
+            bordercolor='rgba(255, 255, 255, 0.1)', borderwidth=1,
+            font=dict(color='#777', family='monospace', size=11),
+        )],
+    )
+    return fig
+
+
+def get_dividend_info(data):
+    """
+    Obtiene información precisa de dividendos.
+    
+    Args:
+        data: StockSnapshot de la empresa
+        
+    Returns:
+        dict con yield_pct, annual_amount, quarterly_amount y frequency (None si no aplica)
+    """
+    precio = data.precio_actual
+    dividend_rate = data.dividend_rate  # Dividendo anual por acción
+    
+    result = {
+        'yield_pct': None,
+        'annual_amount': None,
+        'quarterly_amount': None,
+        'frequency': None
+    }
+    
+    def is_valid(val):
+        return has_value(val) and val > 0
+    
+    # Prioridad para yield: dividend_rate > trailing_annual > dividend_yield
+    if is_valid(dividend_rate) and is_valid(precio):
+        # Calcular yield desde dividend_rate (más preciso)
+        result['yield_pct'] = (dividend_rate / precio) * 100
+        result['annual_amount'] = dividend_rate
+        result['quarterly_amount'] = dividend_rate / 4  # Asumimos trimestral por defecto
+        result['frequency'] = 'trimestral'
+    elif is_valid(data.trailing_annual_dividend_yield):
+        yield_val = data.trailing_annual_dividend_yield
+        result['yield_pct'] = yield_val * 100 if yield_val < 1 else yield_val
+    elif is_valid(data.dividend_yield):
+        yield_val = data.dividend_yield
+        result['yield_pct'] = yield_val * 100 if yield_val < 1 else yield_val
+    
+    # Validar que el yield sea razonable (0-20%)
+    if result['yield_pct'] is not None and (result['yield_pct'] < 0 or result['yield_pct'] > 20):
+        result['yield_pct'] = None
+        result['quarterly_amount'] = None
+        
+    return result
+
+
+@st.fragment(run_every=QUOTE_POLL_SECONDS)
+def display_live_quote(data, historico):
+    """
+    Precio, cambio del día y rangos del header con refresco propio.
+    
+    Con la bolsa abierta y la cotización caducada se pide solo `fast_info`
+    (sin fundamentales, historial ni noticias); el botón fuerza el refresco.
+    Al ser un fragmento, solo se vuelve a ejecutar este bloque.
+    
+    Args:
+        data: StockSnapshot con el que se dibujó la página
+        historico: Historial diario (respaldo del cambio del día)
+    """
+    ref = st.session_state.get('stock_ref')
+    snapshot = (get_snapshot_cache().latest(ref[0], float("inf")) if ref else None) or data
+    
+    refresh = st.button(f"↻ {get_text('refresh_price')}", key="refresh_price")
+    if refresh or quote_is_stale(snapshot):
+        try:
+            snapshot, st.session_state['stock_ref'] = refresh_quote(snapshot)
+        except Exception:
+            # Se mantiene el último precio; el fallo ya cuenta en el circuit breaker
+            pass
+    
+    closes = historico['Close']
+    precio_actual = num_or(snapshot.precio_actual, float(closes.iloc[-1]))
+    cierre_anterior = num_or(snapshot.cierre_anterior, float(closes.iloc[-2]) if len(closes) > 1 else precio_actual)
+    cambio = precio_actual - cierre_anterior
+    cambio_pct = (cambio / cierre_anterior) * 100 if cierre_anterior else 0.0
     
     # Color y símbolo - estilo retrofuturista
     if cambio >= 0:
@@ -2255,23 +6786,51 @@ def display_google_finance_header(data, historico, periodo_dias):
         signo = ""
         glow = "0 0 10px rgba(255, 0, 110, 0.5)"
     
+    day_range = (f"{get_text('day_range')} {fmt_num(snapshot.minimo_dia, '${:,.2f}')} – {fmt_num(snapshot.maximo_dia, '${:,.2f}')}"
+                 if has_value(snapshot.minimo_dia) and has_value(snapshot.maximo_dia) else "")
+    range_52w = (f"{get_text('range_52w')} {fmt_num(snapshot.precio_52w_low, '${:,.2f}')} – {fmt_num(snapshot.precio_52w_high, '${:,.2f}')}"
+                 if has_value(snapshot.precio_52w_low) and has_value(snapshot.precio_52w_high) else "")
+    quote_at = datetime.fromtimestamp(num_or(snapshot.cotizacion_at, snapshot.fetched_at)).strftime('%H:%M:%S')
+    
+    st.markdown(f'''
+    <div style='padding: 10px 0;'>
+        <div style='font-size: 2.8rem; font-weight: 300; color: #fff; line-height: 1; 
+                    font-family: "SF Mono", "Monaco", monospace; letter-spacing: -1px;'>
+            ${precio_actual:,.2f}
+        </div>
+        <div style='font-size: 1rem; color: {color}; margin-top: 8px; font-family: monospace;
+                    text-shadow: {glow};'>
+            {arrow} {signo}${abs(cambio):,.2f} ({signo}{cambio_pct:.2f}%) 
+            <span style='color: #444; font-size: 0.8rem; margin-left: 5px;'>⏤ {get_text('period_today')}</span>
+        </div>
+        <div style='color: #555; font-size: 0.7rem; margin-top: 6px; font-family: monospace;'>
+            {day_range}{' · ' if day_range and range_52w else ''}{range_52w}
+        </div>
+        <div style='color: #444; font-size: 0.65rem; margin-top: 2px; font-family: monospace;'>
+            {get_text('quote_as_of').format(time=quote_at)}
+        </div>
+    </div>
+    ''', unsafe_allow_html=True)
+
+
+def display_google_finance_header(data, historico, periodo_dias):
+    """
+    Muestra el header estilo Google Finance con precio y cambio destacado.
+    
+    Args:
+        data: StockSnapshot de la empresa
+        historico: DataFrame con el historial filtrado
+        periodo_dias: Número de días del período (para las estadísticas)
+    """
+    if historico.empty:
+        return
+    
     # Header con precio grande - estilo retrofuturista minimalista
     col1, col2 = st.columns([2, 3])
     
     with col1:
-        st.markdown(f'''
-        <div style='padding: 10px 0;'>
-            <div style='font-size: 2.8rem; font-weight: 300; color: #fff; line-height: 1; 
-                        font-family: "SF Mono", "Monaco", monospace; letter-spacing: -1px;'>
-                ${precio_actual:,.2f}
-            </div>
-            <div style='font-size: 1rem; color: {color}; margin-top: 8px; font-family: monospace;
-                        text-shadow: {glow};'>
-                {arrow} {signo}${abs(cambio):,.2f} ({signo}{cambio_pct:.2f}%) 
-                <span style='color: #444; font-size: 0.8rem; margin-left: 5px;'>⏤ {periodo_text}</span>
-            </div>
-        </div>
-        ''', unsafe_allow_html=True)
+        # Precio en vivo (fast_info), refrescado sin rerun de la página
+        display_live_quote(data, historico)
     
     with col2:
         # Mini estadísticas con estilo retrofuturista (sin bordes izquierdos)
@@ -2280,37 +6839,9 @@ def display_google_finance_header(data, historico, periodo_dias):
         vol_promedio = historico['Volume'].mean()
         
         # Obtener info de dividendos
-        dividend_rate = data.get('dividend_rate')
-        div_yield = data.get('dividend_yield')
-        trailing_yield = data.get('trailing_annual_dividend_yield')
-        precio_actual_val = data.get('precio_actual', precio_actual)
-        
-        # Calcular dividend yield si es posible
-        div_yield_pct = None
-        div_quarterly = None
-        if dividend_rate and precio_actual_val:
-            try:
-                annual_div = float(dividend_rate)
-                div_yield_pct = (annual_div / float(precio_actual_val)) * 100
-                div_quarterly = annual_div / 4
-            except:
-                pass
-        elif trailing_yield:
-            try:
-                yield_val = float(trailing_yield)
-                div_yield_pct = yield_val * 100 if yield_val < 1 else yield_val
-            except:
-                pass
-        elif div_yield:
-            try:
-                yield_val = float(div_yield)
-                div_yield_pct = yield_val * 100 if yield_val < 1 else yield_val
-            except:
-                pass
-        
-        # Validar yield razonable
-        if div_yield_pct and (div_yield_pct < 0 or div_yield_pct > 20):
-            div_yield_pct = None
+        div_info = get_dividend_info(data)
+        div_yield_pct = div_info['yield_pct']
+        div_quarterly = div_info['quarterly_amount']
         
         # HTML para dividendos si existe - todo en una línea para evitar problemas de renderizado
         div_html = ""
@@ -2324,243 +6855,406 @@ def display_google_finance_header(data, historico, periodo_dias):
         st.markdown(stats_html, unsafe_allow_html=True)
 
 
-def create_price_chart(historico, ticker, nombre):
+# =============================================================================
+# PLANTILLAS HTML DE TARJETAS DE MÉTRICAS
+# =============================================================================
+
+# Plantillas precompiladas (str.format con campos con nombre)
+METRIC_CARD_TEMPLATE = (
+    '<div style="background: linear-gradient(145deg, rgba(20, 20, 35, 0.9) 0%, rgba(15, 15, 25, 0.95) 100%); '
+    'border: 1px solid rgba(255,255,255,0.06); border-radius: 12px; padding: 18px 15px; text-align: center; '
+    'font-family: monospace; position: relative; overflow: hidden;">'
+    '<div style="position: absolute; top: 0; left: 50%; transform: translateX(-50%); width: 40%; height: 2px; '
+    'background: linear-gradient(90deg, transparent, {color_60}, transparent);"></div>'
+    '<div style="color: #666; font-size: 0.6rem; text-transform: uppercase; letter-spacing: 1.5px; '
+    'margin-bottom: 10px;">{label}</div>'
+    '<div style="color: {color}; font-size: 1.5rem; font-weight: 400; text-shadow: 0 0 20px {color_30};">{value}</div>'
+    '{badge}{subtitle}</div>'
+).format
+METRIC_BADGE_TEMPLATE = (
+    '<div style="display: inline-block; background: {color_12}; border: 1px solid {color}; border-radius: 12px; '
+    'padding: 2px 12px 6px 12px; margin-top: 8px;"><span style="color: {color}; font-size: 0.65rem; '
+    'font-weight: 500; text-transform: uppercase;">{text}</span></div>'
+).format
+METRIC_SUBTITLE_TEMPLATE = '<div style="color: #666; font-size: 0.6rem; margin-top: 6px;">{text}</div>'.format
+METRICS_GRID_TEMPLATE = '<div class="metrics-grid">{cards}</div>'.format
+
+COLOR_MISSING = "#555"
+
+
+@lru_cache(maxsize=64)
+def card_palette(hex_color):
     """
-    Función de compatibilidad - usa el nuevo estilo retrofuturista.
+    Variantes rgba de un color hex usadas por las tarjetas (memoizadas).
+    
+    Args:
+        hex_color: Color en formato '#RRGGBB'
+    
+    Returns:
+        Tupla (color_60, color_30, color_12) con alpha 0.6, 0.3 y 0.12
     """
-    return create_google_finance_chart(historico, ticker, nombre)
+    digits = hex_color.lstrip('#')
+    if len(digits) == 6:
+        r, g, b = int(digits[0:2], 16), int(digits[2:4], 16), int(digits[4:6], 16)
+    else:
+        r, g, b = 85, 85, 85
+    return tuple(f"rgba({r}, {g}, {b}, {alpha})" for alpha in (0.6, 0.3, 0.12))
 
 
-def display_metrics_panel(data):
-    """
-    Muestra el panel de métricas principales con estilo retrofuturista mejorado.
-    Diseño tipo Google Finance con tarjetas más visuales.
+def render_metric_card(label, value, color="#00FF9F", badge_text=None, subtitle=None):
     """
+    Genera el HTML de una tarjeta de métrica a partir de las plantillas.
     
-    # Función helper para convertir hex a rgba
-    def hex_to_rgba(hex_color, alpha):
-        hex_color = hex_color.lstrip('#')
-        if len(hex_color) == 6:
-            r = int(hex_color[0:2], 16)
-            g = int(hex_color[2:4], 16)
-            b = int(hex_color[4:6], 16)
-            return f"rgba({r}, {g}, {b}, {alpha})"
-        return f"rgba(85, 85, 85, {alpha})"
-    
-    # Función para crear tarjeta de métrica moderna
-    def metric_card_modern(label, value, color="#00FF9F", badge_text=None, subtitle=None):
-        color_60 = hex_to_rgba(color, 0.6)
-        color_30 = hex_to_rgba(color, 0.3)
-        color_12 = hex_to_rgba(color, 0.12)
-        
-        # Construir HTML del badge si existe
-        badge_section = ""
-        if badge_text:
-            badge_section = f'<div style="display: inline-block; background: {color_12}; border: 1px solid {color}; border-radius: 12px; padding: 2px 12px 6px 12px; margin-top: 8px;"><span style="color: {color}; font-size: 0.65rem; font-weight: 500; text-transform: uppercase;">{badge_text}</span></div>'
-        
-        # Construir HTML del subtitle si existe
-        subtitle_section = ""
-        if subtitle:
-            subtitle_section = f'<div style="color: #666; font-size: 0.6rem; margin-top: 6px;">{subtitle}</div>'
-        
-        html = f'<div style="background: linear-gradient(145deg, rgba(20, 20, 35, 0.9) 0%, rgba(15, 15, 25, 0.95) 100%); border: 1px solid rgba(255,255,255,0.06); border-radius: 12px; padding: 18px 15px; text-align: center; font-family: monospace; position: relative; overflow: hidden;"><div style="position: absolute; top: 0; left: 50%; transform: translateX(-50%); width: 40%; height: 2px; background: linear-gradient(90deg, transparent, {color_60}, transparent);"></div><div style="color: #666; font-size: 0.6rem; text-transform: uppercase; letter-spacing: 1.5px; margin-bottom: 10px;">{label}</div><div style="color: {color}; font-size: 1.5rem; font-weight: 400; text-shadow: 0 0 20px {color_30};">{value}</div>{badge_section}{subtitle_section}</div>'
-        
-        return html
-    
-    # Función para calcular dividend yield y frecuencia
-    def get_dividend_info(data):
-        """Obtiene información precisa de dividendos."""
-        precio = data.get('precio_actual', 0)
-        dividend_rate = data.get('dividend_rate')  # Dividendo anual por acción
-        last_dividend = data.get('last_dividend_value')  # Último dividendo pagado
-        div_yield = data.get('dividend_yield')
-        trailing_yield = data.get('trailing_annual_dividend_yield')
-        
-        result = {
-            'yield_pct': None,
-            'annual_amount': None,
-            'quarterly_amount': None,
-            'frequency': None
-        }
-        
-        # Intentar obtener el yield más preciso
-        def is_valid(val):
-            if val is None or val == 'N/A':
-                return False
-            try:
-                v = float(val)
-                return not pd.isna(v) and v > 0
-            except:
-                return False
-        
-        # Prioridad para yield: trailing_annual > dividend_yield calculado desde rate
-        if is_valid(dividend_rate) and is_valid(precio) and float(precio) > 0:
-            # Calcular yield desde dividend_rate (más preciso)
-            annual_div = float(dividend_rate)
-            result['yield_pct'] = (annual_div / float(precio)) * 100
-            result['annual_amount'] = annual_div
-            result['quarterly_amount'] = annual_div / 4  # Asumimos trimestral por defecto
-            result['frequency'] = 'trimestral'
-        elif is_valid(trailing_yield):
-            yield_val = float(trailing_yield)
-            result['yield_pct'] = yield_val * 100 if yield_val < 1 else yield_val
-        elif is_valid(div_yield):
-            yield_val = float(div_yield)
-            result['yield_pct'] = yield_val * 100 if yield_val < 1 else yield_val
-        
-        # Validar que el yield sea razonable (0-20%)
-        if result['yield_pct'] is not None and (result['yield_pct'] < 0 or result['yield_pct'] > 20):
-            result['yield_pct'] = None
-            
-        return result
+    Args:
+        label: Etiqueta de la métrica
+        value: Valor ya formateado
+        color: Color principal en hex
+        badge_text: Texto opcional del badge
+        subtitle: Texto opcional bajo el valor
     
-    # Obtener valores
-    precio = data.get('precio_actual', 'N/A')
-    per = data.get('per_trailing', 'N/A')
-    peg = data.get('peg_ratio')
-    div_info = get_dividend_info(data)
+    Returns:
+        String con el HTML de la tarjeta
+    """
+    color_60, color_30, color_12 = card_palette(color)
+    badge = METRIC_BADGE_TEMPLATE(color=color, color_12=color_12, text=badge_text) if badge_text else ""
+    sub = METRIC_SUBTITLE_TEMPLATE(text=subtitle) if subtitle else ""
+    return METRIC_CARD_TEMPLATE(label=label, value=value, color=color, color_60=color_60,
+                                color_30=color_30, badge=badge, subtitle=sub)
+
+
+def metrics_panel_cards(data, texts):
+    """
+    Calcula el contenido de las 8 tarjetas del panel de métricas.
     
-    # Primera fila de métricas
-    col1, col2, col3, col4 = st.columns(4)
+    Args:
+        data: StockSnapshot de la empresa
+        texts: Tabla de traducción del idioma a renderizar
     
-    with col1:
-        if precio != 'N/A':
-            st.markdown(metric_card_modern(get_text('current_price'), f"${precio:.2f}", "#00FF9F"), unsafe_allow_html=True)
-        else:
-            st.markdown(metric_card_modern(get_text('current_price'), "—", "#555"), unsafe_allow_html=True)
+    Returns:
+        Lista de tuplas (label, value, color, badge_text, subtitle)
+    """
+    cards = []
     
-    with col2:
-        if per != 'N/A':
-            if per > 25:
-                color, badge_text = "#FF006E", get_text('expensive')
-            elif per < 15:
-                color, badge_text = "#00FF9F", get_text('cheap')
-            else:
-                color, badge_text = "#FFB74D", get_text('normal')
-            st.markdown(metric_card_modern(get_text('per_trailing'), f"{per:.2f}", color, badge_text), unsafe_allow_html=True)
+    # Precio actual
+    precio = data.precio_actual
+    if has_value(precio):
+        cards.append((texts['current_price'], f"${precio:.2f}", "#00FF9F", None, None))
+    else:
+        cards.append((texts['current_price'], "—", COLOR_MISSING, None, None))
+    
+    # PER
+    per = data.per_trailing
+    if has_value(per):
+        if per > 25:
+            color, badge_text = "#FF006E", texts['expensive']
+        elif per < 15:
+            color, badge_text = "#00FF9F", texts['cheap']
+        else:
+            color, badge_text = "#FFB74D", texts['normal']
+        cards.append((texts['per_trailing'], f"{per:.2f}", color, badge_text, None))
+    else:
+        cards.append((texts['per_trailing'], "—", COLOR_MISSING, None, None))
+    
+    # PEG
+    peg = data.peg_ratio
+    if has_value(peg):
+        if peg < 1:
+            color, badge_text = "#00FF9F", texts['cheap']
+        elif peg > 2:
+            color, badge_text = "#FF006E", texts['expensive']
         else:
-            st.markdown(metric_card_modern(get_text('per_trailing'), "—", "#555"), unsafe_allow_html=True)
+            color, badge_text = "#FFB74D", texts['fair']
+        cards.append((texts['peg_ratio'], f"{peg:.2f}", color, badge_text, None))
+    else:
+        cards.append((texts['peg_ratio'], "—", COLOR_MISSING, None, None))
     
-    with col3:
-        if peg is not None and peg != 'N/A':
-            try:
-                peg_val = float(peg)
-                if peg_val < 1:
-                    color, badge_text = "#00FF9F", get_text('cheap')
-                elif peg_val > 2:
-                    color, badge_text = "#FF006E", get_text('expensive')
-                else:
-                    color, badge_text = "#FFB74D", get_text('fair')
-                st.markdown(metric_card_modern(get_text('peg_ratio'), f"{peg_val:.2f}", color, badge_text), unsafe_allow_html=True)
-            except:
-                st.markdown(metric_card_modern(get_text('peg_ratio'), "—", "#555"), unsafe_allow_html=True)
+    # Dividendos con yield y monto trimestral
+    div_info = get_dividend_info(data)
+    if div_info['yield_pct'] is not None:
+        yield_pct = div_info['yield_pct']
+        quarterly = div_info.get('quarterly_amount')
+        subtitle = f"${quarterly:.2f} USD / {texts['quarterly']}" if quarterly else None
+        color = "#00FF9F" if yield_pct >= 2 else "#6464FF"
+        cards.append((texts['dividend_yield'], f"{yield_pct:.2f}%", color, None, subtitle))
+    else:
+        cards.append((texts['dividend_yield'], "—", COLOR_MISSING, texts['no_dividends'], None))
+    
+    # Precio / Valor contable
+    pb = data.price_to_book
+    if has_value(pb):
+        if pb < 1.5:
+            color, badge_text = "#00FF9F", texts['undervalued']
+        elif pb > 4:
+            color, badge_text = "#FF006E", texts['overvalued']
         else:
-            st.markdown(metric_card_modern(get_text('peg_ratio'), "—", "#555"), unsafe_allow_html=True)
-    
-    with col4:
-        # Dividendos mejorados con yield y monto
-        if div_info['yield_pct'] is not None:
-            yield_pct = div_info['yield_pct']
-            quarterly = div_info.get('quarterly_amount')
-            freq = get_text('quarterly')
-            
-            if quarterly:
-                subtitle = f"${quarterly:.2f} USD / {freq}"
-            else:
-                subtitle = None
-                
-            color = "#00FF9F" if yield_pct >= 2 else "#6464FF"
-            st.markdown(metric_card_modern(get_text('dividend_yield'), f"{yield_pct:.2f}%", color, None, subtitle), unsafe_allow_html=True)
+            color, badge_text = "#6464FF", None
+        cards.append((texts['price_book'], f"{pb:.2f}x", color, badge_text, None))
+    else:
+        cards.append((texts['price_book'], "—", COLOR_MISSING, None, None))
+    
+    # Capitalización de mercado
+    mcap = data.market_cap
+    badge_text = None
+    if has_value(mcap):
+        if mcap >= 200e9:
+            badge_text = texts['mega_cap']
+        elif mcap >= 10e9:
+            badge_text = texts['large_cap']
+        elif mcap >= 2e9:
+            badge_text = texts['mid_cap']
         else:
-            no_div = "Sin dividendos" if st.session_state.get('language', 'es') == 'es' else "No dividends"
-            st.markdown(metric_card_modern(get_text('dividend_yield'), "—", "#555", no_div), unsafe_allow_html=True)
+            badge_text = texts['small_cap']
+    cards.append((texts['market_cap'], format_large_number(mcap), "#6464FF", badge_text, None))
+    
+    # Ratio Efectivo/Deuda (como Google Finance) - indica capacidad de pago
+    ratio_efectivo_deuda = data.cash_debt_ratio()
+    if ratio_efectivo_deuda == float('inf'):
+        cards.append((texts['cash_debt'], texts['no_debt'], "#00FF9F", texts['excellent'], None))
+    elif has_value(ratio_efectivo_deuda):
+        if ratio_efectivo_deuda >= 1.5:
+            color, badge_text = "#00FF9F", texts['very_solid']
+        elif ratio_efectivo_deuda >= 1.0:
+            color, badge_text = "#00FF9F", texts['solid']
+        elif ratio_efectivo_deuda >= 0.5:
+            color, badge_text = "#FFB74D", texts['moderate']
+        else:
+            color, badge_text = "#FF006E", texts['risk']
+        cards.append((texts['cash_debt'], f"{ratio_efectivo_deuda:.2f}x", color, badge_text, None))
+    else:
+        cards.append((texts['cash_debt'], "—", COLOR_MISSING, None, None))
+    
+    # Beta
+    beta = data.beta
+    if has_value(beta):
+        if beta < 0.8:
+            color, badge_text = "#00FF9F", texts['low_volatility']
+        elif beta > 1.3:
+            color, badge_text = "#FF006E", texts['high_volatility']
+        else:
+            color, badge_text = "#6464FF", texts['market']
+        cards.append((texts['beta'], f"{beta:.2f}", color, badge_text, None))
+    else:
+        cards.append((texts['beta'], "—", COLOR_MISSING, None, None))
     
-    st.markdown("<div style='margin: 12px 0;'></div>", unsafe_allow_html=True)
+    return cards
+
+
+@st.cache_data(max_entries=128, show_spinner=False)
+def render_metrics_panel_html(ticker, version, lang, _data):
+    """
+    HTML completo del panel de métricas, cacheado por versión de snapshot e idioma.
     
-    # Segunda fila de métricas
-    col5, col6, col7, col8 = st.columns(4)
+    Args:
+        ticker: Símbolo del ticker (parte de la clave de caché)
+        version: Versión del snapshot (parte de la clave de caché)
+        lang: Código de idioma (parte de la clave de caché)
+        _data: StockSnapshot (excluido del hash)
     
-    with col5:
-        pb = data.get('price_to_book', 'N/A')
-        if pb != 'N/A':
-            if pb < 1.5:
-                color, badge_text = "#00FF9F", get_text('undervalued')
-            elif pb > 4:
-                color, badge_text = "#FF006E", get_text('overvalued')
-            else:
-                color, badge_text = "#6464FF", None
-            st.markdown(metric_card_modern(get_text('price_book'), f"{pb:.2f}x", color, badge_text), unsafe_allow_html=True)
-        else:
-            st.markdown(metric_card_modern(get_text('price_book'), "—", "#555"), unsafe_allow_html=True)
+    Returns:
+        String con el HTML del panel (rejilla de 2 filas x 4 tarjetas)
+    """
+    cards = metrics_panel_cards(_data, TEXTS[lang])
+    return METRICS_GRID_TEMPLATE(cards="".join(render_metric_card(*card) for card in cards))
+
+
+def display_metrics_panel(data):
+    """
+    Muestra el panel de métricas principales con estilo retrofuturista mejorado.
+    Diseño tipo Google Finance con tarjetas más visuales.
+    
+    Args:
+        data: StockSnapshot de la empresa
+    """
+    html = render_metrics_panel_html(data.ticker, data.version, current_language(), data)
+    st.markdown(html, unsafe_allow_html=True)
+
+
+def parse_ticker_list(text):
+    """Convierte 'ko, pep; aapl' en ('KO', 'PEP', 'AAPL') sin duplicados."""
+    return tuple(dict.fromkeys(t.strip().upper() for t in text.replace(";", ",").split(",") if t.strip()))
+
+
+def display_backtest_panel(ticker):
+    """
+    Panel plegable para ejecutar el backtest de la banda de Lynch.
     
-    with col6:
-        mcap = data.get('market_cap', 'N/A')
-        badge_text = None
-        if mcap != 'N/A':
+    Args:
+        ticker: Ticker analizado (valor por defecto de la lista)
+    """
+    with st.expander(get_text('backtest_title')):
+        st.markdown(f"<div style='color: rgba(255,255,255,0.6); font-size: 0.75rem; font-family: monospace;'>"
+                    f"{get_text('backtest_desc')}</div>", unsafe_allow_html=True)
+        tickers_text = st.text_input(get_text('backtest_tickers'), value=ticker, key="backtest_tickers_input")
+        skip_bearish = st.checkbox(get_text('backtest_skip_bearish'), value=True, key="backtest_skip_bearish")
+        
+        if st.button(get_text('backtest_run'), key="backtest_run"):
+            st.session_state['backtest_request'] = (parse_ticker_list(tickers_text), skip_bearish)
+        
+        request = st.session_state.get('backtest_request')
+        if not request or not request[0]:
+            return
+        
+        tickers, skip_bearish = request
+        entry_trends = tuple(s for s in TREND_STATES if s != 'strong_bearish') if skip_bearish else None
+        with st.spinner(get_text('backtest_spinner')):
             try:
-                mcap_val = float(mcap)
-                if mcap_val >= 200e9:
-                    badge_text = get_text('mega_cap')
-                elif mcap_val >= 10e9:
-                    badge_text = get_text('large_cap')
-                elif mcap_val >= 2e9:
-                    badge_text = get_text('mid_cap')
-                else:
-                    badge_text = get_text('small_cap')
-            except:
-                badge_text = None
-        st.markdown(metric_card_modern(get_text('market_cap'), format_large_number(mcap), "#6464FF", badge_text), unsafe_allow_html=True)
-    
-    with col7:
-        # Ratio Efectivo/Deuda (como Google Finance) - indica capacidad de pago
-        deuda = data.get('deuda_total')
-        efectivo = data.get('efectivo_total')
-        net_debt = data.get('net_debt')
-        
-        if deuda and efectivo and float(deuda) > 0:
-            # Calcular ratio Efectivo/Deuda (cuántas veces puede pagar su deuda)
-            ratio_efectivo_deuda = float(efectivo) / float(deuda)
-            
-            # Evaluar solidez financiera
-            if ratio_efectivo_deuda >= 1.5:
-                color, badge_text = "#00FF9F", get_text('very_solid')
-            elif ratio_efectivo_deuda >= 1.0:
-                color, badge_text = "#00FF9F", get_text('solid')
-            elif ratio_efectivo_deuda >= 0.5:
-                color, badge_text = "#FFB74D", get_text('moderate')
-            else:
-                color, badge_text = "#FF006E", get_text('risk')
-            
-            st.markdown(metric_card_modern(get_text('cash_debt'), f"{ratio_efectivo_deuda:.2f}x", color, badge_text), unsafe_allow_html=True)
-        elif efectivo and (not deuda or float(deuda) == 0):
-            st.markdown(metric_card_modern(get_text('cash_debt'), get_text('no_debt'), "#00FF9F", get_text('excellent')), unsafe_allow_html=True)
+                result = get_lynch_backtest(tickers, entry_trends=entry_trends)
+            except Exception as e:
+                st.warning(f"{get_text('backtest_error')}: {str(e)}")
+                return
+        if result is None:
+            st.info(get_text('backtest_no_data'))
+            return
+        
+        portfolio = result["portfolio"]
+        cols = st.columns(5)
+        for col, (key, value) in zip(cols, [
+            ('bt_total_return', f"{portfolio['total_return'] * 100:+.1f}%"),
+            ('bt_cagr', f"{portfolio['cagr'] * 100:+.1f}%"),
+            ('bt_max_drawdown', f"{portfolio['max_drawdown'] * 100:.1f}%"),
+            ('bt_hit_rate', fmt_num(portfolio['hit_rate'] * 100, "{:.0f}%")),
+            ('bt_trades', f"{portfolio['trades']}"),
+        ]):
+            col.metric(get_text(key), value)
+        
+        summary = result["summary"].copy()
+        for column in ("total_return", "buy_hold_return", "max_drawdown", "exposure", "hit_rate", "avg_trade_return"):
+            summary[column] = summary[column].apply(lambda x: f"{x * 100:.1f}%" if pd.notna(x) else "N/A")
+        summary = summary.rename(columns={
+            "total_return": get_text('bt_total_return'),
+            "buy_hold_return": get_text('bt_buy_hold'),
+            "max_drawdown": get_text('bt_max_drawdown'),
+            "exposure": get_text('bt_exposure'),
+            "trades": get_text('bt_trades'),
+            "hit_rate": get_text('bt_hit_rate'),
+            "avg_trade_return": get_text('bt_avg_trade'),
+        })
+        st.dataframe(summary, use_container_width=True)
+        st.markdown(f"<div style='font-size: 0.65rem; color: rgba(255,183,77,0.6); font-family: monospace;'>"
+                    f"{get_text('backtest_note')}</div>", unsafe_allow_html=True)
+
+
+def display_ai_screen_panel(ticker, api_key):
+    """
+    Panel plegable de veredictos por lotes para una lista de tickers.
+    
+    Cada ticker recibe al momento el veredicto por reglas; solo los dudosos
+    (needs_ai_review) pasan a la IA si así se elige. Los prompts compactos
+    se agrupan en peticiones de AI_BATCH_SIZE empresas y la tabla se lee de
+    la caché de veredictos, así que los ya analizados no gastan cuota.
+    
+    Args:
+        ticker: Ticker analizado (valor por defecto de la lista)
+        api_key: API Key de Groq (sin clave ni servidor local = solo reglas)
+    """
+    lang = current_language()
+    with st.expander(get_text('ai_screen_title')):
+        st.markdown(f"<div style='color: rgba(255,255,255,0.6); font-size: 0.75rem; font-family: monospace;'>"
+                    f"{get_text('ai_screen_desc')}</div>", unsafe_allow_html=True)
+        tickers_text = st.text_input(get_text('backtest_tickers'), value=ticker, key="ai_screen_tickers_input")
+        use_ai = ai_configured(api_key)
+        if use_ai:
+            borderline_only = st.checkbox(get_text('ai_screen_borderline'), value=True, key="ai_screen_borderline")
         else:
-            st.markdown(metric_card_modern(get_text('cash_debt'), "—", "#555"), unsafe_allow_html=True)
-    
-    with col8:
-        beta = data.get('beta', 'N/A')
-        if beta != 'N/A':
-            if beta < 0.8:
-                color, badge_text = "#00FF9F", get_text('low_volatility')
-            elif beta > 1.3:
-                color, badge_text = "#FF006E", get_text('high_volatility')
+            st.info(get_text('api_key_missing_body'))
+        
+        if st.button(get_text('ai_screen_run'), key="ai_screen_run"):
+            items, rules, invalid = [], {}, []
+            progress = st.progress(0.0)
+            tickers = parse_ticker_list(tickers_text)
+            for i, symbol in enumerate(tickers):
+                progress.progress((i + 1) / len(tickers), text=f"{get_text('loading_data')} {symbol}...")
+                data, _, _ = load_snapshot(symbol)
+                if data is None:
+                    invalid.append(symbol)
+                    continue
+                rules[symbol] = rule_based_verdict(data)
+                if use_ai and (not borderline_only or needs_ai_review(rules[symbol])):
+                    prompt = build_analysis_prompt(data, symbol)
+                    items.append((symbol, AIJobQueue.job_key(symbol, lang, prompt, "json")[-1], prompt))
+            progress.empty()
+            job_key = None
+            if items:
+                batch_hash = hashlib.sha256("|".join(h for _, h, _ in items).encode("utf-8")).hexdigest()[:16]
+                job_key = ("*batch*", lang, "json", batch_hash)
+                get_ai_job_queue().submit(job_key, run_batch_verdicts, items, lang, api_key)
+            st.session_state['ai_screen_request'] = (lang, job_key, rules, tuple(invalid))
+        
+        request = st.session_state.get('ai_screen_request')
+        if not request or request[0] != lang:
+            return
+        _, job_key, rules, invalid = request
+        future = get_ai_job_queue().get(job_key) if job_key else None
+        if future is not None and not future.done():
+            poll_ai_job(job_key)
+            return
+        
+        errors = dict.fromkeys(invalid, get_text('invalid_ticker'))
+        if future is not None:
+            if future.exception() is not None:
+                st.warning(f"{get_text('api_error')}: {future.exception()}")
             else:
-                color, badge_text = "#6464FF", get_text('market')
-            st.markdown(metric_card_modern(get_text('beta'), f"{beta:.2f}", color, badge_text), unsafe_allow_html=True)
-        else:
-            st.markdown(metric_card_modern(get_text('beta'), "—", "#555"), unsafe_allow_html=True)
+                outcome = future.result()
+                errors.update(outcome["errors"])
+                st.caption(get_text('ai_screen_stats').format(
+                    tickers=len(rules), requests=outcome["requests"], cached=outcome["cached"]))
+        
+        def peg_text(p):
+            return get_text(PEG_ASSESSMENT_KEYS[p]) if p in PEG_ASSESSMENT_KEYS else "N/A"
+        
+        def debt_text(d):
+            return get_text(DEBT_ASSESSMENT_KEYS[d]).lstrip("● ") if d in DEBT_ASSESSMENT_KEYS else "N/A"
+        
+        if rules:
+            ai = get_verdict_store().query(tickers=list(rules), lang=lang).set_index("ticker")
+            table = pd.DataFrame({
+                "Ticker": list(rules),
+                get_text('rule_score'): [fmt_num(r["score"], "{:.0f}", missing="—") for r in rules.values()],
+                get_text('rule_verdict_short'): [get_text(f"verdict_{r['verdict'].lower()}") for r in rules.values()],
+                get_text('verdict_ai'): [
+                    get_text(f"verdict_{ai.at[t, 'verdict'].lower()}") if t in ai.index else "—" for t in rules],
+                get_text('confidence_label'): [
+                    f"{ai.at[t, 'confidence'] * 100:.0f}%" if t in ai.index else "—" for t in rules],
+                get_text('classification_label'): [
+                    get_text(f"class_{ai.at[t, 'classification'] if t in ai.index else r['classification']}")
+                    for t, r in rules.items()],
+                get_text('peg_label'): [peg_text(r["peg_assessment"]) for r in rules.values()],
+                get_text('debt_label'): [debt_text(r["debt_assessment"]) for r in rules.values()],
+            })
+            st.dataframe(table, use_container_width=True, hide_index=True)
+        for symbol, message in errors.items():
+            st.caption(f"❌ {symbol}: {message}")
 
 
 # =============================================================================
 # INTERFAZ PRINCIPAL DE LA APLICACIÓN
 # =============================================================================
 
+def render_invalid_ticker(ticker):
+    """Mensaje de ticker no válido; limpia el análisis anterior de la sesión."""
+    st.error(f"""
+    ❌ **{get_text('invalid_ticker')} '{ticker}'**
+    
+    {get_text('verify_intro')}
+    - {get_text('verify_spelling')}
+    - {get_text('verify_suffix')}
+    - {get_text('verify_listed')}
+    """)
+    for key in ('stock_ref', 'current_ticker'):
+        if key in st.session_state:
+            del st.session_state[key]
+
+
 def main():
     """Función principal que ejecuta la aplicación Streamlit."""
     
     # Inicializar idioma en session_state si no existe
     if 'language' not in st.session_state:
-        st.session_state.language = 'es'
+        st.session_state.language = DEFAULT_LANGUAGE
+    
+    # Ligar la tabla de traducción una sola vez para todo el rerun
+    bind_language()
+    lang = current_language()
     
     # Header principal retrofuturista (dinámico según idioma)
     st.markdown(f"""
@@ -2571,7 +7265,7 @@ def main():
         <p style='font-family: monospace; color: #FF006E; font-size: 0.9rem; letter-spacing: 3px;
                   text-transform: uppercase; margin-top: 10px;'>{get_text('app_subtitle')}</p>
         <p style='font-family: monospace; color: rgba(255,255,255,0.4); font-size: 0.75rem; font-style: italic;
-                  margin-top: 5px;'>"{'Compra lo que conoces' if st.session_state.language == 'es' else 'Buy what you know'}"</p>
+                  margin-top: 5px;'>"{get_text('tagline')}"</p>
     </div>
     """, unsafe_allow_html=True)
     
@@ -2587,8 +7281,7 @@ def main():
         """, unsafe_allow_html=True)
         
         # ========== SELECTOR DE IDIOMA (BOTÓN QUE ABRE MODAL) ==========
-        current_flag = "🇪🇸" if st.session_state.language == 'es' else "🇬🇧"
-        current_lang = "ES" if st.session_state.language == 'es' else "EN"
+        current_lang = lang.upper()
         
         if st.button(f"🌐 {current_lang}", use_container_width=True, key="open_language_modal"):
             language_modal()
@@ -2607,7 +7300,9 @@ def main():
             label_visibility="collapsed"
         )
         
-        if not api_key:
+        if LOCAL_LLM_URL:
+            st.caption(get_text('local_llm_active').format(model=LOCAL_LLM_MODEL, url=LOCAL_LLM_URL))
+        if not ai_configured(api_key):
             st.markdown(f"""
             <div style='background: rgba(255, 0, 110, 0.1); border: 1px solid rgba(255, 0, 110, 0.3);
                         border-radius: 8px; padding: 12px; margin: 10px 0; font-family: monospace;'>
@@ -2644,6 +7339,7 @@ def main():
         classification_placeholder = st.empty()
         
         st.markdown("<hr style='opacity: 0.2; margin: 20px 0;'>", unsafe_allow_html=True)
+        render_http_pool_stats()
         st.markdown(f"""
         <div style='text-align: center; font-family: monospace; font-size: 0.65rem; color: rgba(255,255,255,0.3);'>
             {get_text('developed_with')} <span style='color: #FF006E;'>♥</span> {get_text('using')}<br>
@@ -2709,38 +7405,105 @@ def main():
             ticker_input = "GOOGL"
             analyze_button = True
     
+    # Sugerencias del directorio local mientras el texto no sea un símbolo conocido
+    directory = get_symbol_directory()
+    query = ticker_input.strip() if ticker_input else ""
+    literal = False
+    suggestions = directory.search(query) if query and directory.get(query) is None else []
+    if suggestions:
+        st.caption(get_text('did_you_mean'))
+        # Un símbolo ya se analiza tal cual; una palabra suelta puede pedirse así
+        literal_offer = bool(SYMBOL_PATTERN.match(query)) and not looks_like_symbol(query)
+        suggestion_cols = st.columns(len(suggestions) + literal_offer)
+        for col, (entry, _) in zip(suggestion_cols, suggestions):
+            with col:
+                short_name = re.split(r"[,(]", entry.name)[0].strip()
+                if st.button(f"{entry.symbol} · {short_name}", key=f"suggest_{entry.symbol}",
+                             help=f"{entry.name} · {entry.exchange}", use_container_width=True):
+                    ticker_input = entry.symbol
+                    analyze_button = True
+        if literal_offer:
+            with suggestion_cols[-1]:
+                if st.button(get_text('analyze_literal').format(query=query.upper()),
+                             key="suggest_literal", use_container_width=True):
+                    literal = True
+                    analyze_button = True
+    
     st.markdown("---")
     
-    # Proceso de análisis
+    # Proceso de análisis (con presupuesto de latencia hasta el primer pintado)
+    st.session_state['pending_sections'] = []
+    deadline = time.time() + ANALYSIS_BUDGET_SECONDS
     if analyze_button and ticker_input:
-        ticker = ticker_input.upper().strip()
+        # Nombres y erratas se resuelven en local; a Yahoo solo llega un
+        # símbolo conocido, inequívoco, escrito como símbolo o pedido tal cual
+        query = ticker_input.strip()
+        symbol_like = looks_like_symbol(query)
+        entry = None if literal else directory.get(query) or (directory.resolve(query) if looks_like_name(query) else None)
+        if entry is not None:
+            if entry.symbol != query.upper():
+                st.caption(get_text('resolved_ticker').format(query=query, ticker=entry.symbol, name=entry.name))
+            # El ticker pedido queda pendiente hasta que llegue su snapshot
+            st.session_state['pending_ticker'] = entry.symbol
+        elif not literal and directory.is_rejected(query):
+            render_invalid_ticker(query.upper())
+        elif literal or symbol_like or (not suggestions and SYMBOL_PATTERN.match(query)):
+            st.session_state['pending_ticker'] = query.upper()
+        elif suggestions:
+            st.warning(get_text('choose_suggestion').format(query=query))
+        else:
+            st.warning(get_text('no_symbol_match').format(query=query))
+    
+    if st.session_state.get('pending_ticker'):
+        ticker = st.session_state['pending_ticker']
+        # Un ticker nuevo cancela lo que quede en curso del anterior
+        token = session_cancel_token(ticker)
         
         loading_msg = f"🔄 {get_text('loading_data')} {ticker}..."
-        with st.spinner(loading_msg):
-            data = get_stock_data(ticker)
-        
-        if data is None:
-            error_msg = f"""
-            ❌ **{get_text('invalid_ticker')} '{ticker}'**
-            
-            {'Por favor verifica que:' if st.session_state.get('language', 'es') == 'es' else 'Please verify that:'}
-            - {'El símbolo esté escrito correctamente' if st.session_state.get('language', 'es') == 'es' else 'The symbol is spelled correctly'}
-            - {'Para mercados europeos, añade el sufijo correcto (ej: .MC para Madrid, .L para Londres)' if st.session_state.get('language', 'es') == 'es' else 'For European markets, add the correct suffix (e.g., .MC for Madrid, .L for London)'}
-            - {'La acción esté listada en una bolsa soportada por Yahoo Finance' if st.session_state.get('language', 'es') == 'es' else 'The stock is listed on an exchange supported by Yahoo Finance'}
-            """
-            st.error(error_msg)
-            if 'stock_data' in st.session_state:
-                del st.session_state['stock_data']
-            if 'current_ticker' in st.session_state:
-                del st.session_state['current_ticker']
+        try:
+            with st.spinner(loading_msg):
+                data, stock_ref, error = load_snapshot(ticker, token=token, deadline=deadline)
+        except DeadlineExceeded:
+            # La descarga sigue en el pool: se pinta en cuanto llegue
+            st.info(get_text('analysis_loading').format(ticker=ticker))
+            if 'stock_ref' in st.session_state:
+                del st.session_state['stock_ref']
         else:
-            # Guardar datos en session_state para persistencia
-            st.session_state['stock_data'] = data
-            st.session_state['current_ticker'] = ticker
-    
-    # Mostrar análisis si hay datos (ya sea recién cargados o en session_state)
-    if 'stock_data' in st.session_state and st.session_state['stock_data'] is not None:
-        data = st.session_state['stock_data']
+            del st.session_state['pending_ticker']
+            if data is None:
+                # Solo un ticker que Yahoo da por inválido se descarta; un
+                # fallo de Yahoo (error, circuito abierto...) ya se ha mostrado
+                if error is None:
+                    directory.reject(ticker)
+                    render_invalid_ticker(ticker)
+            else:
+                # La sesión solo guarda la referencia (ticker, versión) al snapshot compartido
+                st.session_state['stock_ref'] = stock_ref
+                st.session_state['current_ticker'] = ticker
+                directory.learn(ticker, data.nombre, data.bolsa)
+    
+    # Resolver la referencia de la sesión (si se descartó, se vuelve a descargar;
+    # si caducó o está incompleto, se pasa al snapshot más reciente y se
+    # refresca en segundo plano)
+    data = None
+    if st.session_state.get('stock_ref'):
+        ref_ticker = st.session_state['stock_ref'][0]
+        token = session_cancel_token(ref_ticker)
+        data = get_snapshot_cache().get(st.session_state['stock_ref'])
+        try:
+            if data is not None and (not snapshot_is_fresh(data) or data.pendiente):
+                data, st.session_state['stock_ref'], _ = load_snapshot(ref_ticker, token=token, deadline=deadline)
+            if data is None:
+                with st.spinner(f"🔄 {get_text('loading_data')} {ref_ticker}..."):
+                    data, st.session_state['stock_ref'], _ = load_snapshot(ref_ticker, token=token, deadline=deadline)
+        except DeadlineExceeded:
+            data = None
+            st.session_state['pending_ticker'] = ref_ticker
+            del st.session_state['stock_ref']
+            st.info(get_text('analysis_loading').format(ticker=ref_ticker))
+    
+    # Mostrar análisis si hay datos (ya sea recién cargados o de la sesión)
+    if data is not None:
         ticker = st.session_state.get('current_ticker', 'N/A')
         
         # Clasificar la empresa automáticamente
@@ -2752,22 +7515,16 @@ def main():
         # Actualizar sidebar con la clasificación activa
         with classification_placeholder.container():
             # Clasificaciones traducidas según el idioma
-            if st.session_state.get('language', 'es') == 'en':
-                classifications = [
-                    ("🚀 Fast Grower", "Fast Grower"),
-                    ("🏛️ Stalwart", "Stalwart"),
-                    ("🔄 Cyclical", "Cyclical"),
-                    ("📈 Turnaround", "Turnaround"),
-                    ("💎 Asset Play", "Asset Play"),
-                ]
-            else:
-                classifications = [
-                    ("🚀 Crecimiento Rápido", "Crecimiento Rápido"),
-                    ("🏛️ Estable", "Estable"),
-                    ("🔄 Cíclica", "Cíclica"),
-                    ("📈 Recuperación", "Recuperación"),
-                    ("💎 Activo Oculto", "Activo Oculto"),
-                ]
+            classifications = [
+                (f"{emoji} {get_text(key)}", get_text(key))
+                for emoji, key in (
+                    ("🚀", 'class_fast_grower'),
+                    ("🏛️", 'class_stalwart'),
+                    ("🔄", 'class_cyclical'),
+                    ("📈", 'class_turnaround'),
+                    ("💎", 'class_asset_play'),
+                )
+            ]
             for label, name in classifications:
                 if name == clasificacion:
                     st.markdown(f'<div class="sidebar-item-active">✓ {label}</div>', unsafe_allow_html=True)
@@ -2775,8 +7532,8 @@ def main():
                     st.markdown(f'<div class="sidebar-item">{label}</div>', unsafe_allow_html=True)
         
         # Obtener PEG ya calculado y validado
-        peg = data.get('peg_ratio')
-        peg_calculation = data.get('peg_calculation', '')
+        peg = data.peg_ratio
+        peg_calculation = data.peg_calculation
         
         # Crear la barra de información usando componentes nativos de Streamlit
         # Header con nombre y sector
@@ -2784,22 +7541,18 @@ def main():
         
         with col_info1:
             # Nombre y sector
-            empresa_nombre = data.get('nombre', ticker)
-            empresa_sector = data.get('sector', 'N/A')
-            empresa_industria = data.get('industria', 'N/A')
+            empresa_nombre = data.nombre or ticker
+            empresa_sector = data.sector or 'N/A'
+            empresa_industria = data.industria or 'N/A'
             
             # Construir texto del PEG
-            if peg is not None and peg != 'N/A':
-                try:
-                    peg_val = float(peg)
-                    if peg_val < 1:
-                        peg_text = f" | 🟢 PEG: {peg_val:.2f} (Barato)"
-                    elif peg_val > 2:
-                        peg_text = f" | 🔴 PEG: {peg_val:.2f} (Caro)"
-                    else:
-                        peg_text = f" | 🟡 PEG: {peg_val:.2f} (Justo)"
-                except:
-                    peg_text = ""
+            if has_value(peg):
+                if peg < 1:
+                    peg_text = f" | 🟢 PEG: {peg:.2f} ({get_text('peg_cheap')})"
+                elif peg > 2:
+                    peg_text = f" | 🔴 PEG: {peg:.2f} ({get_text('peg_expensive')})"
+                else:
+                    peg_text = f" | 🟡 PEG: {peg:.2f} ({get_text('peg_fair')})"
             else:
                 peg_text = ""
             
@@ -2821,6 +7574,17 @@ def main():
         # Explicación de la clasificación
         st.caption(f"💡 {explicacion_class}")
         
+        # Frescura de los datos (stale-while-revalidate)
+        st.caption(freshness_caption(data.fetched_at, ticker, "snapshot",
+                                     data.bolsa or None, data.zona_horaria or None))
+        if data.pendiente:
+            # Secciones que no cupieron en el presupuesto: se completan en segundo plano
+            st.caption(get_text('sections_pending').format(sections=", ".join(
+                get_text(f"section_{name}") for name in data.pendiente.split(","))))
+            shown = data
+            mark_pending(lambda: (get_snapshot_cache().latest(shown.ticker, float("inf")) or shown).version
+                         != shown.version)
+        
         # Panel de métricas con título retrofuturista
         st.markdown(f"""
         <div style='margin: 25px 0 15px 0;'>
@@ -2837,7 +7601,7 @@ def main():
         # =================================================================
         # GRÁFICO ESTILO GOOGLE FINANCE
         # =================================================================
-        if not data.get('historico', pd.DataFrame()).empty:
+        if not data.historico.empty:
             st.markdown(f"""
             <div style='margin: 20px 0 15px 0;'>
                 <span style='font-family: monospace; color: #00FF9F; font-size: 1rem; letter-spacing: 2px; 
@@ -2857,38 +7621,26 @@ def main():
                 "5A": 1260
             }
             
-            # Radio buttons horizontales para período
-            periodo_seleccionado = st.radio(
-                "Período:",
-                options=list(periodos.keys()),
-                index=4,  # Default: 1A
-                horizontal=True,
-                key="periodo_chart",
-                label_visibility="collapsed"
-            )
+            # El período se cambia en el navegador (botones de Plotly); fuera
+            # del gráfico el resumen es el del período por defecto (1A)
+            periodo_seleccionado = "1A"
             
             # Obtener el historial completo
-            historico_completo = data['historico']
-            dias_periodo = periodos[periodo_seleccionado]
-            
-            # Filtrar según período
-            if dias_periodo == -1:  # MAX
-                historico_filtrado = historico_completo
-                dias_reales = len(historico_completo)
-            else:
-                historico_filtrado = historico_completo.tail(dias_periodo)
-                dias_reales = min(dias_periodo, len(historico_completo))
+            historico_completo = data.historico
+            dias_reales = min(periodos[periodo_seleccionado], len(historico_completo))
+            historico_filtrado = historico_completo.tail(dias_reales)
             
             # Verificar que hay datos
             if not historico_filtrado.empty and len(historico_filtrado) > 1:
                 # Mostrar header con precio y cambio
                 display_google_finance_header(data, historico_filtrado, dias_reales)
                 
-                # Crear el gráfico
-                result = create_google_finance_chart(
-                    historico_filtrado,
+                # Crear el gráfico con la serie completa y el selector de período
+                result = create_period_switch_chart(
+                    historico_completo,
                     ticker,
-                    data.get('nombre', ticker),
+                    data.nombre or ticker,
+                    periodos,
                     periodo_seleccionado
                 )
                 
@@ -3044,13 +7796,13 @@ def main():
                 """, unsafe_allow_html=True)
                 
                 # Calcular rendimientos
-                hist_completo = data['historico'].copy()
+                hist_completo = data.historico.copy()
                 hist_completo = hist_completo.sort_index()
                 precio_actual_rend = hist_completo['Close'].iloc[-1]
                 
                 # Nombres de períodos según idioma
                 period_1w = get_text('1w')
-                periodos_calc = [(period_1w, 5), ("1M", 22), ("3M", 66), ("6M", 132), ("1A" if st.session_state.get('language', 'es') == 'es' else "1Y", 252), ("YTD", "ytd")]
+                periodos_calc = [(period_1w, 5), ("1M", 22), ("3M", 66), ("6M", 132), (get_text('period_1y'), 252), ("YTD", "ytd")]
                 rendimientos_items = []
                 
                 for nombre_p, dias_p in periodos_calc:
@@ -3095,14 +7847,14 @@ def main():
                 """, unsafe_allow_html=True)
                 
             else:
-                st.warning("⚠️ No hay suficientes datos para el período seleccionado")
+                st.warning(get_text('not_enough_period_data'))
         else:
-            st.warning("⚠️ No hay datos históricos disponibles para mostrar el gráfico")
+            st.warning(get_text('no_history_data'))
         
         st.markdown("---")
         
         # Análisis con IA - Estilo retrofuturista
-        ai_title = "🤖 AI ENGINEER BROKER ANALYSIS" if st.session_state.get('language', 'es') == 'en' else "🤖 ANÁLISIS INGENIERO BROKER"
+        ai_title = get_text('ai_title')
         st.markdown(f"""
         <div style='margin: 30px 0 20px 0;'>
             <span style='font-family: "JetBrains Mono", monospace; color: #FF006E; font-size: 1.2rem; 
@@ -3112,41 +7864,67 @@ def main():
         </div>
         """, unsafe_allow_html=True)
         
-        if api_key:
-            # Usar caché para el análisis de IA
-            cache_key = f"ai_analysis_{ticker}"
-            if cache_key not in st.session_state:
-                spinner_msg = "🧠 The Engineer Broker is analyzing the data..." if st.session_state.get('language', 'es') == 'en' else "🧠 El Ingeniero Broker está analizando los datos..."
-                with st.spinner(spinner_msg):
-                    # Construir el prompt
-                    prompt = build_analysis_prompt(data, ticker)
-                    
-                    # Obtener análisis de Groq (Llama 3.3 70B)
-                    analysis = get_ai_analysis(prompt, api_key)
-                    st.session_state[cache_key] = analysis
+        # Veredicto por reglas: instantáneo y sin coste, mientras la IA trabaja
+        try:
+            band_dataset, band_error = run_for_session(token, get_lynch_band_dataset, ticker, deadline=deadline)
+            band_pending = False
+        except DeadlineExceeded:
+            band_dataset, band_error, band_pending = None, None, True
+        rule_verdict = rule_based_verdict(
+            data, CLASSIFICATION_CODES.get(css_class),
+            band_dataset.latest()["Band_Position"] if band_dataset is not None else None,
+        )
+        render_structured_verdict(
+            dict(rule_verdict, rationale=get_text('rule_verdict_detail').format(
+                score=fmt_num(rule_verdict["score"], "{:.0f}"), coverage=rule_verdict["coverage"] * 100)),
+            title=get_text('rule_verdict_label'),
+        )
+        if band_pending:
+            st.caption(get_text('section_pending'))
+        
+        if ai_configured(api_key) and data.pendiente:
+            # Sin gastar un análisis en un prompt al que aún le faltan datos
+            st.caption(get_text('ai_waiting_data'))
+        elif ai_configured(api_key):
+            # El análisis corre en la cola compartida: los reruns no lo cancelan
+            structured = st.toggle(get_text('structured_verdict'), key="ai_structured",
+                                   help=get_text('structured_verdict_help'))
+            prompt = build_analysis_prompt(data, ticker)
+            job_key = AIJobQueue.job_key(ticker, lang, prompt, "json" if structured else "text")
+            queue = get_ai_job_queue()
+            if structured:
+                future = queue.submit(job_key, run_structured_verdict, ticker, lang, job_key[-1], prompt, api_key,
+                                      owner=session_owner_id())
             else:
-                analysis = st.session_state[cache_key]
+                future = queue.submit(job_key, get_ai_analysis, prompt, api_key, lang, owner=session_owner_id())
             
-            # Mostrar el análisis con estilo retrofuturista
-            st.markdown(f"""
-            <div style='background: linear-gradient(135deg, rgba(15, 15, 25, 0.95) 0%, rgba(20, 20, 35, 0.95) 100%); 
-                        border: 1px solid rgba(255, 0, 110, 0.3); border-radius: 12px; padding: 25px; margin: 15px 0;
-                        box-shadow: 0 0 30px rgba(255, 0, 110, 0.1);'>
-                <div style='font-family: monospace; color: rgba(255,255,255,0.85); line-height: 1.8; font-size: 0.9rem;'>
-                    {analysis}
-                </div>
-            </div>
-            """, unsafe_allow_html=True)
+            if future.done():
+                error = future.exception()
+                if isinstance(error, ValueError):
+                    render_ai_analysis(f"❌ {get_text('verdict_invalid')}: {error}")
+                elif error:
+                    render_ai_analysis(f"❌ {get_text('api_error')}: {error}")
+                elif structured:
+                    render_structured_verdict(future.result())
+                else:
+                    render_ai_analysis(future.result())
+            else:
+                poll_ai_job(job_key)
+            st.caption(get_text('prompt_tokens').format(
+                prompt=estimate_tokens(prompt),
+                system=estimate_tokens(get_system_instruction(lang, structured=structured)),
+            ))
             
             # Botón para regenerar análisis
-            regen_text = "🔄 Regenerate Analysis" if st.session_state.get('language', 'es') == 'en' else "🔄 Regenerar Análisis"
+            regen_text = get_text('regenerate_analysis')
             if st.button(regen_text, key="regenerate_ai"):
-                if cache_key in st.session_state:
-                    del st.session_state[cache_key]
+                queue.discard(job_key)
+                if structured:
+                    get_verdict_store().delete(ticker, lang, job_key[-1])
                 st.rerun()
             
             # Disclaimer retrofuturista (bilingüe)
-            disclaimer_text = "This analysis is generated by AI for educational purposes. It does not constitute financial advice. Always do your own research before investing." if st.session_state.get('language', 'es') == 'en' else "Este análisis es generado por IA con fines educativos. No constituye asesoramiento financiero. Siempre haz tu propia investigación antes de invertir."
+            disclaimer_text = get_text('ai_disclaimer')
             st.markdown(f"""
             <div style='background: rgba(255, 183, 77, 0.1); border: 1px solid rgba(255, 183, 77, 0.3); 
                         border-radius: 8px; padding: 15px; margin-top: 20px; font-family: monospace;'>
@@ -3157,30 +7935,32 @@ def main():
             </div>
             """, unsafe_allow_html=True)
         else:
-            st.markdown("""
+            st.markdown(f"""
             <div style='background: rgba(255, 0, 110, 0.1); border: 1px solid rgba(255, 0, 110, 0.3);
                         border-radius: 8px; padding: 20px; font-family: monospace;'>
-                <div style='color: #FF006E; font-size: 0.85rem; margin-bottom: 10px;'>{'⚠ API Key not configured' if st.session_state.get('language', 'es') == 'en' else '⚠ API Key no configurada'}</div>
+                <div style='color: #FF006E; font-size: 0.85rem; margin-bottom: 10px;'>{get_text('api_key_missing_title')}</div>
                 <div style='color: rgba(255,255,255,0.6); font-size: 0.8rem;'>
-                    {'To get the Engineer Broker analysis, enter your Groq API Key in the sidebar.' if st.session_state.get('language', 'es') == 'en' else 'Para obtener el análisis del Ingeniero Broker, introduce tu API Key de Groq en la barra lateral.'}<br>
-                    {'Financial data is already available above.' if st.session_state.get('language', 'es') == 'en' else 'Los datos financieros ya están disponibles arriba.'}
+                    {get_text('api_key_missing_body')}<br>
+                    {get_text('data_available_above')}
                 </div>
             </div>
             """, unsafe_allow_html=True)
             
             # Mostrar los datos crudos como alternativa
-            raw_data_label = "📋 View raw data for manual analysis" if st.session_state.get('language', 'es') == 'en' else "📋 Ver datos crudos para análisis manual"
+            raw_data_label = get_text('raw_data_label')
             with st.expander(raw_data_label):
                 prompt = build_analysis_prompt(data, ticker)
                 st.code(prompt, language="text")
+                st.caption(get_text('prompt_tokens').format(
+                    prompt=estimate_tokens(prompt), system=estimate_tokens(get_system_instruction(lang))
+                ))
         
         # =====================================================================
         # GRÁFICO DE PETER LYNCH - Precio vs Línea de Beneficios
         # =====================================================================
         st.markdown("---")
         
-        is_en = st.session_state.get('language', 'es') == 'en'
-        lynch_chart_title = "📊 PETER LYNCH CHART - Price vs Earnings" if is_en else "📊 GRÁFICO DE PETER LYNCH - Precio vs Beneficios"
+        lynch_chart_title = get_text('lynch_chart_title')
         st.markdown(f"""
         <div style='margin: 30px 0 20px 0;'>
             <span style='font-family: "JetBrains Mono", monospace; color: #FFB74D; font-size: 1.2rem; 
@@ -3200,17 +7980,13 @@ def main():
             </div>
         </div>
         """
-        if is_en:
-            lynch_title = "What does this chart show?"
-            lynch_desc = "Peter Lynch recommended comparing the stock price with its 'fair value line' (EPS × Fair P/E). The <span style='color:#FFB74D;'>fair P/E multiplier</span> is calculated as the <b>historical median</b> of the stock's P/E ratio. When the <span style='color:#00FF9F;'>price line</span> is ABOVE the <span style='color:#FFB74D;'>fair value line</span>, the stock may be overvalued. When it's BELOW, it may be undervalued."
-        else:
-            lynch_title = "¿Qué muestra este gráfico?"
-            lynch_desc = "Peter Lynch recomendaba comparar el precio de la acción con su 'línea de valor justo' (EPS × P/E Justo). El <span style='color:#FFB74D;'>multiplicador P/E justo</span> se calcula como la <b>mediana histórica</b> del P/E de la acción. Cuando la <span style='color:#00FF9F;'>línea de precio</span> está POR ENCIMA de la <span style='color:#FFB74D;'>línea de valor justo</span>, la acción puede estar sobrevalorada. Cuando está POR DEBAJO, puede estar infravalorada."
+        lynch_title = get_text('lynch_help_title')
+        lynch_desc = get_text('lynch_help_desc')
         
         st.markdown(lynch_explanation.format(lynch_title, lynch_desc), unsafe_allow_html=True)
         
         # Obtener datos para el gráfico de Lynch
-        lynch_data = get_peter_lynch_chart_data(ticker)
+        lynch_data = None if band_pending else get_peter_lynch_chart_data(ticker, band_dataset, band_error)
         
         if lynch_data and lynch_data.get("has_data"):
             try:
@@ -3273,38 +8049,38 @@ def main():
                 
                 # 1. Línea de valor conservador histórica (PRIMERO - línea inferior de la banda)
                 if hist_conservative is not None and len(hist_conservative) > 0:
-                    growth_pct = f" ({growth_rate*100:.0f}% growth)" if growth_rate and growth_rate > 0 else ""
-                    growth_pct_es = f" ({growth_rate*100:.0f}% crecim.)" if growth_rate and growth_rate > 0 else ""
-                    conservative_legend = f"Conservative PEG=1 (EPS×{conservative_multiplier}){growth_pct}" if is_en else f"Conservador PEG=1 (EPS×{conservative_multiplier}){growth_pct_es}"
+                    growth_pct = get_text('lynch_growth_suffix').format(pct=growth_rate * 100) if growth_rate and growth_rate > 0 else ""
+                    conservative_legend = get_text('lynch_conservative_legend').format(
+                        multiplier=conservative_multiplier, growth=growth_pct
+                    )
                     fig.add_trace(go.Scatter(
-                        x=hist_conservative.index,
-                        y=hist_conservative['Conservative_Value'],
+                        x=chart_dates(hist_conservative.index),
+                        y=chart_values(hist_conservative['Conservative_Value']),
                         name=conservative_legend,
                         line=dict(color='#8B9DC3', width=1.5),
                         opacity=0.8,
-                        hovertemplate='%{x|%Y-%m-%d}<br>Conservative Value: $%{y:.2f}<extra></extra>' if is_en else '%{x|%Y-%m-%d}<br>Valor Conservador: $%{y:.2f}<extra></extra>'
+                        hovertemplate=get_text('hover_conservative')
                     ))
                 
                 # 2. Línea de valor justo histórica (SEGUNDO - con fill='tonexty' para banda)
-                legend_name = f"Fair Value (EPS×{fair_multiplier})" if is_en else f"Valor Justo (EPS×{fair_multiplier})"
-                band_legend = f"Fair Value Band" if is_en else f"Banda de Valor Justo"
+                band_legend = get_text('lynch_band_legend')
                 fig.add_trace(go.Scatter(
-                    x=hist_fair.index,
-                    y=hist_fair['Fair_Value'],
+                    x=chart_dates(hist_fair.index),
+                    y=chart_values(hist_fair['Fair_Value']),
                     name=band_legend,
                     line=dict(color='#FFB74D', width=2, dash='dash'),
                     fill='tonexty' if hist_conservative is not None and len(hist_conservative) > 0 else None,
                     fillcolor='rgba(255, 183, 77, 0.12)',  # Naranja suave semitransparente
-                    hovertemplate='%{x|%Y-%m-%d}<br>Fair Value: $%{y:.2f}<extra></extra>' if is_en else '%{x|%Y-%m-%d}<br>Valor Justo: $%{y:.2f}<extra></extra>'
+                    hovertemplate=get_text('hover_fair_value')
                 ))
                 
                 # 3. Línea de precio (TERCERO - siempre encima, Z-index superior)
                 fig.add_trace(go.Scatter(
-                    x=price_df.index,
-                    y=price_df['Close'],
-                    name='Price' if is_en else 'Precio',
+                    x=chart_dates(price_df.index),
+                    y=chart_values(price_df['Close']),
+                    name=get_text('price'),
                     line=dict(color='#00FF9F', width=2.5),
-                    hovertemplate='%{x|%Y-%m-%d}<br>Price: $%{y:.2f}<extra></extra>' if is_en else '%{x|%Y-%m-%d}<br>Precio: $%{y:.2f}<extra></extra>'
+                    hovertemplate=get_text('hover_price')
                 ))
                 
                 # Líneas de proyección (si existen)
@@ -3312,30 +8088,30 @@ def main():
                     # Proyección Conservadora primero (para fill='tonexty')
                     if proj_conservative is not None and len(proj_conservative) > 0:
                         fig.add_trace(go.Scatter(
-                            x=proj_conservative.index,
-                            y=proj_conservative['Conservative_Value'],
-                            name=f"Proj. Conservative" if is_en else f"Proy. Conservador",
+                            x=chart_dates(proj_conservative.index),
+                            y=chart_values(proj_conservative['Conservative_Value']),
+                            name=get_text('lynch_proj_conservative'),
                             line=dict(color='#8B9DC3', width=1.5, dash='dot'),
                             opacity=0.6,
                             showlegend=False,
-                            hovertemplate='%{x|%Y-%m-%d}<br>Projected Conservative: $%{y:.2f}<extra></extra>' if is_en else '%{x|%Y-%m-%d}<br>Conservador Proyectado: $%{y:.2f}<extra></extra>'
+                            hovertemplate=get_text('hover_proj_conservative')
                         ))
                     
                     # Proyección Fair Value con banda
-                    proj_legend = f"Projection" if is_en else f"Proyección"
+                    proj_legend = get_text('lynch_projection')
                     fig.add_trace(go.Scatter(
-                        x=proj_fair.index,
-                        y=proj_fair['Fair_Value'],
+                        x=chart_dates(proj_fair.index),
+                        y=chart_values(proj_fair['Fair_Value']),
                         name=proj_legend,
                         line=dict(color='#FFB74D', width=2, dash='dot'),
                         fill='tonexty' if proj_conservative is not None and len(proj_conservative) > 0 else None,
                         fillcolor='rgba(255, 183, 77, 0.08)',
                         opacity=0.7,
-                        hovertemplate='%{x|%Y-%m-%d}<br>Projected Fair Value: $%{y:.2f}<extra></extra>' if is_en else '%{x|%Y-%m-%d}<br>Valor Justo Proyectado: $%{y:.2f}<extra></extra>'
+                        hovertemplate=get_text('hover_proj_fair_value')
                     ))
                     
                     # Añadir anotación de "Projection"
-                    annotation_text = "PROJECTION" if is_en else "PROYECCIÓN"
+                    annotation_text = get_text('lynch_projection_annotation')
                     mid_proj_idx = len(proj_fair) // 2
                     fig.add_annotation(
                         x=proj_fair.index[mid_proj_idx],
@@ -3358,6 +8134,7 @@ def main():
                     plot_bgcolor='rgba(15, 15, 25, 0.8)',
                     font=dict(family='JetBrains Mono, monospace', color='rgba(255,255,255,0.8)'),
                     xaxis=dict(
+                        type='date',
                         showgrid=True,
                         gridcolor='rgba(255,255,255,0.05)',
                         linecolor='rgba(255,255,255,0.1)',
@@ -3416,49 +8193,49 @@ def main():
                     if is_deep_value:
                         status_color = "#00FFFF"  # Cian brillante
                         status_icon = "💎"
-                        status_text = "DEEP VALUE" if is_en else "OPORTUNIDAD PROFUNDA"
-                        status_desc = f"Price is {abs(discount_vs_conservative):.1f}% below conservative value. Market is extremely pessimistic." if is_en else f"El precio está {abs(discount_vs_conservative):.1f}% por debajo del valor conservador. El mercado es muy pesimista."
+                        status_text = get_text('status_deep_value')
+                        status_desc = get_text('status_deep_value_desc').format(pct=abs(discount_vs_conservative))
                     
                     # PRIORIDAD 2: Claramente sobrevalorado (> 20% sobre fair value)
                     elif premium_discount > 20:
                         status_color = "#FF006E"
                         status_icon = "🔴"
-                        status_text = "OVERVALUED" if is_en else "SOBREVALORADO"
-                        status_desc = f"Price is {premium_discount:.1f}% above fair value" if is_en else f"El precio está {premium_discount:.1f}% por encima del valor justo"
+                        status_text = get_text('status_overvalued')
+                        status_desc = get_text('status_above_fair_desc').format(pct=premium_discount)
                     
                     # PRIORIDAD 3: Ligeramente sobrevalorado (0-20% sobre fair value)
                     elif premium_discount > 0:
                         status_color = "#FFB74D"
                         status_icon = "🟡"
-                        status_text = "SLIGHTLY OVERVALUED" if is_en else "LIGERAMENTE SOBREVALORADO"
-                        status_desc = f"Price is {premium_discount:.1f}% above fair value" if is_en else f"El precio está {premium_discount:.1f}% por encima del valor justo"
+                        status_text = get_text('status_slightly_overvalued')
+                        status_desc = get_text('status_above_fair_desc').format(pct=premium_discount)
                     
                     # PRIORIDAD 4: High PE Warning (PER > 35, pero precio aún sobre conservador)
                     elif is_high_pe:
                         status_color = "#FFB74D"
                         status_icon = "⚠️"
-                        status_text = "PRICED FOR PERFECTION" if is_en else "PRECIO DE PERFECCIÓN"
-                        status_desc = f"High P/E ({fair_multiplier:.0f}x) requires sustained high growth" if is_en else f"PER alto ({fair_multiplier:.0f}x) requiere crecimiento alto sostenido"
+                        status_text = get_text('status_priced_perfection')
+                        status_desc = get_text('status_priced_perfection_desc').format(pe=fair_multiplier)
                     
                     # PRIORIDAD 5: Fair Value (PER normal, precio cercano al fair value)
                     elif premium_discount > -20:
                         status_color = "#E2D1F3"
                         status_icon = "⚖️"
-                        status_text = "FAIR VALUE" if is_en else "VALOR JUSTO"
-                        status_desc = f"Price is {abs(premium_discount):.1f}% below fair value" if is_en else f"El precio está {abs(premium_discount):.1f}% por debajo del valor justo"
+                        status_text = get_text('status_fair_value')
+                        status_desc = get_text('status_below_fair_desc').format(pct=abs(premium_discount))
                     
                     # PRIORIDAD 6: Undervalued (PER normal, precio muy por debajo del fair value)
                     else:
                         status_color = "#00FF9F"
                         status_icon = "🟢"
-                        status_text = "UNDERVALUED" if is_en else "INFRAVALORADO"
-                        status_desc = f"Price is {abs(premium_discount):.1f}% below fair value" if is_en else f"El precio está {abs(premium_discount):.1f}% por debajo del valor justo"
+                        status_text = get_text('status_undervalued')
+                        status_desc = get_text('status_below_fair_desc').format(pct=abs(premium_discount))
                     
                     cols_status = st.columns([1, 2, 1])
                     with cols_status[1]:
                         # Mostrar status con 3 métricas
                         conservative_value_text = f"${current_conservative:.2f}" if current_conservative and current_conservative > 0 else "N/A"
-                        conservative_label = 'Conservative (PEG=1)' if is_en else 'Conservador (PEG=1)'
+                        conservative_label = get_text('conservative_peg1_label')
                         
                         st.markdown(f"""
                         <div style='background: linear-gradient(135deg, rgba(15, 15, 25, 0.9) 0%, rgba(20, 20, 35, 0.9) 100%); 
@@ -3473,11 +8250,11 @@ def main():
                             </div>
                             <div style='display: flex; justify-content: space-around; margin-top: 15px; padding-top: 15px; border-top: 1px solid rgba(255,255,255,0.1);'>
                                 <div>
-                                    <div style='font-size: 0.65rem; color: rgba(255,255,255,0.5);'>{'Current Price' if is_en else 'Precio Actual'}</div>
+                                    <div style='font-size: 0.65rem; color: rgba(255,255,255,0.5);'>{get_text('current_price')}</div>
                                     <div style='font-size: 1rem; color: #00FF9F; font-weight: bold;'>${current_price:.2f}</div>
                                 </div>
                                 <div>
-                                    <div style='font-size: 0.65rem; color: rgba(255,255,255,0.5);'>{'Fair Value' if is_en else 'Valor Justo'}</div>
+                                    <div style='font-size: 0.65rem; color: rgba(255,255,255,0.5);'>{get_text('fair_value_label')}</div>
                                     <div style='font-size: 1rem; color: #FFB74D; font-weight: bold;'>${current_fair:.2f}</div>
                                 </div>
                                 <div>
@@ -3489,20 +8266,13 @@ def main():
                         """, unsafe_allow_html=True)
                 
                 # Nota metodológica con multiplicador dinámico
-                if is_en:
-                    method_note = f"ℹ️ Fair value = EPS × {fair_multiplier} (historical median P/E). "
-                    method_note += f"Conservative (PEG=1) = EPS × {conservative_multiplier} (based on growth rate, floor 15, cap 25). "
-                    if method_used == "current_eps_only":
-                        method_note += "Using current EPS only."
-                    else:
-                        method_note += "Projection: 1 year using Forward EPS."
+                method_note = get_text('lynch_method_note').format(
+                    fair=fair_multiplier, conservative=conservative_multiplier
+                )
+                if method_used == "current_eps_only":
+                    method_note += get_text('lynch_method_current_eps')
                 else:
-                    method_note = f"ℹ️ Valor justo = EPS × {fair_multiplier} (mediana histórica del P/E). "
-                    method_note += f"Conservador (PEG=1) = EPS × {conservative_multiplier} (basado en tasa de crecimiento, mín 15, máx 25). "
-                    if method_used == "current_eps_only":
-                        method_note += "Usando solo EPS actual."
-                    else:
-                        method_note += "Proyección: 1 año usando Forward EPS."
+                    method_note += get_text('lynch_method_projection')
                 
                 st.markdown(f"""
                 <div style='font-size: 0.65rem; color: rgba(255,183,77,0.6); font-family: monospace; margin-top: 15px; text-align: center;'>
@@ -3511,23 +8281,28 @@ def main():
                 """, unsafe_allow_html=True)
                 
             except Exception as e:
-                st.warning(f"{'Could not generate Peter Lynch chart' if is_en else 'No se pudo generar el gráfico de Peter Lynch'}: {str(e)}")
+                st.warning(f"{get_text('lynch_chart_error')}: {str(e)}")
         else:
             # Mostrar mensaje de error específico si está disponible
             error_msg = lynch_data.get("error", "") if lynch_data else ""
-            if error_msg:
-                no_data_msg = f"{'Could not generate chart' if is_en else 'No se pudo generar el gráfico'}: {error_msg}"
+            if band_pending:
+                no_data_msg = get_text('section_pending')
+            elif error_msg:
+                no_data_msg = f"{get_text('chart_error')}: {error_msg}"
             else:
-                no_data_msg = "Not enough earnings data available to generate the Peter Lynch chart" if is_en else "No hay suficientes datos de beneficios disponibles para generar el gráfico de Peter Lynch"
+                no_data_msg = get_text('lynch_no_eps_data')
             st.info(no_data_msg)
         
+        # Backtest de la señal de la banda
+        display_backtest_panel(ticker)
+        display_ai_screen_panel(ticker, api_key)
+        
         # =====================================================================
         # SECCIÓN DE INSIDERS Y INSTITUCIONALES
         # =====================================================================
         st.markdown("---")
         
-        is_en = st.session_state.get('language', 'es') == 'en'
-        insiders_title = "👔 INSIDER & INSTITUTIONAL DATA" if is_en else "👔 DATOS DE INSIDERS E INSTITUCIONALES"
+        insiders_title = get_text('insiders_title')
         st.markdown(f"""
         <div style='margin: 30px 0 20px 0;'>
             <span style='font-family: "JetBrains Mono", monospace; color: #6464FF; font-size: 1.2rem; 
@@ -3538,11 +8313,19 @@ def main():
         """, unsafe_allow_html=True)
         
         # Obtener datos de insiders
-        insider_data = get_insider_data(ticker)
+        # Último valor bueno al instante (se refresca en segundo plano si caducó)
+        try:
+            insider_data, insiders_fetched_at = run_for_session(
+                token, fetch_swr, ticker, "insiders", get_insider_data, ticker, deadline=deadline)
+            insiders_pending = False
+        except DeadlineExceeded:
+            insider_data, insiders_pending = None, True
+        if insider_data and time.time() - insiders_fetched_at >= INSIDERS_FRESH_SECONDS:
+            st.caption(freshness_caption(insiders_fetched_at, ticker, "insiders"))
         
         if insider_data:
             # ==================== RESUMEN DE PROPIEDAD ====================
-            major_title = "📊 Ownership Summary" if is_en else "📊 Resumen de Propiedad"
+            major_title = get_text('ownership_summary')
             with st.expander(major_title, expanded=True):
                 ownership_info = insider_data.get("ownership_info")
                 
@@ -3557,7 +8340,7 @@ def main():
                             pct_value = f"{inst_pct * 100:.2f}%" if inst_pct < 1 else f"{inst_pct:.2f}%"
                         else:
                             pct_value = "N/A"
-                        label = "Institutional Ownership" if is_en else "Participación Institucional"
+                        label = get_text('institutional_ownership')
                         st.markdown(f"""
                         <div style='background: rgba(15, 15, 25, 0.6); border-radius: 10px; padding: 15px; 
                                     border: 1px solid rgba(100, 100, 255, 0.3); margin-bottom: 10px;'>
@@ -3582,7 +8365,7 @@ def main():
                                 formatted_value = f"{float_shares:,.0f}"
                         else:
                             formatted_value = "N/A"
-                        label = "Float Shares" if is_en else "Acciones en Circulación (Float)"
+                        label = get_text('float_shares')
                         st.markdown(f"""
                         <div style='background: rgba(15, 15, 25, 0.6); border-radius: 10px; padding: 15px; 
                                     border: 1px solid rgba(0, 255, 159, 0.3); margin-bottom: 10px;'>
@@ -3596,7 +8379,7 @@ def main():
                         """, unsafe_allow_html=True)
                     
                     # Nota informativa
-                    note_text = "ℹ️ Data sourced from Yahoo Finance. Float shares are the shares available for public trading." if is_en else "ℹ️ Datos obtenidos de Yahoo Finance. Las acciones float son las disponibles para negociación pública."
+                    note_text = get_text('ownership_note')
                     st.markdown(f"""
                     <div style='font-size: 0.65rem; color: rgba(255,183,77,0.7); font-family: monospace; margin-top: 10px; margin-bottom: 10px; padding: 10px; 
                                 background: rgba(255,183,77,0.1); border-radius: 6px; border-left: 3px solid rgba(255,183,77,0.5);'>
@@ -3609,10 +8392,10 @@ def main():
                     major_df = insider_data["major_holders"]
                     
                     label_translations = {
-                        'insidersPercentHeld': ('Insiders Ownership' if is_en else 'Participación de Insiders', '#FF006E'),
-                        'institutionsPercentHeld': ('Institutional Ownership' if is_en else 'Participación Institucional', '#6464FF'),
-                        'institutionsFloatPercentHeld': ('Institutions % of Float' if is_en else '% Institucional del Float', '#6464FF'),
-                        'institutionsCount': ('Number of Institutions' if is_en else 'Número de Instituciones', '#00FF9F'),
+                        'insidersPercentHeld': (get_text('insiders_ownership'), '#FF006E'),
+                        'institutionsPercentHeld': (get_text('institutional_ownership'), '#6464FF'),
+                        'institutionsFloatPercentHeld': (get_text('institutions_pct_float'), '#6464FF'),
+                        'institutionsCount': (get_text('institutions_count'), '#00FF9F'),
                     }
                     
                     cols = st.columns(2)
@@ -3656,11 +8439,11 @@ def main():
                             """, unsafe_allow_html=True)
                         col_idx += 1
                 else:
-                    no_data_msg = "No ownership data available" if is_en else "No hay datos de propiedad disponibles"
+                    no_data_msg = get_text('no_ownership_data')
                     st.info(no_data_msg)
             
             # ==================== TENEDORES INSTITUCIONALES ====================
-            inst_title = "🏦 Top Institutional Holders" if is_en else "🏦 Principales Tenedores Institucionales"
+            inst_title = get_text('top_institutional_holders')
             with st.expander(inst_title):
                 if insider_data.get("institutional_holders") is not None:
                     inst_df = insider_data["institutional_holders"].head(10)
@@ -3668,11 +8451,11 @@ def main():
                     
                     # Renombrar columnas
                     col_names = {
-                        'Holder': 'Institution' if is_en else 'Institución', 
-                        'Shares': 'Shares' if is_en else 'Acciones', 
-                        'Date Reported': 'Date' if is_en else 'Fecha', 
-                        'pctHeld': '% Held' if is_en else '% Posición', 
-                        'Value': 'Value' if is_en else 'Valor'
+                        'Holder': get_text('col_institution'), 
+                        'Shares': get_text('col_shares'), 
+                        'Date Reported': get_text('col_date'), 
+                        'pctHeld': get_text('col_pct_held'), 
+                        'Value': get_text('col_value')
                     }
                     
                     for old_col, new_col in col_names.items():
@@ -3692,11 +8475,11 @@ def main():
                     
                     st.dataframe(display_df, use_container_width=True, hide_index=True)
                 else:
-                    no_data_msg = "No institutional holders data available" if is_en else "No hay datos de institucionales disponibles"
+                    no_data_msg = get_text('no_institutional_data')
                     st.info(no_data_msg)
             
             # ==================== SHORT INTEREST (INTERÉS EN CORTO) ====================
-            short_title = "📉 Short Interest" if is_en else "📉 Interés en Corto"
+            short_title = get_text('short_interest')
             with st.expander(short_title, expanded=False):
                 ownership_info = insider_data.get("ownership_info")
                 
@@ -3715,7 +8498,7 @@ def main():
                                 formatted_value = f"{shares_short:,.0f}"
                         else:
                             formatted_value = "N/A"
-                        label = "Shares Short" if is_en else "Acciones en Corto"
+                        label = get_text('shares_short')
                         st.markdown(f"""
                         <div style='background: rgba(15, 15, 25, 0.6); border-radius: 10px; padding: 15px; 
                                     border: 1px solid rgba(255, 0, 110, 0.3); text-align: center;'>
@@ -3743,7 +8526,7 @@ def main():
                         else:
                             formatted_value = "N/A"
                             ratio_color = "#6464FF"
-                        label = "Short Ratio (Days)" if is_en else "Ratio en Corto (Días)"
+                        label = get_text('short_ratio_days')
                         st.markdown(f"""
                         <div style='background: rgba(15, 15, 25, 0.6); border-radius: 10px; padding: 15px; 
                                     border: 1px solid rgba(100, 100, 255, 0.3); text-align: center;'>
@@ -3772,7 +8555,7 @@ def main():
                         else:
                             formatted_value = "N/A"
                             pct_color = "#6464FF"
-                        label = "% Float Short" if is_en else "% Float en Corto"
+                        label = get_text('float_short_pct')
                         st.markdown(f"""
                         <div style='background: rgba(15, 15, 25, 0.6); border-radius: 10px; padding: 15px; 
                                     border: 1px solid rgba(0, 255, 159, 0.3); text-align: center;'>
@@ -3792,7 +8575,7 @@ def main():
                         change_pct = ((shares_short - shares_short_prior) / shares_short_prior) * 100
                         change_color = "#FF006E" if change_pct > 0 else "#00FF9F"
                         change_icon = "📈" if change_pct > 0 else "📉"
-                        change_text = f"{change_icon} {'Change vs Prior Month:' if is_en else 'Cambio vs Mes Anterior:'} <span style='color: {change_color};'>{'+' if change_pct > 0 else ''}{change_pct:.1f}%</span>"
+                        change_text = f"{change_icon} {get_text('change_vs_prior_month')} <span style='color: {change_color};'>{'+' if change_pct > 0 else ''}{change_pct:.1f}%</span>"
                         st.markdown(f"""
                         <div style='font-size: 0.75rem; color: rgba(255,255,255,0.6); font-family: monospace; margin-top: 15px; text-align: center;'>
                             {change_text}
@@ -3800,7 +8583,7 @@ def main():
                         """, unsafe_allow_html=True)
                     
                     # Nota explicativa
-                    note_text = "ℹ️ Short Ratio indicates days to cover all short positions at average daily volume. High % Float Short (>15%) may indicate bearish sentiment or potential short squeeze." if is_en else "ℹ️ El Ratio en Corto indica días para cubrir todas las posiciones cortas al volumen diario promedio. Alto % Float en Corto (>15%) puede indicar sentimiento bajista o potencial short squeeze."
+                    note_text = get_text('short_interest_note')
                     st.markdown(f"""
                     <div style='font-size: 0.65rem; color: rgba(255,183,77,0.7); font-family: monospace; margin-top: 15px; margin-bottom: 10px; padding: 10px; 
                                 background: rgba(255,183,77,0.1); border-radius: 6px; border-left: 3px solid rgba(255,183,77,0.5);'>
@@ -3808,11 +8591,11 @@ def main():
                     </div>
                     """, unsafe_allow_html=True)
                 else:
-                    no_data_msg = "No short interest data available for this ticker" if is_en else "No hay datos de interés en corto disponibles para este ticker"
+                    no_data_msg = get_text('no_short_data')
                     st.info(no_data_msg)
             
             # ==================== TRANSACCIONES DE INSIDERS ====================
-            activity_title = "📈 Recent Insider Transactions" if is_en else "📈 Transacciones Recientes de Insiders"
+            activity_title = get_text('insider_transactions')
             with st.expander(activity_title, expanded=False):
                 
                 has_transactions = insider_data.get("insider_transactions") is not None
@@ -3827,15 +8610,15 @@ def main():
                             return "—"
                         text_lower = str(text).lower()
                         if 'sale' in text_lower or 'sold' in text_lower:
-                            return "🔴 " + ("Sale" if is_en else "Venta")
+                            return "🔴 " + (get_text('tx_sale'))
                         elif 'purchase' in text_lower or 'bought' in text_lower or ('acquisition' in text_lower and 'non' not in text_lower):
-                            return "🟢 " + ("Buy" if is_en else "Compra")
+                            return "🟢 " + (get_text('tx_buy'))
                         elif 'exercise' in text_lower or 'conversion' in text_lower:
-                            return "🔵 " + ("Exercise" if is_en else "Ejercicio")
+                            return "🔵 " + (get_text('tx_exercise'))
                         elif 'gift' in text_lower:
-                            return "🟣 " + ("Gift" if is_en else "Regalo")
+                            return "🟣 " + (get_text('tx_gift'))
                         else:
-                            return "⚪ " + ("Other" if is_en else "Otro")
+                            return "⚪ " + (get_text('tx_other'))
                     
                     if 'Text' in display_df.columns:
                         display_df['Type'] = display_df['Text'].apply(get_transaction_type)
@@ -3848,11 +8631,11 @@ def main():
                     # Renombrar columnas
                     col_renames = {
                         'Insider': 'Insider',
-                        'Position': 'Position' if is_en else 'Cargo',
-                        'Type': 'Type' if is_en else 'Tipo',
-                        'Shares': 'Shares' if is_en else 'Acciones',
-                        'Value': 'Value' if is_en else 'Valor',
-                        'Start Date': 'Date' if is_en else 'Fecha'
+                        'Position': get_text('col_position'),
+                        'Type': get_text('col_type'),
+                        'Shares': get_text('col_shares'),
+                        'Value': get_text('col_value'),
+                        'Start Date': get_text('col_date')
                     }
                     display_df = display_df.rename(columns=col_renames)
                     
@@ -3867,15 +8650,17 @@ def main():
                     
                     st.dataframe(display_df, use_container_width=True, hide_index=True)
                 else:
-                    no_data_msg = "No insider activity data available" if is_en else "No hay datos de actividad insider disponibles"
+                    no_data_msg = get_text('no_insider_activity')
                     st.info(no_data_msg)
+        elif insiders_pending:
+            st.info(get_text('section_pending'))
         else:
-            no_insider_msg = "Could not retrieve insider data for this ticker" if is_en else "No se pudieron obtener datos de insiders para este ticker"
+            no_insider_msg = get_text('no_insider_data')
             st.warning(no_insider_msg)
     
     # Mensaje si se presiona analizar sin ticker
     elif analyze_button and not ticker_input:
-        warning_msg = "⚠ Please enter a ticker to analyze" if st.session_state.get('language', 'es') == 'en' else "⚠ Por favor, introduce un ticker para analizar"
+        warning_msg = get_text('enter_ticker_warning')
         st.markdown(f"""
         <div style='background: rgba(255, 183, 77, 0.1); border: 1px solid rgba(255, 183, 77, 0.3);
                     border-radius: 8px; padding: 15px; font-family: monospace; text-align: center;'>
@@ -3883,13 +8668,17 @@ def main():
         </div>
         """, unsafe_allow_html=True)
     
+    # Secciones fuera de presupuesto: relanzar la página cuando lleguen
+    if st.session_state.get('pending_sections'):
+        poll_pending_sections()
+    
     # Footer retrofuturista
-    methodology_text = "Based on" if st.session_state.get('language', 'es') == 'en' else "Basado en la metodología de"
+    methodology_text = get_text('based_on')
     st.markdown(f"""
     <div style='margin-top: 50px; padding: 30px 0; border-top: 1px solid rgba(0, 255, 159, 0.1);'>
         <div style='text-align: center; font-family: monospace;'>
             <div style='color: rgba(255,255,255,0.4); font-size: 0.7rem; letter-spacing: 2px; margin-bottom: 10px;'>
-                {methodology_text} <span style='color: #00FF9F;'>PETER LYNCH</span> {'methodology' if st.session_state.get('language', 'es') == 'en' else ''}
+                {methodology_text} <span style='color: #00FF9F;'>PETER LYNCH</span> {get_text('methodology_suffix')}
             </div>
             <div style='color: rgba(255,255,255,0.3); font-size: 0.65rem;'>
                 <span style='color: #FF006E;'>Streamlit</span> • 
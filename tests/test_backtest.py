@@ -0,0 +1,73 @@
+"""Backtest vectorizado de la banda de Lynch: EPS point-in-time y rendimientos."""
+
+import os
+import sys
+import tempfile
+
+import numpy as np
+import pandas as pd
+import pytest
+
+os.environ.setdefault("LYNCHPANEL_DATA_DIR", tempfile.mkdtemp(prefix="lynchpanel-test-"))
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import app  # noqa: E402
+
+DATES = pd.bdate_range("2020-01-01", "2020-12-31")
+# EPS del ejercicio 2019: se publica 90 días después, el 30/03/2020
+EPS_REPORTS = {"LYN": {pd.Timestamp("2019-12-31"): 1.0}}
+PUBLISHED = pd.Timestamp("2019-12-31") + pd.Timedelta(days=app.EPS_REPORT_LAG_DAYS)
+
+
+def _closes():
+    """Barato antes de publicarse el EPS, P/E 20, caída bajo la banda en julio y subida en agosto."""
+    price = pd.Series(20.0, index=DATES)
+    price[DATES < pd.Timestamp("2020-03-01")] = 5.0
+    price[(DATES >= pd.Timestamp("2020-07-01")) & (DATES < pd.Timestamp("2020-08-01"))] = 5.0
+    price[DATES >= pd.Timestamp("2020-08-01")] = 50.0
+    return price.to_frame("LYN")
+
+
+def _adjusted(closes):
+    """Ajustados por dividendos: un 0,1 % diario más que los cierres."""
+    return closes.mul(1 + 0.001 * np.arange(len(closes)), axis=0)
+
+
+def test_eps_is_visible_only_after_the_report_lag():
+    eps, growth = app._point_in_time_eps(
+        {"LYN": {pd.Timestamp("2019-12-31"): 1.0, pd.Timestamp("2020-06-30"): 2.0}}, DATES)
+    assert eps.loc[DATES < PUBLISHED, "LYN"].isna().all()
+    assert eps.loc[PUBLISHED, "LYN"] == 1.0
+    second = pd.Timestamp("2020-06-30") + pd.Timedelta(days=app.EPS_REPORT_LAG_DAYS)
+    assert eps.loc[DATES >= second, "LYN"].eq(2.0).all()
+    assert growth.loc[DATES >= second, "LYN"].eq(1.0).all()
+
+
+def test_backtest_enters_only_once_eps_is_published():
+    result = app.run_lynch_band_backtest(_closes(), EPS_REPORTS)
+    trades = result["trades"]
+    assert len(trades) == 1
+    # Señal al primer cierre de julio, ejecución al siguiente; venta el primer día de agosto
+    assert trades["entry"].iloc[0] == pd.Timestamp("2020-07-02")
+    assert trades["exit"].iloc[0] == pd.Timestamp("2020-08-03")
+
+    # Sin retraso el EPS "se conoce" el 31/12 y el precio de enero ya parecería barato
+    lookahead = app.run_lynch_band_backtest(_closes(), EPS_REPORTS, report_lag_days=0)
+    assert lookahead["trades"]["entry"].iloc[0] < PUBLISHED
+
+
+def test_signals_use_closes_and_returns_use_adjusted_closes():
+    closes = _closes()
+    adjusted = _adjusted(closes)
+    raw = app.run_lynch_band_backtest(closes, EPS_REPORTS)
+    result = app.run_lynch_band_backtest(closes, EPS_REPORTS, adjusted_closes=adjusted)
+
+    # Mismas operaciones: el ajuste por dividendos no mueve las señales
+    pd.testing.assert_frame_equal(result["positions"], raw["positions"])
+
+    entry_close = adjusted.loc["2020-07-01", "LYN"]
+    exit_close = adjusted.loc["2020-08-03", "LYN"]
+    assert result["trades"]["return"].iloc[0] == pytest.approx(exit_close / entry_close - 1)
+    assert raw["trades"]["return"].iloc[0] == pytest.approx(50.0 / 5.0 - 1)
+    assert result["summary"].loc["LYN", "buy_hold_return"] == pytest.approx(
+        adjusted["LYN"].iloc[-1] / adjusted["LYN"].iloc[0] - 1)
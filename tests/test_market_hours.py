@@ -0,0 +1,58 @@
+"""Horario de mercado: las criptomonedas cotizan siempre."""
+
+import os
+import sys
+import tempfile
+
+import pandas as pd
+
+os.environ.setdefault("LYNCHPANEL_DATA_DIR", tempfile.mkdtemp(prefix="lynchpanel-test-"))
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import app  # noqa: E402
+
+# Sábado 17/10/2026 a las 03:00 UTC: cualquier bolsa con horario está cerrada
+SATURDAY_NIGHT = pd.Timestamp("2026-10-17 03:00", tz="UTC").timestamp()
+
+
+def test_crypto_exchange_is_always_open():
+    assert app.market_hours("BTC-USD", "CCC", "UTC") is None
+    assert app.market_is_open("BTC-USD", "CCC", "UTC", now=SATURDAY_NIGHT)
+    assert app.quote_expiry("BTC-USD", SATURDAY_NIGHT, 60, "CCC", "UTC") == SATURDAY_NIGHT + 60
+
+
+def test_crypto_history_expires_by_ttl_on_weekends(tmp_path):
+    index = pd.date_range("2026-09-01", periods=30, freq="D", tz="UTC")
+    hist = pd.DataFrame({"Close": range(30)}, index=index, dtype=float)
+    store = app.PriceStore(str(tmp_path))
+    store.write("BTC-USD", "5y", hist, now=SATURDAY_NIGHT, exchange="CCC")
+    frame, fetched_at = store.read("BTC-USD", "5y")
+
+    exchange = frame.attrs["exchange"]
+    assert exchange == "CCC"
+    assert not app.quote_is_fresh("BTC-USD", fetched_at, 60, exchange, "UTC", now=SATURDAY_NIGHT + 61)
+    # Sin la bolsa se aplicaría el horario por defecto y seguiría "vigente" hasta el lunes
+    assert app.quote_is_fresh("BTC-USD", fetched_at, 60, None, "UTC", now=SATURDAY_NIGHT + 61)
+
+
+def _local_expiry(symbol, fetched, tz):
+    expiry = app.quote_expiry(symbol, pd.Timestamp(fetched, tz="UTC").timestamp(), 60)
+    return pd.Timestamp(expiry, unit="s", tz="UTC").tz_convert(tz)
+
+
+def test_weekend_quote_expires_at_monday_open_across_dst_changes():
+    # Fin del horario de verano: EE. UU. el 2/11/2025, Europa el 26/10/2025
+    assert _local_expiry("AAPL", "2025-11-01 12:00", "America/New_York") == \
+        pd.Timestamp("2025-11-03 09:30", tz="America/New_York")
+    assert _local_expiry("SAP.DE", "2025-10-25 12:00", "Europe/Berlin") == \
+        pd.Timestamp("2025-10-27 09:00", tz="Europe/Berlin")
+    # Inicio del horario de verano: EE. UU. el 8/3/2026, Europa el 29/3/2026
+    assert _local_expiry("AAPL", "2026-03-07 12:00", "America/New_York") == \
+        pd.Timestamp("2026-03-09 09:30", tz="America/New_York")
+    assert _local_expiry("SAP.DE", "2026-03-28 12:00", "Europe/Berlin") == \
+        pd.Timestamp("2026-03-30 09:00", tz="Europe/Berlin")
+
+
+def test_open_market_quote_expires_by_ttl():
+    monday = pd.Timestamp("2025-11-03 15:00", tz="UTC").timestamp()  # 10:00 en Nueva York
+    assert app.quote_expiry("AAPL", monday, 60) == monday + 60